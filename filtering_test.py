@@ -19,6 +19,10 @@ if __name__ == "__main__":
     ]
     print(smsa_datasets)
 
+    # peek at the first examples of a config without preparing it
+    print('Preview SMSA')
+    print(conhelps.preview('smsa_nusantara_text', n=3))
+
     # examples of other filters
     # ====================================================================
 
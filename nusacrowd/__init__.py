@@ -1,5 +1,32 @@
-from .config_helper import NusantaraMetadata, NusantaraConfigHelper, NusantaraMetadataHelper
-from .utils.constants import Tasks
-from .config_helper import list_datasets, load_dataset, load_datasets, list_benchmarks, load_benchmark
+# Public names are resolved on first access (PEP 562), so `import nusacrowd`
+# and `from nusacrowd.utils import schemas` in loader scripts do not pay for
+# `config_helper` and its dependencies.
+_LAZY_ATTRIBUTES = {
+    "NusantaraMetadata": ".config_helper",
+    "NusantaraConfigHelper": ".config_helper",
+    "NusantaraMetadataHelper": ".config_helper",
+    "list_datasets": ".config_helper",
+    "load_dataset": ".config_helper",
+    "load_datasets": ".config_helper",
+    "list_benchmarks": ".config_helper",
+    "load_benchmark": ".config_helper",
+    "Tasks": ".utils.constants",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
 
 __version__ = "0.1.1"
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
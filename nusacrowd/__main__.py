@@ -0,0 +1,174 @@
+"""
+Command line interface, e.g.
+
+    python -m nusacrowd export --benchmark IndoNLU --output-dir indonlu --format parquet
+    python -m nusacrowd export --schema nusantara_text --languages sun --output-dir sun_text
+    python -m nusacrowd mirror --benchmark IndoNLU --output-dir indonlu_pack --archive
+    python -m nusacrowd profile-memory --dataset posp nerp --output memory_report.txt
+    python -m nusacrowd cache enforce --budget 500GB --pin-benchmark IndoNLU --dry-run
+    python -m nusacrowd cache status --benchmark IndoNLU --rebuild
+"""
+import argparse
+import logging
+
+from .utils.cache_manager import parse_size
+
+
+def get_selection(args):
+    """Benchmark name, config names or a filtered `NusantaraConfigHelper` from the selection arguments."""
+    if args.benchmark:
+        return args.benchmark
+    if args.configs:
+        return args.configs
+
+    from .config_helper import NusantaraConfigHelper
+
+    def is_keeper(metadata):
+        return (
+            (not args.dataset or metadata.dataset_name in args.dataset)
+            and (not args.schema or metadata.config.schema in args.schema)
+            and (not args.languages or any(language in metadata.languages for language in args.languages))
+            and (args.include_large or not metadata.is_large)
+        )
+
+    return NusantaraConfigHelper().filtered(is_keeper)
+
+
+def add_selection_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group("selection")
+    group.add_argument("--benchmark", help="benchmark name of BENCHMARK_DICT")
+    group.add_argument("--configs", nargs="+", help="config names")
+    group.add_argument("--dataset", nargs="+", help="keep configs of these datasets")
+    group.add_argument("--schema", nargs="+", help="keep configs of these schemas, e.g. nusantara_text")
+    group.add_argument("--languages", nargs="+", help="keep configs covering any of these languages")
+    group.add_argument("--include-large", action="store_true", help="also keep large configs")
+
+
+def run_export(args):
+    from .utils.export import export
+
+    manifest = export(
+        get_selection(args),
+        args.output_dir,
+        export_format=args.format,
+        splits=args.splits,
+        max_shard_bytes=parse_size(args.max_shard_size),
+        num_proc=args.num_proc,
+        resume=not args.no_resume,
+        compression=args.compression,
+    )
+    num_splits = sum(len(splits) for splits in manifest["configs"].values())
+    print(f"Exported {num_splits} splits of {len(manifest['configs'])} configs to {args.output_dir}")
+
+
+def run_mirror(args):
+    from .config_helper import MIRROR_ENV_VARIABLE
+    from .utils.mirror import build_mirror
+
+    manifest = build_mirror(get_selection(args), args.output_dir, archive=args.archive)
+    print(f"Mirrored {manifest.get('num_urls', 0)} URLs ({manifest.get('num_bytes', 0)} bytes) of {len(manifest['configs'])} configs to {args.output_dir}")
+    print(f"Load offline with {MIRROR_ENV_VARIABLE}={args.output_dir} or `load_dataset(mirror=...)`")
+
+
+def run_profile_memory(args):
+    from .utils.memory_profile import profile_configs, write_report
+
+    profiles = profile_configs(
+        get_selection(args),
+        isolate=not args.no_isolate,
+        top=args.top,
+        sample_interval=args.sample_interval,
+        trace_allocations=not args.rss_only,
+        num_frames=args.num_frames,
+    )
+    write_report(profiles, args.output, top=args.top)
+    print(f"Profiled {len(profiles)} configs, report written to {args.output}")
+
+
+def run_cache(args):
+    from .utils.cache_manager import CacheManager, format_entries
+
+    manager = CacheManager(args.cache_dir, pinned_benchmarks=args.pin_benchmark or (), pinned_configs=args.pin or ())
+    if args.cache_command == "list":
+        entries = manager.inventory()
+        if args.sort == "size":
+            entries.sort(key=lambda entry: entry.num_bytes, reverse=True)
+        elif args.sort == "access":
+            entries.sort(key=lambda entry: entry.last_access)
+        print(format_entries(entries))
+        print(f"{len(entries)} configs, {manager.total_bytes(entries) / 2**30:.2f} GiB in {manager.cache_root}")
+        return
+    if args.cache_command == "status":
+        from .config_helper import NusantaraConfigHelper
+        from .utils.export import iter_selected_metadata
+        from .utils.fingerprint import format_statuses
+
+        helpers = NusantaraConfigHelper(helpers=list(iter_selected_metadata(get_selection(args))))
+        statuses = helpers.cache_status(args.cache_dir, verify_sources=args.verify_sources, rebuild=args.rebuild)
+        print(format_statuses(statuses))
+        return
+    if args.cache_command == "evict":
+        entries = manager.evict(args.configs)
+    else:
+        entries = manager.enforce_budget(parse_size(args.budget), dry_run=args.dry_run)
+    action = "Would evict" if getattr(args, "dry_run", False) else "Evicted"
+    print(format_entries(entries))
+    print(f"{action} {len(entries)} configs")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nusacrowd", description="NusaCrowd dataset tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="export configs to Parquet or JSONL shards")
+    add_selection_arguments(export_parser)
+    export_parser.add_argument("--output-dir", required=True)
+    export_parser.add_argument("--format", choices=["parquet", "jsonl"], default="parquet")
+    export_parser.add_argument("--splits", nargs="+", default=None)
+    export_parser.add_argument("--max-shard-size", default="256MB", help="uncompressed size bound per shard, e.g. 512MB")
+    export_parser.add_argument("--compression", default="zstd", help="Parquet compression codec")
+    export_parser.add_argument("--num-proc", type=int, default=4, help="number of writer threads")
+    export_parser.add_argument("--no-resume", action="store_true", help="re-export splits that were already exported")
+    export_parser.set_defaults(func=run_export)
+
+    mirror_parser = subparsers.add_parser("mirror", help="download raw artifacts into an offline mirror pack")
+    add_selection_arguments(mirror_parser)
+    mirror_parser.add_argument("--output-dir", required=True, help="pack directory, extended if it exists")
+    mirror_parser.add_argument("--archive", action="store_true", help="also write <output-dir>.tar")
+    mirror_parser.set_defaults(func=run_mirror)
+
+    profile_parser = subparsers.add_parser("profile-memory", help="profile the memory used to prepare configs")
+    add_selection_arguments(profile_parser)
+    profile_parser.add_argument("--output", required=True, help="text report, full profiles are written next to it as .json")
+    profile_parser.add_argument("--top", type=int, default=5, help="allocation sites and functions reported per config")
+    profile_parser.add_argument("--sample-interval", type=float, default=0.05, help="seconds between RSS samples")
+    profile_parser.add_argument("--num-frames", type=int, default=6, help="traceback depth stored by tracemalloc")
+    profile_parser.add_argument("--rss-only", action="store_true", help="only sample RSS, without tracemalloc")
+    profile_parser.add_argument("--no-isolate", action="store_true", help="profile all configs in this process")
+    profile_parser.set_defaults(func=run_profile_memory)
+
+    cache_parser = subparsers.add_parser("cache", help="inspect and evict prepared caches")
+    cache_parser.add_argument("--cache-dir", default=None, help="datasets cache directory, defaults to HF_DATASETS_CACHE")
+    cache_parser.add_argument("--pin-benchmark", nargs="+", help="never evict configs of these benchmarks")
+    cache_parser.add_argument("--pin", nargs="+", help="never evict these configs")
+    cache_subparsers = cache_parser.add_subparsers(dest="cache_command", required=True)
+    list_parser = cache_subparsers.add_parser("list", help="list cached configs")
+    list_parser.add_argument("--sort", choices=["name", "size", "access"], default="name")
+    evict_parser = cache_subparsers.add_parser("evict", help="evict configs")
+    evict_parser.add_argument("configs", nargs="+")
+    status_parser = cache_subparsers.add_parser("status", help="report fresh, stale and missing configs")
+    add_selection_arguments(status_parser)
+    status_parser.add_argument("--verify-sources", action="store_true", help="rehash downloaded sources")
+    status_parser.add_argument("--rebuild", action="store_true", help="re-prepare stale configs")
+    enforce_parser = cache_subparsers.add_parser("enforce", help="evict least recently used configs to fit a budget")
+    enforce_parser.add_argument("--budget", required=True, help="cache size budget, e.g. 500GB")
+    enforce_parser.add_argument("--dry-run", action="store_true", help="only list the configs that would be evicted")
+    cache_parser.set_defaults(func=run_cache)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,20 +2,38 @@
 Utility for filtering and loading Nusantara datasets.
 """
 from collections import Counter
+from contextlib import nullcontext
 from importlib.machinery import SourceFileLoader
+import itertools
 import logging
 import os
 import pathlib
+import time
 from types import ModuleType
-from typing import Callable, Iterable, List, Optional, Dict
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional, Dict
 
 from dataclasses import dataclass
 from dataclasses import field
 import datasets
 
+from .utils.builder_utils import examples_to_dataset, get_download_manager, iter_split_examples
 from .utils.configs import NusantaraConfig
 from .utils.constants import Tasks, SCHEMA_TO_TASKS
-import pandas as pd
+from .utils.folds import FOLD_VIEW_DATASETS, get_fold_family, get_fold_index, load_fold_view
+
+if TYPE_CHECKING:
+    # deferred to the methods using them, see `tests/test_import_time.py`
+    import pandas as pd
+
+    from .utils.mixture import TaskMixture
+    from .utils.memory_profile import MemoryProfile
+    from .utils.fingerprint import CacheStatus
+    from .utils.flat_kb import FlatKB
+    from .utils.qa_store import QAStore
+    from .utils.statistics import DatasetStatistics
+    from .utils.tracing import Tracer
+
+MIRROR_ENV_VARIABLE = "NUSACROWD_MIRROR"
 
 _LARGE_CONFIG_NAMES = [
     'covost2_ind_eng_nusantara_sptext',
@@ -632,22 +650,206 @@ class NusantaraMetadata:
 
     def load_dataset(
         self,
+        use_fold_views: bool = True,
+        mirror: Optional[str] = None,
+        tracer: Optional["Tracer"] = None,
+        single_flight: bool = True,
+        lock_timeout: Optional[float] = None,
+        fail_fast: bool = False,
+        **extra_load_dataset_kwargs,
+    ):
+        """
+        Load this config with `datasets.load_dataset`.
+
+        With `single_flight`, loading holds a lock per config (per fold family
+        for fold views) shared by all processes using the same cache directory,
+        so only one of them prepares the config while the others wait and then
+        load the finished cache, see `nusacrowd.utils.locking`. `lock_timeout`
+        bounds the wait (raising `PreparationLockTimeout`), and `fail_fast`
+        raises `PreparationInProgress` instead of waiting.
+
+        K-fold configs of `FOLD_VIEW_DATASETS` are loaded as index views over
+        a pool shared by all folds (see `nusacrowd.utils.folds`) unless
+        `use_fold_views` is False or unsupported loading kwargs are given.
+
+        With a `mirror` pack (or the `NUSACROWD_MIRROR` environment variable),
+        raw files are resolved from the pack without network calls, see
+        `nusacrowd.utils.mirror`.
+
+        With a `tracer`, the time spent in each preparation stage is recorded,
+        see `nusacrowd.utils.tracing`.
+
+        The access is recorded for LRU eviction, and `NUSACROWD_CACHE_BUDGET`
+        is enforced if set, see `nusacrowd.utils.cache_manager`. A freshly
+        prepared cache gets a fingerprint of the code and sources that
+        prepared it, see `nusacrowd.utils.fingerprint`.
+        """
+        if extra_load_dataset_kwargs.get("streaming"):
+            return self._load_dataset(use_fold_views, mirror, tracer, **extra_load_dataset_kwargs)
+
+        from .utils.cache_manager import enforce_budget_from_env, record_access
+        from .utils.fingerprint import get_cache_name, record_fingerprint
+        from .utils.locking import preparation_lock
+
+        cache_name = get_cache_name(self, use_fold_views)
+        cache_dir = extra_load_dataset_kwargs.get("cache_dir")
+        # mtimes of the cache files may lag behind the clock a little
+        started = time.time() - 1
+        if single_flight:
+            with preparation_lock(cache_name, cache_dir, timeout=lock_timeout, fail_fast=fail_fast):
+                dataset = self._load_dataset(use_fold_views, mirror, tracer, **extra_load_dataset_kwargs)
+                record_fingerprint(self, dataset, started, cache_dir, use_fold_views)
+        else:
+            dataset = self._load_dataset(use_fold_views, mirror, tracer, **extra_load_dataset_kwargs)
+            record_fingerprint(self, dataset, started, cache_dir, use_fold_views)
+        record_access(cache_name, cache_dir)
+        enforce_budget_from_env(cache_dir, protect=[cache_name])
+        return dataset
+
+    def _load_dataset(
+        self,
+        use_fold_views: bool,
+        mirror: Optional[str],
+        tracer: Optional["Tracer"],
         **extra_load_dataset_kwargs,
     ):
+        mirror = mirror or os.environ.get(MIRROR_ENV_VARIABLE)
+        if mirror and not extra_load_dataset_kwargs.get("streaming"):
+            from .utils.mirror import load_from_mirror
+
+            return load_from_mirror(self.get_load_dataset_kwargs(**extra_load_dataset_kwargs), mirror, tracer=tracer)
+        if use_fold_views and self.is_fold_view and set(extra_load_dataset_kwargs) <= {"cache_dir", "download_config"}:
+            with tracer.span("load_dataset", self.config.name, fold_view=True) if tracer else nullcontext():
+                return load_fold_view(
+                    self.script,
+                    self.config.name,
+                    self.fold_config_names,
+                    cache_dir=extra_load_dataset_kwargs.get("cache_dir"),
+                    download_config=extra_load_dataset_kwargs.get("download_config"),
+                )
+        if tracer is not None:
+            from .utils import tracing
+
+            return tracing.load_dataset(self.get_load_dataset_kwargs(**extra_load_dataset_kwargs), tracer)
         return datasets.load_dataset(
             path=self.script,
             name=self.config.name,
             **extra_load_dataset_kwargs,
         )
 
-    def get_metadata(self, **extra_load_dataset_kwargs):
+    @property
+    def is_fold_view(self) -> bool:
+        return self.dataset_name in FOLD_VIEW_DATASETS and get_fold_index(self.config.name) is not None
+
+    @property
+    def fold_config_names(self) -> List[str]:
+        """Names of all fold configs sharing data with this one (same dataset and schema)."""
+        family = get_fold_family(self.config.name)
+        return sorted(
+            config.name for config in self._ds_cls.BUILDER_CONFIGS
+            if get_fold_index(config.name) is not None and get_fold_family(config.name) == family
+        )
+
+    def preview(
+        self,
+        n: int = 5,
+        **extra_load_dataset_kwargs,
+    ) -> datasets.DatasetDict:
+        """
+        Load the first `n` examples of every split without preparing the dataset.
+
+        The builder's `_split_generators` and `_generate_examples` are driven
+        directly and stopped after `n` examples per split. Raw files are still
+        downloaded, but no Arrow cache is written.
+        """
+        builder = datasets.load_dataset_builder(**self.get_load_dataset_kwargs(**extra_load_dataset_kwargs))
+        dl_manager = get_download_manager(builder, extra_load_dataset_kwargs.get("download_config"), extra_load_dataset_kwargs.get("download_mode"))
+        return datasets.DatasetDict({
+            split: examples_to_dataset(list(itertools.islice(examples, n)), builder.info.features, split=split)
+            for split, examples in iter_split_examples(builder, dl_manager)
+        })
+
+    def load_splits(
+        self,
+        ratios: Optional[Dict[str, float]] = None,
+        seed: int = 42,
+        stratify_by: Optional[str] = None,
+        source_split: str = "train",
+        **extra_load_dataset_kwargs,
+    ) -> datasets.DatasetDict:
+        """
+        Load this config with `source_split` re-split into seeded splits, e.g. for configs with only a TRAIN split.
+
+        The row indices of the splits are computed once and stored next to
+        the prepared cache, each split is a selection over the cache, see
+        `nusacrowd.utils.splits.split_dataset`. The other splits of the config
+        are kept as they are.
+
+        :param ratios: fraction of rows per split, 80/10/10 train/validation/test by default
+        :param stratify_by: column keeping its class proportions in every split, e.g. `label`
+        """
+        from .utils.splits import split_dataset
+
+        dsd = self.load_dataset(**extra_load_dataset_kwargs)
+        splits = split_dataset(dsd[source_split], ratios, seed, stratify_by)
+        kept = {split: dataset for split, dataset in dsd.items() if split != source_split}
+        if set(kept) & set(splits):
+            raise ValueError(f"{self.config.name} already has the splits {sorted(set(kept) & set(splits))}")
+        return datasets.DatasetDict({**splits, **kept})
+
+    def load_flat_kb(self, **extra_load_dataset_kwargs) -> Dict[str, "FlatKB"]:
+        """
+        Load every split of this `nusantara_kb` config in the flat columnar KB layout.
+
+        Splits are converted once and saved next to the prepared cache, see
+        `nusacrowd.utils.flat_kb`.
+        """
+        from .utils.flat_kb import get_flat_kb
+
+        if self.config.schema != "nusantara_kb":
+            raise ValueError(f"only supported for the nusantara_kb schema, not {self.config.schema}")
+        dsd = self.load_dataset(**extra_load_dataset_kwargs)
+        return {split: get_flat_kb(dataset) for split, dataset in dsd.items()}
+
+    def load_qa_store(self, **extra_load_dataset_kwargs) -> Dict[str, "QAStore"]:
+        """
+        Load every split of this `nusantara_qa` config with each unique context stored once.
+
+        Splits are converted once and saved next to the prepared cache, see
+        `nusacrowd.utils.qa_store`.
+        """
+        from .utils.qa_store import get_qa_store
+
+        if self.config.schema != "nusantara_qa":
+            raise ValueError(f"only supported for the nusantara_qa schema, not {self.config.schema}")
+        dsd = self.load_dataset(**extra_load_dataset_kwargs)
+        return {split: get_qa_store(dataset) for split, dataset in dsd.items()}
+
+    def profile_memory(self, **profile_kwargs) -> "MemoryProfile":
+        """
+        Prepare this config with memory profiling (tracemalloc and RSS sampling).
+
+        See `nusacrowd.utils.memory_profile.profile_load` for the arguments.
+        """
+        from .utils.memory_profile import profile_load
+
+        return profile_load(self.get_load_dataset_kwargs(), **profile_kwargs)
+
+    def get_metadata(self, **extra_load_dataset_kwargs) -> Dict[str, "DatasetStatistics"]:
+        """
+        Compute schema statistics of every split of this config.
+
+        Statistics are computed with Arrow over the prepared cache and
+        memoized per dataset fingerprint.
+        """
+        from .utils.statistics import DatasetStatistics
+
         if not self.is_nusantara_schema:
             raise ValueError("only supported for nusantara schemas")
         dsd = self.load_dataset(**extra_load_dataset_kwargs)
         split_metas = {}
         for split, ds in dsd.items():
-            meta = SCHEMA_TO_METADATA_CLS[self.config.schema].from_dataset(ds)
-            split_metas[split] = meta
+            split_metas[split] = DatasetStatistics.from_dataset(ds, self.nusantara_schema_caps)
         return split_metas
 
 
@@ -802,6 +1004,10 @@ class NusantaraConfigHelper:
         else:
             raise TypeError("Invalid argument type.")
     
+    def preview(self, config_name: str, n: int = 5, **extra_load_dataset_kwargs) -> datasets.DatasetDict:
+        """Load the first `n` examples per split of a config, see `NusantaraMetadata.preview`."""
+        return self.for_config_name(config_name).preview(n=n, **extra_load_dataset_kwargs)
+
     def list_datasets(self, with_config=False):
         name_to_schema = {}
         for helper in self:
@@ -813,7 +1019,7 @@ class NusantaraConfigHelper:
         else:
             return name_to_schema
     
-    def load_dataset(self, dataset_name, schema='nusantara'):
+    def load_dataset(self, dataset_name, schema='nusantara', tracer=None):
         try:        
             for helper in sorted(self.filtered(
                     lambda x: (
@@ -821,13 +1027,13 @@ class NusantaraConfigHelper:
                         (x.is_nusantara_schema if schema == 'nusantara' else not x.is_nusantara_schema)
                     )
                 ), key=lambda x: len(x.config.name)):
-                return helper.load_dataset()
+                return helper.load_dataset(tracer=tracer)
         except:
             raise ValueError(f"Couldn't find dataset with name=`{dataset_name}` and schema=`{schema}`")
 
-    def load_datasets(self, dataset_names, schema='nusantara'):
+    def load_datasets(self, dataset_names, schema='nusantara', tracer=None):
         return {
-            helper.config.name: helper.load_dataset()
+            helper.config.name: helper.load_dataset(tracer=tracer)
             for helper in self.filtered(
                 lambda x: (
                     (x.dataset_name in dataset_names) and 
@@ -839,9 +1045,9 @@ class NusantaraConfigHelper:
     def list_benchmarks(self):
         return list(BENCHMARK_DICT.keys())
 
-    def load_benchmark(self, benchmark_name):
+    def load_benchmark(self, benchmark_name, tracer=None):
         return {
-            helper.config.name: helper.load_dataset()
+            helper.config.name: helper.load_dataset(tracer=tracer)
             for helper in self.filtered(
                 lambda x: (
                     x.config.name in BENCHMARK_DICT[benchmark_name]
@@ -849,6 +1055,48 @@ class NusantaraConfigHelper:
             )
         }
 
+    def cache_status(
+        self,
+        cache_dir: Optional[str] = None,
+        verify_sources: bool = False,
+        rebuild: bool = False,
+    ) -> List["CacheStatus"]:
+        """
+        Report whether the prepared cache of each config is fresh, stale or missing.
+
+        A cache is stale when the loader script, the `nusacrowd` modules it
+        imports or its raw sources changed since it was prepared, see
+        `nusacrowd.utils.fingerprint`. Nothing is loaded or downloaded.
+
+        :param verify_sources: rehash downloaded sources instead of comparing their sizes
+        :param rebuild: re-prepare the stale configs (once per fold family) and report their new status
+        """
+        from .utils.fingerprint import STALE, get_cache_name, get_cache_status
+        from .utils.fingerprint import rebuild as rebuild_cache
+
+        statuses = [get_cache_status(helper, cache_dir, verify_sources) for helper in self]
+        if not rebuild:
+            return statuses
+
+        rebuilt = set()
+        for i, (helper, status) in enumerate(zip(self, statuses)):
+            if status.status != STALE:
+                continue
+            cache_name = get_cache_name(helper)
+            if cache_name not in rebuilt:
+                rebuild_cache(helper, status, cache_dir)
+                rebuilt.add(cache_name)
+            statuses[i] = get_cache_status(helper, cache_dir, verify_sources)
+        return statuses
+
+    def load_mixture(self, names, split='train', **mixture_kwargs) -> "TaskMixture":
+        """Lazy multi-task mixture over a list of config names or a benchmark name, see `TaskMixture`."""
+        from .utils.mixture import TaskMixture
+
+        if isinstance(names, str):
+            return TaskMixture.from_benchmark(names, split=split, conhelps=self, **mixture_kwargs)
+        return TaskMixture.from_config_names(names, split=split, conhelps=self, **mixture_kwargs)
+
 # Metadata Helper
 @dataclass
 class MetaDict:
@@ -861,7 +1109,7 @@ class NusantaraMetadataHelper:
 
     def __init__(
         self,
-        meta_df: Optional[pd.DataFrame] = None,
+        meta_df: Optional["pd.DataFrame"] = None,
         keep_broken: bool = False
     ):
         # Load Config Helper
@@ -876,6 +1124,8 @@ class NusantaraMetadataHelper:
             return
         
         # Load Metadata
+        import pandas as pd
+
         self._meta_df = pd.read_csv('https://docs.google.com/spreadsheets/d/17o83IvWxmtGLYridZis0nEprHhsZIMeFtHGtXV35h6M/export?format=csv&gid=879729812', skiprows=1)
         self._meta_df = self._meta_df[self._meta_df['Implemented'] != 0].rename({
             'No.': 'id', 'Name': 'name', 'Subsets': 'subsets', 'Link': 'source_link', 'Description': 'description',
@@ -958,21 +1208,21 @@ def list_datasets(with_config=False):
     conhelps = NusantaraConfigHelper()
     return conhelps.list_datasets(with_config=with_config)
 
-def load_dataset(dataset_name, schema='nusantara'):
+def load_dataset(dataset_name, schema='nusantara', tracer=None):
     conhelps = NusantaraConfigHelper()
-    return conhelps.load_dataset(dataset_name=dataset_name, schema=schema)
+    return conhelps.load_dataset(dataset_name=dataset_name, schema=schema, tracer=tracer)
 
-def load_datasets(dataset_names, schema='nusantara'):
+def load_datasets(dataset_names, schema='nusantara', tracer=None):
     conhelps = NusantaraConfigHelper()
-    return conhelps.load_datasets(dataset_names=dataset_names, schema=schema)
+    return conhelps.load_datasets(dataset_names=dataset_names, schema=schema, tracer=tracer)
 
 def list_benchmarks():
     conhelps = NusantaraConfigHelper()
     return conhelps.list_benchmarks()
 
-def load_benchmark(benchmark_name):
+def load_benchmark(benchmark_name, tracer=None):
     conhelps = NusantaraConfigHelper()
-    return conhelps.load_benchmark(benchmark_name=benchmark_name)
+    return conhelps.load_benchmark(benchmark_name=benchmark_name, tracer=tracer)
 
 if __name__ == "__main__":
     print(f'LIST DATASETS')
@@ -2,11 +2,11 @@ from pathlib import Path
 from typing import List
 
 import datasets
-import pandas as pd
 
 from nusacrowd.utils import schemas
 from nusacrowd.utils.configs import NusantaraConfig
 from nusacrowd.utils.constants import DEFAULT_NUSANTARA_VIEW_NAME, DEFAULT_SOURCE_VIEW_NAME, Tasks
+from nusacrowd.utils.excel_cache import read_excel
 
 _DATASETNAME = "id_abusive_news_comment"
 _SOURCE_VIEW_NAME = DEFAULT_SOURCE_VIEW_NAME
@@ -94,7 +94,7 @@ class IdAbusiveNewsComment(datasets.GeneratorBasedBuilder):
         ]
 
     def _generate_examples(self, filepath: Path):
-        df = pd.read_excel(filepath).reset_index()
+        df = read_excel(filepath).reset_index()
 
         if self.config.schema == "source":
             for row in df.itertuples():
@@ -13,18 +13,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import os
 from pathlib import Path
 from typing import Dict, List, Tuple
 
 import datasets
 import pandas as pd
-from sklearn.model_selection import train_test_split
 
 from nusacrowd.utils import schemas
 from nusacrowd.utils.configs import NusantaraConfig
 from nusacrowd.utils.constants import (DEFAULT_NUSANTARA_VIEW_NAME,
                                        DEFAULT_SOURCE_VIEW_NAME, Tasks)
+from nusacrowd.utils.splits import train_test_indices
 
 _CITATION = """\
 @inproceedings{10.1145/3330482.3330491,
@@ -108,41 +107,21 @@ class IdHSDNofaaulia(datasets.GeneratorBasedBuilder):
 
     def _split_generators(self, dl_manager: datasets.DownloadManager) -> List[datasets.SplitGenerator]:
         """Returns SplitGenerators."""
-
         urls = _URLS[_DATASETNAME]
-        data_dir = Path(dl_manager.download_and_extract(urls))
-
-        data_files = {"train": os.path.join(data_dir.parent, "train.csv"), "test": os.path.join(data_dir.parent, "test.csv")}
-
-        df = pd.read_csv(data_dir)
-        df = df.dropna(axis=0)
-
-        features = [c for c in df.columns.values if c not in []]
-        target = "label"
-
-        # The split follows the implementation below
-        # https://github.com/IndoNLP/nusa-crowd/blob/master/nusantara/utils/schemas/pairs.py
-        # test_size=0.1, random_state=42
-        # tested locally using :
-        # scikit-learn 1.1.2
-        # python 3.10.4
-        x_train, x_test, y_train, y_test = train_test_split(df[features].replace(r'\s+|\\n', ' ', regex=True), df[target], test_size=0.1, random_state=42)
-
-        x_train.to_csv(data_files["train"], index=False)
-        x_test.to_csv(data_files["test"], index=False)
+        filepath = dl_manager.download_and_extract(urls)
 
         return [
             datasets.SplitGenerator(
                 name=datasets.Split.TRAIN,
                 gen_kwargs={
-                    "filepath": data_files["train"],
+                    "filepath": filepath,
                     "split": "train",
                 },
             ),
             datasets.SplitGenerator(
                 name=datasets.Split.TEST,
                 gen_kwargs={
-                    "filepath": data_files["test"],
+                    "filepath": filepath,
                     "split": "test",
                 },
             ),
@@ -151,8 +130,14 @@ class IdHSDNofaaulia(datasets.GeneratorBasedBuilder):
     def _generate_examples(self, filepath: Path, split: str) -> Tuple[int, Dict]:
         """Yields examples as (key, example) tuples."""
         # Dataset Split: 816 train, 0 validation, 91 test
+        df = pd.read_csv(filepath)
+        df = df.dropna(axis=0).replace(r'\s+|\\n', ' ', regex=True)
 
-        df = pd.read_csv(filepath).reset_index()
+        # The split follows the implementation below
+        # https://github.com/IndoNLP/nusa-crowd/blob/master/nusantara/utils/schemas/pairs.py
+        # sklearn's train_test_split with test_size=0.1, random_state=42, reproduced without sklearn
+        train_indices, test_indices = train_test_indices(len(df), test_size=0.1, seed=42)
+        df = df.iloc[train_indices if split == "train" else test_indices].reset_index(drop=True)
 
         if self.config.schema == "source":
             for row in df.itertuples():
@@ -1,6 +1,5 @@
 # Taken from https://github.com/valentinakania/indocoref/blob/main/src/utils/feature_utils.py
 import re
-import nltk
 
 PRONOUNS = ['dia', 'ia', 'beliau', 'mereka', 'kami', 'kita', 'aku', 'saya', 'kamu', 'anda', 'kalian']
 PRONOUN_SINGULAR = ['dia', 'ia', 'beliau', 'aku', 'saya', 'kamu', 'anda']
@@ -28,6 +27,8 @@ class FeatureUtils:
         PP: {<ADP><NOUN|PROPN|PRON>*}
         '''
 
+        import nltk
+
         chunk_parser = nltk.RegexpParser(grammar)
         return chunk_parser
 
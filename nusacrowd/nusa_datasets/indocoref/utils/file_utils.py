@@ -5,7 +5,6 @@ import pickle
 import json
 import logging
 from pathlib import Path
-from nltk.tokenize import sent_tokenize
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level = logging.INFO)
@@ -44,6 +43,8 @@ class FileUtils:
 
     @staticmethod
     def read_annotated_file(annotated_dir, name):
+        from nltk.tokenize import sent_tokenize
+
         with open(Path(annotated_dir).joinpath(name), 'r', encoding='utf-8') as f:
             annotated = f.read()
         sentences = sent_tokenize(annotated)
@@ -51,6 +52,8 @@ class FileUtils:
 
     @staticmethod
     def read_passage_file(passage_dir, name):
+        from nltk.tokenize import sent_tokenize
+
         passage_name = re.sub(r"_[0-9]{8}-[0-9]{6}.+", ".txt", name)
         with open(Path(passage_dir).joinpath(passage_name), 'r', encoding='utf-8') as f:
             passage = f.read()
@@ -124,10 +124,8 @@ class IndolemNERUGM(datasets.GeneratorBasedBuilder):
     def _split_generators(self, dl_manager: datasets.DownloadManager) -> List[datasets.SplitGenerator]:
         idx = self._get_fold_index()
 
-        urls = _URLS[_DATASETNAME]
-
-        for key in urls:
-            urls[key] = urls[key].format(fold_number=idx+1)
+        # format a copy, formatting `_URLS` in place would pin every later fold to the first one
+        urls = {key: url.format(fold_number=idx + 1) for key, url in _URLS[_DATASETNAME].items()}
 
         data_dir = dl_manager.download_and_extract(urls)
 
@@ -33,7 +33,6 @@ from pathlib import Path
 from typing import List
 
 import datasets
-import jsonlines
 
 from nusacrowd.utils import schemas
 from nusacrowd.utils.configs import NusantaraConfig
@@ -159,6 +158,7 @@ class IndoNli(datasets.GeneratorBasedBuilder):
         ]
 
     def _generate_examples(self, filepath: Path):
+        import jsonlines
 
         if self.config.schema == "source":
             print(filepath)
@@ -7,8 +7,6 @@ import datasets
 from nusacrowd.utils.configs import NusantaraConfig
 from nusacrowd.utils.constants import Tasks
 from nusacrowd.utils import schemas
-import jsonlines
-from nltk.tokenize.treebank import TreebankWordDetokenizer
 
 _CITATION = """\
 @INPROCEEDINGS{8629109,
@@ -149,6 +147,8 @@ class IndoSUM(datasets.GeneratorBasedBuilder):
         ]
 
     def _get_full_paragraph_and_summary(self, data: Dict) -> Tuple[str, str]:
+        from nltk.tokenize.treebank import TreebankWordDetokenizer
+
         detokenizer = TreebankWordDetokenizer()
         paragraph = ""
         summary = ""
@@ -175,6 +175,7 @@ class IndoSUM(datasets.GeneratorBasedBuilder):
         return paragraph, summary
 
     def _generate_examples(self, filepath: Path, split: str) -> Tuple[int, Dict]:
+        import jsonlines
 
         if self.config.schema == "source":
             i = 0
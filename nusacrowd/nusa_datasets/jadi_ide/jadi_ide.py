@@ -2,11 +2,11 @@ from pathlib import Path
 from typing import Dict, List, Tuple
 
 import datasets
-import pandas as pd
 
 from nusacrowd.utils import schemas
 from nusacrowd.utils.configs import NusantaraConfig
 from nusacrowd.utils.constants import Tasks
+from nusacrowd.utils.excel_cache import read_excel
 
 _CITATION = """\
 @article{hidayatullah2020attention,
@@ -106,7 +106,7 @@ class JaDi_Ide(datasets.GeneratorBasedBuilder):
 
     def _generate_examples(self, filepath: Path, split: str) -> Tuple[int, Dict]:
         """Yields examples as (key, example) tuples."""
-        df = pd.read_excel(filepath)
+        df = read_excel(filepath)
         df.columns = ["id", "text", "label"]
 
         if self.config.schema == "source":
@@ -24,12 +24,12 @@ import json
 from typing import List
 
 import datasets
-import zstandard as zstd
 
 from nusacrowd.utils import schemas
 from nusacrowd.utils.configs import NusantaraConfig
 from nusacrowd.utils.constants import (DEFAULT_NUSANTARA_VIEW_NAME,
                                        DEFAULT_SOURCE_VIEW_NAME, Tasks)
+from nusacrowd.utils.download import download
 
 _DATASETNAME = "kopi_cc"
 _LANGUAGES  = ["ind"]
@@ -177,7 +177,7 @@ class KoPICC(datasets.GeneratorBasedBuilder):
                 urls.extend([_URLS[split_name[1]].format(snapshot=m, index=k + idx) for k in range(_N_SHARDS_PER_SNAPSHOT[m].get(split_name[1]))])
         else:
             urls = [_URLS[split_name[1]].format(snapshot=split_name[0], index=k + 1) for k in range(_N_SHARDS_PER_SNAPSHOT[split_name[0]][split_name[1]])]
-        path = dl_manager.download(urls)
+        path = download(dl_manager, urls)
 
         return [
             datasets.SplitGenerator(
@@ -188,6 +188,8 @@ class KoPICC(datasets.GeneratorBasedBuilder):
 
     def _generate_examples(self, filepaths, split, type):
         """This function returns the examples in the raw (text) form by iterating on all the files."""
+        import zstandard as zstd
+
         id_ = 0
         for filepath in filepaths:
             if type == "raw":
@@ -23,12 +23,12 @@ import json
 from typing import List
 
 import datasets
-import zstandard as zstd
 
 from nusacrowd.utils import schemas
 from nusacrowd.utils.configs import NusantaraConfig
 from nusacrowd.utils.constants import (DEFAULT_NUSANTARA_VIEW_NAME,
                                        DEFAULT_SOURCE_VIEW_NAME, Tasks)
+from nusacrowd.utils.download import download
 
 _DATASETNAME = "kopi_cc_news"
 _LOCAL = False
@@ -114,7 +114,7 @@ class KoPICCNEWS(datasets.GeneratorBasedBuilder):
             urls = [_URLS.format(year=m) for m in _YEAR]
         else:
             urls = [_URLS.format(year=name)]
-        path = dl_manager.download(urls)
+        path = download(dl_manager, urls)
 
         return [
             datasets.SplitGenerator(
@@ -125,6 +125,8 @@ class KoPICCNEWS(datasets.GeneratorBasedBuilder):
 
     def _generate_examples(self, filepaths, split):
         """This function returns the examples in the raw (text) form by iterating on all the files."""
+        import zstandard as zstd
+
         id_ = 0
         for filepath in filepaths:
             with zstd.open(open(filepath, "rb"), "rt", encoding="utf-8") as f:
@@ -16,12 +16,12 @@
 import json
 
 import datasets
-import zstandard as zstd
 
 from nusacrowd.utils import schemas
 from nusacrowd.utils.configs import NusantaraConfig
 from nusacrowd.utils.constants import (DEFAULT_NUSANTARA_VIEW_NAME,
                                        DEFAULT_SOURCE_VIEW_NAME, Tasks)
+from nusacrowd.utils.download import download
 
 logger = datasets.logging.get_logger(__name__)
 
@@ -139,11 +139,13 @@ class KoPINLLB(datasets.GeneratorBasedBuilder):
             train = [_BASE_URL.format(tipe=split_name[1], lang=m) for m in _CONF_LANG]
         else:
             train = [_BASE_URL.format(tipe=split_name[1], lang=split_name[0])]
-        train_downloaded_files = dl_manager.download(train)
+        train_downloaded_files = download(dl_manager, train)
         return [datasets.SplitGenerator(name=datasets.Split.TRAIN, gen_kwargs={"filepaths": train_downloaded_files})]
 
     def _generate_examples(self, filepaths):
         """This function returns the examples in the raw (text) form by iterating on all the files."""
+        import zstandard as zstd
+
         id_ = 0
         for filepath in filepaths:
             logger.info(f"Generating examples from {filepath}")
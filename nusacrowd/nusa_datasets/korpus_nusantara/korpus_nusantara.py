@@ -8,6 +8,7 @@ import pandas as pd
 from nusacrowd.utils import schemas
 from nusacrowd.utils.configs import NusantaraConfig
 from nusacrowd.utils.constants import Tasks, DEFAULT_SOURCE_VIEW_NAME, DEFAULT_NUSANTARA_VIEW_NAME
+from nusacrowd.utils.excel_cache import read_excel
 
 _DATASETNAME = "korpus_nusantara"
 _SOURCE_VIEW_NAME = DEFAULT_SOURCE_VIEW_NAME
@@ -191,7 +192,7 @@ class KorpusNusantara(datasets.GeneratorBasedBuilder):
 
     def _generate_examples(self, filepath: Path):
         """Yields examples as (key, example) tuples."""
-        dfs = pd.read_excel(filepath, sheet_name=None, header=None)
+        dfs = read_excel(filepath, sheet_name=None, header=None)
         src_lang, tgt_lang, df = self.get_domain_data((dfs))
         
         if self.config.schema == "source":
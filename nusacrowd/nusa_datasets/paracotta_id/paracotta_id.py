@@ -7,8 +7,6 @@ import datasets
 from nusacrowd.utils.configs import NusantaraConfig
 from nusacrowd.utils.constants import Tasks
 from nusacrowd.utils import schemas
-import jsonlines
-from nltk.tokenize.treebank import TreebankWordDetokenizer
 
 
 _CITATION = """\
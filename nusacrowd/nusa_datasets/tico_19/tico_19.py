@@ -19,7 +19,6 @@ import os
 import re
 from pathlib import Path
 from typing import Dict, List, Tuple
-from translate.storage.tmx import tmxfile
 
 import datasets
 
@@ -245,6 +244,8 @@ class Tico19(datasets.GeneratorBasedBuilder):
             
             # all language pairs except eng-ind dataset provided in .tmx format
             else:
+                from translate.storage.tmx import tmxfile
+
                 with open(filepath, "rb") as f:
                     tmx_file = tmxfile(f)
 
@@ -285,6 +286,8 @@ class Tico19(datasets.GeneratorBasedBuilder):
                             "text_2_name": lang_target
                         }
             else:
+                from translate.storage.tmx import tmxfile
+
                 with open(filepath, "rb") as f:
                     tmx_file = tmxfile(f)
                 
@@ -14,16 +14,18 @@
 # limitations under the License.
 
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import TYPE_CHECKING, Dict, List, Tuple
 
 import datasets
-from conllu import TokenList
 
 from nusacrowd.utils import schemas
 from nusacrowd.utils.common_parser import load_ud_data, load_ud_data_as_nusantara_kb
 from nusacrowd.utils.configs import NusantaraConfig
 from nusacrowd.utils.constants import Tasks
 
+if TYPE_CHECKING:
+    import conllu
+
 _CITATION = """\
 @article {10.3844/jcssp.2020.1585.1597,
 author = {Alfina, Ika and Budi, Indra and Suhartanto, Heru},
@@ -180,7 +182,7 @@ class UdIdCsuiDataset(datasets.GeneratorBasedBuilder):
         ]
 
     @staticmethod
-    def _assert_multispan_range_is_one(token_list: TokenList):
+    def _assert_multispan_range_is_one(token_list: "conllu.TokenList"):
         """
         Asserting that all tokens with multiple span can only have 2 span, and \
         no field other than form has important information
@@ -7,8 +7,6 @@ import datasets
 from nusacrowd.utils.configs import NusantaraConfig
 from nusacrowd.utils.constants import Tasks
 from nusacrowd.utils import schemas
-import jsonlines
-from nltk.tokenize.treebank import TreebankWordDetokenizer
 
 _CITATION = """\
 @inproceedings{hasan2021xl,
@@ -126,6 +124,7 @@ class XLSum(datasets.GeneratorBasedBuilder):
         ]
 
     def _generate_examples(self, filepath: Path, split: str) -> Tuple[int, Dict]:
+        import jsonlines
 
         if self.config.schema == "source":
             with jsonlines.open(filepath) as f:
@@ -0,0 +1,106 @@
+"""
+Helpers for working directly on the Arrow tables backing `datasets.Dataset` objects.
+"""
+from typing import Tuple, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+def get_arrow_table(dataset) -> pa.Table:
+    """
+    Return the Arrow table of a dataset without decoding rows to Python.
+
+    :param dataset: a `datasets.Dataset` (memory-mapped or in-memory)
+    :return: pyarrow Table, with any indices mapping of the dataset applied
+    """
+    return dataset.with_format("arrow")[:]
+
+
+def is_list_type(arrow_type: pa.DataType) -> bool:
+    return pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type)
+
+
+def as_array(column: Union[pa.Array, pa.ChunkedArray]) -> pa.Array:
+    if isinstance(column, pa.ChunkedArray):
+        if column.num_chunks == 0:
+            return pa.array([], type=column.type)
+        return column.combine_chunks()
+    return column
+
+
+def flatten_path(table: pa.Table, path: str, flatten_leaf: bool = True) -> Tuple[pa.Array, np.ndarray]:
+    """
+    Flatten a dotted feature path (e.g. `entities.normalized.db_name`) down to its values.
+
+    Lists met along the path are flattened and struct fields are selected, so
+    `entities.id` of a KB table returns every entity id of every example.
+
+    :param table: pyarrow Table
+    :param path: dotted path to a (possibly nested) feature
+    :param flatten_leaf: whether to flatten the leaf value if it is still a list
+    :return: tuple of (values, row index of the example each value comes from)
+    """
+    segments = path.split(".")
+    values = as_array(table.column(segments[0]))
+    rows = np.arange(len(values), dtype=np.int64)
+
+    for segment in segments[1:]:
+        values, rows = _flatten_lists(values, rows)
+        values = pc.struct_field(values, segment)
+    if flatten_leaf:
+        values, rows = _flatten_lists(values, rows)
+    return values, rows
+
+
+def _flatten_lists(values: pa.Array, rows: np.ndarray) -> Tuple[pa.Array, np.ndarray]:
+    while is_list_type(values.type):
+        parents = pc.list_parent_indices(values).to_numpy(zero_copy_only=False)
+        rows = rows[parents]
+        values = pc.list_flatten(values)
+    return values, rows
+
+
+def count_elements(values: pa.Array) -> int:
+    """
+    Count elements the way `len()` would on decoded examples, summed over rows.
+
+    Scalars count once per non-null value, lists count their items and
+    `datasets.Sequence` of dicts (struct of lists) counts the items of its first field.
+    """
+    if is_list_type(values.type):
+        return int(pc.sum(pc.list_value_length(values)).as_py() or 0)
+    if pa.types.is_struct(values.type) and values.type.num_fields > 0 and is_list_type(values.type.field(0).type):
+        return count_elements(pc.struct_field(values, 0))
+    return len(values) - values.null_count
+
+
+def element_lengths(values: pa.Array) -> np.ndarray:
+    """Per-row length of a list (or struct of lists) column; null rows count as 0."""
+    if pa.types.is_struct(values.type) and values.type.num_fields > 0:
+        values = pc.struct_field(values, 0)
+    lengths = pc.fill_null(pc.list_value_length(values), 0)
+    return lengths.to_numpy(zero_copy_only=False)
+
+
+def code_points(strings: pa.Array) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decode all strings at once into a single UTF-32 buffer, with the start of each string.
+
+    Character offsets and n-grams can then be computed with numpy, e.g. the
+    characters of string `i` are `chars[starts[i]:starts[i + 1]]`. Nulls are empty strings.
+
+    :return: tuple of (uint32 code points, int64 starts of length `len(strings) + 1`)
+    """
+    strings = pc.cast(pc.fill_null(strings, ""), pa.large_string())
+    lengths = pc.utf8_length(strings).to_numpy(zero_copy_only=False).astype(np.int64)
+    starts = np.zeros(len(strings) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=starts[1:])
+
+    _, offsets_buffer, data_buffer = strings.buffers()
+    offsets = np.frombuffer(offsets_buffer, dtype=np.int64)[strings.offset:strings.offset + len(strings) + 1]
+    if data_buffer is None or offsets[-1] == offsets[0]:
+        return np.zeros(0, dtype=np.uint32), starts
+    data = memoryview(data_buffer)[offsets[0]:offsets[-1]].tobytes()
+    return np.frombuffer(data.decode("utf-8").encode("utf-32-le"), dtype=np.uint32), starts
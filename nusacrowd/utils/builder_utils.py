@@ -0,0 +1,68 @@
+"""
+Helpers to drive a dataset builder's generation methods directly, without `download_and_prepare`.
+"""
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+import datasets
+
+
+def get_download_config(builder: datasets.DatasetBuilder, download_mode: Optional[Union[datasets.DownloadMode, str]] = None) -> datasets.DownloadConfig:
+    """
+    Create the download config `download_and_prepare` derives for `builder` when none is given.
+
+    Files are downloaded to the downloads directory of the builder's `cache_dir`.
+
+    :param download_mode: `force_redownload` re-downloads and re-extracts the files
+    """
+    download_mode = datasets.DownloadMode(download_mode or datasets.DownloadMode.REUSE_DATASET_IF_EXISTS)
+    force = download_mode == datasets.DownloadMode.FORCE_REDOWNLOAD
+    return datasets.DownloadConfig(
+        cache_dir=builder._cache_downloaded_dir,
+        force_download=force,
+        force_extract=force,
+        use_etag=False,
+        token=builder.token,
+        storage_options=builder.storage_options,
+    )
+
+
+def get_download_manager(
+    builder: datasets.DatasetBuilder,
+    download_config: Optional[datasets.DownloadConfig] = None,
+    download_mode: Optional[Union[datasets.DownloadMode, str]] = None,
+) -> datasets.DownloadManager:
+    """
+    Create the same download manager `download_and_prepare` would use for `builder`.
+
+    :param download_config: defaults to `get_download_config(builder, download_mode)`
+    """
+    return datasets.DownloadManager(
+        dataset_name=builder.name,
+        data_dir=builder.config.data_dir,
+        download_config=download_config or get_download_config(builder, download_mode),
+        base_path=builder.base_path,
+        record_checksums=False,
+    )
+
+
+def iter_split_examples(
+    builder: datasets.DatasetBuilder,
+    dl_manager: Optional[datasets.DownloadManager] = None,
+) -> Iterator[Tuple[str, Iterator[Dict]]]:
+    """
+    Run the builder's `_split_generators` and yield the raw examples of each split.
+
+    :param builder: a `datasets.GeneratorBasedBuilder`
+    :param dl_manager: download manager, see `get_download_manager`
+    :return: generator of (split name, generator of examples)
+    """
+    dl_manager = dl_manager or get_download_manager(builder)
+    for split_generator in builder._split_generators(dl_manager):
+        examples = (example for _, example in builder._generate_examples(**split_generator.gen_kwargs))
+        yield str(split_generator.name), examples
+
+
+def examples_to_dataset(examples, features: datasets.Features, split: Optional[str] = None) -> datasets.Dataset:
+    """Encode a list of raw examples into an in-memory dataset."""
+    columns = {name: [example.get(name) for example in examples] for name in features}
+    return datasets.Dataset.from_dict(columns, features=features, split=split)
@@ -0,0 +1,356 @@
+"""
+Disk-budgeted management of prepared caches.
+
+`CacheManager` inventories a datasets cache directory per config name:
+
+- prepared Arrow caches (`<dataset>/<config>/<version>/<hash>/`),
+- fold view pools (`nusacrowd_folds/<fold family>/<hash>/`),
+- the raw downloads (and their extracted directories) listed in the
+  `download_checksums` of each prepared cache; downloads shared by several
+  configs are counted once in totals and only removed with their last user.
+
+Last access times are recorded by `NusantaraMetadata.load_dataset` as marker
+files in `nusacrowd_access/`, falling back to the preparation time.
+`enforce_budget` evicts least recently used configs until the cache fits a
+byte budget. Configs of pinned benchmarks and configs currently locked by a
+loading process (see `nusacrowd.utils.locking`) are never evicted.
+
+Setting `NUSACROWD_CACHE_BUDGET` (e.g. `500GB`) enforces the budget after
+every `load_dataset`, pinning the benchmarks listed in
+`NUSACROWD_CACHE_PINNED` (comma separated). Configs already loaded by the
+current process are never evicted by it, as the datasets it returned are
+memory-mapped from their caches (e.g. earlier configs of `load_benchmark`).
+The process keeps a running total of the cache size, adding the configs it
+loads, and only inventories the whole cache when the total exceeds the budget
+(caches written by other processes are counted from that inventory on).
+
+    python -m nusacrowd cache list --sort size
+    python -m nusacrowd cache enforce --budget 500GB --pin-benchmark IndoNLU NusaX --dry-run
+"""
+import json
+import logging
+import os
+import shutil
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from itertools import chain
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+logger = logging.getLogger(__name__)
+
+BUDGET_ENV_VARIABLE = "NUSACROWD_CACHE_BUDGET"
+PINNED_ENV_VARIABLE = "NUSACROWD_CACHE_PINNED"
+
+ACCESS_DIR_NAME = "nusacrowd_access"
+FOLDS_DIR_NAME = "nusacrowd_folds"
+_NON_DATASET_DIRS = {"downloads", ACCESS_DIR_NAME, FOLDS_DIR_NAME, "nusacrowd_locks"}
+
+# config names loaded by this process, per cache root
+_loaded_configs: Dict[Path, Set[str]] = {}
+# running total of cache bytes and the config names it counts, per cache root, see `enforce_budget_from_env`
+_running_totals: Dict[Path, int] = {}
+_counted_configs: Dict[Path, Set[str]] = {}
+
+
+def parse_size(size: str) -> int:
+    """Parse a size such as `512MB` or `2GB` into bytes."""
+    units = {"KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30, "TB": 1 << 40}
+    size = size.strip().upper()
+    for unit, factor in units.items():
+        if size.endswith(unit):
+            return int(float(size[:-len(unit)]) * factor)
+    return int(size.rstrip("B"))
+
+
+def get_cache_root(cache_dir: Optional[Union[str, Path]] = None) -> Path:
+    import datasets
+
+    return Path(cache_dir or datasets.config.HF_DATASETS_CACHE)
+
+
+def record_access(config_name: str, cache_dir: Optional[Union[str, Path]] = None):
+    """Mark `config_name` as used now, and as loaded by this process."""
+    cache_root = get_cache_root(cache_dir)
+    path = cache_root / ACCESS_DIR_NAME / config_name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+    _loaded_configs.setdefault(cache_root.resolve(), set()).add(config_name)
+
+
+def get_loaded_configs(cache_dir: Optional[Union[str, Path]] = None) -> Set[str]:
+    """Config names (or fold families) loaded by this process from `cache_dir`."""
+    return set(_loaded_configs.get(get_cache_root(cache_dir).resolve(), ()))
+
+
+def get_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+
+def get_download_paths(cache_root: Path, urls: Optional[Iterable[str]] = None) -> Dict[str, List[Path]]:
+    """
+    Downloaded files (with their lock and extracted directory, if any) per URL, the file first.
+
+    :param urls: only look up these URLs, at the paths `datasets` downloads them to (without etag),
+        instead of reading the metadata of every download
+    """
+    from datasets.utils.file_utils import hash_url_to_filename
+
+    download_dir = cache_root / "downloads"
+    if urls is None:
+        meta_paths = download_dir.glob("*.json")
+    else:
+        meta_paths = (download_dir / f"{hash_url_to_filename(url)}.json" for url in urls)
+    url_paths = {}
+    for meta_path in meta_paths:
+        path = meta_path.with_suffix("")
+        try:
+            with open(meta_path) as f:
+                url = json.load(f)["url"]
+        except (ValueError, KeyError, OSError):
+            continue
+        if not path.exists():
+            continue
+        paths = [path, meta_path]
+        lock_path = path.with_name(path.name + ".lock")
+        if lock_path.exists():
+            paths.append(lock_path)
+        extracted = download_dir / "extracted" / hash_url_to_filename(str(path.resolve()))
+        if extracted.exists():
+            paths.append(extracted)
+        url_paths[url] = paths
+    return url_paths
+
+
+def remove_prepared_dir(path: Union[str, Path]):
+    """Remove a prepared cache directory and the lock files datasets keeps next to it."""
+    path = Path(path)
+    shutil.rmtree(path, ignore_errors=True)
+    for lock_path in path.parent.glob(f"{path.name}[._]*lock"):
+        lock_path.unlink()
+
+
+@dataclass
+class CacheEntry:
+    """Cached files of one config."""
+
+    config_name: str
+    dataset_name: str
+    arrow_dirs: List[str] = field(default_factory=list)
+    # bytes of each downloaded file or extracted directory
+    download_sizes: Dict[str, int] = field(default_factory=dict)
+    arrow_bytes: int = 0
+    last_access: float = 0.0
+    pinned: bool = False
+    locked: bool = False
+
+    @property
+    def download_paths(self) -> List[str]:
+        return list(self.download_sizes)
+
+    @property
+    def download_bytes(self) -> int:
+        return sum(self.download_sizes.values())
+
+    @property
+    def num_bytes(self) -> int:
+        return self.arrow_bytes + self.download_bytes
+
+
+class CacheManager:
+    """
+    Inventory and LRU eviction of the caches in `cache_dir`.
+
+    :param cache_dir: datasets cache directory, defaults to `HF_DATASETS_CACHE`
+    :param pinned_benchmarks: benchmark names of `BENCHMARK_DICT` whose configs are never evicted
+    :param pinned_configs: config names (or fold families) never evicted
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[Union[str, Path]] = None,
+        pinned_benchmarks: Iterable[str] = (),
+        pinned_configs: Iterable[str] = (),
+    ):
+        self.cache_root = get_cache_root(cache_dir)
+        self.pinned: Set[str] = set(pinned_configs)
+        if pinned_benchmarks:
+            from ..config_helper import BENCHMARK_DICT
+            from .folds import get_fold_family
+
+            for benchmark in pinned_benchmarks:
+                config_names = BENCHMARK_DICT[benchmark]
+                self.pinned.update(config_names)
+                self.pinned.update(get_fold_family(config_name) for config_name in config_names)
+
+    def _get_last_access(self, name: str, arrow_dirs: List[Path]) -> float:
+        access_path = self.cache_root / ACCESS_DIR_NAME / name
+        times = [path.stat().st_mtime for path in arrow_dirs if path.exists()]
+        if access_path.exists():
+            times.append(access_path.stat().st_mtime)
+        return max(times, default=0.0)
+
+    def inventory(self, config_names: Optional[Iterable[str]] = None) -> List[CacheEntry]:
+        """
+        Cache entries of every config with a prepared cache, sorted by name.
+
+        :param config_names: only inventory these config names (or fold families)
+        """
+        from .locking import get_lock_path
+
+        names = ["*"] if config_names is None else list(config_names)
+        arrow_dirs: Dict[str, List[Path]] = {}
+        dataset_names, urls = {}, {}
+        for info_path in chain.from_iterable(self.cache_root.glob(f"*/{name}/*/*/dataset_info.json") for name in names):
+            arrow_dir = info_path.parent
+            dataset_name, config_name = arrow_dir.parts[-4], arrow_dir.parts[-3]
+            if dataset_name in _NON_DATASET_DIRS or arrow_dir.name.endswith(".incomplete"):
+                continue
+            arrow_dirs.setdefault(config_name, []).append(arrow_dir)
+            dataset_names[config_name] = dataset_name
+            try:
+                with open(info_path) as f:
+                    urls.setdefault(config_name, set()).update((json.load(f).get("download_checksums") or {}).keys())
+            except (ValueError, OSError):
+                pass
+        for pool_dir in chain.from_iterable((self.cache_root / FOLDS_DIR_NAME).glob(f"{name}/*") for name in names):
+            if pool_dir.is_dir():
+                arrow_dirs.setdefault(pool_dir.parent.name, []).append(pool_dir)
+                dataset_names[pool_dir.parent.name] = FOLDS_DIR_NAME
+
+        url_paths = get_download_paths(self.cache_root, None if config_names is None else set().union(*urls.values()))
+        entries = []
+        for config_name, dirs in sorted(arrow_dirs.items()):
+            download_paths = [path for url in sorted(urls.get(config_name, ())) for path in url_paths.get(url, [])]
+            entries.append(CacheEntry(
+                config_name=config_name,
+                dataset_name=dataset_names[config_name],
+                arrow_dirs=[str(path) for path in dirs],
+                download_sizes={str(path): get_size(path) for path in download_paths},
+                arrow_bytes=sum(get_size(path) for path in dirs),
+                last_access=self._get_last_access(config_name, dirs),
+                pinned=config_name in self.pinned,
+                locked=get_lock_path(config_name, self.cache_root).exists(),
+            ))
+        return entries
+
+    @staticmethod
+    def total_bytes(entries: List[CacheEntry]) -> int:
+        """Bytes used by `entries`, counting shared downloads once."""
+        download_sizes = {path: size for entry in entries for path, size in entry.download_sizes.items()}
+        return sum(entry.arrow_bytes for entry in entries) + sum(download_sizes.values())
+
+    def evict(self, config_names: Iterable[str], entries: Optional[List[CacheEntry]] = None) -> List[CacheEntry]:
+        """
+        Remove the caches of `config_names`, and their downloads not used by any other config.
+
+        :return: the evicted entries
+        """
+        entries = entries if entries is not None else self.inventory()
+        config_names = set(config_names)
+        evicted = [entry for entry in entries if entry.config_name in config_names]
+        kept_downloads = {path for entry in entries if entry.config_name not in config_names for path in entry.download_paths}
+        for entry in evicted:
+            logger.info(f"Evicting {entry.config_name} ({entry.num_bytes / 2**20:.1f} MiB)")
+            for path in entry.arrow_dirs:
+                remove_prepared_dir(path)
+            for path in entry.download_paths:
+                if path in kept_downloads or not os.path.exists(path):
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+            access_path = self.cache_root / ACCESS_DIR_NAME / entry.config_name
+            if access_path.exists():
+                access_path.unlink()
+        return evicted
+
+    def plan_eviction(self, max_bytes: int, protect: Iterable[str] = (), entries: Optional[List[CacheEntry]] = None) -> List[CacheEntry]:
+        """Least recently used entries to evict for the cache to fit in `max_bytes`."""
+        entries = entries if entries is not None else self.inventory()
+        protect = set(protect)
+        # number of remaining entries using each download, which is freed with its last user
+        users = Counter(path for entry in entries for path in entry.download_sizes)
+        total = self.total_bytes(entries)
+        planned = []
+        candidates = sorted(
+            (entry for entry in entries if not entry.pinned and not entry.locked and entry.config_name not in protect),
+            key=lambda entry: entry.last_access,
+        )
+        for entry in candidates:
+            if total <= max_bytes:
+                break
+            planned.append(entry)
+            total -= entry.arrow_bytes
+            for path, size in entry.download_sizes.items():
+                users[path] -= 1
+                if users[path] == 0:
+                    total -= size
+        if total > max_bytes:
+            logger.warning(f"Cache of {self.cache_root} exceeds the budget of {max_bytes} bytes with only pinned, locked or protected configs left")
+        return planned
+
+    def enforce_budget(self, max_bytes: int, protect: Iterable[str] = (), dry_run: bool = False) -> List[CacheEntry]:
+        """
+        Evict least recently used configs until the cache fits in `max_bytes`.
+
+        :param protect: config names not to evict, in addition to pinned and locked ones
+        :param dry_run: only return the entries that would be evicted
+        """
+        entries = self.inventory()
+        planned = self.plan_eviction(max_bytes, protect, entries)
+        if not dry_run:
+            self.evict([entry.config_name for entry in planned], entries)
+        return planned
+
+
+def enforce_budget_from_env(cache_dir: Optional[Union[str, Path]] = None, protect: Iterable[str] = ()):
+    """
+    Enforce `NUSACROWD_CACHE_BUDGET`, if set, pinning the benchmarks of `NUSACROWD_CACHE_PINNED`.
+
+    Configs loaded by this process are protected, in addition to `protect`.
+    The configs of `protect` not counted yet are added to the running total of
+    the cache size; the whole cache is only inventoried, and evicted from, when
+    that total exceeds the budget.
+    """
+    budget = os.environ.get(BUDGET_ENV_VARIABLE)
+    if not budget:
+        return
+    max_bytes = parse_size(budget)
+    cache_root = get_cache_root(cache_dir).resolve()
+    pinned = [name.strip() for name in os.environ.get(PINNED_ENV_VARIABLE, "").split(",") if name.strip()]
+    manager = CacheManager(cache_dir, pinned_benchmarks=pinned)
+    protect = set(protect)
+
+    if cache_root in _running_totals:
+        # shared downloads of new configs may be counted twice, which at worst triggers an exact inventory early
+        new_configs = protect - _counted_configs[cache_root]
+        if new_configs:
+            _running_totals[cache_root] += manager.total_bytes(manager.inventory(new_configs))
+            _counted_configs[cache_root] |= new_configs
+        if _running_totals[cache_root] <= max_bytes:
+            return
+
+    entries = manager.inventory()
+    planned = manager.plan_eviction(max_bytes, protect | get_loaded_configs(cache_dir), entries)
+    manager.evict([entry.config_name for entry in planned], entries)
+    evicted = {entry.config_name for entry in planned}
+    kept = [entry for entry in entries if entry.config_name not in evicted]
+    _running_totals[cache_root] = manager.total_bytes(kept)
+    _counted_configs[cache_root] = {entry.config_name for entry in kept} | protect
+
+
+def format_entries(entries: List[CacheEntry]) -> str:
+    lines = [f"{'arrow':>12}  {'downloads':>12}  {'last access':>19}  config"]
+    for entry in entries:
+        last_access = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry.last_access)) if entry.last_access else "-"
+        flags = [flag for flag, is_set in [("pinned", entry.pinned), ("locked", entry.locked)] if is_set]
+        lines.append(
+            f"{entry.arrow_bytes / 2**20:>8.1f} MiB  {entry.download_bytes / 2**20:>8.1f} MiB  {last_access:>19}  {entry.config_name}"
+            + (f"  ({', '.join(flags)})" if flags else "")
+        )
+    return "\n".join(lines)
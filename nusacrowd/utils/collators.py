@@ -0,0 +1,307 @@
+"""
+Schema-aware batch collation with length bucketing.
+
+`SchemaCollator` turns a batch of rows of any nusantara schema into padded
+numpy arrays, reading the Arrow columns directly. `LengthBucketSampler` groups
+examples of similar length (from a precomputed length index) so that long-tail
+lengths, e.g. liputan6 or xl_sum documents, do not inflate the padding of
+every batch.
+"""
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import datasets
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .arrow_utils import as_array, get_arrow_table, is_list_type
+from .constants import SCHEMA_TO_FEATURES
+
+# Columns to collate for each schema of `SCHEMA_TO_FEATURES`, the first one is used for length bucketing.
+# Nested columns are dotted paths, e.g. `metadata.labels`. KB is not collated: its entities, relations
+# and events are collated differently per task, see `nusacrowd.utils.flat_kb` for columnar KB arrays.
+SCHEMA_TO_COLLATE_COLUMNS = {
+    "TEXT": ["text", "label"],
+    "TEXT_MULTI": ["text", "labels"],
+    "PAIRS": ["text_1", "text_2", "label"],
+    "PAIRS_MULTI": ["text_1", "text_2", "label"],
+    "PAIRS_SCORE": ["text_1", "text_2", "label"],
+    "SEQ_LABEL": ["tokens", "labels"],
+    "T2T": ["text_1", "text_2"],
+    "QA": ["context", "question", "choices", "answer"],
+    "SSP": ["text"],
+    "SPTEXT": ["text", "audio"],
+    "S2S": ["text_1", "text_2", "audio_1", "audio_2"],
+    "IMTEXT": ["texts", "image_paths", "metadata.labels"],
+}
+
+# String list columns mapped with `token_to_id`, other string lists (e.g. QA choices) are collated as lists of strings
+SCHEMA_TO_TOKEN_COLUMNS = {
+    "SEQ_LABEL": ["tokens"],
+}
+
+LABEL_PAD_ID = -100
+
+
+def pad_list_array(values: pa.Array, pad_value=0, dtype=None, max_length: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pad a list column into a 2D array without going through Python lists.
+
+    :param values: Arrow list array (one list per row)
+    :param pad_value: value used for padding
+    :param dtype: numpy dtype of the output, defaults to the dtype of the values
+    :param max_length: truncate rows longer than this
+    :return: tuple of (padded array [rows, max length], boolean mask of real values)
+    """
+    values = as_array(values)
+    lengths = pc.fill_null(pc.list_value_length(values), 0).to_numpy(zero_copy_only=False).astype(np.int64)
+    flat = pc.list_flatten(values).to_numpy(zero_copy_only=False)
+    width = int(lengths.max()) if len(lengths) else 0
+    if max_length is not None:
+        width = min(width, max_length)
+
+    padded = np.full((len(lengths), width), pad_value, dtype=dtype or flat.dtype)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    cols = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    keep = cols < width
+    padded[rows[keep], cols[keep]] = flat[keep]
+    mask = np.arange(width)[None, :] < lengths[:, None]
+    return padded, mask
+
+
+class SchemaCollator:
+    """
+    Collate rows of a nusantara schema into padded numpy batches.
+
+    String columns are encoded with `encode` (e.g. a tokenizer returning ids)
+    and token lists with `token_to_id`; without them strings are returned as
+    (padded) object arrays. Other string lists, e.g. QA choices and answers,
+    are returned as object arrays of lists. Label sequences are padded with
+    `LABEL_PAD_ID`.
+
+    :param schema: nusantara schema in caps, e.g. `SEQ_LABEL`
+    :param encode: callable mapping a text to a list of token ids
+    :param token_to_id: callable mapping a token of a token list to its id
+    :param pad_id: padding value of token ids
+    :param max_length: truncate sequences longer than this
+    """
+
+    def __init__(
+        self,
+        schema: str,
+        encode: Optional[Callable[[str], List[int]]] = None,
+        token_to_id: Optional[Callable[[str], int]] = None,
+        pad_id: int = 0,
+        max_length: Optional[int] = None,
+        features: Optional[datasets.Features] = None,
+    ):
+        if schema not in SCHEMA_TO_COLLATE_COLUMNS:
+            raise ValueError(f"Collation is not supported for schema {schema}, must be one of {list(SCHEMA_TO_COLLATE_COLUMNS)}")
+        self.schema = schema
+        self.columns = SCHEMA_TO_COLLATE_COLUMNS[schema]
+        self.token_columns = SCHEMA_TO_TOKEN_COLUMNS.get(schema, [])
+        self.encode = encode
+        self.token_to_id = token_to_id
+        self.pad_id = pad_id
+        self.max_length = max_length
+        self.features = features or SCHEMA_TO_FEATURES[schema]
+
+    def __call__(self, batch: pa.Table) -> Dict[str, np.ndarray]:
+        """:param batch: Arrow table of the rows to collate, e.g. `dataset.with_format("arrow")[indices]`"""
+        collated = {}
+        for column in self.columns:
+            name, *fields = column.split(".")
+            values, feature = as_array(batch.column(name)), self.features[name]
+            for field in fields:
+                values, feature = pc.struct_field(values, field), feature[field]
+            if isinstance(feature, datasets.Audio):
+                collated[column], collated[f"{column}_mask"] = self._collate_audio(values, feature)
+            elif is_list_type(values.type) and _is_string_type(values.type.value_type) and column not in self.token_columns:
+                collated[column] = _to_object_array(values.to_pylist())
+            elif is_list_type(values.type):
+                collated[column], collated[f"{column}_mask"] = self._collate_list(values)
+            elif _is_string_type(values.type):
+                collated.update(self._collate_text(column, values))
+            else:
+                collated[column] = values.to_numpy(zero_copy_only=False)
+        return collated
+
+    def _collate_list(self, values: pa.Array) -> Tuple[np.ndarray, np.ndarray]:
+        if _is_string_type(values.type.value_type):
+            if self.token_to_id is None:
+                return pad_list_array(values, pad_value="", dtype=object, max_length=self.max_length)
+            ids = pa.array([self.token_to_id(token) for token in pc.list_flatten(values).to_pylist()], type=pa.int64())
+            values = pa.ListArray.from_arrays(_list_offsets(values), ids)
+            return pad_list_array(values, pad_value=self.pad_id, max_length=self.max_length)
+        # label sequences (ClassLabel ids)
+        return pad_list_array(values, pad_value=LABEL_PAD_ID, dtype=np.int64, max_length=self.max_length)
+
+    def _collate_text(self, column: str, values: pa.Array) -> Dict[str, np.ndarray]:
+        texts = values.to_pylist()
+        if self.encode is None:
+            return {column: np.array(texts, dtype=object)}
+        ids = pa.array([self.encode(text or "") for text in texts], type=pa.list_(pa.int64()))
+        padded, mask = pad_list_array(ids, pad_value=self.pad_id, max_length=self.max_length)
+        return {column: padded, f"{column}_mask": mask}
+
+    def _collate_audio(self, values: pa.Array, feature: datasets.Audio) -> Tuple[np.ndarray, np.ndarray]:
+        arrays = [feature.decode_example(value)["array"] for value in values.to_pylist()]
+        lengths = np.array([len(array) for array in arrays], dtype=np.int64)
+        padded = np.zeros((len(arrays), int(lengths.max()) if len(arrays) else 0), dtype=np.float32)
+        for i, array in enumerate(arrays):
+            padded[i, : len(array)] = array
+        return padded, np.arange(padded.shape[1])[None, :] < lengths[:, None]
+
+
+def _is_string_type(arrow_type: pa.DataType) -> bool:
+    return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+
+
+def _to_object_array(items: List) -> np.ndarray:
+    # filled item by item, `np.array` would make a 2D array of lists of equal length
+    array = np.empty(len(items), dtype=object)
+    array[:] = items
+    return array
+
+
+def _list_offsets(values: pa.Array) -> pa.Array:
+    lengths = pc.fill_null(pc.list_value_length(values), 0).to_numpy(zero_copy_only=False)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int32)
+    np.cumsum(lengths, out=offsets[1:])
+    return pa.array(offsets)
+
+
+def compute_length_index(dataset: datasets.Dataset, schema: str) -> np.ndarray:
+    """
+    Length of every example, from the first collated column of the schema.
+
+    Lists count their items, strings their whitespace-separated words.
+    """
+    column = as_array(get_arrow_table(dataset).column(SCHEMA_TO_COLLATE_COLUMNS[schema][0]))
+    if is_list_type(column.type):
+        lengths = pc.list_value_length(column)
+    else:
+        lengths = pc.count_substring_regex(column, pattern=r"\S+")
+    return pc.fill_null(lengths, 0).to_numpy(zero_copy_only=False).astype(np.int64)
+
+
+def get_length_index(dataset: datasets.Dataset, schema: str) -> np.ndarray:
+    """
+    `compute_length_index`, stored as a `.npy` file next to the dataset cache (keyed by fingerprint).
+    """
+    if not dataset.cache_files:
+        return compute_length_index(dataset, schema)
+    index_file = Path(dataset.cache_files[0]["filename"]).parent / f"lengths-{dataset._fingerprint}.npy"
+    if index_file.exists():
+        return np.load(index_file)
+    lengths = compute_length_index(dataset, schema)
+    np.save(index_file, lengths)
+    return lengths
+
+
+class LengthBucketSampler:
+    """
+    Yield batches of indices of examples with similar lengths.
+
+    Indices are shuffled, split into chunks of `batch_size * bucket_size_multiplier`,
+    sorted by length within each chunk and cut into batches; the batch order is
+    then shuffled again.
+
+    :param lengths: length index, see `get_length_index`
+    :param batch_size: number of examples per batch
+    :param bucket_size_multiplier: number of batches sorted together
+    :param shuffle: shuffle examples and batches, otherwise sort globally
+    :param seed: random seed, the epoch is added to it
+    """
+
+    def __init__(self, lengths: np.ndarray, batch_size: int, bucket_size_multiplier: int = 100, shuffle: bool = True, seed: int = 0, drop_last: bool = False):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.bucket_size = batch_size * bucket_size_multiplier
+        self.shuffle = shuffle
+        self.seed = seed
+        self.drop_last = drop_last
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        rng = np.random.default_rng(self.seed + self.epoch)
+        indices = rng.permutation(len(self.lengths)) if self.shuffle else np.arange(len(self.lengths))
+        batches = []
+        for start in range(0, len(indices), self.bucket_size):
+            bucket = indices[start:start + self.bucket_size]
+            bucket = bucket[np.argsort(self.lengths[bucket], kind="stable")]
+            batches += [bucket[i:i + self.batch_size] for i in range(0, len(bucket), self.batch_size)]
+        if self.drop_last:
+            batches = [batch for batch in batches if len(batch) == self.batch_size]
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        return iter(batches)
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.lengths) // self.batch_size
+        return -(-len(self.lengths) // self.batch_size)
+
+
+def iter_batches(dataset: datasets.Dataset, collator: SchemaCollator, batch_sampler=None, batch_size: int = 32) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Iterate collated batches of a dataset, in `batch_sampler` order or sequentially.
+    """
+    arrow_dataset = dataset.with_format("arrow")
+    if batch_sampler is None:
+        batch_sampler = (np.arange(i, min(i + batch_size, len(dataset))) for i in range(0, len(dataset), batch_size))
+    for indices in batch_sampler:
+        yield collator(arrow_dataset[indices.tolist()] if isinstance(indices, np.ndarray) else arrow_dataset[indices])
+
+
+def padding_ratio(lengths: np.ndarray, batches) -> float:
+    """Fraction of padded positions over all positions of the batches."""
+    padded = real = 0
+    for batch in batches:
+        batch_lengths = lengths[batch]
+        padded += int(batch_lengths.max()) * len(batch_lengths)
+        real += int(batch_lengths.sum())
+    return 1 - real / padded if padded else 0.0
+
+
+def benchmark_collation(num_examples: int = 20000, batch_size: int = 32, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """
+    Compare sequential batching and length bucketing on a synthetic long-tailed `SEQ_LABEL` corpus.
+
+    :return: padding ratio and batches/sec of both strategies
+    """
+    rng = np.random.default_rng(seed)
+    lengths = np.clip(rng.lognormal(mean=3.0, sigma=0.9, size=num_examples).astype(np.int64), 1, 2000)
+    dataset = datasets.Dataset.from_dict(
+        {
+            "id": [str(i) for i in range(num_examples)],
+            "tokens": [["tok"] * length for length in lengths],
+            "labels": [[0] * length for length in lengths],
+        },
+        features=SCHEMA_TO_FEATURES["SEQ_LABEL"],
+    )
+    collator = SchemaCollator("SEQ_LABEL", token_to_id=len)
+    length_index = compute_length_index(dataset, "SEQ_LABEL")
+
+    strategies = {
+        "sequential": [np.arange(i, min(i + batch_size, num_examples)) for i in range(0, num_examples, batch_size)],
+        "bucketed": list(LengthBucketSampler(length_index, batch_size, seed=seed)),
+    }
+    results = {}
+    for name, batches in strategies.items():
+        start = time.perf_counter()
+        for _ in iter_batches(dataset, collator, batches):
+            pass
+        elapsed = time.perf_counter() - start
+        results[name] = {"padding_ratio": padding_ratio(length_index, batches), "batches_per_sec": len(batches) / elapsed}
+    return results
+
+
+if __name__ == "__main__":
+    for strategy, result in benchmark_collation().items():
+        print(f"{strategy}: padding ratio {result['padding_ratio']:.3f}, {result['batches_per_sec']:.1f} batches/sec")
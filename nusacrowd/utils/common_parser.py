@@ -1,8 +1,5 @@
 from typing import Iterable
 
-import pandas as pd
-from conllu import parse
-
 
 def load_conll_data(file_path):
     # Read file
@@ -34,6 +31,9 @@ def load_ud_data(filepath, filter_kwargs=None, assert_fn=None):
     :param assert_fn: assertion to make sure raw data is in the expected format
     :return: generator with schema following CONLLU
     """
+    import pandas as pd
+    from conllu import parse
+
     dataset_raw = parse(open(filepath).read())
 
     filter_kwargs = filter_kwargs or dict()
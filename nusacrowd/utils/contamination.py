@@ -0,0 +1,283 @@
+"""
+Benchmark contamination checks for `nusantara_ssp` corpora.
+
+`ContaminationIndex.from_benchmark` hashes the word n-grams of the test and
+validation splits of a benchmark (see `BENCHMARK_DICT`) into a sorted uint64
+array, with the benchmark configs of every n-gram stored CSR-style. `scan` streams a pretraining corpus through worker processes, which
+memory-map the index and look up the n-grams of every document with a binary
+search, and reports the contaminated documents per benchmark config.
+"""
+import json
+import multiprocessing
+import re
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import datasets
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .arrow_utils import flatten_path, get_arrow_table
+from .packing import iter_text_chunks
+from .statistics import SCHEMA_TO_TEXT_FEATURES
+
+_WORD_PATTERN = re.compile(r"\w+")
+_NGRAM_BASE = np.uint64(0x100000001B3)
+
+_HASHES_FILE = "hashes.npy"
+_SOURCES_FILE = "sources.npy"
+_OFFSETS_FILE = "offsets.npy"
+_INDEX_FILE = "index.json"
+
+# Texts to fingerprint per schema, on top of `SCHEMA_TO_TEXT_FEATURES`
+_EXTRA_TEXT_FEATURES = {"SEQ_LABEL": ["tokens"]}
+
+
+def words(text: str) -> List[str]:
+    return _WORD_PATTERN.findall((text or "").lower())
+
+
+def ngram_hashes(tokens: Sequence[str], n: int) -> np.ndarray:
+    """64-bit hashes of the word n-grams of a tokenized text."""
+    if len(tokens) < n:
+        return np.zeros(0, dtype=np.uint64)
+    word_hashes = np.fromiter((zlib.crc32(token.encode()) for token in tokens), dtype=np.uint64, count=len(tokens))
+    hashes = np.full(len(tokens) - n + 1, n, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for k in range(n):
+            hashes = hashes * _NGRAM_BASE + word_hashes[k:len(tokens) - n + 1 + k]
+    return hashes
+
+
+def get_schema(config_name: str) -> str:
+    """Schema key of a config name, e.g. `smsa_nusantara_text` -> `TEXT`."""
+    return config_name.rsplit("_nusantara_", 1)[-1].upper()
+
+
+def iter_example_texts(dataset: datasets.Dataset, schema: str) -> Iterable[str]:
+    """Texts of a benchmark split; token lists (`SEQ_LABEL`) are joined with spaces."""
+    table = get_arrow_table(dataset)
+    for path in SCHEMA_TO_TEXT_FEATURES.get(schema, []) + _EXTRA_TEXT_FEATURES.get(schema, []):
+        if path.split(".")[0] not in table.column_names:
+            continue
+        values, rows = flatten_path(table, path, flatten_leaf=False)
+        if pa.types.is_list(values.type) or pa.types.is_large_list(values.type):
+            values = pa.array([" ".join(tokens) for tokens in values.to_pylist()], type=pa.string())
+        yield from pc.cast(values, pa.string()).to_pylist()
+
+
+class ContaminationIndex:
+    """
+    Sorted array of n-gram hashes of benchmark texts, each tagged with every benchmark config it comes from.
+
+    Texts shorter than `n` words, but at least `min_n`, are indexed as a single
+    n-gram of their own length, so short benchmark sentences are matched too.
+
+    :param hashes: sorted unique uint64 n-gram hashes
+    :param sources: indices into `source_names`, those of `hashes[i]` are `sources[offsets[i]:offsets[i + 1]]`
+    :param offsets: start of the sources of every hash, plus the total number of sources
+    :param source_names: benchmark config names
+    :param lengths: n-gram lengths present in the index
+    """
+
+    def __init__(self, hashes: np.ndarray, sources: np.ndarray, offsets: np.ndarray, source_names: List[str], lengths: List[int], n: int, min_n: int):
+        self.hashes = hashes
+        self.sources = sources
+        self.offsets = offsets
+        self.source_names = source_names
+        self.lengths = lengths
+        self.n = n
+        self.min_n = min_n
+
+    @classmethod
+    def from_datasets(
+        cls,
+        benchmark: Dict[str, datasets.DatasetDict],
+        splits: Sequence[str] = ("test", "validation"),
+        n: int = 13,
+        min_n: int = 8,
+    ) -> "ContaminationIndex":
+        """
+        :param benchmark: config name to DatasetDict, as returned by `load_benchmark`
+        :param splits: splits to fingerprint
+        :param n: n-gram length
+        :param min_n: texts shorter than this are not indexed
+        """
+        source_names, all_hashes, all_sources = [], [], []
+        lengths = set()
+        for config_name, dataset_dict in benchmark.items():
+            schema = get_schema(config_name)
+            source = len(source_names)
+            source_names.append(config_name)
+            for split in splits:
+                if split not in dataset_dict:
+                    continue
+                for text in iter_example_texts(dataset_dict[split], schema):
+                    tokens = words(text)
+                    if len(tokens) < min_n:
+                        continue
+                    length = min(n, len(tokens))
+                    lengths.add(length)
+                    all_hashes.append(ngram_hashes(tokens, length))
+            num_hashes = sum(len(hashes) for hashes in all_hashes) - sum(len(sources) for sources in all_sources)
+            all_sources.append(np.full(num_hashes, source, dtype=np.int32))
+
+        hashes = np.concatenate(all_hashes) if all_hashes else np.zeros(0, dtype=np.uint64)
+        sources = np.concatenate(all_sources) if all_sources else np.zeros(0, dtype=np.int32)
+        # unique (hash, source) pairs sorted by hash, so an n-gram shared by configs keeps all of them
+        order = np.lexsort((sources, hashes))
+        hashes, sources = hashes[order], sources[order]
+        distinct = np.ones(len(hashes), dtype=bool)
+        distinct[1:] = (hashes[1:] != hashes[:-1]) | (sources[1:] != sources[:-1])
+        hashes, sources = hashes[distinct], sources[distinct]
+        hashes, starts = np.unique(hashes, return_index=True)
+        offsets = np.append(starts, len(sources)).astype(np.int64)
+        return cls(hashes, sources, offsets, source_names, sorted(lengths), n, min_n)
+
+    @classmethod
+    def from_benchmark(cls, benchmark_name: str, conhelps=None, **kwargs) -> "ContaminationIndex":
+        """Fingerprint a benchmark of `BENCHMARK_DICT`, see `from_datasets`."""
+        if conhelps is None:
+            from ..config_helper import NusantaraConfigHelper
+
+            conhelps = NusantaraConfigHelper()
+        return cls.from_datasets(conhelps.load_benchmark(benchmark_name), **kwargs)
+
+    def save(self, path: Union[str, Path]):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / _HASHES_FILE, self.hashes)
+        np.save(path / _SOURCES_FILE, self.sources)
+        np.save(path / _OFFSETS_FILE, self.offsets)
+        with open(path / _INDEX_FILE, "w") as f:
+            json.dump({"source_names": self.source_names, "lengths": self.lengths, "n": self.n, "min_n": self.min_n}, f, indent=2)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> "ContaminationIndex":
+        path = Path(path)
+        with open(path / _INDEX_FILE) as f:
+            meta = json.load(f)
+        mmap_mode = "r" if mmap else None
+        arrays = [np.load(path / file, mmap_mode=mmap_mode) for file in (_HASHES_FILE, _SOURCES_FILE, _OFFSETS_FILE)]
+        return cls(*arrays, **meta)
+
+    def lookup(self, hashes: np.ndarray) -> np.ndarray:
+        """:return: sources of the indexed hashes among `hashes`, one per matching (hash, source) pair"""
+        if len(self.hashes) == 0 or len(hashes) == 0:
+            return np.zeros(0, dtype=np.int32)
+        positions = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1)
+        found = positions[self.hashes[positions] == hashes]
+        starts = np.asarray(self.offsets[found])
+        counts = np.asarray(self.offsets[found + 1]) - starts
+        # concatenated ranges offsets[i]:offsets[i + 1] of the found hashes
+        ends = np.cumsum(counts)
+        return np.asarray(self.sources[np.repeat(starts - ends + counts, counts) + np.arange(ends[-1] if len(ends) else 0)])
+
+    def match(self, text: str) -> np.ndarray:
+        """Sources of the indexed n-grams found in a text."""
+        tokens = words(text)
+        hashes = [ngram_hashes(tokens, length) for length in self.lengths]
+        return self.lookup(np.concatenate(hashes)) if hashes else np.zeros(0, dtype=np.int32)
+
+
+@dataclass
+class ContaminationReport:
+    """
+    Result of `scan`.
+
+    :param contaminated: benchmark config name to positions of the documents containing its n-grams
+    :param keep_mask: False for contaminated documents, in corpus order
+    """
+
+    num_documents: int = 0
+    contaminated: Dict[str, List[int]] = field(default_factory=dict)
+    keep_mask: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
+
+    @property
+    def num_contaminated(self) -> int:
+        return int((~self.keep_mask).sum())
+
+    def __str__(self):
+        lines = [f"num_documents: {self.num_documents}", f"num_contaminated: {self.num_contaminated}"]
+        lines += [f"{name}: {len(positions)}" for name, positions in self.contaminated.items()]
+        return "\n".join(lines)
+
+
+_index: Optional[ContaminationIndex] = None
+
+
+def _init_worker(index_path: str):
+    global _index
+    _index = ContaminationIndex.load(index_path)
+
+
+def _match_chunk(texts: List[str]) -> List[np.ndarray]:
+    return [np.unique(_index.match(text)) for text in texts]
+
+
+def scan(
+    corpus: Union[datasets.Dataset, Iterable[dict]],
+    index_path: Union[str, Path],
+    num_proc: int = 1,
+    chunk_size: int = 1000,
+) -> ContaminationReport:
+    """
+    Scan a prepared or streamed `ssp_features` corpus against a saved `ContaminationIndex`.
+
+    Documents sharing at least one n-gram with a benchmark text are reported;
+    `dedup.iter_kept(corpus, report.keep_mask)` gives the decontaminated stream.
+
+    :param index_path: directory written by `ContaminationIndex.save`
+    :param num_proc: number of worker processes, each memory-mapping the index
+    """
+    index_path = str(index_path)
+    chunks = iter_text_chunks(corpus, chunk_size=chunk_size)
+    if num_proc > 1:
+        pool = multiprocessing.Pool(num_proc, initializer=_init_worker, initargs=(index_path,))
+        matched_chunks = pool.imap(_match_chunk, chunks)
+    else:
+        pool = None
+        _init_worker(index_path)
+        matched_chunks = map(_match_chunk, chunks)
+
+    source_names = ContaminationIndex.load(index_path).source_names
+    report = ContaminationReport()
+    keep = []
+    try:
+        for matched in matched_chunks:
+            for position, sources in enumerate(matched, start=report.num_documents):
+                for source in sources:
+                    report.contaminated.setdefault(source_names[source], []).append(position)
+            keep.append(np.fromiter((len(sources) == 0 for sources in matched), dtype=bool, count=len(matched)))
+            report.num_documents += len(matched)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    report.keep_mask = np.concatenate(keep) if keep else np.zeros(0, dtype=bool)
+    return report
+
+
+def scan_configs(config_names: List[str], index_path: Union[str, Path], conhelps=None, streaming: bool = False, **scan_kwargs) -> Dict[str, ContaminationReport]:
+    """
+    Scan every split of a set of `nusantara_ssp` configs, see `scan`.
+
+    :return: `<config>/<split>` to report
+    """
+    if conhelps is None:
+        from ..config_helper import NusantaraConfigHelper
+
+        conhelps = NusantaraConfigHelper()
+
+    reports = {}
+    for config_name in config_names:
+        metadata = conhelps.for_config_name(config_name)
+        if metadata.config.schema != "nusantara_ssp":
+            raise ValueError(f"{config_name} is not a nusantara_ssp config")
+        dataset_dict = metadata.load_dataset(streaming=True) if streaming else metadata.load_dataset()
+        for split, dataset in dataset_dict.items():
+            reports[f"{config_name}/{split}"] = scan(dataset, index_path, **scan_kwargs)
+    return reports
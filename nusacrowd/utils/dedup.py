@@ -0,0 +1,340 @@
+"""
+MinHash-LSH near-duplicate detection across `nusantara_ssp` corpora.
+
+cc100, kopi_cc, kopi_cc_news, indo4b and indo4b_plus are all derived from
+Common Crawl and overlap heavily. `deduplicate` computes MinHash signatures of
+word n-gram shingles in worker processes, reduces them to LSH band hashes and
+keeps only the first document of every group of documents sharing a band.
+
+Only band hashes are kept (`bands * 8` bytes per document), in per-band sorted
+runs persisted in the index directory and memory-mapped, so later corpora can
+be deduplicated incrementally against everything indexed before and RAM only
+holds the hashes of documents not yet flushed to a run. A corpus is recorded in the
+index once its shards and keep mask are written: corpora already in the index
+are not deduplicated again (their saved mask is returned), and the shards of a
+corpus interrupted midway are discarded when the index is reopened.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+import datasets
+import numpy as np
+
+from .packing import iter_text_chunks
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_SHINGLE_BASE = np.uint64(1000003)
+_BAND_BASE = np.uint64(0x100000001B3)
+
+_INDEX_FILE = "index.json"
+
+
+class MinHasher:
+    """
+    MinHash signatures of word n-gram shingles, reduced to LSH band hashes.
+
+    Two documents with Jaccard similarity `s` share at least one band with
+    probability `1 - (1 - s ** rows) ** bands`, with `rows = num_perm // bands`.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 16, ngram: int = 5, seed: int = 1):
+        if num_perm % bands != 0:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ngram = ngram
+        self.seed = seed
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, int(_MERSENNE_PRIME), size=num_perm, dtype=np.int64).astype(np.uint64)
+        self.b = rng.randint(0, int(_MERSENNE_PRIME), size=num_perm, dtype=np.int64).astype(np.uint64)
+
+    def shingle_hashes(self, text: str) -> np.ndarray:
+        words = (text or "").lower().split()
+        word_hashes = np.fromiter((zlib.crc32(word.encode()) for word in words), dtype=np.uint64, count=len(words))
+        n = min(self.ngram, len(word_hashes))
+        if n == 0:
+            return word_hashes
+        hashes = np.zeros(len(word_hashes) - n + 1, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for k in range(n):
+                hashes = hashes * _SHINGLE_BASE + word_hashes[k:len(word_hashes) - n + 1 + k]
+        return hashes & _MAX_HASH
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = self.shingle_hashes(text)
+        if len(hashes) == 0:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            permuted = ((hashes[:, None] * self.a + self.b) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def band_hashes(self, texts: List[str]) -> np.ndarray:
+        """:return: uint64 array of shape [len(texts), bands]"""
+        signatures = np.stack([self.signature(text) for text in texts]) if texts else np.zeros((0, self.num_perm), dtype=np.uint64)
+        signatures = signatures.reshape(len(texts), self.bands, self.rows)
+        hashes = np.zeros((len(texts), self.bands), dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for r in range(self.rows):
+                hashes = hashes * _BAND_BASE + signatures[:, :, r]
+        return hashes
+
+    def params(self) -> dict:
+        return {"num_perm": self.num_perm, "bands": self.bands, "ngram": self.ngram, "seed": self.seed}
+
+
+_minhasher: Optional[MinHasher] = None
+
+
+def _init_worker(params: dict):
+    global _minhasher
+    _minhasher = MinHasher(**params)
+
+
+def _band_hashes_chunk(texts: List[str]) -> np.ndarray:
+    return _minhasher.band_hashes(texts)
+
+
+class MinHashLSHIndex:
+    """
+    Persistent LSH index of band hashes.
+
+    Band hashes of accepted documents are first kept in per-band sets, and written
+    as a sorted run (one sorted array per band) once `merge_every` documents are
+    pending after a chunk.
+    Runs are memory-mapped and merged like a binary counter (a run is merged into
+    the previous one while it is at least as large), so there are O(log n) runs to
+    search and every hash is merged O(log n) times.
+
+    :param path: directory of the index, created if needed
+    :param minhasher_params: `MinHasher` parameters, read from the index if it exists
+    """
+
+    def __init__(self, path: Union[str, Path], merge_every: int = 100_000, **minhasher_params):
+        self.path = Path(path)
+        self.merge_every = merge_every
+        if (self.path / _INDEX_FILE).exists():
+            with open(self.path / _INDEX_FILE) as f:
+                self.meta = json.load(f)
+        else:
+            self.meta = {"params": MinHasher(**minhasher_params).params(), "shards": [], "next_shard": 0, "corpora": {}}
+        self.params = self.meta["params"]
+        self.bands = self.params["bands"]
+        self._discard_interrupted()
+
+        self._runs = [self._open_run(shard) for shard in self.meta["shards"]]
+        self._pending_sets = [set() for _ in range(self.bands)]
+        self._pending = []
+
+    def _open_run(self, shard: str) -> np.ndarray:
+        """:return: memory-mapped [bands, n] run, every band sorted"""
+        return np.load(self.path / shard, mmap_mode="r")
+
+    def _discard_interrupted(self):
+        """Remove the shards written by a corpus whose deduplication did not finish."""
+        in_progress = self.meta.pop("in_progress", None)
+        if in_progress is None:
+            return
+        stale_shards = self.meta["shards"][in_progress["num_shards"]:]
+        logger.warning(f"Discarding {len(stale_shards)} shards of the interrupted deduplication of {in_progress['name']}")
+        for shard in stale_shards:
+            (self.path / shard).unlink(missing_ok=True)
+        self.meta["shards"] = self.meta["shards"][:in_progress["num_shards"]]
+        self.save()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.meta["corpora"]
+
+    def mask_path(self, name: str) -> Path:
+        return self.path / "masks" / f"{name.replace('/', '__')}.npy"
+
+    def begin(self, name: str):
+        """Mark corpus `name` as being deduplicated, so that its shards are discarded if it is interrupted."""
+        self.meta["in_progress"] = {"name": name, "num_shards": len(self.meta["shards"])}
+        self.save()
+
+    def commit(self, name: str, keep_mask: np.ndarray):
+        """Write the pending documents and the keep mask of corpus `name`, then record it in the index."""
+        self.flush()
+        mask_path = self.mask_path(name)
+        mask_path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(mask_path, keep_mask)
+        self.meta["corpora"][name] = {"num_documents": len(keep_mask), "num_kept": int(keep_mask.sum())}
+        self.meta.pop("in_progress", None)
+        self.save()
+        self._merge_runs()
+
+    def __len__(self):
+        return sum(run.shape[1] for run in self._runs) + len(self._pending)
+
+    def query_and_add(self, band_hashes: np.ndarray) -> np.ndarray:
+        """
+        Mark documents as kept unless they share a band with an indexed (or earlier) document.
+
+        :param band_hashes: [n, bands] band hashes, in corpus order
+        :return: boolean keep mask
+        """
+        seen = np.zeros(len(band_hashes), dtype=bool)
+        for run in self._runs:
+            for band in range(self.bands):
+                column, sorted_band = band_hashes[:, band], run[band]
+                positions = np.minimum(np.searchsorted(sorted_band, column), len(sorted_band) - 1)
+                seen |= sorted_band[positions] == column
+
+        keep = ~seen
+        for i in np.flatnonzero(keep):
+            row = band_hashes[i]
+            if any(int(row[band]) in self._pending_sets[band] for band in range(self.bands)):
+                keep[i] = False
+                continue
+            for band in range(self.bands):
+                self._pending_sets[band].add(int(row[band]))
+            self._pending.append(row)
+        # flushed after the chunk: `seen` only covers the runs searched above
+        if len(self._pending) >= self.merge_every:
+            self.flush()
+        return keep
+
+    def flush(self):
+        """Write pending documents as a new sorted run, then merge runs as needed."""
+        if not self._pending:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        shard = self._next_shard()
+        np.save(self.path / shard, np.sort(np.stack(self._pending).T, axis=1))
+        self.meta["shards"].append(shard)
+        self._runs.append(self._open_run(shard))
+        self._pending_sets = [set() for _ in range(self.bands)]
+        self._pending = []
+        self.save()
+        self._merge_runs()
+
+    def _next_shard(self) -> str:
+        shard = f"bands_{self.meta['next_shard']:05d}.npy"
+        self.meta["next_shard"] += 1
+        return shard
+
+    def _merge_runs(self):
+        # runs of an unfinished corpus are only merged with each other, so they can still be discarded
+        first_run = self.meta["in_progress"]["num_shards"] if "in_progress" in self.meta else 0
+        while len(self._runs) - first_run >= 2 and self._runs[-1].shape[1] >= self._runs[-2].shape[1]:
+            previous, last = self._runs[-2], self._runs[-1]
+            shard = self._next_shard()
+            merged = np.lib.format.open_memmap(self.path / shard, mode="w+", dtype=np.uint64, shape=(self.bands, previous.shape[1] + last.shape[1]))
+            for band in range(self.bands):
+                # one band in memory at a time, a stable sort merges the two sorted halves in linear time
+                merged[band] = np.sort(np.concatenate([previous[band], last[band]]), kind="stable")
+            merged.flush()
+            del merged
+
+            merged_shards = self.meta["shards"][-2:]
+            self.meta["shards"][-2:] = [shard]
+            self._runs[-2:] = [self._open_run(shard)]
+            # the index no longer refers to the merged runs once saved
+            self.save()
+            for merged_shard in merged_shards:
+                (self.path / merged_shard).unlink()
+
+    def save(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / f"{_INDEX_FILE}.incomplete", "w") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(self.path / f"{_INDEX_FILE}.incomplete", self.path / _INDEX_FILE)
+
+
+def deduplicate(
+    corpora: Dict[str, Union[datasets.Dataset, Iterable[dict]]],
+    index_path: Union[str, Path],
+    num_proc: int = 1,
+    chunk_size: int = 1000,
+    **minhasher_params,
+) -> Dict[str, np.ndarray]:
+    """
+    Deduplicate corpora against each other and against everything already in the index.
+
+    Corpora are processed in the given order; the first occurrence of a group of
+    near-duplicates is kept. Keep masks are also saved as `masks/<name>.npy` in the index.
+    Corpora already in the index are skipped and their saved mask is returned, so
+    an interrupted run can be resumed by calling `deduplicate` again.
+
+    :param corpora: name (e.g. `cc100_ind_nusantara_ssp/train`) to dataset or stream with a `text` column
+    :param index_path: directory of the persistent index
+    :param num_proc: number of processes computing signatures
+    :param minhasher_params: `MinHasher` parameters of a new index
+    :return: name to boolean keep mask
+    """
+    index = MinHashLSHIndex(index_path, **minhasher_params)
+    masks = {}
+    pool = multiprocessing.Pool(num_proc, initializer=_init_worker, initargs=(index.params,)) if num_proc > 1 else None
+    try:
+        for name, corpus in corpora.items():
+            if name in index:
+                logger.info(f"{name} is already deduplicated in {index.path}, loading its keep mask")
+                masks[name] = np.load(index.mask_path(name))
+                continue
+            index.begin(name)
+            chunks = iter_text_chunks(corpus, chunk_size=chunk_size)
+            if pool is not None:
+                band_chunks = pool.imap(_band_hashes_chunk, chunks)
+            else:
+                _init_worker(index.params)
+                band_chunks = map(_band_hashes_chunk, chunks)
+            keep = [index.query_and_add(band_hashes) for band_hashes in band_chunks]
+            masks[name] = np.concatenate(keep) if keep else np.zeros(0, dtype=bool)
+            index.commit(name, masks[name])
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return masks
+
+
+def iter_kept(corpus: Iterable[dict], keep_mask: np.ndarray) -> Iterator[dict]:
+    """Filtered stream of the documents of `corpus` whose keep mask is True."""
+    for keep, example in zip(keep_mask, corpus):
+        if keep:
+            yield example
+
+
+def deduplicate_configs(config_names: List[str], index_path: Union[str, Path], conhelps=None, streaming: bool = False, num_proc: int = 1, **minhasher_params) -> Dict[str, np.ndarray]:
+    """
+    Deduplicate every split of a set of `nusantara_ssp` configs, see `deduplicate`.
+
+    :param config_names: config names, e.g. `["cc100_ind_nusantara_ssp", "kopi_cc_news_all_nusantara_ssp"]`
+    :param conhelps: a `NusantaraConfigHelper`, created if not given
+    :param streaming: stream the configs instead of preparing them
+    :return: `<config>/<split>` to boolean keep mask
+    """
+    if conhelps is None:
+        from ..config_helper import NusantaraConfigHelper
+
+        conhelps = NusantaraConfigHelper()
+
+    def iter_corpora():
+        for config_name in config_names:
+            metadata = conhelps.for_config_name(config_name)
+            if metadata.config.schema != "nusantara_ssp":
+                raise ValueError(f"{config_name} is not a nusantara_ssp config")
+            dataset_dict = metadata.load_dataset(streaming=True) if streaming else metadata.load_dataset()
+            for split, dataset in dataset_dict.items():
+                yield f"{config_name}/{split}", dataset
+
+    return deduplicate(_LazyDict(iter_corpora), index_path, num_proc=num_proc, **minhasher_params)
+
+
+class _LazyDict:
+    """Mapping-like wrapper that produces its items lazily, so configs are loaded one at a time."""
+
+    def __init__(self, factory):
+        self.factory = factory
+
+    def items(self):
+        return self.factory()
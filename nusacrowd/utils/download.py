@@ -0,0 +1,199 @@
+"""
+Concurrent, resumable downloads for loaders with long URL lists.
+
+`download_files` fetches URLs with one `aiohttp` session, so connections are
+pooled and kept alive across files, with at most `max_concurrency` transfers
+in flight. Partial files are kept as `.incomplete` and resumed with HTTP
+`Range` requests after a failure, SHA-256 checksums are computed while the
+bytes are written and verified against expected values, and completed files
+are reused on later calls.
+
+Loaders call `download(dl_manager, urls)` instead of `dl_manager.download(urls)`;
+streaming (`StreamingDownloadManager`) keeps the datasets behaviour.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import aiohttp
+import datasets
+
+logger = logging.getLogger(__name__)
+
+_INCOMPLETE_SUFFIX = ".incomplete"
+_META_SUFFIX = ".json"
+
+
+class ChecksumMismatchError(ValueError):
+    pass
+
+
+def get_download_path(url: str, download_dir: Union[str, Path]) -> Path:
+    """Path of the downloaded file for `url`: a hash of the URL followed by its file name."""
+    name = url.split("?")[0].rstrip("/").split("/")[-1]
+    return Path(download_dir) / f"{hashlib.sha256(url.encode()).hexdigest()[:16]}-{name}"
+
+
+def _read_meta(path: Path) -> Optional[Dict]:
+    meta_path = path.with_name(path.name + _META_SUFFIX)
+    if not path.exists() or not meta_path.exists():
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def _hash_file(path: Path, hasher, chunk_size: int = 1 << 20):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+
+
+async def _fetch(session: aiohttp.ClientSession, url: str, path: Path, expected_sha256: Optional[str], chunk_size: int) -> Dict:
+    tmp_path = path.with_name(path.name + _INCOMPLETE_SUFFIX)
+    hasher = hashlib.sha256()
+    offset = tmp_path.stat().st_size if tmp_path.exists() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    async with session.get(url, headers=headers) as response:
+        if response.status == 416:
+            # the partial file already holds every byte
+            _hash_file(tmp_path, hasher)
+        else:
+            response.raise_for_status()
+            if offset and response.status == 206:
+                logger.info(f"Resuming {url} from byte {offset}")
+                _hash_file(tmp_path, hasher)
+                mode = "ab"
+            else:
+                mode = "wb"
+            with open(tmp_path, mode) as f:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    hasher.update(chunk)
+                    f.write(chunk)
+
+    sha256 = hasher.hexdigest()
+    if expected_sha256 is not None and sha256 != expected_sha256:
+        tmp_path.unlink()
+        raise ChecksumMismatchError(f"Checksum mismatch for {url}: expected {expected_sha256}, got {sha256}")
+    os.replace(tmp_path, path)
+    meta = {"url": url, "sha256": sha256, "num_bytes": path.stat().st_size}
+    with open(path.with_name(path.name + _META_SUFFIX), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+async def _download_one(session, semaphore, url, path, expected_sha256, max_retries, chunk_size) -> Path:
+    meta = _read_meta(path)
+    if meta is not None and (expected_sha256 is None or meta["sha256"] == expected_sha256):
+        return path
+    async with semaphore:
+        for attempt in range(max_retries + 1):
+            try:
+                await _fetch(session, url, path, expected_sha256, chunk_size)
+                return path
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == max_retries:
+                    raise
+                delay = 2 ** attempt
+                logger.warning(f"Download of {url} failed ({e!r}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+
+
+async def _download_all(urls, paths, checksums, max_concurrency, max_retries, chunk_size, timeout) -> List[Path]:
+    semaphore = asyncio.Semaphore(max_concurrency)
+    connector = aiohttp.TCPConnector(limit=max_concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=None, sock_read=timeout)) as session:
+        return await asyncio.gather(
+            *[
+                _download_one(session, semaphore, url, path, checksums.get(url), max_retries, chunk_size)
+                for url, path in zip(urls, paths)
+            ]
+        )
+
+
+def _run(coroutine):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # called from a running event loop (e.g. a notebook), run in a separate thread
+    result = {}
+
+    def target():
+        try:
+            result["value"] = asyncio.run(coroutine)
+        except BaseException as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+def download_files(
+    urls: List[str],
+    download_dir: Optional[Union[str, Path]] = None,
+    checksums: Optional[Dict[str, str]] = None,
+    max_concurrency: int = 8,
+    max_retries: int = 3,
+    chunk_size: int = 1 << 20,
+    timeout: float = 300,
+) -> List[str]:
+    """
+    Download URLs concurrently, resuming partial files.
+
+    :param urls: URLs to download
+    :param download_dir: defaults to the datasets downloads directory
+    :param checksums: expected SHA-256 per URL
+    :param max_concurrency: maximum number of transfers (and connections) at once
+    :param max_retries: retries per URL, each resuming from the bytes already written
+    :param timeout: seconds without receiving data before a transfer is retried
+    :return: local paths, in the order of `urls`
+    """
+    download_dir = Path(download_dir or datasets.config.DOWNLOADED_DATASETS_PATH)
+    download_dir.mkdir(parents=True, exist_ok=True)
+    paths = [get_download_path(url, download_dir) for url in urls]
+    _run(_download_all(urls, paths, checksums or {}, max_concurrency, max_retries, chunk_size, timeout))
+    return [str(path) for path in paths]
+
+
+def download(dl_manager: datasets.DownloadManager, urls: Union[str, List[str]], **download_kwargs) -> Union[str, List[str]]:
+    """
+    Drop-in replacement of `dl_manager.download(urls)` for a URL or a list of URLs, see `download_files`.
+
+    Streaming and offline mirror download managers (see `nusacrowd.utils.mirror`) and
+    local paths are passed through to `dl_manager.download`.
+    """
+    if not isinstance(dl_manager, datasets.DownloadManager) or getattr(dl_manager, "is_offline_mirror", False):
+        return dl_manager.download(urls)
+    url_list = [urls] if isinstance(urls, str) else list(urls)
+    if not all(url.startswith(("http://", "https://")) for url in url_list):
+        return dl_manager.download(urls)
+
+    # like `cached_path`, the download config cache dir is the downloads directory itself
+    paths = download_files(url_list, download_dir=dl_manager.download_config.cache_dir, **download_kwargs)
+    dl_manager.downloaded_paths.update(zip(url_list, paths))
+    _record_sizes_checksums(dl_manager, url_list, paths)
+    return paths[0] if isinstance(urls, str) else paths
+
+
+def _record_sizes_checksums(dl_manager: datasets.DownloadManager, urls: List[str], paths: List[str]):
+    """
+    Record sizes and checksums like `DownloadManager.download`, so the files are listed in `download_checksums`.
+
+    The checksums computed while downloading are reused instead of reading the files again.
+    """
+    for url, path in zip(urls, paths):
+        meta = _read_meta(Path(path))
+        dl_manager._recorded_sizes_checksums[url] = {
+            "num_bytes": meta["num_bytes"],
+            "checksum": meta["sha256"] if dl_manager.record_checksums else None,
+        }
@@ -0,0 +1,158 @@
+"""
+Columnar cache for Excel workbooks.
+
+`pd.read_excel` is one of the slowest parsers used by the loaders. `read_excel`
+below parses a downloaded workbook once, writes every sheet as an Arrow IPC
+file keyed by the file checksum (and the read options), and memory-maps the
+converted sheets on every later call, e.g. for the other configs of the same
+dataset or when a config is rebuilt.
+
+Cached sheets are the same DataFrames as `pd.read_excel` returns: column labels
+are stored in the manifest with their type, and missing values of object
+columns are restored as NaN. A workbook whose sheets do not round-trip exactly
+through Arrow is not cached and keeps being parsed with pandas.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import datasets
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+_MANIFEST_FILE = "sheets.json"
+# part of the cache key, bumped when the format of cached sheets changes
+_CACHE_VERSION = 2
+
+_LABEL_TYPES = {"str": str, "int": int, "float": float, "bool": bool}
+_LABEL_TYPE_NAMES = {str: "str", int: "int", float: "float", bool: "bool", np.int64: "int", np.float64: "float"}
+
+
+def file_checksum(filepath: Union[str, Path]) -> str:
+    """SHA-256 of a file, memoized until it is modified."""
+    from .fingerprint import hash_file
+
+    return hash_file(filepath)
+
+
+def get_excel_cache_dir(filepath: Union[str, Path], read_kwargs: Dict, cache_dir: Optional[str] = None) -> Path:
+    options = hashlib.sha1(json.dumps({"version": _CACHE_VERSION, **read_kwargs}, sort_keys=True, default=str).encode()).hexdigest()[:12]
+    cache_dir = cache_dir or datasets.config.HF_DATASETS_CACHE
+    return Path(cache_dir) / "nusacrowd_excel" / file_checksum(filepath) / options
+
+
+def _encode_labels(columns: pd.Index) -> List[Tuple[str, Union[str, int, float, bool]]]:
+    labels = []
+    for label in columns:
+        label_type = _LABEL_TYPE_NAMES.get(type(label))
+        if label_type is None:
+            raise TypeError(f"column label {label!r} of type {type(label).__name__}")
+        labels.append((label_type, _LABEL_TYPES[label_type](label)))
+    return labels
+
+
+def _to_table(df: pd.DataFrame) -> pa.Table:
+    # Arrow field names are strings, the original labels are restored from the manifest
+    return pa.Table.from_pandas(df.set_axis([f"column_{i}" for i in range(df.shape[1])], axis=1))
+
+
+def _to_dataframe(table: pa.Table, labels: List) -> pd.DataFrame:
+    df = table.to_pandas()
+    for column in df.columns:
+        if df[column].dtype == object:
+            # Arrow nulls become None, pandas parses empty cells as NaN
+            df[column] = df[column].where(df[column].notna(), np.nan)
+    return df.set_axis(pd.Index([_LABEL_TYPES[label_type](label) for label_type, label in labels]), axis=1)
+
+
+def _is_exact(df: pd.DataFrame, restored: pd.DataFrame) -> bool:
+    return (
+        restored.equals(df)
+        and [(type(label), label) for label in restored.columns] == [(type(label), label) for label in df.columns]
+        and restored.dtypes.tolist() == df.dtypes.tolist()
+    )
+
+
+def _convert_workbook(filepath, sheets_dir: Path, read_kwargs: Dict) -> Dict[str, pd.DataFrame]:
+    start = time.perf_counter()
+    dfs = pd.read_excel(filepath, sheet_name=None, **read_kwargs)
+    parse_seconds = time.perf_counter() - start
+
+    sheets = []
+    for sheet, df in dfs.items():
+        try:
+            labels = _encode_labels(df.columns)
+            table = _to_table(df)
+            if not _is_exact(df, _to_dataframe(table, labels)):
+                raise ValueError("the sheet read back from Arrow differs")
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError) as e:
+            # e.g. mixed-type object columns cannot be stored losslessly, keep parsing this workbook with pandas
+            logger.warning(f"Not caching workbook {filepath}: sheet {sheet!r} does not round-trip through Arrow ({e})")
+            return dfs
+        sheets.append((sheet, labels, table))
+
+    sheets_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {"sheets": [], "parse_seconds": parse_seconds}
+    for i, (sheet, labels, table) in enumerate(sheets):
+        sheet_file = f"sheet_{i}.arrow"
+        tmp_file = sheets_dir / f"{sheet_file}.{os.getpid()}.incomplete"
+        with pa.OSFile(str(tmp_file), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_file, sheets_dir / sheet_file)
+        manifest["sheets"].append({"name": sheet, "file": sheet_file, "columns": labels})
+
+    tmp_manifest = sheets_dir / f"{_MANIFEST_FILE}.{os.getpid()}.incomplete"
+    with open(tmp_manifest, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_manifest, sheets_dir / _MANIFEST_FILE)
+    logger.info(f"Converted workbook {filepath} ({len(dfs)} sheets) to Arrow, parsing took {parse_seconds:.2f}s")
+    return dfs
+
+
+def _load_sheets(sheets_dir: Path) -> Dict[str, pd.DataFrame]:
+    start = time.perf_counter()
+    with open(sheets_dir / _MANIFEST_FILE) as f:
+        manifest = json.load(f)
+    dfs = {}
+    for sheet in manifest["sheets"]:
+        with pa.memory_map(str(sheets_dir / sheet["file"])) as source:
+            dfs[sheet["name"]] = _to_dataframe(pa.ipc.open_file(source).read_all(), sheet["columns"])
+    logger.info(f"Loaded {len(dfs)} cached sheets in {time.perf_counter() - start:.2f}s (cold parse took {manifest['parse_seconds']:.2f}s)")
+    return dfs
+
+
+def read_excel(
+    filepath: Union[str, Path],
+    sheet_name: Optional[Union[str, int, List[Union[str, int]]]] = 0,
+    cache_dir: Optional[str] = None,
+    **read_kwargs,
+) -> Union[pd.DataFrame, Dict[str, pd.DataFrame]]:
+    """
+    Drop-in replacement of `pd.read_excel` backed by a per-sheet Arrow cache.
+
+    :param filepath: path to the (downloaded) workbook
+    :param sheet_name: same as `pd.read_excel`: sheet name or position, a list of them, or None for all sheets
+    :param cache_dir: root of the cache, defaults to the datasets cache directory
+    :param read_kwargs: other `pd.read_excel` arguments (e.g. `header`), part of the cache key
+    """
+    sheets_dir = get_excel_cache_dir(filepath, read_kwargs, cache_dir)
+    if (sheets_dir / _MANIFEST_FILE).exists():
+        dfs = _load_sheets(sheets_dir)
+    else:
+        dfs = _convert_workbook(filepath, sheets_dir, read_kwargs)
+
+    def select(key):
+        return list(dfs.values())[key] if isinstance(key, int) else dfs[key]
+
+    if sheet_name is None:
+        return dfs
+    if isinstance(sheet_name, list):
+        return {key: select(key) for key in sheet_name}
+    return select(sheet_name)
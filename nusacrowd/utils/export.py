@@ -0,0 +1,198 @@
+"""
+Export configs to portable Parquet or JSONL shards.
+
+Every config/split is written to `<output_dir>/<config>/<split>/part-XXXXX.<ext>`
+shards of bounded (uncompressed Arrow) size by a pool of writer threads. A
+split is finalized with a `_SUCCESS.json` file listing its shards, row counts
+and checksums; re-running an export skips the splits whose `_SUCCESS.json`
+matches the dataset fingerprint, so an interrupted export resumes where it
+stopped. `manifest.json` at the root collects the splits and their features,
+which can be read back with `datasets.Features.from_dict` without nusacrowd.
+"""
+import gzip
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+import datasets
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .excel_cache import file_checksum
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {"parquet": ".parquet", "jsonl": ".jsonl.gz"}
+
+_MANIFEST_FILE = "manifest.json"
+_SUCCESS_FILE = "_SUCCESS.json"
+
+
+def _iter_record_batches(dataset: datasets.Dataset, batch_size: int) -> Iterator[pa.RecordBatch]:
+    table = dataset.with_format("arrow")
+    for start in range(0, len(dataset), batch_size):
+        yield from table[start:start + batch_size].to_batches()
+
+
+class _ShardWriter:
+    def __init__(self, split_dir: Path, schema: pa.Schema, export_format: str, compression: Optional[str]):
+        self.split_dir = split_dir
+        self.schema = schema
+        self.export_format = export_format
+        self.compression = compression
+        self.shards = []
+        self._writer = None
+        self._path = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    def open(self):
+        name = f"part-{len(self.shards):05d}{EXPORT_FORMATS[self.export_format]}"
+        self._path = self.split_dir / f"{name}.incomplete"
+        if self.export_format == "parquet":
+            self._writer = pq.ParquetWriter(str(self._path), self.schema, compression=self.compression or "none")
+        else:
+            self._writer = gzip.open(self._path, "wt", encoding="utf-8")
+        self.shards.append({"file": name, "num_rows": 0})
+
+    def write(self, batch: pa.RecordBatch):
+        if not self.is_open:
+            self.open()
+        if self.export_format == "parquet":
+            self._writer.write_batch(batch)
+        else:
+            for row in batch.to_pylist():
+                self._writer.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+        self.shards[-1]["num_rows"] += batch.num_rows
+
+    def close(self):
+        if not self.is_open:
+            return
+        self._writer.close()
+        path = self.split_dir / self.shards[-1]["file"]
+        os.replace(self._path, path)
+        self.shards[-1]["num_bytes"] = path.stat().st_size
+        self.shards[-1]["sha256"] = file_checksum(path)
+        self._writer = None
+
+
+def export_split(
+    dataset: datasets.Dataset,
+    split_dir: Union[str, Path],
+    export_format: str = "parquet",
+    max_shard_bytes: int = 256 << 20,
+    batch_size: int = 1000,
+    compression: Optional[str] = "zstd",
+) -> Dict:
+    """
+    Write one split to shards and its `_SUCCESS.json`.
+
+    :param max_shard_bytes: bound on the uncompressed Arrow size of a shard
+    :param compression: Parquet codec; JSONL shards are always gzipped
+    :return: the split entry of the manifest
+    """
+    split_dir = Path(split_dir)
+    split_dir.mkdir(parents=True, exist_ok=True)
+    for stale in [*split_dir.glob("part-*"), split_dir / _SUCCESS_FILE]:
+        stale.unlink(missing_ok=True)
+
+    writer = _ShardWriter(split_dir, dataset.features.arrow_schema, export_format, compression)
+    shard_bytes = 0
+    for batch in _iter_record_batches(dataset, batch_size):
+        if writer.is_open and shard_bytes + batch.nbytes > max_shard_bytes:
+            writer.close()
+            shard_bytes = 0
+        writer.write(batch)
+        shard_bytes += batch.nbytes
+    writer.close()
+
+    entry = {
+        "fingerprint": dataset._fingerprint,
+        "num_rows": len(dataset),
+        "shards": writer.shards,
+        "features": dataset.features.to_dict(),
+    }
+    with open(split_dir / _SUCCESS_FILE, "w") as f:
+        json.dump(entry, f, indent=2)
+    return entry
+
+
+def _read_success(split_dir: Path, fingerprint: str) -> Optional[Dict]:
+    success_file = split_dir / _SUCCESS_FILE
+    if not success_file.exists():
+        return None
+    with open(success_file) as f:
+        entry = json.load(f)
+    if entry["fingerprint"] != fingerprint or not all((split_dir / shard["file"]).exists() for shard in entry["shards"]):
+        return None
+    return entry
+
+
+def iter_selected_metadata(selection, conhelps=None):
+    """`NusantaraMetadata` of a benchmark name, a list of config names or a `NusantaraConfigHelper`."""
+    from ..config_helper import BENCHMARK_DICT, NusantaraConfigHelper
+
+    if isinstance(selection, NusantaraConfigHelper):
+        yield from selection
+        return
+    conhelps = conhelps or NusantaraConfigHelper()
+    config_names = BENCHMARK_DICT[selection] if isinstance(selection, str) else selection
+    for config_name in config_names:
+        yield conhelps.for_config_name(config_name)
+
+
+def export(
+    selection,
+    output_dir: Union[str, Path],
+    export_format: str = "parquet",
+    splits: Optional[List[str]] = None,
+    max_shard_bytes: int = 256 << 20,
+    num_proc: int = 4,
+    resume: bool = True,
+    compression: Optional[str] = "zstd",
+    conhelps=None,
+) -> Dict:
+    """
+    Export a selection of configs to shards with a manifest.
+
+    :param selection: a benchmark name, a list of config names or a `NusantaraConfigHelper` (e.g. from `filtered()`)
+    :param export_format: `parquet` or `jsonl`
+    :param splits: splits to export, all by default
+    :param num_proc: number of writer threads
+    :param resume: skip splits already exported from the same dataset fingerprint
+    :return: the manifest
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format}, expected one of {list(EXPORT_FORMATS)}")
+    output_dir = Path(output_dir)
+    manifest = {"format": export_format, "compression": compression if export_format == "parquet" else "gzip", "configs": {}}
+
+    with ThreadPoolExecutor(num_proc) as executor:
+        futures = {}
+        for metadata in iter_selected_metadata(selection, conhelps):
+            config_name = metadata.config.name
+            for split, dataset in metadata.load_dataset().items():
+                if splits is not None and split not in splits:
+                    continue
+                split_dir = output_dir / config_name / split
+                entry = _read_success(split_dir, dataset._fingerprint) if resume else None
+                if entry is not None:
+                    logger.info(f"Skipping {config_name}/{split}, already exported")
+                    manifest["configs"].setdefault(config_name, {})[split] = entry
+                    continue
+                futures[(config_name, split)] = executor.submit(
+                    export_split, dataset, split_dir, export_format, max_shard_bytes, compression=compression
+                )
+        for (config_name, split), future in futures.items():
+            manifest["configs"].setdefault(config_name, {})[split] = future.result()
+            logger.info(f"Exported {config_name}/{split}")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / _MANIFEST_FILE, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
@@ -0,0 +1,341 @@
+"""
+Fingerprints of prepared caches, to detect caches prepared by older code or from older sources.
+
+datasets only hashes a loader script and its local imports into the cache
+directory name, so a fix in an imported `nusacrowd.utils` module silently
+keeps serving caches prepared with the old code, and a fixed script leaves
+the old cache behind. Loader versions are rarely bumped.
+
+When `NusantaraMetadata.load_dataset` prepares a config, a fingerprint is
+written next to the prepared cache (`nusacrowd_fingerprint.json`). It covers:
+
+- the loader script and every `nusacrowd` module it imports, transitively
+  (for fold views also the modules building the fold pool),
+- the size and SHA-256 of every raw download listed in the cache's
+  `download_checksums`.
+
+`get_cache_status` compares it with the current code without loading
+anything: a config is `missing` without prepared cache, `stale` when the
+code changed, its sources changed or it has no fingerprint, and `fresh`
+otherwise. Sources are compared by size unless `verify_sources` rehashes
+them. `rebuild` re-prepares a stale config and removes its outdated caches.
+"""
+import ast
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    from ..config_helper import NusantaraMetadata
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_FILE = "nusacrowd_fingerprint.json"
+
+FRESH = "fresh"
+STALE = "stale"
+MISSING = "missing"
+
+PACKAGE_ROOT = Path(__file__).resolve().parents[1]
+
+# modules shaping the content of fold view pools, in addition to the loader's imports
+FOLD_VIEW_MODULES = ("utils/folds.py", "utils/builder_utils.py")
+
+_PREPARED_MARKERS = ("dataset_info.json", "manifest.json")
+
+
+@lru_cache(maxsize=None)
+def _hash_file(path: str, mtime_ns: int, size: int) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def hash_file(path: Union[str, Path]) -> str:
+    """SHA-256 of a file, memoized until it is modified."""
+    stat = os.stat(path)
+    return _hash_file(str(path), stat.st_mtime_ns, stat.st_size)
+
+
+def _resolve_module(module_name: str) -> Optional[Path]:
+    parts = module_name.split(".")
+    if parts[0] != PACKAGE_ROOT.name:
+        return None
+    base = PACKAGE_ROOT.joinpath(*parts[1:])
+    for path in (base.with_suffix(".py"), base / "__init__.py"):
+        if path.is_file():
+            return path
+    return None
+
+
+def _module_name(path: Path) -> str:
+    relative = path.relative_to(PACKAGE_ROOT.parent).with_suffix("")
+    parts = relative.parts[:-1] if relative.name == "__init__" else relative.parts
+    return ".".join(parts)
+
+
+@lru_cache(maxsize=None)
+def _direct_imports(path: Path, mtime_ns: int) -> Tuple[Path, ...]:
+    """`nusacrowd` modules imported anywhere in a file (including function level imports)."""
+    tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+    imports = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                if PACKAGE_ROOT not in path.parents:
+                    continue
+                package = _module_name(path) if path.name == "__init__.py" else _module_name(path).rpartition(".")[0]
+                base = ".".join(package.split(".")[:len(package.split(".")) - node.level + 1])
+                module = f"{base}.{node.module}" if node.module else base
+            else:
+                module = node.module or ""
+            # `from package import module` imports a submodule, `from module import name` the module
+            names = [module] + [f"{module}.{alias.name}" for alias in node.names]
+        else:
+            continue
+        for name in names:
+            resolved = _resolve_module(name)
+            if resolved is not None and resolved != path:
+                imports.add(resolved)
+    return tuple(sorted(imports))
+
+
+def get_module_closure(script: Union[str, Path], extra_modules: Tuple[str, ...] = ()) -> List[Path]:
+    """The loader script and all `nusacrowd` modules it imports, transitively."""
+    script = Path(script).resolve()
+    pending = [script] + [PACKAGE_ROOT / module for module in extra_modules]
+    seen = set()
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        pending.extend(_direct_imports(path, path.stat().st_mtime_ns))
+    return sorted(seen)
+
+
+def _relative_name(path: Path) -> str:
+    try:
+        return str(path.relative_to(PACKAGE_ROOT.parent))
+    except ValueError:
+        return str(path)
+
+
+def get_code_hashes(script: Union[str, Path], is_fold_view: bool = False) -> Dict[str, str]:
+    """SHA-256 of each module covered by the fingerprint of a config."""
+    extra_modules = FOLD_VIEW_MODULES if is_fold_view else ()
+    return {_relative_name(path): hash_file(path) for path in get_module_closure(script, extra_modules)}
+
+
+def combine_hashes(hashes: Dict[str, Dict]) -> str:
+    return hashlib.sha256(json.dumps(hashes, sort_keys=True).encode()).hexdigest()
+
+
+def get_cache_name(metadata: "NusantaraMetadata", use_fold_views: bool = True) -> str:
+    """Name of the prepared cache of a config: the fold family for fold views, the config name otherwise."""
+    from .folds import get_fold_family
+
+    if use_fold_views and metadata.is_fold_view:
+        return get_fold_family(metadata.config.name)
+    return metadata.config.name
+
+
+def find_prepared_dirs(metadata: "NusantaraMetadata", cache_dir: Optional[Union[str, Path]] = None, use_fold_views: bool = True) -> List[Path]:
+    """Prepared caches of a config, whatever code prepared them, most recent first."""
+    from .cache_manager import FOLDS_DIR_NAME, get_cache_root
+
+    cache_root = get_cache_root(cache_dir)
+    if use_fold_views and metadata.is_fold_view:
+        markers = (cache_root / FOLDS_DIR_NAME / get_cache_name(metadata)).glob("*/manifest.json")
+    else:
+        markers = (cache_root / Path(metadata.script).stem / metadata.config.name).glob("*/*/dataset_info.json")
+    markers = sorted(markers, key=lambda marker: marker.stat().st_mtime, reverse=True)
+    return [marker.parent for marker in markers if not marker.parent.name.endswith(".incomplete")]
+
+
+def get_prepared_dir(dataset) -> Optional[Path]:
+    """Directory of the cache files of a loaded dataset (or dataset dict), None if it is in memory."""
+    cache_files = dataset.cache_files
+    if isinstance(cache_files, dict):
+        cache_files = [file for files in cache_files.values() for file in files]
+    if not cache_files:
+        return None
+    return Path(cache_files[0]["filename"]).parent
+
+
+def _get_source_urls(prepared_dir: Path) -> Dict[str, Dict]:
+    try:
+        with open(prepared_dir / "dataset_info.json") as f:
+            return json.load(f).get("download_checksums") or {}
+    except (OSError, ValueError):
+        return {}
+
+
+def get_source_hashes(prepared_dir: Path, cache_root: Path, verify: bool = True) -> Dict[str, Dict]:
+    """Size and SHA-256 (with `verify`) of the raw downloads of a prepared cache, per URL."""
+    from .cache_manager import get_download_paths
+
+    url_paths = get_download_paths(cache_root)
+    sources = {}
+    for url, checksum in _get_source_urls(prepared_dir).items():
+        if url in url_paths and url_paths[url][0].is_file():
+            path = url_paths[url][0]
+            sources[url] = {"num_bytes": path.stat().st_size, "sha256": hash_file(path) if verify else None}
+        else:
+            # local data dirs, or downloads evicted since preparation
+            sources[url] = {"num_bytes": checksum.get("num_bytes"), "sha256": None}
+    return sources
+
+
+def record_fingerprint(
+    metadata: "NusantaraMetadata",
+    dataset,
+    prepared_since: float,
+    cache_dir: Optional[Union[str, Path]] = None,
+    use_fold_views: bool = True,
+) -> Optional[Path]:
+    """
+    Write the fingerprint of a loaded config if its cache was prepared after `prepared_since`.
+
+    Caches that were only reused keep their fingerprint (or lack of), so that
+    loading a stale cache never marks it fresh.
+    """
+    from .cache_manager import get_cache_root
+
+    prepared_dir = get_prepared_dir(dataset)
+    if prepared_dir is None:
+        return None
+    markers = [prepared_dir / marker for marker in _PREPARED_MARKERS if (prepared_dir / marker).exists()]
+    if not markers or markers[0].stat().st_mtime < prepared_since:
+        return None
+
+    is_fold_view = use_fold_views and metadata.is_fold_view
+    code = get_code_hashes(metadata.script, is_fold_view)
+    sources = get_source_hashes(prepared_dir, get_cache_root(cache_dir))
+    fingerprint = {
+        "config_name": get_cache_name(metadata, use_fold_views),
+        "fingerprint": combine_hashes({"code": code, "sources": sources}),
+        "code_fingerprint": combine_hashes(code),
+        "code": code,
+        "sources": sources,
+        "created": time.time(),
+    }
+    path = prepared_dir / FINGERPRINT_FILE
+    tmp_path = path.with_name(f"{path.name}.incomplete")
+    with open(tmp_path, "w") as f:
+        json.dump(fingerprint, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+@dataclass
+class CacheStatus:
+    """Freshness of the prepared cache of a config."""
+
+    config_name: str
+    status: str
+    cache_dir: Optional[str] = None
+    reasons: List[str] = field(default_factory=list)
+    sources_changed: bool = False
+    # caches of the same config prepared by older code
+    outdated_dirs: List[str] = field(default_factory=list)
+
+
+def get_cache_status(
+    metadata: "NusantaraMetadata",
+    cache_dir: Optional[Union[str, Path]] = None,
+    verify_sources: bool = False,
+    use_fold_views: bool = True,
+) -> CacheStatus:
+    """
+    Compare the fingerprint of the most recent prepared cache of a config with the current code and sources.
+
+    :param verify_sources: rehash downloaded sources instead of comparing their sizes
+    """
+    from .cache_manager import get_cache_root
+
+    prepared_dirs = find_prepared_dirs(metadata, cache_dir, use_fold_views)
+    if not prepared_dirs:
+        return CacheStatus(metadata.config.name, MISSING)
+
+    prepared_dir = prepared_dirs[0]
+    status = CacheStatus(metadata.config.name, FRESH, str(prepared_dir), outdated_dirs=[str(path) for path in prepared_dirs[1:]])
+    try:
+        with open(prepared_dir / FINGERPRINT_FILE) as f:
+            recorded = json.load(f)
+    except (OSError, ValueError):
+        status.status = STALE
+        status.reasons.append("no fingerprint recorded")
+        return status
+
+    code = get_code_hashes(metadata.script, use_fold_views and metadata.is_fold_view)
+    if combine_hashes(code) != recorded["code_fingerprint"]:
+        changed = sorted(
+            name for name in set(code) | set(recorded["code"])
+            if code.get(name) != recorded["code"].get(name)
+        )
+        status.reasons.append(f"code changed: {', '.join(changed)}")
+
+    current_sources = get_source_hashes(prepared_dir, get_cache_root(cache_dir), verify=verify_sources)
+    changed_urls = []
+    for url, source in recorded["sources"].items():
+        current = current_sources.get(url, {})
+        if current.get("num_bytes") != source["num_bytes"]:
+            changed_urls.append(url)
+        elif verify_sources and current.get("sha256") and source["sha256"] and current["sha256"] != source["sha256"]:
+            changed_urls.append(url)
+    if changed_urls:
+        status.sources_changed = True
+        status.reasons.append(f"sources changed: {', '.join(changed_urls)}")
+
+    if status.reasons:
+        status.status = STALE
+    return status
+
+
+def rebuild(
+    metadata: "NusantaraMetadata",
+    status: CacheStatus,
+    cache_dir: Optional[Union[str, Path]] = None,
+    use_fold_views: bool = True,
+):
+    """
+    Re-prepare a stale config, removing its stale and outdated caches.
+
+    Raw files are downloaded again only if the sources changed.
+    """
+    import datasets
+
+    from .cache_manager import get_cache_root, remove_prepared_dir
+    from .locking import preparation_lock
+
+    logger.info(f"Rebuilding {metadata.config.name}: {'; '.join(status.reasons)}")
+    load_kwargs = {"cache_dir": cache_dir} if cache_dir else {}
+    if status.sources_changed:
+        load_kwargs["download_config"] = datasets.DownloadConfig(
+            cache_dir=str(get_cache_root(cache_dir) / "downloads"),
+            force_download=True,
+        )
+    with preparation_lock(get_cache_name(metadata, use_fold_views), cache_dir):
+        for path in [status.cache_dir] + status.outdated_dirs:
+            if path:
+                logger.info(f"Removing {path}")
+                remove_prepared_dir(path)
+        return metadata.load_dataset(use_fold_views=use_fold_views, single_flight=False, **load_kwargs)
+
+
+def format_statuses(statuses: List[CacheStatus]) -> str:
+    lines = [f"{status.status:<8} {status.config_name}" + (f"  ({'; '.join(status.reasons)})" if status.reasons else "") for status in statuses]
+    counts = {name: sum(status.status == name for status in statuses) for name in (FRESH, STALE, MISSING)}
+    lines.append(", ".join(f"{count} {name}" for name, count in counts.items()))
+    return "\n".join(lines)
@@ -0,0 +1,417 @@
+"""
+Flat columnar layout of `kb_features` datasets.
+
+`kb_features` nests passages, entities, relations and coreferences of a
+document as lists of dicts referring to each other by string ids (e.g.
+`f"{sent_id}_EntID_{ent_id}"`), so training on UD or coreference configs
+decodes every row to Python and resolves ids by string. `FlatKB` stores the
+same content as separate tables with one row per element:
+
+- `documents`: `id`, `passages`, `events` (kept nested),
+- `entities`: `document` row, `id`, int-encoded `type`, `text`, `offsets`, `normalized`,
+- `relations`: `document` row, `id`, int-encoded `type`, `arg1` and `arg2` entity rows, `normalized`,
+- `coreferences`: `document` row, `id`, `entities` rows.
+
+References are global row indices into the entity table, -1 when the string
+id does not resolve to an entity of the document (e.g. the root head `0` of
+UD configs); the unresolved string ids are kept in `arg1_id`/`arg2_id` and
+`entity_ids` (null when resolved), and null types stay null, so that `to_kb`
+reproduces the original rows. Conversion is vectorized over the Arrow columns, and e.g. head/deprel
+arrays of each sentence are numpy views (`iter_dependencies`).
+
+    flat_kb = metadata.load_flat_kb()["train"]
+    for heads, deprels in flat_kb.iter_dependencies():
+        ...
+"""
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import datasets
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from datasets.table import InMemoryTable
+
+from .arrow_utils import as_array, get_arrow_table
+from .schemas import kb_features
+
+FLAT_KB_DIR_NAME = "nusacrowd_flat_kb"
+# part of the name of saved conversions, bumped when the layout changes
+_FORMAT_VERSION = 2
+
+TABLE_NAMES = ("documents", "entities", "relations", "coreferences")
+
+_ENTITY = kb_features["entities"][0]
+_RELATION = kb_features["relations"][0]
+
+
+def _get_features(entity_types: List[str], relation_types: List[str]) -> Dict[str, datasets.Features]:
+    return {
+        "documents": datasets.Features({"id": kb_features["id"], "passages": kb_features["passages"], "events": kb_features["events"]}),
+        "entities": datasets.Features({
+            "document": datasets.Value("int32"),
+            "id": _ENTITY["id"],
+            "type": datasets.ClassLabel(names=entity_types),
+            "text": _ENTITY["text"],
+            "offsets": _ENTITY["offsets"],
+            "normalized": _ENTITY["normalized"],
+        }),
+        "relations": datasets.Features({
+            "document": datasets.Value("int32"),
+            "id": _RELATION["id"],
+            "type": datasets.ClassLabel(names=relation_types),
+            "arg1": datasets.Value("int64"),
+            "arg2": datasets.Value("int64"),
+            "arg1_id": datasets.Value("string"),
+            "arg2_id": datasets.Value("string"),
+            "normalized": _RELATION["normalized"],
+        }),
+        "coreferences": datasets.Features({
+            "document": datasets.Value("int32"),
+            "id": datasets.Value("string"),
+            "entities": datasets.Sequence(datasets.Value("int64")),
+            "entity_ids": datasets.Sequence(datasets.Value("string")),
+        }),
+    }
+
+
+def _to_dataset(columns: Dict[str, pa.Array], features: datasets.Features, split=None) -> datasets.Dataset:
+    table = pa.table({name: columns[name] for name in features})
+    return datasets.Dataset(InMemoryTable(table.cast(features.arrow_schema)), info=datasets.DatasetInfo(features=features), split=split)
+
+
+def _flatten(table: pa.Table, column: str) -> Tuple[pa.StructArray, np.ndarray]:
+    """Elements of a list column with the document row of each."""
+    values = as_array(table.column(column))
+    documents = pc.list_parent_indices(values).to_numpy(zero_copy_only=False).astype(np.int32)
+    return pc.list_flatten(values), documents
+
+
+def _encode(values: pa.Array) -> Tuple[pa.Array, List[str]]:
+    """Int codes of string values (null for null values), with the sorted vocabulary."""
+    names = sorted(name for name in pc.unique(values).to_pylist() if name is not None)
+    return pc.index_in(values, value_set=pa.array(names, pa.string())), names
+
+
+def _keys(documents: np.ndarray, ids: pa.Array) -> pa.Array:
+    """Document-qualified ids, since element ids are only unique within a document."""
+    return pc.binary_join_element_wise(pc.cast(pa.array(documents), pa.string()), pc.cast(ids, pa.string()), "\x1f")
+
+
+def _resolve(keys: pa.Array, entity_keys: pa.Array, ids: pa.Array) -> Tuple[np.ndarray, pa.Array]:
+    """Entity rows of `keys` (-1 if unresolved), with the ids of unresolved keys (null if resolved)."""
+    rows = pc.index_in(keys, value_set=entity_keys)
+    unresolved = pc.if_else(pc.is_null(rows), ids, pa.scalar(None, pa.string()))
+    return pc.fill_null(rows, -1).to_numpy(zero_copy_only=False).astype(np.int64), unresolved
+
+
+def _offsets(documents: np.ndarray, num_documents: int) -> np.ndarray:
+    """Row offsets of each document's elements in a table sorted by document."""
+    offsets = np.zeros(num_documents + 1, dtype=np.int64)
+    np.cumsum(np.bincount(documents, minlength=num_documents), out=offsets[1:])
+    return offsets
+
+
+def _restore(rows: pa.Array, ids: pa.Array, unresolved: pa.Array) -> pa.Array:
+    """String ids of entity rows, the unresolved ids where a row is -1."""
+    rows = rows.to_numpy(zero_copy_only=False)
+    resolved = pc.take(ids, pa.array(np.where(rows >= 0, rows, 0)))
+    return pc.if_else(pa.array(rows >= 0), resolved, unresolved) if len(ids) else unresolved
+
+
+class FlatKB:
+    """
+    `kb_features` content as flat `documents`, `entities`, `relations` and `coreferences` tables.
+
+    Each table is a `datasets.Dataset` (memory-mapped once saved), with
+    elements sorted by document so that the elements of document `i` are the
+    rows `offsets[i]:offsets[i + 1]` of their table.
+    """
+
+    def __init__(self, documents: datasets.Dataset, entities: datasets.Dataset, relations: datasets.Dataset, coreferences: datasets.Dataset):
+        self.documents = documents
+        self.entities = entities
+        self.relations = relations
+        self.coreferences = coreferences
+        self._columns = {}
+
+    @classmethod
+    def from_kb(cls, dataset: datasets.Dataset) -> "FlatKB":
+        """Convert a `kb_features` dataset, without decoding its rows to Python."""
+        table = get_arrow_table(dataset)
+
+        entities, entity_documents = _flatten(table, "entities")
+        entity_ids = pc.struct_field(entities, "id")
+        entity_types, entity_type_names = _encode(pc.struct_field(entities, "type"))
+        entity_keys = _keys(entity_documents, entity_ids)
+
+        relations, relation_documents = _flatten(table, "relations")
+        relation_types, relation_type_names = _encode(pc.struct_field(relations, "type"))
+        relation_args = {}
+        for arg in ("arg1", "arg2"):
+            arg_ids = pc.struct_field(relations, f"{arg}_id")
+            relation_args[arg], relation_args[f"{arg}_id"] = _resolve(_keys(relation_documents, arg_ids), entity_keys, arg_ids)
+
+        coreferences, coreference_documents = _flatten(table, "coreferences")
+        member_lists = pc.struct_field(coreferences, "entity_ids")
+        member_ids = pc.list_flatten(member_lists)
+        member_documents = coreference_documents[pc.list_parent_indices(member_lists).to_numpy(zero_copy_only=False)]
+        member_rows, member_unresolved = _resolve(_keys(member_documents, member_ids), entity_keys, member_ids)
+        member_offsets = pa.array(_offsets(pc.list_parent_indices(member_lists).to_numpy(zero_copy_only=False), len(coreferences)).astype(np.int32))
+
+        features = _get_features(entity_type_names, relation_type_names)
+        return cls(
+            documents=_to_dataset({name: as_array(table.column(name)) for name in ("id", "passages", "events")}, features["documents"], dataset.split),
+            entities=_to_dataset({
+                "document": pa.array(entity_documents),
+                "id": entity_ids,
+                "type": entity_types,
+                **{name: pc.struct_field(entities, name) for name in ("text", "offsets", "normalized")},
+            }, features["entities"], dataset.split),
+            relations=_to_dataset({
+                "document": pa.array(relation_documents),
+                "id": pc.struct_field(relations, "id"),
+                "type": relation_types,
+                **{name: pa.array(values) if isinstance(values, np.ndarray) else values for name, values in relation_args.items()},
+                "normalized": pc.struct_field(relations, "normalized"),
+            }, features["relations"], dataset.split),
+            coreferences=_to_dataset({
+                "document": pa.array(coreference_documents),
+                "id": pc.struct_field(coreferences, "id"),
+                "entities": pa.ListArray.from_arrays(member_offsets, pa.array(member_rows)),
+                "entity_ids": pa.ListArray.from_arrays(member_offsets, member_unresolved),
+            }, features["coreferences"], dataset.split),
+        )
+
+    def to_kb(self) -> datasets.Dataset:
+        """Convert back to a `kb_features` dataset, with the same rows as the converted one."""
+        num_documents = len(self)
+        entities = get_arrow_table(self.entities)
+        relations = get_arrow_table(self.relations)
+        coreferences = get_arrow_table(self.coreferences)
+        entity_ids = as_array(entities.column("id"))
+
+        def to_list(structs: Dict[str, pa.Array], documents: pa.ChunkedArray) -> pa.ListArray:
+            offsets = _offsets(as_array(documents).to_numpy(zero_copy_only=False), num_documents)
+            return pa.ListArray.from_arrays(pa.array(offsets.astype(np.int32)), pa.StructArray.from_arrays(list(structs.values()), names=list(structs)))
+
+        def decode(table: pa.Table, names: List[str]) -> pa.Array:
+            return pc.take(pa.array(names, pa.string()), as_array(table.column("type")))
+
+        member_lists = as_array(coreferences.column("entities"))
+        member_ids = _restore(pc.list_flatten(member_lists), entity_ids, pc.list_flatten(as_array(coreferences.column("entity_ids"))))
+        member_offsets = _offsets(pc.list_parent_indices(member_lists).to_numpy(zero_copy_only=False), len(member_lists)).astype(np.int32)
+
+        documents = get_arrow_table(self.documents)
+        columns = {
+            "id": as_array(documents.column("id")),
+            "passages": as_array(documents.column("passages")),
+            "entities": to_list({
+                "id": entity_ids,
+                "type": decode(entities, self.entity_types),
+                **{name: as_array(entities.column(name)) for name in ("text", "offsets", "normalized")},
+            }, entities.column("document")),
+            "events": as_array(documents.column("events")),
+            "coreferences": to_list({
+                "id": as_array(coreferences.column("id")),
+                "entity_ids": pa.ListArray.from_arrays(pa.array(member_offsets), member_ids),
+            }, coreferences.column("document")),
+            "relations": to_list({
+                "id": as_array(relations.column("id")),
+                "type": decode(relations, self.relation_types),
+                **{
+                    f"{arg}_id": _restore(as_array(relations.column(arg)), entity_ids, as_array(relations.column(f"{arg}_id")))
+                    for arg in ("arg1", "arg2")
+                },
+                "normalized": as_array(relations.column("normalized")),
+            }, relations.column("document")),
+        }
+        return _to_dataset(columns, kb_features, self.documents.split)
+
+    def __len__(self):
+        return self.documents.num_rows
+
+    @property
+    def entity_types(self) -> List[str]:
+        return self.entities.features["type"].names
+
+    @property
+    def relation_types(self) -> List[str]:
+        return self.relations.features["type"].names
+
+    def column(self, table_name: str, column: str) -> np.ndarray:
+        """
+        A numeric column of a table as a (memoized) numpy array, e.g. `column("relations", "arg2")`.
+
+        Null values of integer columns (e.g. null types) are -1.
+        """
+        if (table_name, column) not in self._columns:
+            values = as_array(getattr(self, table_name).with_format("arrow")[column])
+            if pa.types.is_integer(values.type):
+                values = pc.fill_null(values, -1)
+            self._columns[(table_name, column)] = values.to_numpy(zero_copy_only=False)
+        return self._columns[(table_name, column)]
+
+    def offsets(self, table_name: str) -> np.ndarray:
+        """Row offsets of each document's elements in `entities`, `relations` or `coreferences`."""
+        if (table_name, "offsets") not in self._columns:
+            self._columns[(table_name, "offsets")] = _offsets(self.column(table_name, "document"), len(self))
+        return self._columns[(table_name, "offsets")]
+
+    def dependency_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Head and relation type of every entity (token), for UD configs.
+
+        Heads are 1-based positions within the document (sentence), 0 for the
+        root or a head that is not a token; relation types index `relation_types`.
+        Entities that are not the `arg1` of a relation get head 0 and type -1.
+        """
+        if ("entities", "heads") not in self._columns:
+            entity_offsets = self.offsets("entities")
+            children = self.column("relations", "arg1")
+            parents = self.column("relations", "arg2")
+            documents = self.column("relations", "document")
+            resolved = children >= 0
+            heads = np.zeros(self.entities.num_rows, dtype=np.int32)
+            deprels = np.full(self.entities.num_rows, -1, dtype=np.int32)
+            heads[children[resolved]] = np.where(parents >= 0, parents - entity_offsets[documents] + 1, 0)[resolved]
+            deprels[children[resolved]] = self.column("relations", "type")[resolved]
+            self._columns[("entities", "heads")] = heads
+            self._columns[("entities", "deprels")] = deprels
+        return self._columns[("entities", "heads")], self._columns[("entities", "deprels")]
+
+    def iter_dependencies(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Heads and relation types of each document as numpy views, see `dependency_arrays`."""
+        heads, deprels = self.dependency_arrays()
+        offsets = self.offsets("entities")
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield heads[start:end], deprels[start:end]
+
+    def save(self, path: Union[str, Path]):
+        for name in TABLE_NAMES:
+            getattr(self, name).save_to_disk(str(Path(path) / name))
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "FlatKB":
+        """Load saved tables, memory-mapped."""
+        return cls(**{name: datasets.load_from_disk(str(Path(path) / name)) for name in TABLE_NAMES})
+
+
+def get_flat_kb(dataset: datasets.Dataset) -> FlatKB:
+    """
+    Flat layout of a `kb_features` dataset, converted once and saved next to its prepared cache.
+    """
+    from .fingerprint import get_prepared_dir
+
+    prepared_dir = get_prepared_dir(dataset)
+    if prepared_dir is None:
+        return FlatKB.from_kb(dataset)
+    path = prepared_dir / FLAT_KB_DIR_NAME / f"{dataset.split}-{dataset._fingerprint[:16]}-v{_FORMAT_VERSION}"
+    if not path.exists():
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.incomplete")
+        FlatKB.from_kb(dataset).save(tmp_path)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # converted concurrently by another process
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    return FlatKB.load(path)
+
+
+def _nested_dependencies(example: Dict, relation_types: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Heads and relation types of a decoded `kb_features` row, resolving string ids."""
+    positions = {entity["id"]: i for i, entity in enumerate(example["entities"])}
+    heads = np.zeros(len(positions), dtype=np.int32)
+    deprels = np.full(len(positions), -1, dtype=np.int32)
+    for relation in example["relations"]:
+        child = positions.get(relation["arg1_id"])
+        if child is not None:
+            parent = positions.get(relation["arg2_id"])
+            heads[child] = 0 if parent is None else parent + 1
+            deprels[child] = relation_types[relation["type"]]
+    return heads, deprels
+
+
+def synthetic_ud_kb(num_sentences: int = 5000, seed: int = 0) -> datasets.Dataset:
+    """UD-like `kb_features` dataset, as built by `load_ud_data_as_nusantara_kb`."""
+    rng = np.random.default_rng(seed)
+    deprels = ["nsubj", "obj", "root", "det", "amod", "case", "nmod", "punct"]
+    upos = ["NOUN", "VERB", "ADJ", "DET", "ADP", "PUNCT", "PROPN"]
+    rows = []
+    for sent in range(num_sentences):
+        sent_id = f"sent-{sent}"
+        num_tokens = int(rng.integers(3, 40))
+        forms = [f"w{i}" for i in range(num_tokens)]
+        text = " ".join(forms)
+        starts = np.cumsum([0] + [len(form) + 1 for form in forms[:-1]])
+        heads = rng.integers(0, num_tokens + 1, size=num_tokens)
+        rows.append({
+            "id": sent_id,
+            "passages": [{"id": f"{sent_id}_passages", "type": "", "text": [text], "offsets": [[0, len(text)]]}],
+            "entities": [
+                {
+                    "id": f"{sent_id}_EntID_{i + 1}",
+                    "type": upos[int(rng.integers(len(upos)))],
+                    "text": [form],
+                    "offsets": [[int(start), int(start) + len(form)]],
+                    "normalized": [{"db_name": form, "db_id": None}],
+                }
+                for i, (form, start) in enumerate(zip(forms, starts))
+            ],
+            "relations": [
+                {
+                    "id": f"{sent_id}_RelID_{i}",
+                    "type": deprels[int(rng.integers(len(deprels)))],
+                    "arg1_id": f"{sent_id}_EntID_{i + 1}",
+                    "arg2_id": f"{sent_id}_EntID_{head}",
+                    "normalized": [],
+                }
+                for i, head in enumerate(heads)
+            ],
+            "events": [],
+            "coreferences": [],
+        })
+    return datasets.Dataset.from_list(rows, features=kb_features)
+
+
+def benchmark_epoch(dataset: Optional[datasets.Dataset] = None, num_epochs: int = 3) -> Dict[str, Dict[str, float]]:
+    """
+    Compare an epoch over head/deprel arrays of every sentence from nested rows and from the flat layout.
+
+    :param dataset: a `kb_features` dataset of a UD config, `synthetic_ud_kb()` by default
+    :return: seconds of the conversion and sentences/sec of each layout
+    """
+    dataset = dataset if dataset is not None else synthetic_ud_kb()
+    start = time.perf_counter()
+    flat_kb = FlatKB.from_kb(dataset)
+    conversion = time.perf_counter() - start
+    relation_types = {name: i for i, name in enumerate(flat_kb.relation_types)}
+
+    def nested_epoch():
+        for example in dataset:
+            _nested_dependencies(example, relation_types)
+
+    def flat_epoch():
+        # a fresh view each epoch, so that array extraction is part of the measure
+        for _ in FlatKB(flat_kb.documents, flat_kb.entities, flat_kb.relations, flat_kb.coreferences).iter_dependencies():
+            pass
+
+    results = {}
+    for name, epoch in [("nested", nested_epoch), ("flat", flat_epoch)]:
+        start = time.perf_counter()
+        for _ in range(num_epochs):
+            epoch()
+        elapsed = time.perf_counter() - start
+        results[name] = {"sentences_per_sec": num_epochs * len(dataset) / elapsed}
+    results["flat"]["conversion_seconds"] = conversion
+    return results
+
+
+if __name__ == "__main__":
+    results = benchmark_epoch()
+    print(f"conversion: {results['flat']['conversion_seconds']:.2f}s")
+    for layout, result in results.items():
+        print(f"{layout}: {result['sentences_per_sec']:.0f} sentences/sec")
@@ -0,0 +1,162 @@
+"""
+Parse-once k-fold views.
+
+K-fold configs (e.g. `indolem_ner_ugm_fold0_nusantara_seq_label` ... `fold4`) are
+different partitions of the same examples. Instead of preparing one full Arrow
+cache per fold, the examples of all folds are generated once into a shared pool
+table, and each fold split is stored as an array of row indices into that pool.
+Loading a fold is then a memory-mapped `select` on the pool.
+"""
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import datasets
+import numpy as np
+from datasets.arrow_writer import ArrowWriter
+
+from .builder_utils import get_download_config, get_download_manager, iter_split_examples
+
+# Datasets whose `_fold{i}` configs are partitions of the same examples, with their positional id
+# columns (`str(i)` within a split), which are ignored when matching examples across folds.
+# indosum ids are document ids of the source data and identify examples.
+FOLD_VIEW_DATASETS = {
+    "indolem_ner_ugm": ("id", "index"),
+    "indolem_nerui": ("id", "index"),
+    "indosum": (),
+}
+
+_FOLD_PATTERN = re.compile(r"_fold(\d+)")
+_POOL_FILE = "pool.arrow"
+_MANIFEST_FILE = "manifest.json"
+# bumped when the pool content changes for the same loader, so that older pools are not reused
+_POOL_VERSION = 2
+
+
+def get_fold_index(config_name: str) -> Optional[int]:
+    match = _FOLD_PATTERN.search(config_name)
+    return int(match.group(1)) if match else None
+
+
+def get_fold_family(config_name: str) -> str:
+    """Name shared by all folds of a config, e.g. `indolem_nerui_nusantara_seq_label`."""
+    return _FOLD_PATTERN.sub("", config_name)
+
+
+def get_fold_view_dir(script: str, config_names: List[str], cache_dir: Optional[str] = None) -> Path:
+    hasher = hashlib.sha256(Path(script).read_bytes())
+    hasher.update("\n".join(sorted(config_names)).encode())
+    hasher.update(f"pool-v{_POOL_VERSION}".encode())
+    cache_dir = cache_dir or datasets.config.HF_DATASETS_CACHE
+    return Path(cache_dir) / "nusacrowd_folds" / get_fold_family(config_names[0]) / hasher.hexdigest()[:16]
+
+
+def get_positional_id_columns(script: str) -> Tuple[str, ...]:
+    return FOLD_VIEW_DATASETS.get(Path(script).stem, ())
+
+
+def _example_key(example: Dict, id_columns: Tuple[str, ...] = ()) -> str:
+    content = {k: v for k, v in example.items() if k not in id_columns}
+    return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def prepare_fold_pool(
+    script: str,
+    config_names: List[str],
+    cache_dir: Optional[str] = None,
+    download_config: Optional[datasets.DownloadConfig] = None,
+    id_columns: Optional[Tuple[str, ...]] = None,
+) -> Path:
+    """
+    Generate the examples of every fold once and write the shared pool and fold indices.
+
+    The k-th occurrence of an example within a split is mapped to the k-th pool
+    copy of that example, so genuine duplicates are kept and each fold split is
+    reproduced exactly (up to the positional ids in `id_columns`).
+
+    :param script: path to the dataloader script
+    :param config_names: all fold configs of one family (same schema)
+    :param download_config: defaults to the download config `download_and_prepare` derives from each builder
+    :param id_columns: positional id columns, those of `FOLD_VIEW_DATASETS` by default
+    :return: directory containing the pool table and the manifest
+    """
+    if id_columns is None:
+        id_columns = get_positional_id_columns(script)
+    view_dir = get_fold_view_dir(script, config_names, cache_dir)
+    if (view_dir / _MANIFEST_FILE).exists():
+        return view_dir
+
+    view_dir.mkdir(parents=True, exist_ok=True)
+    pool, pool_keys, manifest = [], {}, {"configs": {}}
+    features = None
+    for config_name in config_names:
+        builder = datasets.load_dataset_builder(path=script, name=config_name, cache_dir=cache_dir, download_config=download_config)
+        features = builder.info.features
+        manifest["configs"][config_name] = {}
+        # raw files go to the downloads dir of `cache_dir`, as with `download_and_prepare`
+        dl_manager = get_download_manager(builder, download_config or get_download_config(builder))
+        for split, examples in iter_split_examples(builder, dl_manager):
+            indices, occurrences = [], {}
+            for example in examples:
+                key = _example_key(example, id_columns)
+                occurrence = occurrences.get(key, 0)
+                occurrences[key] = occurrence + 1
+                if (key, occurrence) not in pool_keys:
+                    pool_keys[(key, occurrence)] = len(pool)
+                    pool.append(example)
+                indices.append(pool_keys[(key, occurrence)])
+
+            index_file = f"{config_name}-{split}.npy"
+            np.save(view_dir / index_file, np.asarray(indices, dtype=np.int64))
+            manifest["configs"][config_name][split] = index_file
+
+    # positional ids (`str(i)` per split) collide once folds are pooled, renumber them by pool row
+    for id_column in id_columns:
+        if id_column in features and len({example[id_column] for example in pool}) < len(pool):
+            for row, example in enumerate(pool):
+                example[id_column] = str(row)
+
+    tmp_pool = view_dir / f"{_POOL_FILE}.incomplete"
+    writer = ArrowWriter(features=features, path=str(tmp_pool))
+    try:
+        for example in pool:
+            writer.write(features.encode_example(example))
+        writer.finalize()
+    finally:
+        writer.close()
+    os.replace(tmp_pool, view_dir / _POOL_FILE)
+
+    manifest["num_rows"] = len(pool)
+    with open(view_dir / _MANIFEST_FILE, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return view_dir
+
+
+def load_fold_view(
+    script: str,
+    config_name: str,
+    config_names: List[str],
+    cache_dir: Optional[str] = None,
+    download_config: Optional[datasets.DownloadConfig] = None,
+) -> datasets.DatasetDict:
+    """
+    Load one fold config as an index view over the shared pool, preparing the pool if needed.
+
+    :param script: path to the dataloader script
+    :param config_name: fold config to load
+    :param config_names: all fold configs of the same family
+    """
+    view_dir = prepare_fold_pool(script, config_names, cache_dir=cache_dir, download_config=download_config)
+    with open(view_dir / _MANIFEST_FILE) as f:
+        manifest = json.load(f)
+
+    pool = datasets.Dataset.from_file(str(view_dir / _POOL_FILE))
+    return datasets.DatasetDict(
+        {
+            split: pool.select(np.load(view_dir / index_file), keep_in_memory=True)
+            for split, index_file in manifest["configs"][config_name].items()
+        }
+    )
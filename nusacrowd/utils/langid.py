@@ -0,0 +1,214 @@
+"""
+Lightweight character n-gram language identification.
+
+`LanguageIdentifier` is a multinomial Naive Bayes model over hashed character
+n-grams, trained offline from labeled monolingual text (e.g. the language
+sides of NusaX and NusaTranslation). Texts are decoded, lowercased and hashed
+per batch with Arrow and numpy, so it can be used as a batched
+`Dataset.filter` / `IterableDataset.filter` stage over `nusantara_ssp` corpora.
+
+    identifier = LanguageIdentifier.train_from_configs({"nusax_mt_ind_sun_nusantara_t2t": None})
+    corpus = corpus.filter(language_filter(identifier, ["sun"], min_confidence=0.9), batched=True)
+"""
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import datasets
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .arrow_utils import code_points
+
+_NGRAM_BASE = np.uint64(0x01000193)
+_MODEL_FILE = "langid.npz"
+_CONFIG_FILE = "langid.json"
+
+
+def normalize_texts(texts: Sequence[str]) -> pa.Array:
+    """Lowercase, replace every run of non-letters by a space and pad with spaces to mark word boundaries."""
+    texts = pc.utf8_lower(pc.fill_null(pa.array(texts, type=pa.string()), ""))
+    texts = pc.replace_substring_regex(texts, pattern=r"[^\p{L}]+", replacement=" ")
+    return pc.binary_join_element_wise(" ", texts, " ", "")
+
+
+def char_ngram_ids(texts: Sequence[str], ngram_range: Tuple[int, int], num_features: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hashed character n-grams of a batch of texts.
+
+    :return: tuple of (feature ids, index of the text each n-gram comes from)
+    """
+    chars, starts = code_points(normalize_texts(texts))
+    chars = chars.astype(np.uint64)
+    owners = np.repeat(np.arange(len(starts) - 1), np.diff(starts))
+    all_ids, all_owners = [], []
+    with np.errstate(over="ignore"):
+        for n in range(ngram_range[0], ngram_range[1] + 1):
+            if len(chars) < n:
+                continue
+            num_ngrams = len(chars) - n + 1
+            hashes = np.full(num_ngrams, n, dtype=np.uint64)
+            for k in range(n):
+                hashes = hashes * _NGRAM_BASE + chars[k:k + num_ngrams]
+            # keep the n-grams that do not cross two texts
+            within = owners[:num_ngrams] == owners[n - 1:]
+            all_ids.append((hashes[within] % np.uint64(num_features)).astype(np.int64))
+            all_owners.append(owners[:num_ngrams][within])
+    if not all_ids:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(all_ids), np.concatenate(all_owners)
+
+
+class LanguageIdentifier:
+    """
+    Multinomial Naive Bayes over hashed character n-grams.
+
+    :param languages: language codes (ISO 639-3), one per column of `log_probs`
+    :param log_probs: [num_features, num_languages] log P(n-gram | language)
+    """
+
+    def __init__(self, languages: List[str], log_probs: np.ndarray, ngram_range: Tuple[int, int] = (1, 4)):
+        self.languages = list(languages)
+        self.log_probs = log_probs
+        self.ngram_range = tuple(ngram_range)
+
+    @property
+    def num_features(self) -> int:
+        return self.log_probs.shape[0]
+
+    @classmethod
+    def train(
+        cls,
+        texts: Sequence[str],
+        labels: Sequence[str],
+        ngram_range: Tuple[int, int] = (1, 4),
+        num_features: int = 1 << 18,
+        alpha: float = 0.1,
+        batch_size: int = 10000,
+    ) -> "LanguageIdentifier":
+        """
+        :param texts: training texts
+        :param labels: language code of every text
+        :param alpha: additive smoothing of the n-gram counts
+        """
+        languages = sorted(set(labels))
+        label_ids = np.asarray([languages.index(label) for label in labels], dtype=np.int64)
+        counts = np.zeros(num_features * len(languages), dtype=np.float64)
+        for start in range(0, len(texts), batch_size):
+            ids, owners = char_ngram_ids(texts[start:start + batch_size], ngram_range, num_features)
+            counts += np.bincount(ids * len(languages) + label_ids[start + owners], minlength=len(counts))
+        counts = counts.reshape(num_features, len(languages)) + alpha
+        log_probs = np.log(counts / counts.sum(axis=0, keepdims=True)).astype(np.float32)
+        return cls(languages, log_probs, ngram_range)
+
+    @classmethod
+    def train_from_configs(cls, configs: Dict[str, Optional[str]], split: str = "train", conhelps=None, **train_kwargs) -> "LanguageIdentifier":
+        """
+        Train from labeled configs.
+
+        :param configs: config name to its language; None for `nusantara_t2t` configs, whose
+            `text_1`/`text_2` are labeled by `text_1_name`/`text_2_name`
+        """
+        if conhelps is None:
+            from ..config_helper import NusantaraConfigHelper
+
+            conhelps = NusantaraConfigHelper()
+        texts, labels = [], []
+        for config_name, language in configs.items():
+            table = conhelps.for_config_name(config_name).load_dataset(split=split).with_format("arrow")[:]
+            if language is not None:
+                column = table.column("text").to_pylist()
+                texts += column
+                labels += [language] * len(column)
+            else:
+                for side in ["1", "2"]:
+                    texts += table.column(f"text_{side}").to_pylist()
+                    labels += table.column(f"text_{side}_name").to_pylist()
+        return cls.train(texts, labels, **train_kwargs)
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """:return: [len(texts), num_languages] posterior probabilities (uniform prior)"""
+        ids, owners = char_ngram_ids(texts, self.ngram_range, self.num_features)
+        scores = np.stack(
+            [np.bincount(owners, weights=self.log_probs[ids, i], minlength=len(texts)) for i in range(len(self.languages))],
+            axis=1,
+        )
+        scores -= scores.max(axis=1, keepdims=True)
+        probs = np.exp(scores)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    def predict(self, texts: Sequence[str]) -> Tuple[List[str], np.ndarray]:
+        """:return: tuple of (predicted language per text, its probability)"""
+        probs = self.predict_proba(texts)
+        best = probs.argmax(axis=1)
+        return [self.languages[i] for i in best], probs[np.arange(len(texts)), best]
+
+    def save(self, path: Union[str, Path]):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(path / _MODEL_FILE, log_probs=self.log_probs)
+        with open(path / _CONFIG_FILE, "w") as f:
+            json.dump({"languages": self.languages, "ngram_range": list(self.ngram_range)}, f, indent=2)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "LanguageIdentifier":
+        path = Path(path)
+        with open(path / _CONFIG_FILE) as f:
+            config = json.load(f)
+        return cls(log_probs=np.load(path / _MODEL_FILE)["log_probs"], **config)
+
+
+def language_filter(identifier: LanguageIdentifier, languages: List[str], min_confidence: float = 0.0, text_column: str = "text"):
+    """
+    Batched predicate keeping texts identified as one of `languages`, for
+    `Dataset.filter(..., batched=True)` and `IterableDataset.filter(..., batched=True)`.
+    """
+    keep_ids = np.asarray([identifier.languages.index(language) for language in languages])
+
+    def is_kept(batch: Dict[str, list]) -> List[bool]:
+        probs = identifier.predict_proba(batch[text_column])
+        best = probs.argmax(axis=1)
+        return (np.isin(best, keep_ids) & (probs.max(axis=1) >= min_confidence)).tolist()
+
+    return is_kept
+
+
+def evaluate(identifier: LanguageIdentifier, texts: Sequence[str], labels: Sequence[str], batch_size: int = 1000) -> Dict:
+    """Accuracy (overall and per language) and throughput of `identifier` on labeled texts."""
+    start = time.perf_counter()
+    predictions = []
+    for i in range(0, len(texts), batch_size):
+        predictions += identifier.predict(texts[i:i + batch_size])[0]
+    seconds = time.perf_counter() - start
+
+    predictions, labels = np.asarray(predictions), np.asarray(labels)
+    return {
+        "accuracy": float((predictions == labels).mean()),
+        "per_language_accuracy": {language: float((predictions[labels == language] == language).mean()) for language in np.unique(labels)},
+        "texts_per_sec": len(texts) / seconds,
+        "chars_per_sec": sum(len(text) for text in texts) / seconds,
+    }
+
+
+if __name__ == "__main__":
+    # NusaX MT pairs every language with Indonesian; train on train splits and evaluate on test splits
+    from ..config_helper import NusantaraConfigHelper
+
+    conhelps = NusantaraConfigHelper()
+    config_names = [
+        metadata.config.name for metadata in conhelps
+        if metadata.dataset_name == "nusax_mt" and metadata.config.schema == "nusantara_t2t" and metadata.config.name.startswith("nusax_mt_ind_")
+    ]
+    identifier = LanguageIdentifier.train_from_configs({config_name: None for config_name in config_names}, conhelps=conhelps)
+
+    texts, labels = [], []
+    for config_name in config_names:
+        table = conhelps.for_config_name(config_name).load_dataset(split=datasets.Split.TEST).with_format("arrow")[:]
+        texts += table.column("text_2").to_pylist()
+        labels += table.column("text_2_name").to_pylist()
+    result = evaluate(identifier, texts, labels)
+    print(f"accuracy: {result['accuracy']:.4f}, {result['texts_per_sec']:.0f} texts/sec, {result['chars_per_sec']:.0f} chars/sec")
+    for language, accuracy in result["per_language_accuracy"].items():
+        print(f"{language}: {accuracy:.4f}")
@@ -0,0 +1,211 @@
+"""
+Cross-process single-flight locking of dataset preparation.
+
+When several processes (e.g. the training ranks of a node) load the same
+config, `preparation_lock` lets one of them prepare it while the others
+wait; they then find the finished cache and memory-map it.
+
+The lock is a file created with `O_EXCL`, holding the owner's host, pid and
+a token. The owner refreshes its modification time from a heartbeat thread.
+A lock is stale, and broken by the next process trying to acquire it, when
+its owner is a dead process on the same host or its heartbeat is older than
+`stale_after` seconds (e.g. an owner on another host of a shared filesystem
+that died). Breaking a lock is itself guarded by a short-lived `.break`
+file, so that two waiters never both break the same lock and delete each
+other's fresh one.
+"""
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+LOCKS_DIR_NAME = "nusacrowd_locks"
+
+
+class PreparationLockTimeout(TimeoutError):
+    pass
+
+
+class PreparationInProgress(RuntimeError):
+    """Raised with `fail_fast=True` when another process is preparing the config."""
+
+
+def get_lock_path(config_name: str, cache_dir: Optional[Union[str, Path]] = None) -> Path:
+    """Lock file of a config in the datasets cache directory (or `cache_dir`)."""
+    import datasets
+
+    return Path(cache_dir or datasets.config.HF_DATASETS_CACHE) / LOCKS_DIR_NAME / f"{config_name}.lock"
+
+
+def _is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_owner(path: Path) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        # created but not written yet
+        return {}
+
+
+class SingleFlightLock:
+    """
+    Exclusive lock over processes and hosts sharing a filesystem, with stale-lock recovery.
+
+    :param path: lock file
+    :param timeout: seconds to wait for the lock, forever if None
+    :param fail_fast: raise `PreparationInProgress` instead of waiting when the lock is held
+    :param stale_after: seconds without heartbeat after which a lock is considered stale
+    :param poll_interval: seconds between attempts while waiting
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        timeout: Optional[float] = None,
+        fail_fast: bool = False,
+        stale_after: float = 60.0,
+        poll_interval: float = 0.5,
+    ):
+        self.path = Path(path)
+        self.timeout = timeout
+        self.fail_fast = fail_fast
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self.token = None
+        self._heartbeat = None
+        self._stop_heartbeat = threading.Event()
+
+    @property
+    def is_locked(self) -> bool:
+        return self.token is not None
+
+    def is_stale(self, owner: Optional[Dict]) -> bool:
+        if owner is None:
+            return False
+        if owner.get("host") == socket.gethostname() and owner.get("pid") and not _is_process_alive(owner["pid"]):
+            return True
+        try:
+            return time.time() - self.path.stat().st_mtime > self.stale_after
+        except FileNotFoundError:
+            return False
+
+    def _try_create(self) -> bool:
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        self.token = uuid.uuid4().hex
+        with os.fdopen(fd, "w") as f:
+            json.dump({"host": socket.gethostname(), "pid": os.getpid(), "token": self.token, "created": time.time()}, f)
+        return True
+
+    def _break_stale(self, owner: Dict) -> bool:
+        """Remove the lock if it is still the stale one read as `owner`."""
+        break_path = self.path.with_name(self.path.name + ".break")
+        try:
+            fd = os.open(break_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # a process that died while breaking the lock leaves its break file behind
+            try:
+                if time.time() - break_path.stat().st_mtime > self.stale_after:
+                    break_path.unlink()
+            except FileNotFoundError:
+                pass
+            return False
+        os.close(fd)
+        try:
+            if _read_owner(self.path) == owner and self.is_stale(owner):
+                logger.warning(f"Breaking stale lock {self.path} of {owner}")
+                self.path.unlink()
+                return True
+            return False
+        finally:
+            break_path.unlink()
+
+    def _beat(self):
+        interval = max(self.stale_after / 4, 0.1)
+        while not self._stop_heartbeat.wait(interval):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                logger.warning(f"Lock {self.path} was removed while held")
+                return
+
+    def acquire(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        start = time.monotonic()
+        waiting_logged = False
+        while not self._try_create():
+            owner = _read_owner(self.path)
+            if self.is_stale(owner) and self._break_stale(owner):
+                continue
+            if self.fail_fast:
+                raise PreparationInProgress(f"{self.path} is held by {owner}")
+            if self.timeout is not None and time.monotonic() - start >= self.timeout:
+                raise PreparationLockTimeout(f"Timed out after {self.timeout}s waiting for {self.path} held by {owner}")
+            if not waiting_logged:
+                logger.info(f"Waiting for {self.path} held by {owner}")
+                waiting_logged = True
+            time.sleep(self.poll_interval * random.uniform(0.5, 1.5))
+
+        self._stop_heartbeat.clear()
+        self._heartbeat = threading.Thread(target=self._beat, daemon=True)
+        self._heartbeat.start()
+
+    def release(self):
+        if not self.is_locked:
+            return
+        self._stop_heartbeat.set()
+        self._heartbeat.join()
+        owner = _read_owner(self.path)
+        if owner and owner.get("token") == self.token:
+            self.path.unlink()
+        self.token = None
+
+    def __enter__(self) -> "SingleFlightLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+@contextmanager
+def preparation_lock(
+    config_name: str,
+    cache_dir: Optional[Union[str, Path]] = None,
+    timeout: Optional[float] = None,
+    fail_fast: bool = False,
+    **lock_kwargs,
+) -> Iterator[SingleFlightLock]:
+    """
+    Hold the single-flight lock of a config while preparing or loading it.
+
+    :param config_name: config name, locks are per config and cache directory
+    :param cache_dir: `cache_dir` given to `load_dataset`, if any
+    :param timeout: seconds to wait, forever if None
+    :param fail_fast: raise `PreparationInProgress` instead of waiting
+    :param lock_kwargs: see `SingleFlightLock`
+    """
+    with SingleFlightLock(get_lock_path(config_name, cache_dir), timeout=timeout, fail_fast=fail_fast, **lock_kwargs) as lock:
+        yield lock
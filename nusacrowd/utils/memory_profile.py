@@ -0,0 +1,340 @@
+"""
+Memory profiling of dataset preparation.
+
+`profile_load` prepares a config with `tracemalloc` enabled and a thread
+sampling the resident set size (RSS). `MemoryTracer`, a `Tracer` of
+`nusacrowd.utils.tracing`, records the traced peak of every preparation
+stage (`split_generators`, `write_arrow` which includes `generate_examples`,
+...), and a snapshot taken near the traced peak gives the top allocation
+sites, attributed to the innermost function of the loader scripts or of
+`nusacrowd` (e.g. `common_parser.py:load_conll_data`).
+
+`profile_configs` profiles a selection of configs, by default each in a
+fresh process so that RSS peaks are not shared between configs and an
+out-of-memory kill is reported for the config that caused it:
+
+    python -m nusacrowd profile-memory --dataset posp nerp --output memory_report.txt
+"""
+import ast
+import json
+import linecache
+import logging
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from .tracing import SpanEvent, Tracer
+from .tracing import load_dataset as traced_load_dataset
+
+logger = logging.getLogger(__name__)
+
+_LOADER_PATH_MARKERS = ("datasets_modules", f"{os.sep}nusacrowd{os.sep}")
+# profiling wrappers around the loader calls
+_EXCLUDED_FILES = ("tracing.py", "memory_profile.py")
+
+
+def get_rss() -> int:
+    """Current resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        pass
+    try:
+        import psutil
+    except ImportError:
+        # peak instead of current RSS, in KiB on Linux and bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if os.uname().sysname == "Darwin" else max_rss * 1024
+    return psutil.Process().memory_info().rss
+
+
+@dataclass
+class AllocationSite:
+    """Memory allocated at one line and still alive at the snapshot."""
+
+    location: str
+    function: str
+    num_bytes: int
+    count: int
+
+
+@dataclass
+class MemoryProfile:
+    """Memory used while preparing one config."""
+
+    config_name: str
+    peak_traced_bytes: int = 0
+    peak_rss_bytes: int = 0
+    baseline_rss_bytes: int = 0
+    seconds: float = 0.0
+    stage_peaks: Dict[str, int] = field(default_factory=dict)
+    stage_rss: Dict[str, int] = field(default_factory=dict)
+    function_bytes: Dict[str, int] = field(default_factory=dict)
+    top_sites: List[AllocationSite] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "MemoryProfile":
+        data = dict(data)
+        data["top_sites"] = [AllocationSite(**site) for site in data.get("top_sites", [])]
+        return cls(**data)
+
+
+class MemoryTracer(Tracer):
+    """
+    Tracer recording the RSS at the end of every span as its `rss_bytes` attribute and,
+    when `tracemalloc` is tracing, the traced memory peak within the span as `peak_traced_bytes`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._peaks: List[int] = []
+
+    def _update_parent_peak(self):
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+
+    @contextmanager
+    def span(self, stage: str, config_name: str, **attributes) -> Iterator[SpanEvent]:
+        if not tracemalloc.is_tracing():
+            with super().span(stage, config_name, **attributes) as event:
+                try:
+                    yield event
+                finally:
+                    event.attributes["rss_bytes"] = get_rss()
+            return
+
+        # `reset_peak` is global, so the running peak of the enclosing span is saved first
+        self._update_parent_peak()
+        tracemalloc.reset_peak()
+        self._peaks.append(0)
+        with super().span(stage, config_name, **attributes) as event:
+            try:
+                yield event
+            finally:
+                peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+                event.attributes["peak_traced_bytes"] = peak
+                event.attributes["rss_bytes"] = get_rss()
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+
+
+class _Sampler(threading.Thread):
+    """Samples RSS and takes a tracemalloc snapshot whenever the traced peak grows by `snapshot_growth`."""
+
+    def __init__(self, interval: float, snapshot_growth: float = 1.2):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.snapshot_growth = snapshot_growth
+        self.peak_rss = get_rss()
+        self.snapshot = None
+        self.snapshot_bytes = 0
+        self._stop_event = threading.Event()
+
+    def sample(self):
+        self.peak_rss = max(self.peak_rss, get_rss())
+        if not tracemalloc.is_tracing():
+            return
+        current = tracemalloc.get_traced_memory()[0]
+        if current > max(self.snapshot_bytes * self.snapshot_growth, 1 << 20):
+            self.snapshot = tracemalloc.take_snapshot()
+            self.snapshot_bytes = current
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.sample()
+
+
+def is_loader_file(filename: str) -> bool:
+    return (
+        filename.endswith(".py")
+        and any(marker in filename for marker in _LOADER_PATH_MARKERS)
+        and not filename.endswith(_EXCLUDED_FILES)
+    )
+
+
+@lru_cache(maxsize=None)
+def _function_spans(filename: str) -> List[Tuple[int, int, str]]:
+    source = "".join(linecache.getlines(filename))
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return []
+    return [
+        (node.lineno, node.end_lineno, node.name)
+        for node in ast.walk(tree)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+    ]
+
+
+def get_function_name(filename: str, lineno: int) -> str:
+    """Name of the innermost function defined around `lineno`, `<module>` if none."""
+    spans = [span for span in _function_spans(filename) if span[0] <= lineno <= span[1]]
+    return min(spans, key=lambda span: span[1] - span[0])[2] if spans else "<module>"
+
+
+def _attribute(snapshot: tracemalloc.Snapshot, top: int) -> Tuple[Dict[str, int], List[AllocationSite]]:
+    """Bytes per loader function and the top allocation sites, keyed by their innermost loader frame."""
+    function_bytes, sites = {}, {}
+    for statistic in snapshot.statistics("traceback"):
+        # frames are ordered from the oldest to the most recent call
+        frame = next((frame for frame in reversed(statistic.traceback) if is_loader_file(frame.filename)), statistic.traceback[-1])
+        function = f"{Path(frame.filename).name}:{get_function_name(frame.filename, frame.lineno)}"
+        location = f"{frame.filename}:{frame.lineno}"
+        function_bytes[function] = function_bytes.get(function, 0) + statistic.size
+        if location not in sites:
+            sites[location] = AllocationSite(location, function, 0, 0)
+        sites[location].num_bytes += statistic.size
+        sites[location].count += statistic.count
+    function_bytes = dict(sorted(function_bytes.items(), key=lambda item: -item[1])[:top])
+    top_sites = sorted(sites.values(), key=lambda site: -site.num_bytes)[:top]
+    return function_bytes, top_sites
+
+
+def profile_load(
+    load_dataset_kwargs: Dict,
+    top: int = 10,
+    sample_interval: float = 0.05,
+    trace_allocations: bool = True,
+    num_frames: int = 6,
+) -> MemoryProfile:
+    """
+    Prepare a config with memory profiling, see the module docstring.
+
+    The Arrow cache is rebuilt (`download_mode="reuse_cache_if_exists"`) unless another download mode is given.
+    Tracing allocations slows preparation down considerably, more so with more frames.
+
+    :param load_dataset_kwargs: `datasets.load_dataset` arguments, e.g. from `NusantaraMetadata.get_load_dataset_kwargs`
+    :param top: number of allocation sites and loader functions to report
+    :param sample_interval: seconds between RSS samples
+    :param trace_allocations: trace allocations with tracemalloc, otherwise only sample RSS
+    :param num_frames: traceback depth stored by tracemalloc, from the allocation up; the innermost loader frame must be within it
+    """
+    load_dataset_kwargs = {"download_mode": "reuse_cache_if_exists", **load_dataset_kwargs}
+    profile = MemoryProfile(config_name=load_dataset_kwargs.get("name") or str(load_dataset_kwargs.get("path")))
+    tracer = MemoryTracer()
+
+    was_tracing = tracemalloc.is_tracing()
+    if trace_allocations and not was_tracing:
+        tracemalloc.start(num_frames)
+    profile.baseline_rss_bytes = get_rss()
+    sampler = _Sampler(sample_interval)
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        traced_load_dataset(load_dataset_kwargs, tracer)
+    except Exception as e:
+        logger.exception(f"Failed to load {profile.config_name}")
+        profile.error = repr(e)
+    finally:
+        profile.seconds = time.perf_counter() - start
+        sampler.stop()
+        if tracemalloc.is_tracing():
+            profile.peak_traced_bytes = max([tracemalloc.get_traced_memory()[1]] + [event.attributes.get("peak_traced_bytes", 0) for event in tracer.events])
+        if trace_allocations and not was_tracing:
+            tracemalloc.stop()
+
+    for event in tracer.events:
+        stage = f"{event.stage}[{event.split}]" if event.split else event.stage
+        if "peak_traced_bytes" in event.attributes:
+            profile.stage_peaks[stage] = max(profile.stage_peaks.get(stage, 0), event.attributes["peak_traced_bytes"])
+        if "rss_bytes" in event.attributes:
+            profile.stage_rss[stage] = max(profile.stage_rss.get(stage, 0), event.attributes["rss_bytes"])
+    profile.peak_rss_bytes = max([sampler.peak_rss] + list(profile.stage_rss.values()))
+    if sampler.snapshot is not None:
+        profile.function_bytes, profile.top_sites = _attribute(sampler.snapshot, top)
+    return profile
+
+
+def _profile_load_dict(load_dataset_kwargs: Dict, **profile_kwargs) -> Dict:
+    return asdict(profile_load(load_dataset_kwargs, **profile_kwargs))
+
+
+def profile_configs(
+    selection,
+    conhelps=None,
+    isolate: bool = True,
+    **profile_kwargs,
+) -> List[MemoryProfile]:
+    """
+    Profile a selection of configs; failed configs first, then by decreasing peak RSS.
+
+    :param selection: a benchmark name, a list of config names or a `NusantaraConfigHelper` (e.g. from `filtered()`)
+    :param isolate: profile each config in a fresh process
+    :param profile_kwargs: see `profile_load`
+    """
+    from .export import iter_selected_metadata
+
+    profiles = []
+    for metadata in iter_selected_metadata(selection, conhelps):
+        config_name = metadata.config.name
+        load_dataset_kwargs = {**metadata.get_load_dataset_kwargs(), "path": str(metadata.script)}
+        logger.info(f"Profiling {config_name}")
+        if not isolate:
+            profiles.append(profile_load(load_dataset_kwargs, **profile_kwargs))
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            try:
+                profile = MemoryProfile.from_dict(executor.submit(_profile_load_dict, load_dataset_kwargs, **profile_kwargs).result())
+            except BrokenProcessPool:
+                profile = MemoryProfile(config_name, error="process died, e.g. killed when out of memory")
+        profiles.append(profile)
+    return sorted(profiles, key=lambda profile: (profile.error is None, -profile.peak_rss_bytes))
+
+
+def _mib(num_bytes: int) -> str:
+    return f"{num_bytes / 2**20:.1f} MiB"
+
+
+def format_report(profiles: List[MemoryProfile], top: int = 5) -> str:
+    """Plain text report of `profile_configs` results."""
+    lines = [f"{'peak RSS':>12}  {'RSS growth':>12}  {'peak traced':>12}  config"]
+    for profile in profiles:
+        if profile.error:
+            lines.append(f"{'-':>12}  {'-':>12}  {'-':>12}  {profile.config_name}  FAILED: {profile.error}")
+            continue
+        lines.append(
+            f"{_mib(profile.peak_rss_bytes):>12}  {_mib(profile.peak_rss_bytes - profile.baseline_rss_bytes):>12}"
+            f"  {_mib(profile.peak_traced_bytes) if profile.stage_peaks else '-':>12}  {profile.config_name}"
+        )
+    for profile in profiles:
+        if profile.error:
+            continue
+        lines += ["", f"{profile.config_name} ({profile.seconds:.1f}s)"]
+        if profile.stage_peaks:
+            lines.append("  traced peak per stage:")
+            lines += [f"    {_mib(num_bytes):>12}  {stage}" for stage, num_bytes in sorted(profile.stage_peaks.items(), key=lambda item: -item[1])]
+        lines.append("  RSS at the end of each stage:")
+        lines += [f"    {_mib(num_bytes):>12}  {stage}" for stage, num_bytes in sorted(profile.stage_rss.items(), key=lambda item: -item[1])]
+        if profile.function_bytes:
+            lines.append("  functions at the traced peak:")
+            lines += [f"    {_mib(num_bytes):>12}  {function}" for function, num_bytes in list(profile.function_bytes.items())[:top]]
+        if profile.top_sites:
+            lines.append("  top allocation sites:")
+            lines += [f"    {_mib(site.num_bytes):>12}  {site.location} ({site.function}, {site.count} blocks)" for site in profile.top_sites[:top]]
+    return "\n".join(lines)
+
+
+def write_report(profiles: List[MemoryProfile], path: Union[str, Path], top: int = 5):
+    """Write the plain text report to `path` and the full profiles to `path` with a `.json` suffix."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(format_report(profiles, top) + "\n")
+    with open(path.with_suffix(".json"), "w") as f:
+        json.dump([asdict(profile) for profile in profiles], f, indent=2)
@@ -0,0 +1,172 @@
+"""
+Offline mirror packs of raw dataset artifacts.
+
+`build_mirror` runs the `_split_generators` of every selected config, which
+downloads its raw files, and copies each downloaded file once into a
+content-addressed store (`blobs/<sha256[:2]>/<sha256><suffix>`), so files
+shared by many configs (e.g. the three CSVs behind the 132 nusax_mt configs)
+are stored once. `urls.json` maps every URL to its blob, with paths relative
+to the pack, so the pack directory (or the `.tar` written with `archive=True`)
+can be copied to another machine as is.
+
+`load_from_mirror` prepares a config with `MirrorDownloadManager`, which
+resolves remote URLs from the pack and never touches the network.
+`NusantaraMetadata.load_dataset(mirror=...)` and the `NUSACROWD_MIRROR`
+environment variable route loading through it.
+"""
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import datasets
+from datasets.utils.file_utils import is_remote_url
+
+from .builder_utils import get_download_config, get_download_manager
+from .excel_cache import file_checksum
+from .export import iter_selected_metadata
+
+logger = logging.getLogger(__name__)
+
+_URLS_FILE = "urls.json"
+_MANIFEST_FILE = "manifest.json"
+
+
+class MissingFromMirrorError(FileNotFoundError):
+    pass
+
+
+def get_suffix(url: str) -> str:
+    """File extensions of the last URL path segment, e.g. `.jsonl.zst`."""
+    name = url.split("?")[0].rstrip("/").split("/")[-1]
+    return "".join(Path(name).suffixes)[:32]
+
+
+def _add_blob(pack_dir: Path, url: str, path: str) -> str:
+    sha256 = file_checksum(path)
+    blob = Path("blobs") / sha256[:2] / f"{sha256}{get_suffix(url)}"
+    target = pack_dir / blob
+    if not target.exists():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_target = target.with_name(target.name + ".incomplete")
+        shutil.copyfile(path, tmp_target)
+        os.replace(tmp_target, target)
+    return blob.as_posix()
+
+
+def build_mirror(
+    selection,
+    pack_dir: Union[str, Path],
+    conhelps=None,
+    download_config: Optional[datasets.DownloadConfig] = None,
+    archive: bool = False,
+) -> Dict:
+    """
+    Download the raw artifacts of a selection of configs into a pack.
+
+    Building is incremental: configs already in the manifest are skipped.
+
+    :param selection: a benchmark name, a list of config names or a `NusantaraConfigHelper` (e.g. from `filtered()`)
+    :param archive: also write `<pack_dir>.tar`
+    :return: the manifest
+    """
+    pack_dir = Path(pack_dir)
+    pack_dir.mkdir(parents=True, exist_ok=True)
+    urls, manifest = {}, {"configs": {}}
+    if (pack_dir / _MANIFEST_FILE).exists():
+        with open(pack_dir / _URLS_FILE) as f:
+            urls = json.load(f)
+        with open(pack_dir / _MANIFEST_FILE) as f:
+            manifest = json.load(f)
+
+    for metadata in iter_selected_metadata(selection, conhelps):
+        config_name = metadata.config.name
+        if config_name in manifest["configs"]:
+            continue
+        if metadata.is_local:
+            logger.warning(f"Skipping {config_name}: local datasets have no downloadable artifacts")
+            continue
+        builder = datasets.load_dataset_builder(**metadata.get_load_dataset_kwargs(download_config=download_config))
+        dl_manager = get_download_manager(builder, download_config)
+        builder._split_generators(dl_manager)
+
+        config_urls = sorted(url for url in dl_manager.downloaded_paths if is_remote_url(url))
+        for url in config_urls:
+            if url not in urls:
+                urls[url] = _add_blob(pack_dir, url, dl_manager.downloaded_paths[url])
+        manifest["configs"][config_name] = config_urls
+        logger.info(f"Mirrored {len(config_urls)} artifacts of {config_name}")
+
+        # write after every config, so an interrupted build keeps its progress
+        with open(pack_dir / _URLS_FILE, "w") as f:
+            json.dump(urls, f, indent=2)
+        blobs = set(urls.values())
+        manifest["num_urls"] = len(urls)
+        manifest["num_blobs"] = len(blobs)
+        manifest["num_bytes"] = sum((pack_dir / blob).stat().st_size for blob in blobs)
+        with open(pack_dir / _MANIFEST_FILE, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    if archive:
+        shutil.make_archive(str(pack_dir), "tar", root_dir=pack_dir)
+    return manifest
+
+
+class MirrorDownloadManager(datasets.DownloadManager):
+    """
+    Download manager resolving remote URLs from a mirror pack, without network calls.
+
+    Local paths (e.g. `data_dir` of local datasets) are handled as usual.
+    """
+
+    is_offline_mirror = True
+
+    def __init__(self, pack_dir: Union[str, Path], *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pack_dir = Path(pack_dir)
+        with open(self.pack_dir / _URLS_FILE) as f:
+            self.urls = json.load(f)
+
+    def _download(self, url_or_filename: str, download_config: datasets.DownloadConfig) -> str:
+        url_or_filename = str(url_or_filename)
+        if not is_remote_url(url_or_filename):
+            return super()._download(url_or_filename, download_config)
+        if url_or_filename not in self.urls:
+            raise MissingFromMirrorError(f"{url_or_filename} is not in the mirror {self.pack_dir}, add its config with `build_mirror`")
+        return str(self.pack_dir / self.urls[url_or_filename])
+
+
+def get_mirror_download_manager(builder: datasets.DatasetBuilder, pack_dir: Union[str, Path], download_config: Optional[datasets.DownloadConfig] = None) -> MirrorDownloadManager:
+    return MirrorDownloadManager(
+        pack_dir,
+        dataset_name=builder.name,
+        data_dir=builder.config.data_dir,
+        download_config=download_config or get_download_config(builder),
+        base_path=builder.base_path,
+        record_checksums=False,
+    )
+
+
+def load_from_mirror(load_dataset_kwargs: Dict, pack_dir: Union[str, Path], tracer=None) -> datasets.DatasetDict:
+    """
+    Prepare and load a config with its raw files resolved from a mirror pack.
+
+    :param load_dataset_kwargs: `path`, `name` and other `datasets.load_dataset_builder` arguments, optionally `split`
+    :param tracer: optional `nusacrowd.utils.tracing.Tracer` recording the preparation stages
+    """
+    if tracer is not None:
+        from .tracing import load_dataset
+
+        return load_dataset(
+            load_dataset_kwargs,
+            tracer,
+            download_manager_factory=lambda builder, download_config: get_mirror_download_manager(builder, pack_dir, download_config),
+        )
+    load_dataset_kwargs = dict(load_dataset_kwargs)
+    split = load_dataset_kwargs.pop("split", None)
+    builder = datasets.load_dataset_builder(**load_dataset_kwargs)
+    download_config = load_dataset_kwargs.get("download_config") or get_download_config(builder, load_dataset_kwargs.get("download_mode"))
+    builder.download_and_prepare(dl_manager=get_mirror_download_manager(builder, pack_dir, download_config))
+    return builder.as_dataset(split=split)
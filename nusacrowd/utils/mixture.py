@@ -0,0 +1,186 @@
+"""
+Lazy multi-task mixtures over configs.
+
+`TaskMixture` samples the next example from one of several datasets with
+temperature-scaled size-proportional weights. Prepared datasets are read by
+index from their memory-mapped Arrow tables (in a seeded per-epoch order) and
+large configs are consumed as streams, so nothing is concatenated in memory.
+The sampler state is a small JSON-serializable dict, so a training run can be
+checkpointed and resumed at the exact same example.
+"""
+import itertools
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import datasets
+import numpy as np
+
+Source = Union[datasets.Dataset, datasets.IterableDataset]
+
+
+def get_mixture_weights(sizes: List[int], temperature: float = 1.0) -> np.ndarray:
+    """
+    Sampling probabilities `p_i ∝ n_i ** (1 / temperature)`.
+
+    `temperature=1` samples proportionally to size, larger values flatten the mixture towards uniform.
+    """
+    weights = np.asarray(sizes, dtype=np.float64) ** (1.0 / temperature)
+    return weights / weights.sum()
+
+
+class _SourceReader:
+    """Reads one source epoch after epoch from a given (epoch, offset) position."""
+
+    def __init__(self, source: Source, seed: int, source_index: int, shuffle: bool, block_size: int):
+        self.source = source
+        self.seed = seed
+        self.source_index = source_index
+        self.shuffle = shuffle
+        self.block_size = block_size
+        self.epoch = 0
+        self.offset = 0
+        self._block: List[dict] = []
+        self._stream: Optional[Iterator[dict]] = None
+        self._order: Optional[Tuple[int, np.ndarray]] = None
+
+    @property
+    def is_stream(self) -> bool:
+        return not isinstance(self.source, datasets.Dataset)
+
+    def seek(self, epoch: int, offset: int):
+        self.epoch, self.offset = epoch, offset
+        self._block, self._stream = [], None
+
+    def _epoch_order(self) -> np.ndarray:
+        if self._order is None or self._order[0] != self.epoch:
+            if self.shuffle:
+                order = np.random.default_rng([self.seed, self.source_index, self.epoch]).permutation(len(self.source))
+            else:
+                order = np.arange(len(self.source))
+            self._order = (self.epoch, order)
+        return self._order[1]
+
+    def _read_block(self):
+        if self.offset >= len(self.source):
+            self.epoch, self.offset = self.epoch + 1, 0
+        indices = self._epoch_order()[self.offset:self.offset + self.block_size]
+        batch = self.source[indices]
+        self._block = [dict(zip(batch, values)) for values in zip(*batch.values())][::-1]
+
+    def _next_streamed(self) -> dict:
+        if self._stream is None:
+            stream = iter(self.source)
+            self._stream = itertools.islice(stream, self.offset, None)
+        try:
+            return next(self._stream)
+        except StopIteration:
+            self.epoch, self.offset, self._stream = self.epoch + 1, 0, iter(self.source)
+            return next(self._stream)
+
+    def __next__(self) -> dict:
+        if self.is_stream:
+            example = self._next_streamed()
+        else:
+            if not self._block:
+                self._read_block()
+            example = self._block.pop()
+        self.offset += 1
+        return example
+
+
+class TaskMixture:
+    """
+    Deterministic, checkpointable sampler over several datasets.
+
+    Iterating yields `(name, example)` pairs; every source is repeated for as
+    many epochs as needed, until `num_steps` examples have been produced.
+
+    :param sources: name (e.g. config name) to prepared dataset or stream
+    :param sizes: number of examples per source, required for streams without split info
+    :param temperature: see `get_mixture_weights`
+    :param seed: seed of the source sampling and of the per-epoch example order
+    :param shuffle: read prepared datasets in a seeded random order instead of sequentially
+    :param num_steps: total number of examples to yield, infinite if None
+    :param block_size: number of rows read at once from a prepared dataset
+    """
+
+    def __init__(
+        self,
+        sources: Dict[str, Source],
+        sizes: Optional[Dict[str, int]] = None,
+        temperature: float = 1.0,
+        seed: int = 0,
+        shuffle: bool = True,
+        num_steps: Optional[int] = None,
+        block_size: int = 64,
+    ):
+        if not sources:
+            raise ValueError("a mixture needs at least one source")
+        self.names = list(sources)
+        self.sizes = [self._get_size(name, source, sizes or {}) for name, source in sources.items()]
+        self.weights = get_mixture_weights(self.sizes, temperature)
+        self.temperature = temperature
+        self.seed = seed
+        self.num_steps = num_steps
+        self._cumulative = np.cumsum(self.weights)
+        self._readers = [_SourceReader(source, seed, i, shuffle, block_size) for i, source in enumerate(sources.values())]
+        self._rng = np.random.default_rng(seed)
+        self.step = 0
+
+    @staticmethod
+    def _get_size(name: str, source: Source, sizes: Dict[str, int]) -> int:
+        if name in sizes:
+            return sizes[name]
+        if isinstance(source, datasets.Dataset):
+            return len(source)
+        splits = source.info.splits
+        if splits and source.split in splits and splits[source.split].num_examples:
+            return splits[source.split].num_examples
+        raise ValueError(f"The size of the stream {name} is unknown, pass it in `sizes`")
+
+    def __iter__(self) -> Iterator[Tuple[str, dict]]:
+        while self.num_steps is None or self.step < self.num_steps:
+            i = min(int(np.searchsorted(self._cumulative, self._rng.random(), side="right")), len(self.names) - 1)
+            example = next(self._readers[i])
+            self.step += 1
+            yield self.names[i], example
+
+    def state_dict(self) -> dict:
+        return {
+            "seed": self.seed,
+            "temperature": self.temperature,
+            "step": self.step,
+            "rng": self._rng.bit_generator.state,
+            "sources": {name: {"epoch": reader.epoch, "offset": reader.offset} for name, reader in zip(self.names, self._readers)},
+        }
+
+    def load_state_dict(self, state: dict):
+        if state["seed"] != self.seed or state["temperature"] != self.temperature:
+            raise ValueError("The state was saved by a mixture with a different seed or temperature")
+        self.step = state["step"]
+        self._rng.bit_generator.state = state["rng"]
+        for name, reader in zip(self.names, self._readers):
+            reader.seek(**state["sources"][name])
+
+    @classmethod
+    def from_config_names(cls, config_names: List[str], split: str = "train", conhelps=None, **kwargs) -> "TaskMixture":
+        """
+        Mixture over the `split` of each config; large configs (`is_large`) are streamed.
+
+        :param kwargs: `TaskMixture` arguments
+        """
+        if conhelps is None:
+            from ..config_helper import NusantaraConfigHelper
+
+            conhelps = NusantaraConfigHelper()
+        sources = {}
+        for config_name in config_names:
+            metadata = conhelps.for_config_name(config_name)
+            sources[config_name] = metadata.load_dataset(split=split, streaming=metadata.is_large)
+        return cls(sources, **kwargs)
+
+    @classmethod
+    def from_benchmark(cls, benchmark_name: str, split: str = "train", conhelps=None, **kwargs) -> "TaskMixture":
+        """Mixture over the configs of a benchmark of `BENCHMARK_DICT`."""
+        from ..config_helper import BENCHMARK_DICT
+
+        return cls.from_config_names(BENCHMARK_DICT[benchmark_name], split=split, conhelps=conhelps, **kwargs)
@@ -0,0 +1,206 @@
+"""
+Packed token blocks for self-supervised pretraining (`nusantara_ssp`) corpora.
+
+`pack_ssp_dataset` tokenizes the `text` column of an SSP dataset (prepared or
+streamed) in worker processes, concatenates the documents separated by an
+end-of-sequence id and writes fixed-length blocks into binary shards.
+`PackedBlocks` memory-maps the shards, so reading a block is an O(1) zero-copy
+slice. The index file is written last, packing again into a directory with an
+index of the same dataset and parameters reuses the existing blocks.
+"""
+import itertools
+import json
+import multiprocessing
+import os
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Union
+
+import datasets
+import numpy as np
+
+_INDEX_FILE = "index.json"
+
+_tokenizer: Optional[Callable[[str], List[int]]] = None
+
+
+def _init_worker(tokenizer: Callable[[str], List[int]]):
+    global _tokenizer
+    _tokenizer = tokenizer
+
+
+def _tokenize_chunk(texts: List[str]) -> List[List[int]]:
+    return [_tokenizer(text) for text in texts]
+
+
+def iter_text_chunks(dataset: Union[datasets.Dataset, Iterable[dict]], chunk_size: int = 1000, text_column: str = "text") -> Iterator[List[str]]:
+    """
+    Yield lists of texts from a prepared dataset (read as Arrow slices) or any iterable of examples (e.g. a streamed dataset).
+    """
+    if isinstance(dataset, datasets.Dataset):
+        arrow_dataset = dataset.with_format("arrow")
+        for start in range(0, len(dataset), chunk_size):
+            yield arrow_dataset[start:start + chunk_size].column(text_column).to_pylist()
+        return
+    examples = iter(dataset)
+    while True:
+        chunk = [example[text_column] for example in itertools.islice(examples, chunk_size)]
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_token_dtype(vocab_size: Optional[int]) -> np.dtype:
+    return np.dtype(np.uint16) if vocab_size is not None and vocab_size <= np.iinfo(np.uint16).max + 1 else np.dtype(np.uint32)
+
+
+def pack_ssp_dataset(
+    dataset: Union[datasets.Dataset, Iterable[dict]],
+    tokenizer: Callable[[str], List[int]],
+    output_dir: Union[str, Path],
+    block_size: int = 1024,
+    eos_id: Optional[int] = None,
+    vocab_size: Optional[int] = None,
+    blocks_per_shard: int = 65536,
+    num_proc: int = 1,
+    chunk_size: int = 1000,
+    overwrite: bool = False,
+) -> "PackedBlocks":
+    """
+    Tokenize and pack an `ssp_features` dataset into fixed-length blocks.
+
+    :param dataset: prepared or streamed dataset with a `text` column
+    :param tokenizer: picklable callable mapping a text to token ids
+    :param output_dir: directory of the shards and the index file
+    :param block_size: number of tokens per block
+    :param eos_id: id appended after every document, if any
+    :param vocab_size: used to store tokens as uint16 when it fits, uint32 otherwise
+    :param blocks_per_shard: number of blocks per shard file
+    :param num_proc: number of tokenizer worker processes
+    :param chunk_size: number of texts sent to a worker at once
+    :param overwrite: pack again even if `output_dir` holds blocks of the same dataset and parameters
+    :return: the packed blocks
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    dtype = get_token_dtype(vocab_size)
+    max_token = np.iinfo(dtype).max
+
+    # the tokenizer cannot be compared, prepared datasets are compared by fingerprint
+    params = {
+        "block_size": block_size,
+        "dtype": dtype.name,
+        "eos_id": eos_id,
+        "blocks_per_shard": blocks_per_shard,
+        "fingerprint": getattr(dataset, "_fingerprint", None),
+    }
+    index_path = output_dir / _INDEX_FILE
+    if index_path.exists():
+        with open(index_path) as f:
+            index = json.load(f)
+        if not overwrite and all(index.get(k) == v for k, v in params.items()):
+            return PackedBlocks(output_dir)
+        # shards are overwritten, an interrupted pack must not look complete
+        index_path.unlink()
+
+    chunks = iter_text_chunks(dataset, chunk_size=chunk_size)
+    if num_proc > 1:
+        pool = multiprocessing.Pool(num_proc, initializer=_init_worker, initargs=(tokenizer,))
+        tokenized_chunks = pool.imap(_tokenize_chunk, chunks)
+    else:
+        pool = None
+        _init_worker(tokenizer)
+        tokenized_chunks = map(_tokenize_chunk, chunks)
+
+    shards, shard_file, shard_blocks = [], None, 0
+    buffer = np.zeros(0, dtype=dtype)
+    num_documents = num_tokens = 0
+    try:
+        for tokenized in tokenized_chunks:
+            documents = [np.asarray(list(tokens) + ([eos_id] if eos_id is not None else []), dtype=np.int64) for tokens in tokenized]
+            num_documents += len(documents)
+            if not documents:
+                continue
+            tokens = np.concatenate(documents)
+            if len(tokens) and (tokens.min() < 0 or tokens.max() > max_token):
+                raise ValueError(f"Token ids must be in [0, {max_token}] to be stored as {dtype}, set `vocab_size` accordingly")
+            num_tokens += len(tokens)
+            buffer = np.concatenate([buffer, tokens.astype(dtype)])
+
+            num_full = len(buffer) // block_size
+            offset = 0
+            while offset < num_full:
+                if shard_file is None:
+                    shards.append({"file": f"shard_{len(shards):05d}.bin", "num_blocks": 0})
+                    shard_file = open(output_dir / f"{shards[-1]['file']}.incomplete", "wb")
+                    shard_blocks = 0
+                n = min(num_full - offset, blocks_per_shard - shard_blocks)
+                buffer[offset * block_size:(offset + n) * block_size].tofile(shard_file)
+                shard_blocks += n
+                shards[-1]["num_blocks"] = shard_blocks
+                offset += n
+                if shard_blocks == blocks_per_shard:
+                    _close_shard(shard_file, output_dir, shards[-1])
+                    shard_file = None
+            buffer = buffer[num_full * block_size:]
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if shard_file is not None:
+        _close_shard(shard_file, output_dir, shards[-1])
+
+    index = {
+        **params,
+        "num_blocks": sum(shard["num_blocks"] for shard in shards),
+        "num_documents": num_documents,
+        "num_tokens": num_tokens,
+        "dropped_tokens": len(buffer),
+        "shards": shards,
+    }
+    with open(f"{index_path}.incomplete", "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(f"{index_path}.incomplete", index_path)
+    return PackedBlocks(output_dir)
+
+
+def _close_shard(shard_file, output_dir: Path, shard: dict):
+    shard_file.close()
+    os.replace(output_dir / f"{shard['file']}.incomplete", output_dir / shard["file"])
+
+
+class PackedBlocks:
+    """
+    Read-only view over packed token blocks written by `pack_ssp_dataset`.
+
+    Shards are memory-mapped on first access; `blocks[i]` returns a numpy view of shape `(block_size,)`.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path / _INDEX_FILE) as f:
+            self.index = json.load(f)
+        self.block_size = self.index["block_size"]
+        self.blocks_per_shard = self.index["blocks_per_shard"]
+        self.dtype = np.dtype(self.index["dtype"])
+        self._shards = [None] * len(self.index["shards"])
+
+    def _shard(self, i: int) -> np.ndarray:
+        if self._shards[i] is None:
+            shard = self.index["shards"][i]
+            self._shards[i] = np.memmap(self.path / shard["file"], dtype=self.dtype, mode="r", shape=(shard["num_blocks"], self.block_size))
+        return self._shards[i]
+
+    def __len__(self):
+        return self.index["num_blocks"]
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError(f"The index ({i}) is out of range.")
+        # every shard but the last is full, so the shard of a block is known without a search
+        return self._shard(i // self.blocks_per_shard)[i % self.blocks_per_shard]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
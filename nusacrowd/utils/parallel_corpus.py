@@ -0,0 +1,213 @@
+"""
+Consolidated, deduplicated store of `nusantara_t2t` sentence pairs.
+
+`ParallelCorpus.build` reads any set of t2t configs (bible_*, nusax_mt,
+nusatranslation_mt, tico_19, ...), drops pairs seen before in the same
+direction, keeps the provenance of every pair and writes one Arrow file whose
+rows are grouped by `(text_1_name, text_2_name)` direction. Reading a language
+pair is then a contiguous, zero-copy slice of the memory-mapped table.
+
+Pairs are deduplicated on 128-bit hashes computed over Arrow batches, only
+the hashes and ids of the pairs are held in memory while building.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import datasets
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from datasets.arrow_writer import ArrowWriter
+
+from .arrow_utils import as_array, get_arrow_table
+
+_CORPUS_FILE = "corpus.arrow"
+_INDEX_FILE = "index.json"
+_HASH_KEYS = ("nusacrowd-pair-1", "nusacrowd-pair-2")
+_PAIR_COLUMNS = ["text_1", "text_2", "text_1_name", "text_2_name"]
+
+PARALLEL_CORPUS_FEATURES = datasets.Features(
+    {
+        "text_1": datasets.Value("string"),
+        "text_2": datasets.Value("string"),
+        "text_1_name": datasets.Value("string"),
+        "text_2_name": datasets.Value("string"),
+        "sources": [{"config": datasets.Value("string"), "split": datasets.Value("string"), "id": datasets.Value("string")}],
+    }
+)
+
+
+def _normalize(texts: pa.Array) -> pa.Array:
+    return pc.utf8_trim_whitespace(pc.replace_substring_regex(pc.fill_null(texts, ""), pattern=r"\s+", replacement=" "))
+
+
+def pair_keys(table: pa.Table) -> np.ndarray:
+    """
+    Hashes of whitespace-normalized pairs in their direction.
+
+    :param table: table with the `t2t_features` text columns
+    :return: array of 16-byte keys (numpy void), one per row
+    """
+    columns = [_normalize(as_array(table.column(name))) for name in ["text_1_name", "text_2_name", "text_1", "text_2"]]
+    content = pc.binary_join_element_wise(*columns, "\x1f").to_numpy(zero_copy_only=False)
+    # two 64-bit hashes, so collisions are negligible on any number of pairs
+    hashes = np.stack([pd.util.hash_array(content, hash_key=hash_key) for hash_key in _HASH_KEYS], axis=1)
+    return np.ascontiguousarray(hashes).view(np.dtype((np.void, 16))).ravel()
+
+
+class ParallelCorpus:
+    """
+    Read-only view over a store written by `ParallelCorpus.build`.
+
+    :param path: directory of the store
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path / _INDEX_FILE) as f:
+            self.index = json.load(f)
+        self.dataset = datasets.Dataset.from_file(str(self.path / _CORPUS_FILE))
+        self._ranges = {tuple(entry["direction"]): (entry["start"], entry["stop"]) for entry in self.index["directions"]}
+
+    @property
+    def directions(self) -> List[Tuple[str, str]]:
+        return list(self._ranges)
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def get(self, text_1_name: str, text_2_name: str) -> datasets.Dataset:
+        """Pairs of one direction, as a contiguous slice of the memory-mapped store."""
+        if (text_1_name, text_2_name) not in self._ranges:
+            raise KeyError(f"No pairs for direction {text_1_name} -> {text_2_name}, available: {self.directions}")
+        start, stop = self._ranges[(text_1_name, text_2_name)]
+        return self.dataset.select(range(start, stop))
+
+    @classmethod
+    def build_from_datasets(
+        cls,
+        t2t_datasets: Dict[str, datasets.DatasetDict],
+        output_dir: Union[str, Path],
+        splits: Optional[Sequence[str]] = ("train",),
+        batch_size: int = 10_000,
+    ) -> "ParallelCorpus":
+        """
+        Consolidate t2t datasets into a store.
+
+        The first occurrence of a pair is kept, with the sources of all its occurrences.
+
+        :param t2t_datasets: config name to DatasetDict with `t2t_features`
+        :param splits: splits to include, None for all (beware of including test splits in training data)
+        :param batch_size: number of rows hashed or written at once
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        tables, table_sources = [], []
+        keys, table_ids, rows, ids = [], [], [], []
+        for config_name, dataset_dict in t2t_datasets.items():
+            for split, dataset in dataset_dict.items():
+                if splits is not None and split not in splits:
+                    continue
+                table = get_arrow_table(dataset).select(["id"] + _PAIR_COLUMNS)
+                for start in range(0, table.num_rows, batch_size):
+                    batch = table.slice(start, batch_size)
+                    keys.append(pair_keys(batch))
+                    ids.append(pc.cast(as_array(batch.column("id")), pa.string()))
+                table_ids.append(np.full(table.num_rows, len(tables), dtype=np.int32))
+                rows.append(np.arange(table.num_rows, dtype=np.int64))
+                tables.append(table.select(_PAIR_COLUMNS))
+                table_sources.append((config_name, split))
+        keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.dtype((np.void, 16)))
+        table_ids = np.concatenate(table_ids) if table_ids else np.zeros(0, dtype=np.int32)
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        ids = pa.concat_arrays(ids) if ids else pa.array([], type=pa.string())
+
+        # first occurrence of every pair, and its occurrences grouped in corpus order
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        occurrences = np.argsort(inverse, kind="stable")
+        occurrence_offsets = np.zeros(len(first) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(inverse, minlength=len(first)), out=occurrence_offsets[1:])
+
+        # unique pairs grouped by direction, in corpus order within a direction
+        direction_names, direction_codes = _direction_codes(tables, table_ids[first], rows[first])
+        sorted_codes = sorted(range(len(direction_names)), key=direction_names.__getitem__)
+        ranks = np.empty(len(direction_names), dtype=np.int64)
+        ranks[sorted_codes] = np.arange(len(direction_names))
+        order = np.lexsort((first, ranks[direction_codes]))
+
+        index = {"num_pairs": len(keys), "num_unique_pairs": len(first), "directions": []}
+        counts = np.bincount(direction_codes, minlength=len(direction_names))
+        start = 0
+        for code in sorted_codes:
+            index["directions"].append({"direction": list(direction_names[code]), "start": start, "stop": start + int(counts[code])})
+            start += int(counts[code])
+
+        config_names = pa.array([config_name for config_name, _ in table_sources], type=pa.string())
+        split_names = pa.array([split for _, split in table_sources], type=pa.string())
+        tmp_corpus = output_dir / f"{_CORPUS_FILE}.incomplete"
+        writer = ArrowWriter(features=PARALLEL_CORPUS_FEATURES, path=str(tmp_corpus))
+        try:
+            for chunk_start in range(0, len(order), batch_size):
+                pairs = order[chunk_start:chunk_start + batch_size]
+                positions = first[pairs]
+                columns = _take_rows(tables, table_ids[positions], rows[positions], _PAIR_COLUMNS)
+
+                lengths = occurrence_offsets[pairs + 1] - occurrence_offsets[pairs]
+                list_offsets = np.zeros(len(pairs) + 1, dtype=np.int32)
+                np.cumsum(lengths, out=list_offsets[1:])
+                sources = occurrences[np.repeat(occurrence_offsets[pairs] - list_offsets[:-1], lengths) + np.arange(list_offsets[-1])]
+                source_tables = pa.array(table_ids[sources])
+                columns["sources"] = pa.ListArray.from_arrays(
+                    pa.array(list_offsets),
+                    pa.StructArray.from_arrays(
+                        [config_names.take(source_tables), split_names.take(source_tables), ids.take(pa.array(sources))],
+                        names=["config", "split", "id"],
+                    ),
+                )
+                writer.write_table(pa.table(columns).cast(PARALLEL_CORPUS_FEATURES.arrow_schema))
+            writer.finalize()
+        finally:
+            writer.close()
+        os.replace(tmp_corpus, output_dir / _CORPUS_FILE)
+        with open(output_dir / _INDEX_FILE, "w") as f:
+            json.dump(index, f, indent=2)
+        return cls(output_dir)
+
+    @classmethod
+    def build(cls, config_names: List[str], output_dir: Union[str, Path], splits: Optional[Sequence[str]] = ("train",), conhelps=None) -> "ParallelCorpus":
+        """Consolidate `nusantara_t2t` configs into a store, see `build_from_datasets`."""
+        if conhelps is None:
+            from ..config_helper import NusantaraConfigHelper
+
+            conhelps = NusantaraConfigHelper()
+
+        def iter_datasets():
+            for config_name in config_names:
+                metadata = conhelps.for_config_name(config_name)
+                if metadata.config.schema != "nusantara_t2t":
+                    raise ValueError(f"{config_name} is not a nusantara_t2t config")
+                yield config_name, metadata.load_dataset()
+
+        return cls.build_from_datasets(dict(iter_datasets()), output_dir, splits=splits)
+
+
+def _take_rows(tables: List[pa.Table], table_ids: np.ndarray, rows: np.ndarray, columns: List[str]) -> Dict[str, pa.Array]:
+    """Columns of the given rows of several tables, in the given order."""
+    if len(rows) == 0:
+        return {name: pa.array([], type=pa.string()) for name in columns}
+    order = np.argsort(table_ids, kind="stable")
+    parts = [tables[table_id].select(columns).take(pa.array(rows[order][table_ids[order] == table_id])) for table_id in np.unique(table_ids)]
+    taken = pa.concat_tables(parts).take(pa.array(np.argsort(order, kind="stable")))
+    return {name: as_array(taken.column(name)) for name in columns}
+
+
+def _direction_codes(tables: List[pa.Table], table_ids: np.ndarray, rows: np.ndarray) -> Tuple[List[Tuple[str, str]], np.ndarray]:
+    """:return: distinct (text_1_name, text_2_name) directions of the given rows, and the direction of every row"""
+    names = _take_rows(tables, table_ids, rows, ["text_1_name", "text_2_name"])
+    direction = pc.binary_join_element_wise(pc.fill_null(names["text_1_name"], ""), pc.fill_null(names["text_2_name"], ""), "\x1f")
+    encoded = pc.dictionary_encode(direction)
+    direction_names = [tuple(name.split("\x1f")) for name in encoded.dictionary.to_pylist()]
+    return direction_names, encoded.indices.to_numpy(zero_copy_only=False).astype(np.int64)
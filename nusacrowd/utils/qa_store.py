@@ -0,0 +1,275 @@
+"""
+Context-deduplicated storage of `qa_features` datasets.
+
+Extractive QA loaders (idk_mrc, squad_id, tydiqa_id, facqa) yield one row
+per question and repeat the full `context` in each, so the Arrow cache
+stores every paragraph once per question. `QAStore` keeps:
+
+- a `documents` table with each unique context once, along with the
+  `document_id` of its first question,
+- a `questions` table with the other `qa_features` columns, the `document`
+  row of its context and `answer_start`/`answer_end`, the character offsets
+  of the first occurrence of each answer text in the context (-1 when it does
+  not occur). `qa_features` has no answer offsets, so these are a first-match
+  heuristic: an answer occurring several times in its context (e.g. a year or
+  a name) may have been annotated at a later occurrence.
+
+Contexts are deduplicated by content rather than by `document_id`, which is
+a title shared by several paragraphs in squad_id and a per-question id in
+tydiqa_id; `document_rows` gives the contexts of a `document_id` (e.g. all
+paragraphs of a squad_id title). Rows of `qa_features` are reconstructed
+lazily (`store[i]`, `iter_rows`) or all at once (`to_qa`).
+
+    store = metadata.load_qa_store()["train"]
+    context_tokens = [tokenize(context) for context in store.contexts]
+"""
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Union
+
+import datasets
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from datasets.table import InMemoryTable
+
+from .arrow_utils import as_array, get_arrow_table
+from .schemas import qa_features
+
+QA_STORE_DIR_NAME = "nusacrowd_qa_store"
+
+TABLE_NAMES = ("documents", "questions")
+
+DOCUMENT_FEATURES = datasets.Features({"document_id": qa_features["document_id"], "context": qa_features["context"]})
+
+QUESTION_FEATURES = datasets.Features({
+    **{name: feature for name, feature in qa_features.items() if name != "context"},
+    "document": datasets.Value("int64"),
+    # first occurrence of each answer in the context, not necessarily the annotated one
+    "answer_start": datasets.Sequence(datasets.Value("int32")),
+    "answer_end": datasets.Sequence(datasets.Value("int32")),
+})
+
+
+def _to_dataset(columns: Dict[str, pa.Array], features: datasets.Features, split=None) -> datasets.Dataset:
+    table = pa.table({name: columns[name] for name in features})
+    return datasets.Dataset(InMemoryTable(table.cast(features.arrow_schema)), info=datasets.DatasetInfo(features=features), split=split)
+
+
+def _answer_spans(contexts: List[Optional[str]], documents: np.ndarray, answers: List[Optional[List[str]]]):
+    """
+    Start and end character offsets of the first occurrence of each answer in its context,
+    which is not necessarily the annotated occurrence of answers found several times.
+    """
+    starts, ends, spans = [], [], {}
+    for document, row_answers in zip(documents, answers):
+        row_starts, row_ends = [], []
+        for answer in row_answers or []:
+            key = (document, answer)
+            if key not in spans:
+                context = contexts[document] if document >= 0 else None
+                start = context.find(answer) if context is not None and answer else -1
+                spans[key] = (start, start + len(answer) if start >= 0 else -1)
+            row_starts.append(spans[key][0])
+            row_ends.append(spans[key][1])
+        starts.append(row_starts)
+        ends.append(row_ends)
+    return pa.array(starts, pa.list_(pa.int32())), pa.array(ends, pa.list_(pa.int32()))
+
+
+class QAStore:
+    """
+    `qa_features` content as a table of unique contexts and a table of questions referencing them.
+
+    Each table is a `datasets.Dataset` (memory-mapped once saved).
+    """
+
+    def __init__(self, documents: datasets.Dataset, questions: datasets.Dataset):
+        self.documents = documents
+        self.questions = questions
+        self._contexts = None
+        self._document_index = None
+
+    @classmethod
+    def from_qa(cls, dataset: datasets.Dataset) -> "QAStore":
+        """Deduplicate the contexts of a `qa_features` dataset."""
+        table = get_arrow_table(dataset)
+        encoded = pc.dictionary_encode(as_array(table.column("context")))
+        documents = pc.fill_null(encoded.indices, -1).to_numpy(zero_copy_only=False).astype(np.int64)
+        resolved = documents >= 0
+        # `document_id` of the first question of each context, in order of first appearance
+        _, first_rows = np.unique(documents[resolved], return_index=True)
+        first_rows = np.flatnonzero(resolved)[first_rows]
+
+        contexts = encoded.dictionary
+        answer_start, answer_end = _answer_spans(contexts.to_pylist(), documents, table.column("answer").to_pylist())
+        questions = {name: as_array(table.column(name)) for name in qa_features if name != "context"}
+        return cls(
+            documents=_to_dataset({
+                "document_id": pc.take(as_array(table.column("document_id")), pa.array(first_rows, pa.int64())),
+                "context": contexts,
+            }, DOCUMENT_FEATURES, dataset.split),
+            questions=_to_dataset({
+                **questions,
+                "document": pa.array(documents, mask=~resolved),
+                "answer_start": answer_start,
+                "answer_end": answer_end,
+            }, QUESTION_FEATURES, dataset.split),
+        )
+
+    def __len__(self):
+        return self.questions.num_rows
+
+    @property
+    def contexts(self) -> pa.Array:
+        """Unique contexts, indexed by the `document` column of the questions."""
+        if self._contexts is None:
+            self._contexts = as_array(self.documents.with_format("arrow")["context"])
+        return self._contexts
+
+    @property
+    def document_index(self) -> Dict[str, np.ndarray]:
+        """Sorted rows of the `documents` table referred to by the questions of each `document_id`."""
+        if self._document_index is None:
+            questions = self.questions.with_format("arrow")
+            encoded = pc.dictionary_encode(as_array(questions["document_id"]))
+            codes = pc.fill_null(encoded.indices, -1).to_numpy(zero_copy_only=False).astype(np.int64)
+            documents = pc.fill_null(as_array(questions["document"]), -1).to_numpy(zero_copy_only=False).astype(np.int64)
+            resolved = (codes >= 0) & (documents >= 0)
+            # unique (document_id, document) pairs, sorted by document_id code then document row
+            pairs = np.unique(np.stack([codes[resolved], documents[resolved]], axis=1), axis=0)
+            document_ids = encoded.dictionary.to_pylist()
+            bounds = np.searchsorted(pairs[:, 0], np.arange(len(document_ids) + 1))
+            self._document_index = {
+                document_id: pairs[start:end, 1]
+                for document_id, start, end in zip(document_ids, bounds[:-1], bounds[1:])
+                if start < end
+            }
+        return self._document_index
+
+    def document_rows(self, document_id: str) -> np.ndarray:
+        """Rows of the `documents` table (and `contexts`) of `document_id`, empty if it has none."""
+        return self.document_index.get(document_id, np.zeros(0, dtype=np.int64))
+
+    def _take(self, questions: pa.Table) -> pa.Table:
+        """`qa_features` table of a slice of the questions table."""
+        contexts = pc.take(self.contexts, as_array(questions.column("document")))
+        return pa.table({name: contexts if name == "context" else questions.column(name) for name in qa_features})
+
+    def __getitem__(self, i: int) -> Dict:
+        """The `qa_features` row of question `i`."""
+        question = self.questions[i]
+        document = question.pop("document")
+        for name in ("answer_start", "answer_end"):
+            question.pop(name)
+        question["context"] = self.contexts[document].as_py() if document is not None else None
+        return {name: question[name] for name in qa_features}
+
+    def iter_rows(self, batch_size: int = 1000) -> Iterator[Dict]:
+        """Iterate over the `qa_features` rows, reconstructing contexts a batch at a time."""
+        questions = self.questions.with_format("arrow")
+        for start in range(0, len(self), batch_size):
+            yield from self._take(questions[start:start + batch_size]).to_pylist()
+
+    def __iter__(self):
+        return self.iter_rows()
+
+    def to_qa(self) -> datasets.Dataset:
+        """Materialize the `qa_features` dataset, with the same rows as the converted one."""
+        table = self._take(get_arrow_table(self.questions))
+        return _to_dataset({name: as_array(table.column(name)) for name in qa_features}, qa_features, self.questions.split)
+
+    @property
+    def nbytes(self) -> int:
+        return self.documents.data.nbytes + self.questions.data.nbytes
+
+    def save(self, path: Union[str, Path]):
+        for name in TABLE_NAMES:
+            getattr(self, name).save_to_disk(str(Path(path) / name))
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "QAStore":
+        """Load saved tables, memory-mapped."""
+        return cls(**{name: datasets.load_from_disk(str(Path(path) / name)) for name in TABLE_NAMES})
+
+
+def get_qa_store(dataset: datasets.Dataset) -> QAStore:
+    """
+    Context-deduplicated store of a `qa_features` dataset, converted once and saved next to its prepared cache.
+    """
+    from .fingerprint import get_prepared_dir
+
+    prepared_dir = get_prepared_dir(dataset)
+    if prepared_dir is None:
+        return QAStore.from_qa(dataset)
+    path = prepared_dir / QA_STORE_DIR_NAME / f"{dataset.split}-{dataset._fingerprint[:16]}"
+    if not path.exists():
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.incomplete")
+        QAStore.from_qa(dataset).save(tmp_path)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # converted concurrently by another process
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    return QAStore.load(path)
+
+
+def synthetic_mrc(num_paragraphs: int = 2000, questions_per_paragraph: int = 5, seed: int = 0) -> datasets.Dataset:
+    """idk_mrc-like `qa_features` dataset, with every context repeated for each of its questions."""
+    rng = np.random.default_rng(seed)
+    words = [f"kata{i}" for i in range(5000)]
+    rows = []
+    for paragraph in range(num_paragraphs):
+        context = " ".join(words[i] for i in rng.integers(len(words), size=int(rng.integers(80, 250)))) + "."
+        for question in range(questions_per_paragraph):
+            question_id = f"{paragraph}-{question}"
+            start = int(rng.integers(len(context) - 20))
+            rows.append({
+                "id": question_id,
+                "question_id": question_id,
+                "document_id": str(paragraph),
+                "question": f"apa {words[int(rng.integers(len(words)))]}?",
+                "type": "extractive",
+                "choices": [],
+                "context": context,
+                "answer": [context[start:start + 12]] if question % 3 else [],
+            })
+    return datasets.Dataset.from_list(rows, features=qa_features)
+
+
+def _tokenize(text: str) -> List[str]:
+    return re.findall(r"\w+|[^\w\s]", text)
+
+
+def benchmark_qa_storage(dataset: Optional[datasets.Dataset] = None, tokenizer: Callable[[str], List] = _tokenize) -> Dict[str, float]:
+    """
+    Compare the size and the context tokenization time of nested `qa_features` rows and of a `QAStore`.
+
+    :param dataset: a `qa_features` dataset, `synthetic_mrc()` by default
+    :param tokenizer: tokenizer applied to every context, e.g. a Hugging Face tokenizer's `tokenize`
+    :return: bytes of both layouts and seconds to tokenize the context of every question
+    """
+    dataset = dataset if dataset is not None else synthetic_mrc()
+    store = QAStore.from_qa(dataset)
+    results = {"nested_bytes": get_arrow_table(dataset).nbytes, "store_bytes": store.nbytes}
+
+    start = time.perf_counter()
+    nested_tokens = [tokenizer(context) for context in dataset.with_format("arrow")["context"].to_pylist()]
+    results["nested_tokenize_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    context_tokens = [tokenizer(context) for context in store.contexts.to_pylist()]
+    store_tokens = [context_tokens[document] for document in store.questions.with_format("arrow")["document"].to_pylist()]
+    results["store_tokenize_seconds"] = time.perf_counter() - start
+    if len(store_tokens) != len(nested_tokens):
+        raise RuntimeError(f"The store has {len(store_tokens)} questions, the dataset {len(nested_tokens)}")
+    return results
+
+
+if __name__ == "__main__":
+    results = benchmark_qa_storage()
+    print(f"size: {results['nested_bytes'] / 2**20:.1f} MiB nested, {results['store_bytes'] / 2**20:.1f} MiB deduplicated")
+    print(f"tokenization: {results['nested_tokenize_seconds']:.2f}s nested, {results['store_tokenize_seconds']:.2f}s deduplicated")
@@ -0,0 +1,146 @@
+"""
+Deterministic, cached splits of prepared configs.
+
+Many loaders only expose a TRAIN split (e.g. `indocoref`). `split_dataset`
+partitions a split of a prepared config into seeded, optionally stratified
+splits. The row indices of each split are stored as compact `.npy` arrays in
+`nusacrowd_splits/` next to the prepared cache, so each split is computed once
+and loaded as a memory-mapped `select` over the cache, like fold views (see
+`nusacrowd.utils.folds`). Removing or rebuilding the cache removes its splits.
+
+    metadata.load_splits({"train": 0.8, "validation": 0.1, "test": 0.1}, stratify_by="label")
+"""
+import hashlib
+import json
+import math
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import datasets
+import numpy as np
+
+SPLITS_DIR_NAME = "nusacrowd_splits"
+
+DEFAULT_RATIOS = {"train": 0.8, "validation": 0.1, "test": 0.1}
+DEFAULT_SEED = 42
+
+
+def train_test_indices(num_rows: int, test_size: float, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Shuffled train and test row indices, the same as `sklearn.model_selection.train_test_split`
+    (without stratification) with `random_state=seed`.
+    """
+    num_test = math.ceil(test_size * num_rows)
+    permutation = np.random.RandomState(seed).permutation(num_rows)
+    return permutation[num_test:], permutation[:num_test]
+
+
+def _allocate(num_rows: int, ratios: Dict[str, float]) -> Dict[str, int]:
+    """Number of rows per split, rounding by largest remainder so that they sum to `num_rows`."""
+    exact = {split: ratio * num_rows for split, ratio in ratios.items()}
+    counts = {split: math.floor(value) for split, value in exact.items()}
+    by_remainder = sorted(ratios, key=lambda split: counts[split] - exact[split])
+    for split in by_remainder[:num_rows - sum(counts.values())]:
+        counts[split] += 1
+    return counts
+
+
+def _get_strata(dataset: datasets.Dataset, column: str) -> np.ndarray:
+    feature = dataset.features[column]
+    if not isinstance(feature, (datasets.ClassLabel, datasets.Value)):
+        raise ValueError(f"Can only stratify on a ClassLabel or Value column, {column} is a {type(feature).__name__}")
+    # the arrow format takes the indices mapping of selections into account
+    values = dataset.with_format("arrow")[column].to_numpy(zero_copy_only=False)
+    if isinstance(feature, datasets.ClassLabel):
+        return values
+    return np.unique(values.astype(str), return_inverse=True)[1]
+
+
+def make_split_indices(
+    dataset: datasets.Dataset,
+    ratios: Dict[str, float],
+    seed: int = DEFAULT_SEED,
+    stratify_by: Optional[str] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Partition the rows of `dataset` into splits, each a sorted array of row indices.
+
+    :param ratios: fraction of rows per split, normalized to sum to 1
+    :param stratify_by: column (usually the `label` ClassLabel) whose class proportions are kept in every split
+    """
+    total = sum(ratios.values())
+    ratios = {split: ratio / total for split, ratio in ratios.items()}
+    dtype = np.uint32 if dataset.num_rows < 2**32 else np.int64
+    rng = np.random.RandomState(seed)
+
+    if stratify_by is None:
+        groups = [np.arange(dataset.num_rows)]
+    else:
+        strata = _get_strata(dataset, stratify_by)
+        groups = [np.flatnonzero(strata == stratum) for stratum in np.unique(strata)]
+
+    parts = {split: [] for split in ratios}
+    for group in groups:
+        group = group[rng.permutation(len(group))]
+        start = 0
+        for split, count in _allocate(len(group), ratios).items():
+            parts[split].append(group[start:start + count])
+            start += count
+    return {split: np.sort(np.concatenate(part)).astype(dtype) for split, part in parts.items()}
+
+
+def get_splits_dir(dataset: datasets.Dataset, ratios: Dict[str, float], seed: int, stratify_by: Optional[str]) -> Optional[Path]:
+    """Directory of the split indices next to the cache of `dataset`, None for in-memory datasets."""
+    from .fingerprint import get_prepared_dir
+
+    prepared_dir = get_prepared_dir(dataset)
+    if prepared_dir is None:
+        return None
+    spec = {"fingerprint": dataset._fingerprint, "num_rows": dataset.num_rows, "ratios": ratios, "seed": seed, "stratify_by": stratify_by}
+    key = hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+    return prepared_dir / SPLITS_DIR_NAME / key
+
+
+def split_dataset(
+    dataset: datasets.Dataset,
+    ratios: Optional[Dict[str, float]] = None,
+    seed: int = DEFAULT_SEED,
+    stratify_by: Optional[str] = None,
+) -> datasets.DatasetDict:
+    """
+    Split `dataset` into seeded (optionally stratified) splits, computing the indices once per cache.
+
+    :param ratios: fraction of rows per split, `DEFAULT_RATIOS` by default
+    :param seed: seed of the shuffle assigning rows to splits
+    :param stratify_by: column keeping its class proportions in every split, e.g. `label`
+    :return: the splits as selections over `dataset`, rows in their original order
+    """
+    ratios = dict(ratios or DEFAULT_RATIOS)
+    splits_dir = get_splits_dir(dataset, ratios, seed, stratify_by)
+    if splits_dir is not None and (splits_dir / "manifest.json").exists():
+        with open(splits_dir / "manifest.json") as f:
+            manifest = json.load(f)
+        indices = {split: np.load(splits_dir / index_file) for split, index_file in manifest["splits"].items()}
+    else:
+        indices = make_split_indices(dataset, ratios, seed, stratify_by)
+        if splits_dir is not None:
+            _save(splits_dir, indices, ratios, seed, stratify_by)
+    return datasets.DatasetDict({split: dataset.select(split_indices, keep_in_memory=True) for split, split_indices in indices.items()})
+
+
+def _save(splits_dir: Path, indices: Dict[str, np.ndarray], ratios: Dict[str, float], seed: int, stratify_by: Optional[str]):
+    splits_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {"ratios": ratios, "seed": seed, "stratify_by": stratify_by, "splits": {}}
+    for split, split_indices in indices.items():
+        index_file = f"{split}.npy"
+        # written under a unique name first, as several processes may split the same cache
+        tmp_path = splits_dir / f"{index_file}.{os.getpid()}.incomplete"
+        with open(tmp_path, "wb") as f:
+            np.save(f, split_indices)
+        os.replace(tmp_path, splits_dir / index_file)
+        manifest["splits"][split] = index_file
+    tmp_path = splits_dir / f"manifest.json.{os.getpid()}.incomplete"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, splits_dir / "manifest.json")
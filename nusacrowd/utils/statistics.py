@@ -0,0 +1,187 @@
+"""
+Per-schema statistics of nusantara datasets, computed with Arrow compute over the cached tables.
+
+Rows are never decoded to Python, so statistics of large splits (and of speech
+datasets, whose audio would otherwise be decoded) are cheap to compute.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import datasets
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .arrow_utils import count_elements, element_lengths, flatten_path, get_arrow_table, is_list_type
+from .constants import SCHEMA_TO_FEATURES
+
+TEXT_LENGTH_PERCENTILES = (0.5, 0.9, 0.99)
+
+# key of the label distribution counting missing labels (-1, e.g. unlabeled test splits)
+MISSING_LABEL = "<missing>"
+
+SCHEMA_TO_TEXT_FEATURES = {
+    "KB": ["passages.text"],
+    "QA": ["question", "context"],
+    "T2T": ["text_1", "text_2"],
+    "TEXT": ["text"],
+    "TEXT_MULTI": ["text"],
+    "PAIRS": ["text_1", "text_2"],
+    "PAIRS_MULTI": ["text_1", "text_2"],
+    "PAIRS_SCORE": ["text_1", "text_2"],
+    "SEQ_LABEL": [],
+    "SSP": ["text"],
+    "SPTEXT": ["text"],
+    "S2S": ["text_1", "text_2"],
+    "IMTEXT": ["texts"],
+}
+
+# Nested KB elements that are counted on top of the top-level features
+KB_NESTED_FEATURES = [
+    "entities.normalized",
+    "events.arguments",
+    "coreferences.entity_ids",
+    "relations.normalized",
+]
+KB_TYPE_FEATURES = ["entities.type", "relations.type", "events.type"]
+
+_STATISTICS_CACHE: Dict[Tuple[str, str], "DatasetStatistics"] = {}
+
+
+@dataclass
+class DatasetStatistics:
+    """Statistics of one split of a dataset in a nusantara schema."""
+
+    schema: str
+    num_examples: int
+    counts: Dict[str, int] = field(default_factory=dict)
+    list_lengths: Dict[str, Dict[int, int]] = field(default_factory=dict)
+    label_distribution: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    text_lengths: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+    @classmethod
+    def from_dataset(cls, dataset: datasets.Dataset, schema: str, features: Optional[datasets.Features] = None) -> "DatasetStatistics":
+        """
+        Compute (or fetch from cache) the statistics of a dataset split.
+
+        Results are cached per dataset fingerprint, so repeated calls on the same
+        prepared split are free.
+
+        :param dataset: split of a nusantara dataset
+        :param schema: nusantara schema in caps, e.g. `SEQ_LABEL`
+        :param features: features to count, defaults to the dataset features
+        """
+        fingerprint = getattr(dataset, "_fingerprint", None)
+        cache_key = (fingerprint, schema)
+        if fingerprint is not None and features is None and cache_key in _STATISTICS_CACHE:
+            return _STATISTICS_CACHE[cache_key]
+
+        stats = cls.from_table(get_arrow_table(dataset), schema, features or dataset.features)
+        if fingerprint is not None and features is None:
+            _STATISTICS_CACHE[cache_key] = stats
+        return stats
+
+    @classmethod
+    def from_table(cls, table: pa.Table, schema: str, features: Optional[datasets.Features] = None) -> "DatasetStatistics":
+        if features is None:
+            features = SCHEMA_TO_FEATURES[schema]
+        stats = cls(schema=schema, num_examples=table.num_rows)
+
+        for name in features:
+            if name not in table.column_names:
+                stats.counts[name] = 0
+                continue
+            values, _ = flatten_path(table, name, flatten_leaf=False)
+            stats.counts[name] = count_elements(values)
+            if is_list_type(values.type):
+                stats.list_lengths[name] = _histogram(element_lengths(values))
+
+        if schema == "KB":
+            for path in KB_NESTED_FEATURES:
+                stats.counts[path] = count_elements(flatten_path(table, path, flatten_leaf=False)[0])
+            for path in KB_TYPE_FEATURES:
+                values, _ = flatten_path(table, path)
+                stats.label_distribution[path] = _value_counts(values)
+
+        for path, names in _iter_label_features(features):
+            if path.split(".")[0] in table.column_names:
+                values, _ = flatten_path(table, path)
+                stats.label_distribution[path] = _label_counts(_value_counts(values), names)
+
+        for path in SCHEMA_TO_TEXT_FEATURES.get(schema, []):
+            if path.split(".")[0] in table.column_names:
+                values, _ = flatten_path(table, path)
+                stats.text_lengths[path] = _length_summary(pc.utf8_length(values))
+
+        return stats
+
+    def __str__(self):
+        lines = [f"num_examples: {self.num_examples}"]
+        lines += [f"{k}: {v}" for k, v in self.counts.items()]
+        lines += [f"{k} distribution: {v}" for k, v in self.label_distribution.items()]
+        lines += [f"{k} length: {v}" for k, v in self.text_lengths.items()]
+        return "\n".join(lines)
+
+
+def get_feature_counts(dataset: datasets.Dataset, schema: str, features: Optional[datasets.Features] = None) -> Dict[str, int]:
+    """Shortcut returning only the per-feature instance counts of a split."""
+    return DatasetStatistics.from_dataset(dataset, schema, features).counts
+
+
+def _label_names(feature) -> Optional[List[str]]:
+    if isinstance(feature, list) and len(feature) > 0:
+        feature = feature[0]
+    elif hasattr(feature, "feature"):
+        feature = feature.feature
+    if isinstance(feature, datasets.ClassLabel):
+        return feature.names
+    return None
+
+
+def _iter_label_features(features: dict, prefix: str = "") -> Iterator[Tuple[str, List[str]]]:
+    for name, feature in features.items():
+        if isinstance(feature, dict):
+            yield from _iter_label_features(feature, f"{prefix}{name}.")
+            continue
+        names = _label_names(feature)
+        if names is not None:
+            yield f"{prefix}{name}", names
+
+
+def _histogram(lengths: np.ndarray) -> Dict[int, int]:
+    if len(lengths) == 0:
+        return {}
+    counts = np.bincount(lengths)
+    return {int(length): int(count) for length, count in enumerate(counts) if count > 0}
+
+
+def _label_counts(counts: Dict, names: List[str]) -> Dict[str, int]:
+    """Class label counts keyed by label name, negative (missing) labels under `MISSING_LABEL`."""
+    label_counts = {}
+    for k, v in counts.items():
+        if k is None:
+            continue
+        name = names[int(k)] if k >= 0 else MISSING_LABEL
+        label_counts[name] = label_counts.get(name, 0) + v
+    return label_counts
+
+
+def _value_counts(values: pa.Array) -> Dict:
+    counts = pc.value_counts(values)
+    return dict(zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist()))
+
+
+def _length_summary(lengths: pa.Array) -> Dict[str, float]:
+    lengths = pc.drop_null(lengths)
+    if len(lengths) == 0:
+        return {}
+    min_max = pc.min_max(lengths)
+    summary = {
+        "min": min_max["min"].as_py(),
+        "mean": pc.mean(lengths).as_py(),
+        "max": min_max["max"].as_py(),
+    }
+    quantiles = pc.quantile(lengths, q=list(TEXT_LENGTH_PERCENTILES)).to_pylist()
+    for q, value in zip(TEXT_LENGTH_PERCENTILES, quantiles):
+        summary[f"p{int(q * 100)}"] = value
+    return summary
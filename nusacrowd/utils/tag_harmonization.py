@@ -0,0 +1,207 @@
+"""
+Harmonization of `seq_label_features` tag inventories to shared schemes.
+
+Every NER/POS dataset declares its own `ClassLabel` names. A `TagMapping`
+declares how those tags (or entity types, for BIO schemes) map to a shared
+`TagScheme`; it is compiled into numpy lookup tables over the source label
+ids and applied to the flattened Arrow `labels` column of a whole split at
+once. BIO output is recomputed from entity types, so IO-tagged datasets
+(e.g. singgalang) and invalid `I-` starts are turned into valid BIO.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import datasets
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from datasets.fingerprint import update_fingerprint
+from datasets.table import InMemoryTable, concat_tables
+
+
+@dataclass
+class TagScheme:
+    name: str
+    tags: List[str]
+    is_bio: bool
+
+    @property
+    def entity_types(self) -> List[str]:
+        """Entity types of a BIO scheme, in the order of their `B-` tags."""
+        return [tag[2:] for tag in self.tags if tag.startswith("B-")]
+
+
+BIO_NER_SCHEME = TagScheme("bio_ner", ["O", "B-PER", "I-PER", "B-ORG", "I-ORG", "B-LOC", "I-LOC"], is_bio=True)
+
+UPOS_SCHEME = TagScheme(
+    "upos",
+    ["ADJ", "ADP", "ADV", "AUX", "CCONJ", "DET", "INTJ", "NOUN", "NUM", "PART", "PRON", "PROPN", "PUNCT", "SCONJ", "SYM", "VERB", "X"],
+    is_bio=False,
+)
+
+
+def split_bio(tag: str) -> Tuple[str, str]:
+    """`B-PER` -> (`B`, `PER`); tags without a prefix (IO tagging) get an empty prefix."""
+    if len(tag) > 2 and tag[1] == "-" and tag[0] in "BIES":
+        return tag[0], tag[2:]
+    return "", tag
+
+
+@dataclass
+class TagMapping:
+    """
+    Mapping of a dataset's tags to a scheme.
+
+    :param scheme: target scheme
+    :param mapping: source entity type (BIO schemes) or source tag without `B-`/`I-` prefix
+        (other schemes) to target type or tag
+    :param default: target of unmapped source tags, `O` for BIO schemes if None; without
+        a default, other schemes must map every source tag
+    """
+
+    scheme: TagScheme
+    mapping: Dict[str, str]
+    default: Optional[str] = None
+
+    def lookup_tables(self, source_names: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: tuple of (target id per source id, whether the source tag starts an entity);
+            for BIO schemes the target id is an entity type id, 0 meaning outside
+        """
+        begins = np.zeros(len(source_names), dtype=bool)
+        if self.scheme.is_bio:
+            type_ids = {entity_type: i + 1 for i, entity_type in enumerate(self.scheme.entity_types)}
+            targets = np.zeros(len(source_names), dtype=np.int64)
+            for i, name in enumerate(source_names):
+                prefix, entity_type = split_bio(name)
+                targets[i] = type_ids.get(self.mapping.get(entity_type, self.default), 0)
+                begins[i] = prefix in ("B", "S")
+            return targets, begins
+
+        target_tags = [self.mapping.get(split_bio(name)[1], self.default) for name in source_names]
+        unmapped = [name for name, tag in zip(source_names, target_tags) if tag not in self.scheme.tags]
+        if unmapped:
+            raise ValueError(f"Source tags {unmapped} are not mapped to a tag of {self.scheme.name}, add them to the mapping or set a default")
+        return np.asarray([self.scheme.tags.index(tag) for tag in target_tags], dtype=np.int64), begins
+
+    def apply(self, dataset: datasets.Dataset) -> datasets.Dataset:
+        """
+        Relabel a `seq_label_features` split; the result has the scheme's `ClassLabel`.
+
+        Only the `labels` column is rewritten (in memory), the other columns stay
+        memory-mapped and the info (description, citation, ...) is kept.
+        """
+        targets, begins = self.lookup_tables(dataset.features["labels"].feature.names)
+        # relabels the rows of the underlying table, so an indices mapping of the dataset stays valid
+        table = dataset.data
+        labels = table.column("labels").combine_chunks()
+        values = pc.list_flatten(labels).to_numpy(zero_copy_only=False).astype(np.int64)
+        lengths = pc.fill_null(pc.list_value_length(labels), 0).to_numpy(zero_copy_only=False).astype(np.int64)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        new_values = targets[values]
+        if self.scheme.is_bio:
+            new_values = self._to_bio(new_values, begins[values], offsets)
+        new_labels = pa.ListArray.from_arrays(pa.array(offsets, type=pa.int32()), pa.array(new_values, type=pa.int64()))
+
+        features = dataset.features.copy()
+        features["labels"] = datasets.Sequence(datasets.ClassLabel(names=self.scheme.tags))
+        info = dataset.info.copy()
+        info.features = features
+        table = concat_tables([table.drop(["labels"]), InMemoryTable.from_arrays([new_labels], names=["labels"])], axis=1).select(table.column_names)
+        fingerprint = update_fingerprint(dataset._fingerprint, "harmonize_tags", {"tags": self.scheme.tags, "mapping": self.mapping, "default": self.default})
+        return datasets.Dataset(table, info=info, split=dataset.split, indices_table=dataset._indices, fingerprint=fingerprint)
+
+    def _to_bio(self, types: np.ndarray, begins: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        # an entity starts at a `B-` tag, at a type change, or at the first token of a sentence
+        previous = np.concatenate([[0], types[:-1]])
+        sentence_start = np.zeros(len(types), dtype=bool)
+        sentence_start[offsets[:-1][offsets[:-1] < len(types)]] = True
+        is_begin = begins | (previous != types) | sentence_start
+
+        bio_ids = np.zeros((len(self.scheme.entity_types) + 1, 2), dtype=np.int64)
+        for i, entity_type in enumerate(self.scheme.entity_types, start=1):
+            bio_ids[i] = [self.scheme.tags.index(f"I-{entity_type}"), self.scheme.tags.index(f"B-{entity_type}")]
+        return bio_ids[types, is_begin.astype(np.int64)]
+
+
+_SHARED_NER_TYPES = {"PER": "PER", "ORG": "ORG", "LOC": "LOC"}
+
+TAG_MAPPINGS = {
+    "nerp": TagMapping(BIO_NER_SCHEME, {"PPL": "PER", "IND": "ORG", "PLC": "LOC"}),
+    "nergrit_ner": TagMapping(BIO_NER_SCHEME, {**_SHARED_NER_TYPES, "GPE": "LOC", "FAC": "LOC"}),
+    "indonlu_nergrit": TagMapping(BIO_NER_SCHEME, {"PERSON": "PER", "ORGANISATION": "ORG", "PLACE": "LOC"}),
+    "indolem_nerui": TagMapping(BIO_NER_SCHEME, {"PERSON": "PER", "ORGANIZATION": "ORG", "LOCATION": "LOC"}),
+    "indolem_ner_ugm": TagMapping(BIO_NER_SCHEME, {"PERSON": "PER", "ORGANIZATION": "ORG", "LOCATION": "LOC"}),
+    "wikiann": TagMapping(BIO_NER_SCHEME, _SHARED_NER_TYPES),
+    "singgalang": TagMapping(BIO_NER_SCHEME, {"Person": "PER", "Organisation": "ORG", "Place": "LOC"}),
+    # InaNLP tagset
+    "posp": TagMapping(
+        UPOS_SCHEME,
+        {
+            "NNO": "NOUN", "NNP": "PROPN", "PRN": "PRON", "PRR": "PRON", "PRK": "PRON", "PRI": "PRON",
+            "VBI": "VERB", "VBT": "VERB", "VBP": "VERB", "VBE": "VERB", "VBL": "AUX",
+            "ADJ": "ADJ", "ADV": "ADV", "ADK": "ADV", "ART": "DET", "KUA": "DET", "NUM": "NUM",
+            "CCN": "CCONJ", "CSN": "SCONJ", "PPO": "ADP", "PAR": "PART", "NEG": "PART",
+            "INT": "INTJ", "SYM": "PUNCT", "$$$": "SYM", "UNS": "X",
+        },
+        default="X",
+    ),
+    # tagset of Dinakaramani et al. (2014)
+    "idn_tagged_corpus_csui": TagMapping(
+        UPOS_SCHEME,
+        {
+            "CC": "CCONJ", "CD": "NUM", "DT": "DET", "FW": "X", "IN": "ADP", "JJ": "ADJ", "MD": "AUX",
+            "NEG": "PART", "NN": "NOUN", "NND": "NOUN", "NNP": "PROPN", "OD": "ADJ", "PR": "PRON",
+            "PRP": "PRON", "RB": "ADV", "RP": "PART", "SC": "SCONJ", "SYM": "SYM", "UH": "INTJ",
+            "VB": "VERB", "WH": "PRON", "X": "X", "Z": "PUNCT",
+        },
+        default="X",
+    ),
+    "postag_su": TagMapping(
+        UPOS_SCHEME,
+        {
+            **{punctuation: "PUNCT" for punctuation in ["!", '"', "'", ")", ",", "-", ".", "...", "....", "/", ":", ";", "?", "`", "–", "—", "‘", "’", "“", "”"]},
+            "CC": "CCONJ", "CDC": "NUM", "CDI": "NUM", "CDO": "NUM", "CDP": "NUM", "CDT": "NUM", "CS": "SCONJ",
+            "DT": "DET", "FW": "X", "IN": "ADP", "J": "ADJ", "JJ": "ADJ", "MD": "AUX", "NEG": "PART",
+            "N": "NOUN", "NN": "NOUN", "NNG": "NOUN", "NNO": "NOUN", "NNP": "PROPN", "NNPP": "PROPN", "NP": "PROPN", "NPP": "PROPN",
+            "PR": "PRON", "PRL": "PRON", "PRN": "PRON", "PRP": "PRON", "WH": "PRON", "WHP": "PRON", "WRP": "PRON",
+            "RB": "ADV", "RBT": "ADV", "RB|RP": "ADV", "RP": "PART", "SC": "SCONJ", "SCC": "SCONJ", "SC|IN": "SCONJ",
+            "PRL|IN": "ADP", "SYM": "SYM", "UH": "INTJ", "VB": "VERB", "VBI": "VERB", "VBT": "VERB", "VRB": "VERB",
+        },
+        default="X",
+    ),
+}
+
+
+def get_tag_mapping(config_name: str) -> TagMapping:
+    """Mapping declared for the dataset (or subset, e.g. `nergrit_ner`) of a config."""
+    matches = [key for key in TAG_MAPPINGS if config_name.startswith(f"{key}_")]
+    if not matches:
+        raise KeyError(f"No tag mapping declared for {config_name}")
+    return TAG_MAPPINGS[max(matches, key=len)]
+
+
+def harmonize_configs(config_names: List[str], scheme: TagScheme = BIO_NER_SCHEME, conhelps=None, add_source_column: bool = True) -> datasets.DatasetDict:
+    """
+    Relabel `nusantara_seq_label` configs to one scheme and concatenate them per split.
+
+    :param add_source_column: add a `source` column with the config name of every example
+    """
+    if conhelps is None:
+        from ..config_helper import NusantaraConfigHelper
+
+        conhelps = NusantaraConfigHelper()
+
+    splits: Dict[str, List[datasets.Dataset]] = {}
+    for config_name in config_names:
+        mapping = get_tag_mapping(config_name)
+        if mapping.scheme.name != scheme.name:
+            raise ValueError(f"{config_name} maps to {mapping.scheme.name}, not {scheme.name}")
+        for split, dataset in conhelps.for_config_name(config_name).load_dataset().items():
+            harmonized = mapping.apply(dataset)
+            if add_source_column:
+                harmonized = harmonized.add_column("source", [config_name] * len(harmonized))
+            splits.setdefault(split, []).append(harmonized)
+    return datasets.DatasetDict({split: datasets.concatenate_datasets(parts) for split, parts in splits.items()})
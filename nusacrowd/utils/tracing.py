@@ -0,0 +1,393 @@
+"""
+Per-stage timing of dataset preparation.
+
+A `Tracer` records nested spans while a config is loaded and passes one
+`SpanEvent` per finished span to its sinks:
+
+- any callable, e.g. `events.append` or a progress callback,
+- `JSONLSink`, appending one JSON object per span to a log file,
+- `OpenTelemetrySink`, exporting spans with the `opentelemetry` API when it
+  is installed and writing OTLP-style JSON lines to a local file otherwise.
+
+Stages of a traced load:
+
+- `load_dataset`: the whole call,
+- `load_builder`: importing the loader script and creating its builder,
+- `download` / `extract`: `dl_manager.download` and `dl_manager.extract`,
+- `split_generators`: the builder's `_split_generators`, excluding downloads,
+- `generate_examples`: time spent inside the builder's `_generate_examples`,
+- `write_arrow`: encoding and writing examples to the Arrow cache, i.e. `_prepare_split` minus `generate_examples`,
+- `as_dataset`: memory-mapping the prepared cache.
+
+Every event carries both the inclusive `duration` and the exclusive
+`self_duration` (minus nested spans), which `TraceSummary` ranks configs by.
+
+    tracer = Tracer([JSONLSink("trace.jsonl")])
+    conhelps.load_benchmark("IndoNLU", tracer=tracer)
+    print(tracer.summary().report())
+"""
+import json
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import datasets
+
+from .builder_utils import get_download_config, get_download_manager
+
+logger = logging.getLogger(__name__)
+
+STAGES = ["load_dataset", "load_builder", "download", "extract", "split_generators", "generate_examples", "write_arrow", "as_dataset"]
+
+
+@dataclass
+class SpanEvent:
+    """A finished span."""
+
+    config_name: str
+    stage: str
+    start_time: float
+    duration: float
+    self_duration: float
+    num_bytes: Optional[int] = None
+    num_examples: Optional[int] = None
+    split: Optional[str] = None
+    trace_id: str = ""
+    span_id: str = ""
+    parent_id: Optional[str] = None
+    attributes: Dict = field(default_factory=dict)
+
+
+@dataclass
+class _Span:
+    event: SpanEvent
+    start: float
+    children_duration: float = 0.0
+
+
+class Tracer:
+    """
+    Records nested spans and passes finished ones to `sinks`.
+
+    :param sinks: callables receiving each `SpanEvent`
+    :param keep_events: also keep events in `self.events`, for `summary()`
+    """
+
+    def __init__(self, sinks: Iterable[Callable[[SpanEvent], None]] = (), keep_events: bool = True):
+        self.sinks = list(sinks)
+        self.keep_events = keep_events
+        self.events: List[SpanEvent] = []
+        self._stack: List[_Span] = []
+        self._trace_id = uuid.uuid4().hex
+
+    @contextmanager
+    def span(self, stage: str, config_name: str, **attributes) -> Iterator[SpanEvent]:
+        """
+        Time a stage; the yielded event can be updated with `num_bytes`, `num_examples` or `split`.
+        """
+        parent = self._stack[-1] if self._stack else None
+        event = SpanEvent(
+            config_name=config_name,
+            stage=stage,
+            start_time=time.time(),
+            duration=0.0,
+            self_duration=0.0,
+            trace_id=self._trace_id,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.event.span_id if parent else None,
+            split=attributes.pop("split", None),
+            attributes=attributes,
+        )
+        span = _Span(event, time.perf_counter())
+        self._stack.append(span)
+        try:
+            yield event
+        finally:
+            self._stack.pop()
+            self.finish(span, time.perf_counter() - span.start, parent)
+
+    def record(self, stage: str, config_name: str, duration: float, **event_fields):
+        """Record a span timed by the caller, e.g. the time spent inside a generator."""
+        parent = self._stack[-1] if self._stack else None
+        event = SpanEvent(
+            config_name=config_name,
+            stage=stage,
+            start_time=time.time() - duration,
+            duration=0.0,
+            self_duration=0.0,
+            trace_id=self._trace_id,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.event.span_id if parent else None,
+            **event_fields,
+        )
+        self.finish(_Span(event, 0.0), duration, parent)
+
+    def finish(self, span: _Span, duration: float, parent: Optional[_Span]):
+        span.event.duration = duration
+        span.event.self_duration = max(duration - span.children_duration, 0.0)
+        if parent is not None:
+            parent.children_duration += duration
+        if self.keep_events:
+            self.events.append(span.event)
+        for sink in self.sinks:
+            try:
+                sink(span.event)
+            except Exception:
+                logger.exception(f"Tracing sink {sink!r} failed")
+
+    def close(self):
+        for sink in self.sinks:
+            if hasattr(sink, "close"):
+                sink.close()
+
+    def summary(self) -> "TraceSummary":
+        return TraceSummary.from_events(self.events)
+
+
+class JSONLSink:
+    """Append one JSON object per span to `path`."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a")
+
+    def __call__(self, event: SpanEvent):
+        self._file.write(json.dumps(asdict(event)) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_events(path: Union[str, Path]) -> List[SpanEvent]:
+    """Read the events of a `JSONLSink` log."""
+    with open(path) as f:
+        return [SpanEvent(**json.loads(line)) for line in f if line.strip()]
+
+
+class OpenTelemetrySink:
+    """
+    Export spans with the OpenTelemetry API, or to a local file when it is not available.
+
+    With `opentelemetry` installed, spans are created on the globally configured
+    tracer provider (e.g. with an OTLP exporter), with the span's fields as
+    `nusacrowd.*` attributes. Otherwise, or if `fallback_only` is set, spans
+    are appended to `fallback_path` as OTLP-style JSON lines (`traceId`,
+    `spanId`, `parentSpanId`, `startTimeUnixNano`, ...).
+    """
+
+    def __init__(self, fallback_path: Union[str, Path] = "nusacrowd_spans.jsonl", service_name: str = "nusacrowd", fallback_only: bool = False):
+        self._otel_tracer = None
+        if not fallback_only:
+            try:
+                from opentelemetry import trace
+            except ImportError:
+                logger.info(f"opentelemetry is not installed, writing spans to {fallback_path}")
+            else:
+                self._otel_tracer = trace.get_tracer(service_name)
+        self.service_name = service_name
+        self._fallback = None if self._otel_tracer else JSONLSink(fallback_path)
+
+    @staticmethod
+    def get_attributes(event: SpanEvent) -> Dict:
+        attributes = {"nusacrowd.config_name": event.config_name, "nusacrowd.stage": event.stage, "nusacrowd.self_duration": event.self_duration}
+        for key in ["num_bytes", "num_examples", "split"]:
+            if getattr(event, key) is not None:
+                attributes[f"nusacrowd.{key}"] = getattr(event, key)
+        attributes.update({f"nusacrowd.{key}": value for key, value in event.attributes.items()})
+        return attributes
+
+    def __call__(self, event: SpanEvent):
+        start_ns = int(event.start_time * 1e9)
+        end_ns = start_ns + int(event.duration * 1e9)
+        if self._otel_tracer is not None:
+            span = self._otel_tracer.start_span(f"{event.stage} {event.config_name}", start_time=start_ns, attributes=self.get_attributes(event))
+            span.end(end_time=end_ns)
+            return
+        self._fallback._file.write(json.dumps({
+            "resource": {"service.name": self.service_name},
+            "traceId": event.trace_id,
+            "spanId": event.span_id,
+            "parentSpanId": event.parent_id or "",
+            "name": f"{event.stage} {event.config_name}",
+            "startTimeUnixNano": start_ns,
+            "endTimeUnixNano": end_ns,
+            "attributes": self.get_attributes(event),
+        }) + "\n")
+        self._fallback._file.flush()
+
+    def close(self):
+        if self._fallback is not None:
+            self._fallback.close()
+
+
+@dataclass
+class TraceSummary:
+    """Exclusive seconds, bytes and examples per config and stage."""
+
+    seconds: Dict[str, Dict[str, float]]
+    num_bytes: Dict[str, Dict[str, int]]
+    num_examples: Dict[str, int]
+
+    @classmethod
+    def from_events(cls, events: Iterable[SpanEvent]) -> "TraceSummary":
+        seconds = defaultdict(lambda: defaultdict(float))
+        num_bytes = defaultdict(lambda: defaultdict(int))
+        num_examples = defaultdict(int)
+        for event in events:
+            duration = event.duration if event.stage == "load_dataset" else event.self_duration
+            seconds[event.config_name][event.stage] += duration
+            if event.num_bytes:
+                num_bytes[event.config_name][event.stage] += event.num_bytes
+            if event.stage == "write_arrow" and event.num_examples:
+                num_examples[event.config_name] += event.num_examples
+        return cls(
+            seconds={config: dict(stages) for config, stages in seconds.items()},
+            num_bytes={config: dict(stages) for config, stages in num_bytes.items()},
+            num_examples=dict(num_examples),
+        )
+
+    @classmethod
+    def from_jsonl(cls, path: Union[str, Path]) -> "TraceSummary":
+        return cls.from_events(read_events(path))
+
+    def rank(self, stage: str, top: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Configs sorted by decreasing seconds spent in `stage`."""
+        ranking = sorted(
+            ((config, stages[stage]) for config, stages in self.seconds.items() if stage in stages),
+            key=lambda item: -item[1],
+        )
+        return ranking[:top]
+
+    def report(self, top: int = 10) -> str:
+        """Plain text report ranking configs by each stage."""
+        lines = []
+        for stage in STAGES:
+            ranking = self.rank(stage, top)
+            if not ranking:
+                continue
+            lines.append(f"{stage} (total {sum(seconds for _, seconds in self.rank(stage)):.2f}s)")
+            for config, seconds in ranking:
+                extra = []
+                if self.num_bytes.get(config, {}).get(stage):
+                    extra.append(f"{self.num_bytes[config][stage] / 2**20:.1f} MiB")
+                if stage == "write_arrow" and self.num_examples.get(config):
+                    extra.append(f"{self.num_examples[config]} examples")
+                lines.append(f"  {seconds:9.2f}s  {config}" + (f"  ({', '.join(extra)})" if extra else ""))
+        return "\n".join(lines)
+
+
+def _get_num_bytes(paths) -> int:
+    if isinstance(paths, dict):
+        return sum(_get_num_bytes(value) for value in paths.values())
+    if isinstance(paths, (list, tuple)):
+        return sum(_get_num_bytes(value) for value in paths)
+    if isinstance(paths, (str, Path)) and os.path.exists(paths):
+        if os.path.isdir(paths):
+            return sum(path.stat().st_size for path in Path(paths).rglob("*") if path.is_file())
+        return os.path.getsize(paths)
+    return 0
+
+
+def instrument(builder: datasets.DatasetBuilder, dl_manager: datasets.DownloadManager, tracer: Tracer, config_name: str):
+    """Wrap the stages of `builder` and `dl_manager` (instance attributes only) in spans of `tracer`."""
+
+    def wrap_paths(stage, method):
+        def wrapper(url_or_urls, *args, **kwargs):
+            with tracer.span(stage, config_name) as event:
+                paths = method(url_or_urls, *args, **kwargs)
+                event.num_bytes = _get_num_bytes(paths)
+            return paths
+
+        return wrapper
+
+    dl_manager.download = wrap_paths("download", dl_manager.download)
+    dl_manager.extract = wrap_paths("extract", dl_manager.extract)
+
+    split_generators = builder._split_generators
+
+    def traced_split_generators(*args, **kwargs):
+        with tracer.span("split_generators", config_name):
+            return split_generators(*args, **kwargs)
+
+    generate_examples = builder._generate_examples
+
+    def traced_generate_examples(**gen_kwargs):
+        # time spent inside the generator only; the rest of `_prepare_split` is Arrow encoding and writing
+        examples = generate_examples(**gen_kwargs)
+        duration, num_examples = 0.0, 0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    example = next(examples)
+                except StopIteration:
+                    break
+                finally:
+                    duration += time.perf_counter() - start
+                num_examples += 1
+                yield example
+        finally:
+            tracer.record("generate_examples", config_name, duration, num_examples=num_examples)
+
+    prepare_split = builder._prepare_split
+
+    def traced_prepare_split(split_generator, *args, **kwargs):
+        with tracer.span("write_arrow", config_name, split=str(split_generator.name)) as event:
+            prepare_split(split_generator, *args, **kwargs)
+            event.num_bytes = split_generator.split_info.num_bytes
+            event.num_examples = split_generator.split_info.num_examples
+
+    builder._split_generators = traced_split_generators
+    builder._generate_examples = traced_generate_examples
+    builder._prepare_split = traced_prepare_split
+
+
+def load_dataset(
+    load_dataset_kwargs: Dict,
+    tracer: Tracer,
+    download_manager_factory: Callable[[datasets.DatasetBuilder, Optional[datasets.DownloadConfig]], datasets.DownloadManager] = get_download_manager,
+):
+    """
+    `datasets.load_dataset` with every stage traced.
+
+    :param load_dataset_kwargs: `datasets.load_dataset` arguments, `name` is used as config name of the spans
+    :param download_manager_factory: creates the download manager from the builder and download config
+    """
+    load_dataset_kwargs = dict(load_dataset_kwargs)
+    config_name = load_dataset_kwargs.get("name") or str(load_dataset_kwargs.get("path"))
+    if load_dataset_kwargs.get("streaming"):
+        with tracer.span("load_dataset", config_name, streaming=True):
+            return datasets.load_dataset(**load_dataset_kwargs)
+
+    split = load_dataset_kwargs.pop("split", None)
+    verification_mode = load_dataset_kwargs.pop("verification_mode", None)
+    keep_in_memory = load_dataset_kwargs.pop("keep_in_memory", None)
+    num_proc = load_dataset_kwargs.pop("num_proc", None)
+    load_dataset_kwargs.pop("streaming", None)
+
+    with tracer.span("load_dataset", config_name):
+        with tracer.span("load_builder", config_name):
+            builder = datasets.load_dataset_builder(**load_dataset_kwargs)
+        download_config = load_dataset_kwargs.get("download_config") or get_download_config(builder, load_dataset_kwargs.get("download_mode"))
+        dl_manager = download_manager_factory(builder, download_config)
+        instrument(builder, dl_manager, tracer, config_name)
+        builder.download_and_prepare(
+            dl_manager=dl_manager,
+            download_mode=load_dataset_kwargs.get("download_mode"),
+            verification_mode=verification_mode,
+            num_proc=num_proc,
+        )
+        with tracer.span("as_dataset", config_name) as event:
+            if keep_in_memory is None:
+                keep_in_memory = datasets.utils.info_utils.is_small_dataset(builder.info.dataset_size)
+            dataset = builder.as_dataset(split=split, verification_mode=verification_mode, in_memory=keep_in_memory)
+            event.num_bytes = builder.info.dataset_size
+    return dataset
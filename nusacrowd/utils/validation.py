@@ -0,0 +1,246 @@
+"""
+Vectorized integrity checks of nusantara datasets (ids, references and offsets).
+
+All checks run on the Arrow tables of the prepared splits: nested columns are
+flattened and compared in bulk instead of walking every example in Python.
+"""
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .arrow_utils import as_array, code_points, flatten_path, is_list_type
+
+DEFAULT_BATCH_SIZE = 1000
+
+# (path of the referencing ids, paths of the elements that may be referenced)
+KB_REFERENCES = [
+    ("events.arguments.ref_id", ["entities.id", "events.id"]),
+    ("coreferences.entity_ids", ["entities.id"]),
+    ("relations.arg1_id", ["entities.id"]),
+    ("relations.arg2_id", ["entities.id"]),
+]
+
+# (path of the elements, path of their `text`/`offsets` relative to the element)
+KB_OFFSET_FEATURES = {
+    "passages": "passages",
+    "entities": "entities",
+    "events": "events.trigger",
+}
+
+
+@dataclass
+class OffsetMismatch:
+    row: int
+    element_id: Optional[str]
+    text: str
+    text_by_offset: str
+
+    def __str__(self):
+        return f"Row:{self.row} - element:{self.element_id} - text:`{self.text}` != text_by_offset:`{self.text_by_offset}`"
+
+
+def iter_id_paths(arrow_type: pa.DataType, prefix: str = "") -> Iterator[str]:
+    """Yield the dotted path of every scalar `id` field, at any nesting level."""
+    while is_list_type(arrow_type):
+        arrow_type = arrow_type.value_type
+    if not pa.types.is_struct(arrow_type):
+        return
+    for arrow_field in arrow_type:
+        path = f"{prefix}{arrow_field.name}"
+        if arrow_field.name == "id" and not is_list_type(arrow_field.type) and not pa.types.is_struct(arrow_field.type):
+            yield path
+        else:
+            yield from iter_id_paths(arrow_field.type, f"{path}.")
+
+
+def _table_id_paths(table: pa.Table) -> List[str]:
+    return list(iter_id_paths(pa.struct(list(table.schema))))
+
+
+def find_duplicate_ids(table: pa.Table) -> List[Tuple[str, List[int]]]:
+    """
+    Find ids that are not globally unique across a split, at any nesting level.
+
+    :param table: pyarrow Table of a split
+    :return: list of (duplicated id, rows it appears in), ordered by first offending row
+    """
+    id_values, id_rows = [], []
+    for path in _table_id_paths(table):
+        values, rows = flatten_path(table, path)
+        id_values.append(pc.cast(values, pa.string()))
+        id_rows.append(rows)
+    if len(id_values) == 0:
+        return []
+    values = pa.concat_arrays(id_values)
+    rows = np.concatenate(id_rows)
+
+    counts = pc.value_counts(values)
+    duplicated = pc.filter(counts.field("values"), pc.greater(counts.field("counts"), 1))
+    if len(duplicated) == 0:
+        return []
+
+    mask = pc.is_in(values, value_set=duplicated).to_numpy(zero_copy_only=False)
+    duplicates = {}
+    for value, row in zip(values.filter(pa.array(mask)).to_pylist(), rows[mask]):
+        duplicates.setdefault(value, []).append(int(row))
+    return sorted(duplicates.items(), key=lambda item: item[1][0])
+
+
+def _row_keys(values: pa.Array, rows: np.ndarray) -> pa.Array:
+    # ids only have to exist within their own example, so we key them by row
+    return pc.binary_join_element_wise(pc.cast(pa.array(rows), pa.string()), pc.cast(values, pa.string()), "\x1f")
+
+
+def find_missing_references(table: pa.Table, references=KB_REFERENCES) -> List[Tuple[int, str, str]]:
+    """
+    Find referenced ids (relation args, coreference entity ids, event arguments)
+    that do not exist in the example they belong to.
+
+    :param table: pyarrow Table of a split in the KB schema
+    :param references: list of (referencing path, referable paths)
+    :return: list of (row, referencing path, missing id), ordered by row
+    """
+    missing = []
+    for ref_path, target_paths in references:
+        if ref_path.split(".")[0] not in table.column_names:
+            continue
+        ref_values, ref_rows = flatten_path(table, ref_path)
+        if len(ref_values) == 0:
+            continue
+        existing = [_row_keys(*flatten_path(table, path)) for path in target_paths if path.split(".")[0] in table.column_names]
+        existing = pa.concat_arrays(existing) if existing else pa.array([], type=pa.string())
+        found = pc.is_in(_row_keys(ref_values, ref_rows), value_set=existing).to_numpy(zero_copy_only=False)
+        for row, ref_id in zip(ref_rows[~found], ref_values.filter(pa.array(~found)).to_pylist()):
+            missing.append((int(row), ref_path, ref_id))
+    return sorted(missing, key=lambda item: item[0])
+
+
+def get_example_texts(table: pa.Table) -> pa.Array:
+    """Concatenate the passage texts of every KB example, like `" ".join(...)` per example."""
+    values, rows = flatten_path(table, "passages.text")
+    offsets = np.zeros(table.num_rows + 1, dtype=np.int32)
+    np.cumsum(np.bincount(rows, minlength=table.num_rows), out=offsets[1:])
+    per_row = pa.ListArray.from_arrays(pa.array(offsets), pc.fill_null(values, ""))
+    return pc.binary_join(per_row, " ")
+
+
+def _ragged_positions(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Positions `starts[i] + k` for every `k < lengths[i]`, concatenated."""
+    total = int(lengths.sum())
+    span_starts = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return span_starts + np.arange(total, dtype=np.int64)
+
+
+def compare_substrings(doc_chars, doc_starts, doc_index, begin, end, text_chars, text_starts) -> np.ndarray:
+    """
+    Vectorized `document[begin:end] == text` over many spans.
+
+    :param doc_chars, doc_starts: output of `code_points` for the documents
+    :param doc_index: document of every span
+    :param begin, end: span offsets within their document
+    :param text_chars, text_starts: output of `code_points` for the expected texts
+    :return: boolean array, True where the substring matches its text
+    """
+    doc_lengths = doc_starts[doc_index + 1] - doc_starts[doc_index]
+    # mimic python slicing semantics for out-of-range offsets
+    begin = np.clip(begin, 0, doc_lengths)
+    end = np.clip(end, begin, doc_lengths)
+    span_lengths = end - begin
+    text_lengths = np.diff(text_starts)
+
+    matches = span_lengths == text_lengths
+    to_compare = np.flatnonzero(matches & (span_lengths > 0))
+    if len(to_compare) == 0:
+        return matches
+
+    lengths = span_lengths[to_compare]
+    doc_pos = _ragged_positions(doc_starts[doc_index[to_compare]] + begin[to_compare], lengths)
+    text_pos = _ragged_positions(text_starts[to_compare], lengths)
+    different = (doc_chars[doc_pos] != text_chars[text_pos]).astype(np.int64)
+    segment_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    matches[to_compare] = np.add.reduceat(different, segment_starts) == 0
+    return matches
+
+
+def find_offset_mismatches(table: pa.Table, element_path: str, span_path: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[OffsetMismatch]:
+    """
+    Check that the text extracted via offsets matches the text of each KB element.
+
+    Rows are processed in batches; within a batch every span is checked at once.
+
+    :param table: pyarrow Table of a split in the KB schema
+    :param element_path: elements to check, e.g. `entities`
+    :param span_path: path holding `text` and `offsets`, defaults to `element_path` (`events.trigger` for events)
+    :param batch_size: number of rows per batch
+    :return: generator of mismatches, ordered by row
+    """
+    span_path = span_path or element_path
+    for batch_start in range(0, table.num_rows, batch_size):
+        batch = table.slice(batch_start, batch_size)
+        yield from _batch_offset_mismatches(batch, batch_start, element_path, span_path)
+
+
+def _batch_offset_mismatches(batch: pa.Table, batch_start: int, element_path: str, span_path: str) -> Iterator[OffsetMismatch]:
+    doc_chars, doc_starts = code_points(get_example_texts(batch))
+
+    element_ids, _ = flatten_path(batch, f"{element_path}.id")
+    offsets, element_rows = flatten_path(batch, f"{span_path}.offsets", flatten_leaf=False)
+    texts, _ = flatten_path(batch, f"{span_path}.text", flatten_leaf=False)
+    offsets, texts = as_array(offsets), as_array(texts)
+    if len(offsets) == 0:
+        return
+
+    # one span per (element, offset pair); the matching text has the same index within the element
+    span_element = pc.list_parent_indices(offsets).to_numpy(zero_copy_only=False)
+    pairs = pc.list_flatten(offsets)
+    span_position = np.arange(len(span_element)) - np.repeat(_list_starts(offsets), _list_lengths(offsets))
+    flat_pairs = pc.list_flatten(pairs).to_numpy(zero_copy_only=False).astype(np.int64)
+    pair_lengths = _list_lengths(pairs)
+    if np.any(pair_lengths != 2):
+        raise ValueError(f"All offsets in `{span_path}` must be in the form [(lo1, hi1), ...]")
+    begin, end = flat_pairs[0::2], flat_pairs[1::2]
+
+    text_lengths = _list_lengths(texts)
+    has_text = span_position < text_lengths[span_element]
+    text_index = np.where(has_text, _list_starts(texts)[span_element] + span_position, 0)
+    flat_texts = pc.list_flatten(texts)
+    expected = pc.if_else(pa.array(has_text), flat_texts.take(pa.array(text_index)) if len(flat_texts) else pa.nulls(len(has_text), pa.string()), pa.scalar(""))
+    text_chars, text_starts = code_points(expected)
+
+    matches = compare_substrings(doc_chars, doc_starts, element_rows[span_element], begin, end, text_chars, text_starts)
+    for span in np.flatnonzero(~matches):
+        row = int(element_rows[span_element[span]])
+        doc_text = doc_chars[doc_starts[row]:doc_starts[row + 1]].tobytes().decode("utf-32-le")
+        yield OffsetMismatch(
+            row=batch_start + row,
+            element_id=element_ids[int(span_element[span])].as_py(),
+            text=expected[int(span)].as_py(),
+            text_by_offset=doc_text[begin[span]:end[span]],
+        )
+
+
+def find_offset_count_mismatches(table: pa.Table, element_path: str, span_path: Optional[str] = None) -> List[Tuple[int, str, int, int]]:
+    """
+    Find elements whose number of texts differs from their number of offsets.
+
+    :return: list of (row, element id, number of texts, number of offsets)
+    """
+    span_path = span_path or element_path
+    element_ids, rows = flatten_path(table, f"{element_path}.id")
+    offsets, _ = flatten_path(table, f"{span_path}.offsets", flatten_leaf=False)
+    texts, _ = flatten_path(table, f"{span_path}.text", flatten_leaf=False)
+    n_offsets, n_texts = _list_lengths(as_array(offsets)), _list_lengths(as_array(texts))
+    different = np.flatnonzero(n_offsets != n_texts)
+    return [(int(rows[i]), element_ids[int(i)].as_py(), int(n_texts[i]), int(n_offsets[i])) for i in different]
+
+
+def _list_lengths(values: pa.Array) -> np.ndarray:
+    return pc.fill_null(pc.list_value_length(values), 0).to_numpy(zero_copy_only=False).astype(np.int64)
+
+
+def _list_starts(values: pa.Array) -> np.ndarray:
+    lengths = _list_lengths(values)
+    return np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
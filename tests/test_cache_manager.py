@@ -0,0 +1,169 @@
+"""
+Tests of the LRU eviction of `nusacrowd.utils.cache_manager` on a synthetic cache directory.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from nusacrowd.utils import cache_manager
+from nusacrowd.utils.cache_manager import BUDGET_ENV_VARIABLE, CacheManager, enforce_budget_from_env, record_access
+from nusacrowd.utils.locking import get_lock_path
+
+KIB = 1 << 10
+
+
+class TestCacheManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_root = Path(self.tmp_dir.name)
+        # config name -> (arrow KiB, downloaded URLs), least recently used first
+        self.configs = {
+            "shared_a_source": (10, ["https://example.com/shared.zip", "https://example.com/a.zip"]),
+            "shared_b_source": (10, ["https://example.com/shared.zip"]),
+            "single_source": (10, ["https://example.com/single.zip"]),
+            "recent_source": (10, []),
+        }
+        self.download_sizes = {"https://example.com/shared.zip": 40, "https://example.com/a.zip": 5, "https://example.com/single.zip": 20}
+        for url, size in self.download_sizes.items():
+            self.download_path(url).parent.mkdir(parents=True, exist_ok=True)
+            self.download_path(url).write_bytes(b"\0" * size * KIB)
+            self.download_path(url).with_suffix(".json").write_text(json.dumps({"url": url, "etag": None}))
+        now = time.time()
+        for age, (config_name, (arrow_size, urls)) in enumerate(reversed(self.configs.items())):
+            arrow_dir = self.arrow_dir(config_name)
+            arrow_dir.mkdir(parents=True)
+            (arrow_dir / "dataset_info.json").write_text(json.dumps({"download_checksums": {url: {} for url in urls}}))
+            (arrow_dir / "toy-train.arrow").write_bytes(b"\0" * arrow_size * KIB)
+            record_access(config_name, self.cache_root)
+            access_time = now - 3600 * (age + 1)
+            os.utime(self.cache_root / cache_manager.ACCESS_DIR_NAME / config_name, (access_time, access_time))
+            os.utime(arrow_dir, (access_time, access_time))
+        self.clear_process_state()
+
+    def tearDown(self):
+        self.clear_process_state()
+        self.tmp_dir.cleanup()
+
+    def clear_process_state(self):
+        cache_manager._loaded_configs.clear()
+        cache_manager._running_totals.clear()
+        cache_manager._counted_configs.clear()
+
+    def arrow_dir(self, config_name: str) -> Path:
+        return self.cache_root / "toy" / config_name / "1.0.0" / "0123456789abcdef"
+
+    def download_path(self, url: str) -> Path:
+        return self.cache_root / "downloads" / hashlib.sha256(url.encode()).hexdigest()
+
+    def names(self, entries):
+        return [entry.config_name for entry in entries]
+
+    def test_inventory_counts_shared_downloads_once(self):
+        manager = CacheManager(self.cache_root)
+        entries = {entry.config_name: entry for entry in manager.inventory()}
+        self.assertEqual(sorted(entries), sorted(self.configs))
+        _, urls = self.configs["shared_a_source"]
+        files = [path for url in urls for path in (self.download_path(url), self.download_path(url).with_suffix(".json"))]
+        self.assertEqual(entries["shared_a_source"].download_bytes, sum(os.path.getsize(path) for path in files))
+        total_arrow = sum(entry.arrow_bytes for entry in entries.values())
+        total_downloads = sum(os.path.getsize(path) for path in (self.cache_root / "downloads").iterdir())
+        self.assertEqual(manager.total_bytes(list(entries.values())), total_arrow + total_downloads)
+
+    def test_evict_keeps_downloads_still_used(self):
+        manager = CacheManager(self.cache_root)
+        manager.evict(["shared_a_source"])
+        self.assertFalse(self.arrow_dir("shared_a_source").exists())
+        self.assertFalse(self.download_path("https://example.com/a.zip").exists())
+        self.assertTrue(self.download_path("https://example.com/shared.zip").exists())
+
+        manager.evict(["shared_b_source"])
+        self.assertFalse(self.download_path("https://example.com/shared.zip").exists())
+        self.assertTrue(self.download_path("https://example.com/single.zip").exists())
+
+    def test_plan_eviction_least_recently_used(self):
+        manager = CacheManager(self.cache_root)
+        entries = manager.inventory()
+        total = manager.total_bytes(entries)
+        # evicting shared_a frees its arrow cache and a.zip, but not shared.zip
+        self.assertEqual(self.names(manager.plan_eviction(total - 10 * KIB, entries=entries)), ["shared_a_source"])
+        self.assertEqual(self.names(manager.plan_eviction(total - 20 * KIB, entries=entries)), ["shared_a_source", "shared_b_source"])
+        self.assertEqual(self.names(manager.plan_eviction(0, entries=entries)), list(self.configs))
+
+    def test_pinned_and_locked_not_evicted(self):
+        get_lock_path("shared_b_source", self.cache_root).parent.mkdir(parents=True)
+        get_lock_path("shared_b_source", self.cache_root).write_text("{}")
+        manager = CacheManager(self.cache_root, pinned_configs=["shared_a_source"])
+        with self.assertLogs(cache_manager.logger, "WARNING"):
+            planned = manager.enforce_budget(0, protect=["recent_source"])
+        self.assertEqual(self.names(planned), ["single_source"])
+        self.assertTrue(self.arrow_dir("shared_a_source").exists())
+        self.assertTrue(self.arrow_dir("shared_b_source").exists())
+        self.assertTrue(self.download_path("https://example.com/shared.zip").exists())
+        self.assertFalse(self.download_path("https://example.com/single.zip").exists())
+
+    def test_dry_run(self):
+        manager = CacheManager(self.cache_root)
+        planned = manager.enforce_budget(0, dry_run=True)
+        self.assertEqual(self.names(planned), list(self.configs))
+        for config_name in self.configs:
+            self.assertTrue(self.arrow_dir(config_name).exists())
+        for url in self.download_sizes:
+            self.assertTrue(self.download_path(url).exists())
+
+    def test_budget_from_env_protects_configs_loaded_by_this_process(self):
+        record_access("shared_a_source", self.cache_root)
+        record_access("recent_source", self.cache_root)
+        with mock.patch.dict(os.environ, {BUDGET_ENV_VARIABLE: "1KB"}), self.assertLogs(cache_manager.logger, "WARNING"):
+            enforce_budget_from_env(self.cache_root)
+        self.assertEqual(sorted(self.names(CacheManager(self.cache_root).inventory())), ["recent_source", "shared_a_source"])
+
+    def test_budget_from_env_unset(self):
+        with mock.patch.dict(os.environ), mock.patch.object(CacheManager, "inventory") as inventory:
+            os.environ.pop(BUDGET_ENV_VARIABLE, None)
+            enforce_budget_from_env(self.cache_root, protect=["single_source"])
+        inventory.assert_not_called()
+
+    def test_budget_from_env_keeps_running_total(self):
+        total = CacheManager(self.cache_root).total_bytes(CacheManager(self.cache_root).inventory())
+        with mock.patch.object(CacheManager, "inventory", autospec=True, side_effect=CacheManager.inventory) as inventory:
+            with mock.patch.dict(os.environ, {BUDGET_ENV_VARIABLE: str(total + 30 * KIB)}):
+                # the first load inventories the whole cache
+                enforce_budget_from_env(self.cache_root, protect=["recent_source"])
+                self.assertEqual(inventory.call_args_list, [mock.call(mock.ANY)])
+                self.assertEqual(cache_manager._running_totals[self.cache_root.resolve()], total)
+
+                # loading a counted config does not inventory
+                enforce_budget_from_env(self.cache_root, protect=["recent_source"])
+                self.assertEqual(inventory.call_count, 1)
+
+                # a new config is inventoried alone and added to the total, its shared download counted again
+                arrow_dir = self.arrow_dir("new_source")
+                arrow_dir.mkdir(parents=True)
+                (arrow_dir / "dataset_info.json").write_text(json.dumps({"download_checksums": {"https://example.com/single.zip": {}}}))
+                (arrow_dir / "toy-train.arrow").write_bytes(b"\0" * 5 * KIB)
+                enforce_budget_from_env(self.cache_root, protect=["new_source"])
+                self.assertEqual(inventory.call_args_list[1:], [mock.call(mock.ANY, {"new_source"})])
+                new_bytes = CacheManager(self.cache_root).inventory(["new_source"])[0].num_bytes
+                self.assertEqual(cache_manager._running_totals[self.cache_root.resolve()], total + new_bytes)
+                for config_name in self.configs:
+                    self.assertTrue(self.arrow_dir(config_name).exists())
+
+                # exceeding the budget inventories the whole cache and evicts the least recently used config
+                arrow_dir = self.arrow_dir("newer_source")
+                arrow_dir.mkdir(parents=True)
+                (arrow_dir / "dataset_info.json").write_text(json.dumps({"download_checksums": {}}))
+                (arrow_dir / "toy-train.arrow").write_bytes(b"\0" * 30 * KIB)
+                enforce_budget_from_env(self.cache_root, protect=["newer_source"])
+                self.assertEqual(inventory.call_args_list[3:], [mock.call(mock.ANY, {"newer_source"}), mock.call(mock.ANY)])
+        entries = CacheManager(self.cache_root).inventory()
+        self.assertNotIn("shared_a_source", self.names(entries))
+        self.assertEqual(cache_manager._running_totals[self.cache_root.resolve()], CacheManager(self.cache_root).total_bytes(entries))
+
+
+if __name__ == "__main__":
+    unittest.main()
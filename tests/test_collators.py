@@ -0,0 +1,152 @@
+"""
+Tests of the schema collators and the length-bucketing sampler of `nusacrowd.utils.collators`.
+"""
+import importlib.util
+import tempfile
+import unittest
+from pathlib import Path
+
+import datasets
+import numpy as np
+import pyarrow as pa
+
+from nusacrowd.utils.collators import LABEL_PAD_ID, SCHEMA_TO_COLLATE_COLUMNS, LengthBucketSampler, SchemaCollator, compute_length_index, iter_batches, pad_list_array, padding_ratio
+from nusacrowd.utils.constants import SCHEMA_TO_FEATURES
+
+
+def make_dataset(schema: str, columns: dict) -> datasets.Dataset:
+    return datasets.Dataset.from_dict({"id": [str(i) for i in range(len(next(iter(columns.values()))))], **columns}, features=SCHEMA_TO_FEATURES[schema])
+
+
+def collate(collator: SchemaCollator, dataset: datasets.Dataset):
+    [batch] = iter_batches(dataset, collator, batch_size=len(dataset))
+    return batch
+
+
+class TestSchemaCollator(unittest.TestCase):
+    def test_pad_list_array(self):
+        values = pa.array([[1, 2, 3], [4], [], None], type=pa.list_(pa.int64()))
+        padded, mask = pad_list_array(values, pad_value=-1)
+        np.testing.assert_array_equal(padded, [[1, 2, 3], [4, -1, -1], [-1, -1, -1], [-1, -1, -1]])
+        np.testing.assert_array_equal(mask, [[True] * 3, [True, False, False], [False] * 3, [False] * 3])
+
+        padded, mask = pad_list_array(values, pad_value=-1, max_length=2)
+        np.testing.assert_array_equal(padded, [[1, 2], [4, -1], [-1, -1], [-1, -1]])
+        np.testing.assert_array_equal(mask, [[True, True], [True, False], [False, False], [False, False]])
+
+    def test_seq_label(self):
+        dataset = make_dataset("SEQ_LABEL", {"tokens": [["Budi", "pergi", "ke", "pasar"], ["Siti"]], "labels": [[1, 0, 0, 0], [1]]})
+        batch = collate(SchemaCollator("SEQ_LABEL", token_to_id=len, pad_id=0), dataset)
+        np.testing.assert_array_equal(batch["tokens"], [[4, 5, 2, 5], [4, 0, 0, 0]])
+        np.testing.assert_array_equal(batch["tokens_mask"], [[True] * 4, [True, False, False, False]])
+        np.testing.assert_array_equal(batch["labels"], [[1, 0, 0, 0], [1, LABEL_PAD_ID, LABEL_PAD_ID, LABEL_PAD_ID]])
+
+        # without `token_to_id` tokens are padded strings
+        batch = collate(SchemaCollator("SEQ_LABEL"), dataset)
+        self.assertEqual(batch["tokens"].tolist(), [["Budi", "pergi", "ke", "pasar"], ["Siti", "", "", ""]])
+
+    def test_text(self):
+        dataset = make_dataset("TEXT", {"text": ["saya suka", "tidak"], "label": [1, 0]})
+        batch = collate(SchemaCollator("TEXT", encode=lambda text: [len(word) for word in text.split()], pad_id=0), dataset)
+        self.assertEqual(set(batch), {"text", "text_mask", "label"})
+        np.testing.assert_array_equal(batch["text"], [[4, 4], [5, 0]])
+        np.testing.assert_array_equal(batch["label"], [1, 0])
+
+    def test_qa(self):
+        dataset = make_dataset("QA", {
+            "question_id": ["q0", "q1"],
+            "document_id": ["d0", "d0"],
+            "question": ["Siapa?", "Di mana?"],
+            "type": ["multiple_choice", "multiple_choice"],
+            "choices": [["Budi", "Siti"], ["pasar", "rumah"]],
+            "context": ["Budi pergi ke pasar.", "Budi pergi ke pasar."],
+            "answer": [["Budi"], ["pasar"]],
+        })
+        batch = collate(SchemaCollator("QA", encode=lambda text: [len(text)]), dataset)
+        self.assertEqual(set(batch), {"context", "context_mask", "question", "question_mask", "choices", "answer"})
+        self.assertEqual(batch["choices"].shape, (2,))
+        self.assertEqual(batch["choices"].tolist(), [["Budi", "Siti"], ["pasar", "rumah"]])
+        self.assertEqual(batch["answer"].tolist(), [["Budi"], ["pasar"]])
+
+    def test_image_text(self):
+        dataset = make_dataset("IMTEXT", {
+            "image_paths": [["a.jpg"], ["b.jpg", "c.jpg"]],
+            "texts": ["gambar satu", "gambar dua"],
+            "metadata": [{"context": "", "labels": [0]}, {"context": "", "labels": [1, 0]}],
+        })
+        batch = collate(SchemaCollator("IMTEXT"), dataset)
+        self.assertEqual(set(batch), {"texts", "image_paths", "metadata.labels", "metadata.labels_mask"})
+        self.assertEqual(batch["image_paths"].tolist(), [["a.jpg"], ["b.jpg", "c.jpg"]])
+        np.testing.assert_array_equal(batch["metadata.labels"], [[0, LABEL_PAD_ID], [1, 0]])
+
+    @unittest.skipUnless(importlib.util.find_spec("soundfile"), "decoding audio requires soundfile")
+    def test_speech_to_speech(self):
+        import soundfile as sf
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = []
+            for i, length in enumerate([160, 320]):
+                paths.append(str(Path(tmp_dir) / f"{i}.wav"))
+                sf.write(paths[-1], np.zeros(length, dtype=np.float32), 16_000)
+            metadata = {"name": "", "speaker_age": 0, "speaker_gender": ""}
+            dataset = make_dataset("S2S", {
+                "path_1": paths, "audio_1": paths, "text_1": ["satu", "dua"], "metadata_1": [metadata] * 2,
+                "path_2": paths[::-1], "audio_2": paths[::-1], "text_2": ["siji", "loro"], "metadata_2": [metadata] * 2,
+            })
+            batch = collate(SchemaCollator("S2S"), dataset)
+        self.assertEqual(batch["audio_1"].shape, (2, 320))
+        np.testing.assert_array_equal(batch["audio_1_mask"].sum(axis=1), [160, 320])
+        np.testing.assert_array_equal(batch["audio_2_mask"].sum(axis=1), [320, 160])
+
+    def test_columns_of_every_schema_exist(self):
+        for schema, columns in SCHEMA_TO_COLLATE_COLUMNS.items():
+            for column in columns:
+                feature = SCHEMA_TO_FEATURES[schema]
+                for name in column.split("."):
+                    feature = feature[name]
+
+    def test_kb_not_supported(self):
+        with self.assertRaises(ValueError):
+            SchemaCollator("KB")
+
+
+class TestLengthBucketSampler(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.lengths = np.clip(rng.lognormal(mean=3.0, sigma=0.9, size=1000).astype(np.int64), 1, 500)
+
+    def test_batches_from_same_bucket(self):
+        batch_size, multiplier, seed, epoch = 8, 4, 3, 2
+        sampler = LengthBucketSampler(self.lengths, batch_size, bucket_size_multiplier=multiplier, seed=seed)
+        sampler.set_epoch(epoch)
+        batches = list(sampler)
+
+        # bucket of every index, from the permutation the sampler draws first
+        permutation = np.random.default_rng(seed + epoch).permutation(len(self.lengths))
+        bucket_of = np.empty(len(self.lengths), dtype=np.int64)
+        bucket_of[permutation] = np.arange(len(self.lengths)) // (batch_size * multiplier)
+
+        self.assertEqual(len(batches), len(sampler))
+        self.assertEqual(sorted(np.concatenate(batches).tolist()), list(range(len(self.lengths))))
+        for batch in batches:
+            self.assertEqual(len(set(bucket_of[batch].tolist())), 1)
+            self.assertLessEqual(len(batch), batch_size)
+
+    def test_less_padding_than_sequential(self):
+        batch_size = 16
+        sequential = [np.arange(i, min(i + batch_size, len(self.lengths))) for i in range(0, len(self.lengths), batch_size)]
+        bucketed = list(LengthBucketSampler(self.lengths, batch_size, bucket_size_multiplier=10))
+        self.assertLess(padding_ratio(self.lengths, bucketed), padding_ratio(self.lengths, sequential) / 2)
+
+    def test_drop_last(self):
+        batches = list(LengthBucketSampler(self.lengths[:100], 16, drop_last=True))
+        self.assertEqual(len(batches), 6)
+        self.assertTrue(all(len(batch) == 16 for batch in batches))
+
+    def test_length_index(self):
+        dataset = make_dataset("TEXT", {"text": ["satu dua tiga", "empat", ""], "label": [0, 1, 0]})
+        np.testing.assert_array_equal(compute_length_index(dataset, "TEXT"), [3, 1, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+Tests of the benchmark contamination index of `nusacrowd.utils.contamination`.
+"""
+import tempfile
+import unittest
+from pathlib import Path
+
+import datasets
+
+from nusacrowd.utils.contamination import ContaminationIndex, scan
+from nusacrowd.utils.schemas import text_features
+
+SHARED = "saya pergi ke pasar membeli sayur dan buah segar bersama ibu pagi ini"
+ONLY_A = "anak anak bermain bola di lapangan dekat sekolah sampai sore hari tadi"
+ONLY_B = "hujan turun dengan deras sehingga jalan di depan rumah menjadi banjir"
+CLEAN = "kucing itu tidur di atas kursi"
+
+
+def text_split(texts):
+    return datasets.Dataset.from_dict({"id": [str(i) for i in range(len(texts))], "text": texts, "label": [0] * len(texts)}, features=text_features())
+
+
+class TestContaminationIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index_path = Path(self.tmp_dir.name) / "index"
+        # both configs have the shared sentence in their test split
+        benchmark = {
+            "toy_a_nusantara_text": datasets.DatasetDict({"test": text_split([SHARED, ONLY_A])}),
+            "toy_b_nusantara_text": datasets.DatasetDict({"test": text_split([ONLY_B, SHARED]), "train": text_split([CLEAN * 3])}),
+        }
+        self.index = ContaminationIndex.from_datasets(benchmark)
+        self.index.save(self.index_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def matched_configs(self, index, text):
+        return {index.source_names[source] for source in index.match(text)}
+
+    def test_shared_ngram_matches_every_config(self):
+        for index in (self.index, ContaminationIndex.load(self.index_path)):
+            self.assertEqual(self.matched_configs(index, f"kemarin {SHARED}."), {"toy_a_nusantara_text", "toy_b_nusantara_text"})
+            self.assertEqual(self.matched_configs(index, ONLY_A), {"toy_a_nusantara_text"})
+            self.assertEqual(self.matched_configs(index, ONLY_B), {"toy_b_nusantara_text"})
+            self.assertEqual(self.matched_configs(index, CLEAN * 3), set())
+
+    def test_scan_reports_every_config(self):
+        corpus = [{"text": text} for text in [CLEAN, SHARED, ONLY_B, f"{ONLY_A} {ONLY_B}"]]
+        report = scan(corpus, self.index_path, chunk_size=2)
+        self.assertEqual(report.keep_mask.tolist(), [True, False, False, False])
+        self.assertEqual(report.contaminated, {"toy_a_nusantara_text": [1, 3], "toy_b_nusantara_text": [1, 2, 3]})
+
+
+if __name__ == "__main__":
+    unittest.main()
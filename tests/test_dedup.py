@@ -0,0 +1,79 @@
+"""
+Tests of the persistent MinHash-LSH index of `nusacrowd.utils.dedup`.
+"""
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from nusacrowd.utils.dedup import MinHashLSHIndex, MinHasher, deduplicate
+
+
+def make_corpus(num_documents: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    words = [f"kata{i}" for i in range(2000)]
+    documents = [" ".join(words[i] for i in rng.integers(len(words), size=40)) for _ in range(num_documents)]
+    # every fifth document repeats an earlier one
+    return [{"text": documents[i - 1] if i % 5 == 4 else documents[i]} for i in range(num_documents)]
+
+
+class TestDeduplicate(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index_path = Path(self.tmp_dir.name) / "index"
+        self.corpus = make_corpus(100)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_duplicates_removed(self):
+        mask = deduplicate({"toy/train": self.corpus}, self.index_path, chunk_size=16)["toy/train"]
+        self.assertEqual(mask.tolist(), [i % 5 != 4 for i in range(len(self.corpus))])
+
+    def test_same_corpus_twice(self):
+        first = deduplicate({"toy/train": self.corpus}, self.index_path, chunk_size=16)["toy/train"]
+        second = deduplicate({"toy/train": self.corpus}, self.index_path, chunk_size=16)["toy/train"]
+        np.testing.assert_array_equal(second, first)
+        np.testing.assert_array_equal(np.load(self.index_path / "masks" / "toy__train.npy"), first)
+        self.assertEqual(len(MinHashLSHIndex(self.index_path)), int(first.sum()))
+
+    def test_runs_merged_logarithmically(self):
+        expected = deduplicate({"toy/train": self.corpus}, Path(self.tmp_dir.name) / "reference", chunk_size=16)["toy/train"]
+
+        index = MinHashLSHIndex(self.index_path, merge_every=3)
+        index.begin("toy/train")
+        keep = np.concatenate([
+            index.query_and_add(MinHasher(**index.params).band_hashes([example["text"] for example in self.corpus[start:start + 16]]))
+            for start in range(0, len(self.corpus), 16)
+        ])
+        index.commit("toy/train", keep)
+        np.testing.assert_array_equal(keep, expected)
+
+        # run sizes decrease, so there are at most log2(number of flushes) + 1 runs
+        sizes = [np.load(self.index_path / shard, mmap_mode="r").shape[1] for shard in index.meta["shards"]]
+        self.assertEqual(sum(sizes), int(expected.sum()))
+        self.assertEqual(sizes, sorted(sizes, reverse=True))
+        self.assertLessEqual(len(sizes), int(np.log2(expected.sum() / 3)) + 1)
+        self.assertEqual(sorted(path.name for path in self.index_path.glob("bands_*.npy")), sorted(index.meta["shards"]))
+        for shard in index.meta["shards"]:
+            run = np.load(self.index_path / shard)
+            self.assertTrue((np.diff(run, axis=1) >= 0).all())
+
+    def test_resume_interrupted_run(self):
+        expected = deduplicate({"toy/train": self.corpus}, Path(self.tmp_dir.name) / "reference", chunk_size=16)["toy/train"]
+
+        # interrupted after some shards of the corpus were written
+        index = MinHashLSHIndex(self.index_path, merge_every=10)
+        index.begin("toy/train")
+        index.query_and_add(MinHasher(**index.params).band_hashes([example["text"] for example in self.corpus[:50]]))
+        self.assertGreater(len(index.meta["shards"]), 0)
+        del index
+
+        mask = deduplicate({"toy/train": self.corpus}, self.index_path, chunk_size=16)["toy/train"]
+        np.testing.assert_array_equal(mask, expected)
+        self.assertEqual(len(MinHashLSHIndex(self.index_path)), int(expected.sum()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,195 @@
+"""
+Tests of `nusacrowd.utils.download` against a local HTTP server.
+"""
+import hashlib
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import datasets
+from datasets.utils.info_utils import get_size_checksum_dict
+
+from nusacrowd.utils.builder_utils import get_download_manager
+from nusacrowd.utils.download import ChecksumMismatchError, download, download_files, get_download_path
+from tests.test_locking import get_toy_metadata
+
+FILES = {f"/shard_{i}.jsonl.zst": bytes(range(256)) * (400 + i) for i in range(6)}
+
+DOWNLOAD_LOADER = '''
+import datasets
+
+URL = "{url}"
+
+
+class Toy(datasets.GeneratorBasedBuilder):
+    BUILDER_CONFIGS = [datasets.BuilderConfig(name="toy_source")]
+
+    def _info(self):
+        return datasets.DatasetInfo(features=datasets.Features({{"path": datasets.Value("string")}}))
+
+    def _split_generators(self, dl_manager):
+        return [datasets.SplitGenerator(name=datasets.Split.TRAIN, gen_kwargs={{"path": dl_manager.download(URL)}})]
+
+    def _generate_examples(self, path):
+        yield 0, {{"path": path}}
+'''
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.headers.get("Range")))
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            self._serve()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def do_HEAD(self):
+        data = FILES.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+
+    def _serve(self):
+        data = FILES.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"].split("=")[1].split("-")[0])
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+        body = data[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        if self.path in self.server.fail_once:
+            # announce the full body, send half of it and drop the connection
+            self.server.fail_once.discard(self.path)
+            self.wfile.write(body[: len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+def start_server() -> ThreadingHTTPServer:
+    """Serve `FILES` on a free local port from a background thread."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.active = server.max_active = 0
+    server.fail_once = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class TestDownload(unittest.TestCase):
+    def setUp(self):
+        self.server = start_server()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def urls(self):
+        return [self.base_url + path for path in FILES]
+
+    def test_download_and_reuse(self):
+        paths = download_files(self.urls(), self.tmp_dir.name, max_concurrency=2)
+        for path, data in zip(paths, FILES.values()):
+            self.assertEqual(Path(path).read_bytes(), data)
+        self.assertLessEqual(self.server.max_active, 2)
+
+        num_requests = len(self.server.requests)
+        download_files(self.urls(), self.tmp_dir.name)
+        self.assertEqual(len(self.server.requests), num_requests)
+
+    def test_resume_partial_file(self):
+        url = self.urls()[0]
+        data = FILES["/shard_0.jsonl.zst"]
+        path = get_download_path(url, self.tmp_dir.name)
+        Path(self.tmp_dir.name, path.name + ".incomplete").write_bytes(data[:1000])
+
+        download_files([url], self.tmp_dir.name, checksums={url: hashlib.sha256(data).hexdigest()})
+        self.assertEqual(path.read_bytes(), data)
+        self.assertEqual(self.server.requests, [("/shard_0.jsonl.zst", "bytes=1000-")])
+
+    def test_retry_resumes_after_dropped_connection(self):
+        url = self.urls()[1]
+        data = FILES["/shard_1.jsonl.zst"]
+        self.server.fail_once.add("/shard_1.jsonl.zst")
+
+        [path] = download_files([url], self.tmp_dir.name, checksums={url: hashlib.sha256(data).hexdigest()}, max_retries=2)
+        self.assertEqual(Path(path).read_bytes(), data)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertIsNotNone(self.server.requests[1][1])
+
+    def test_checksum_mismatch(self):
+        url = self.urls()[2]
+        with self.assertRaises(ChecksumMismatchError):
+            download_files([url], self.tmp_dir.name, checksums={url: "0" * 64})
+        self.assertFalse(get_download_path(url, self.tmp_dir.name).exists())
+
+    def test_download_records_sizes_checksums(self):
+        script = Path(self.tmp_dir.name, "toy", "toy.py")
+        script.parent.mkdir()
+        script.write_text(DOWNLOAD_LOADER.format(url=self.urls()[0]))
+        builder = datasets.load_dataset_builder(str(script), name="toy_source", cache_dir=str(Path(self.tmp_dir.name, "cache")))
+        dl_manager = get_download_manager(builder, datasets.DownloadConfig(cache_dir=builder._cache_downloaded_dir))
+
+        paths = download(dl_manager, self.urls())
+        # checksums are only recorded with `verification_mode="all_checks"`
+        self.assertEqual(dl_manager.get_recorded_sizes_checksums(), {url: {"num_bytes": len(data), "checksum": None} for url, data in zip(self.urls(), FILES.values())})
+        # the files are in the builder downloads directory, next to the ones of `dl_manager.download`
+        for path, data in zip(paths, FILES.values()):
+            self.assertEqual(Path(path).parent, Path(builder._cache_downloaded_dir))
+            self.assertEqual(Path(path).read_bytes(), data)
+        self.assertEqual(Path(dl_manager.download(self.urls()[0])).parent, Path(builder._cache_downloaded_dir))
+
+        # the reused files record the checksums computed while downloading
+        num_requests = len(self.server.requests)
+        dl_manager.record_checksums = True
+        download(dl_manager, self.urls())
+        self.assertEqual(len(self.server.requests), num_requests)
+        self.assertEqual(dl_manager.get_recorded_sizes_checksums(), {url: get_size_checksum_dict(path) for url, path in zip(self.urls(), paths)})
+
+    def test_preview_downloads_to_cache_dir(self):
+        script = Path(self.tmp_dir.name, "toy", "toy.py")
+        script.parent.mkdir()
+        script.write_text(DOWNLOAD_LOADER.format(url=self.urls()[3]))
+        cache_dir = Path(self.tmp_dir.name, "cache")
+
+        preview = get_toy_metadata(str(script)).preview(n=1, cache_dir=str(cache_dir))
+        path = Path(preview["train"][0]["path"])
+        self.assertEqual(path.parent, cache_dir / "downloads")
+        self.assertEqual(path.read_bytes(), FILES["/shard_3.jsonl.zst"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Round-trip tests of `nusacrowd.utils.excel_cache` against `pd.read_excel`.
+"""
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from nusacrowd.utils.excel_cache import _MANIFEST_FILE, get_excel_cache_dir, read_excel
+
+
+class TestExcelCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.cache_dir = str(self.tmp_path / "cache")
+        self.workbook = self.tmp_path / "workbook.xlsx"
+        with pd.ExcelWriter(self.workbook) as writer:
+            # empty cells in text and label columns, a numeric header
+            pd.DataFrame({
+                "Kalimat": ["satu", "dua", None, "empat"],
+                "label": [1.0, np.nan, 0.0, 1.0],
+                2019: ["a", np.nan, "b", "c"],
+            }).to_excel(writer, sheet_name="comments", index=False)
+            pd.DataFrame({"sumber": ["halo", "apa kabar"], "target": [None, "piye kabare"]}).to_excel(writer, sheet_name="corpus", index=False)
+        # parsed without header, e.g. korpus_nusantara
+        self.headerless_workbook = self.tmp_path / "headerless.xlsx"
+        pd.DataFrame([["halo", None], ["apa kabar", "piye kabare"]]).to_excel(self.headerless_workbook, index=False, header=False)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def assert_same_as_pandas(self, workbook: Path, **read_kwargs):
+        expected = pd.read_excel(workbook, sheet_name=None, **read_kwargs)
+        # the first call converts the workbook, the second loads the cached sheets without parsing it
+        for warm in (False, True):
+            with mock.patch("nusacrowd.utils.excel_cache.pd.read_excel", wraps=pd.read_excel) as parse:
+                dfs = read_excel(workbook, sheet_name=None, cache_dir=self.cache_dir, **read_kwargs)
+            self.assertEqual(parse.called, not warm)
+            self.assertEqual(list(dfs), list(expected))
+            for sheet, df in expected.items():
+                self.assertTrue(dfs[sheet].equals(df), sheet)
+                self.assertEqual([(type(label), label) for label in dfs[sheet].columns], [(type(label), label) for label in df.columns])
+                self.assertEqual(dfs[sheet].dtypes.tolist(), df.dtypes.tolist())
+                self.assertEqual(dfs[sheet].astype(str).values.tolist(), df.astype(str).values.tolist())
+        self.assertTrue((get_excel_cache_dir(workbook, read_kwargs, self.cache_dir) / _MANIFEST_FILE).exists())
+
+    def test_round_trip(self):
+        self.assert_same_as_pandas(self.workbook)
+
+    def test_round_trip_without_header(self):
+        self.assert_same_as_pandas(self.headerless_workbook, header=None)
+
+    def test_select_sheet(self):
+        expected = pd.read_excel(self.workbook)
+        self.assertTrue(read_excel(self.workbook, cache_dir=self.cache_dir).equals(expected))
+        with mock.patch("nusacrowd.utils.excel_cache.pd.read_excel") as parse:
+            self.assertTrue(read_excel(self.workbook, cache_dir=self.cache_dir).equals(expected))
+        parse.assert_not_called()
+
+    def test_not_convertible_workbook_is_not_cached(self):
+        # a mixed-type object column cannot be stored in Arrow
+        pd.DataFrame({"value": [1, "dua", 3.5]}).to_excel(self.workbook, index=False)
+        expected = pd.read_excel(self.workbook)
+        self.assertTrue(read_excel(self.workbook, cache_dir=self.cache_dir).equals(expected))
+        self.assertFalse((self.tmp_path / "cache").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+Round-trip tests of the Parquet and JSONL exports of `nusacrowd.utils.export`.
+"""
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import datasets
+
+from nusacrowd.utils.export import _SUCCESS_FILE, _read_success, export_split
+from nusacrowd.utils.schemas import seq_label_features
+
+TAGS = ["O", "B-PER", "I-PER", "B-LOC"]
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        tokens = [["Budi", "tinggal", "di", "Bandung"], ["Siti"], [], ["Ke", "Jakarta", "bersama", "Siti", "Nurbaya", "."]] * 25
+        labels = [[1, 0, 0, 3], [1], [], [0, 3, 0, 1, 2, 0]] * 25
+        self.dataset = datasets.Dataset.from_dict(
+            {"id": [str(i) for i in range(len(tokens))], "tokens": tokens, "labels": labels},
+            features=seq_label_features(TAGS),
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def assert_round_trip(self, export_format: str, builder: str):
+        split_dir = self.tmp_path / export_format / "train"
+        # small shards and batches, so the split spans several shards
+        entry = export_split(self.dataset, split_dir, export_format=export_format, max_shard_bytes=2048, batch_size=10)
+        self.assertGreater(len(entry["shards"]), 1)
+        self.assertEqual(sum(shard["num_rows"] for shard in entry["shards"]), len(self.dataset))
+        with open(split_dir / _SUCCESS_FILE) as f:
+            self.assertEqual(json.load(f), entry)
+
+        # read back without nusacrowd, features from the manifest entry
+        features = datasets.Features.from_dict(entry["features"])
+        data_files = [str(split_dir / shard["file"]) for shard in entry["shards"]]
+        loaded = datasets.load_dataset(builder, data_files=data_files, features=features, split="train", cache_dir=str(self.tmp_path / "cache"))
+        self.assertEqual(loaded.features, self.dataset.features)
+        self.assertEqual(loaded.to_list(), self.dataset.to_list())
+
+        self.assertEqual(_read_success(split_dir, self.dataset._fingerprint), entry)
+        self.assertIsNone(_read_success(split_dir, "other fingerprint"))
+
+    def test_parquet_round_trip(self):
+        self.assert_round_trip("parquet", "parquet")
+
+    def test_jsonl_round_trip(self):
+        self.assert_round_trip("jsonl", "json")
+
+
+if __name__ == "__main__":
+    unittest.main()
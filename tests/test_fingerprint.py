@@ -0,0 +1,115 @@
+"""
+Tests of the cache fingerprints of `nusacrowd.utils.fingerprint` with a toy loader.
+"""
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from nusacrowd.utils.fingerprint import FINGERPRINT_FILE, FRESH, MISSING, STALE, find_prepared_dirs, get_cache_status, rebuild
+from tests.test_locking import get_toy_metadata
+
+TOY_LOADER = '''
+import datasets
+
+PREFIX = "{prefix}"
+
+
+class Toy(datasets.GeneratorBasedBuilder):
+    BUILDER_CONFIGS = [datasets.BuilderConfig(name="toy_source")]
+
+    def _info(self):
+        return datasets.DatasetInfo(features=datasets.Features({{"text": datasets.Value("string")}}))
+
+    def _split_generators(self, dl_manager):
+        return [datasets.SplitGenerator(name=datasets.Split.TRAIN, gen_kwargs={{}})]
+
+    def _generate_examples(self):
+        for i in range(10):
+            yield i, {{"text": f"{{PREFIX}} {{i}}"}}
+'''
+
+
+class TestFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.cache_dir = str(self.tmp_path / "cache")
+        self.script = self.tmp_path / "toy" / "toy.py"
+        self.script.parent.mkdir()
+        self.write_loader("contoh")
+        self.metadata = get_toy_metadata(str(self.script))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_loader(self, prefix: str):
+        self.script.write_text(TOY_LOADER.format(prefix=prefix))
+
+    def load(self):
+        return self.metadata.load_dataset(cache_dir=self.cache_dir, split="train")
+
+    def status(self):
+        return get_cache_status(self.metadata, self.cache_dir)
+
+    def age_prepared_dirs(self, seconds: float = 60):
+        """Make the prepared caches look prepared `seconds` ago, as if by an earlier session."""
+        for prepared_dir in find_prepared_dirs(self.metadata, self.cache_dir):
+            marker = prepared_dir / "dataset_info.json"
+            past = marker.stat().st_mtime - seconds
+            os.utime(marker, (past, past))
+
+    def test_fresh_then_stale_after_code_change(self):
+        self.assertEqual(self.status().status, MISSING)
+        self.load()
+        self.assertEqual(self.status().status, FRESH)
+
+        self.write_loader("contoh baru")
+        status = self.status()
+        self.assertEqual(status.status, STALE)
+        self.assertIn("code changed", status.reasons[0])
+        self.assertFalse(status.sources_changed)
+
+    def test_reused_cache_not_fingerprinted(self):
+        dataset = self.load()
+        fingerprint_path = Path(dataset.cache_files[0]["filename"]).parent / FINGERPRINT_FILE
+        recorded = json.loads(fingerprint_path.read_text())
+        self.age_prepared_dirs()
+
+        self.load()
+        self.assertEqual(json.loads(fingerprint_path.read_text()), recorded)
+
+        # a cache prepared before fingerprints existed stays stale when it is reused
+        fingerprint_path.unlink()
+        self.load()
+        self.assertFalse(fingerprint_path.exists())
+        status = self.status()
+        self.assertEqual(status.status, STALE)
+        self.assertEqual(status.reasons, ["no fingerprint recorded"])
+
+    def test_rebuild_removes_outdated_dirs(self):
+        self.load()
+        self.age_prepared_dirs()
+        self.write_loader("versi dua")
+        self.load()
+        self.age_prepared_dirs()
+        old_dirs = find_prepared_dirs(self.metadata, self.cache_dir)
+        self.assertEqual(len(old_dirs), 2)
+
+        self.write_loader("versi tiga")
+        status = self.status()
+        self.assertEqual(status.status, STALE)
+        self.assertEqual(len(status.outdated_dirs), 1)
+
+        dataset = rebuild(self.metadata, status, self.cache_dir)
+        self.assertEqual(dataset["train"][0]["text"], "versi tiga 0")
+        for old_dir in old_dirs:
+            self.assertFalse(old_dir.exists())
+        [prepared_dir] = find_prepared_dirs(self.metadata, self.cache_dir)
+        self.assertTrue((prepared_dir / FINGERPRINT_FILE).exists())
+        self.assertEqual(self.status().status, FRESH)
+
+
+if __name__ == "__main__":
+    unittest.main()
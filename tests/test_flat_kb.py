@@ -0,0 +1,126 @@
+"""
+Tests of the flat columnar layout of `nusacrowd.utils.flat_kb`.
+"""
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import datasets
+import numpy as np
+
+from nusacrowd.utils.flat_kb import FLAT_KB_DIR_NAME, FlatKB, _nested_dependencies, get_flat_kb, synthetic_ud_kb
+from nusacrowd.utils.schemas import kb_features
+
+
+def entity(entity_id, entity_type, text, start):
+    return {"id": entity_id, "type": entity_type, "text": [text], "offsets": [[start, start + len(text)]], "normalized": [{"db_name": "wikidata", "db_id": None}]}
+
+
+def relation(relation_id, relation_type, arg1_id, arg2_id):
+    return {"id": relation_id, "type": relation_type, "arg1_id": arg1_id, "arg2_id": arg2_id, "normalized": []}
+
+
+def document(doc_id, text, entities=(), relations=(), coreferences=(), events=()):
+    return {
+        "id": doc_id,
+        "passages": [{"id": f"{doc_id}_passage", "type": "paragraph", "text": [text], "offsets": [[0, len(text)]]}],
+        "entities": list(entities),
+        "events": list(events),
+        "coreferences": list(coreferences),
+        "relations": list(relations),
+    }
+
+
+ROWS = [
+    document(
+        "doc-0", "Budi pergi ke Bandung. Dia senang.",
+        entities=[entity("T1", "PER", "Budi", 0), entity("T2", "LOC", "Bandung", 14), entity("T3", None, "Dia", 23)],
+        relations=[relation("R1", "goes_to", "T1", "T2"), relation("R2", None, "T3", "0")],
+        # an unresolved member id and an empty coreference
+        coreferences=[{"id": "C1", "entity_ids": ["T1", "T3", "T9"]}, {"id": "C2", "entity_ids": []}],
+        events=[{"id": "E1", "type": "travel", "trigger": {"text": ["pergi"], "offsets": [[5, 10]]}, "arguments": [{"role": "agent", "ref_id": "T1"}]}],
+    ),
+    document("doc-1", "Kosong."),
+    # same element ids as doc-0, resolved within the document
+    document(
+        "doc-2", "Siti dari Medan.",
+        entities=[entity("T1", "PER", "Siti", 0), entity("T2", "LOC", "Medan", 10)],
+        relations=[relation("R1", "from", "T1", "T2"), relation("R2", "from", "T4", "T2")],
+        coreferences=[{"id": "C1", "entity_ids": ["T2"]}],
+    ),
+]
+
+
+class TestFlatKB(unittest.TestCase):
+    def setUp(self):
+        self.dataset = datasets.Dataset.from_list(ROWS, features=kb_features, split="train")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_tables(self):
+        flat_kb = FlatKB.from_kb(self.dataset)
+        self.assertEqual(len(flat_kb), 3)
+        self.assertEqual(flat_kb.entity_types, ["LOC", "PER"])
+        self.assertEqual(flat_kb.relation_types, ["from", "goes_to"])
+        self.assertEqual(flat_kb.offsets("entities").tolist(), [0, 3, 3, 5])
+        self.assertEqual(flat_kb.column("entities", "type").tolist(), [1, 0, -1, 1, 0])
+        # global entity rows, -1 with the string id kept when unresolved
+        self.assertEqual(flat_kb.column("relations", "arg1").tolist(), [0, 2, 3, -1])
+        self.assertEqual(flat_kb.column("relations", "arg2").tolist(), [1, -1, 4, 4])
+        self.assertEqual(flat_kb.relations["arg2_id"], [None, "0", None, None])
+        self.assertEqual(flat_kb.relations["arg1_id"], [None, None, None, "T4"])
+        self.assertEqual(flat_kb.coreferences["entities"], [[0, 2, -1], [], [4]])
+        self.assertEqual(flat_kb.coreferences["entity_ids"], [[None, None, "T9"], [], [None]])
+
+    def test_round_trip(self):
+        self.assertEqual(FlatKB.from_kb(self.dataset).to_kb().to_list(), self.dataset.to_list())
+
+        # selections convert the selected rows
+        selected = self.dataset.select([2, 0])
+        round_trip = FlatKB.from_kb(selected).to_kb()
+        self.assertEqual(round_trip.features, kb_features)
+        self.assertEqual(round_trip.to_list(), selected.to_list())
+
+        empty = self.dataset.select([1])
+        self.assertEqual(FlatKB.from_kb(empty).to_kb().to_list(), empty.to_list())
+
+    def test_dependency_arrays(self):
+        dataset = synthetic_ud_kb(num_sentences=200)
+        flat_kb = FlatKB.from_kb(dataset)
+        relation_types = {name: i for i, name in enumerate(flat_kb.relation_types)}
+        for example, (heads, deprels) in zip(dataset, flat_kb.iter_dependencies()):
+            expected_heads, expected_deprels = _nested_dependencies(example, relation_types)
+            np.testing.assert_array_equal(heads, expected_heads)
+            np.testing.assert_array_equal(deprels, expected_deprels)
+
+        # an entity that is no relation's arg1 has head 0 and no type
+        heads, deprels = FlatKB.from_kb(self.dataset).dependency_arrays()
+        self.assertEqual(heads.tolist(), [2, 0, 0, 2, 0])
+        self.assertEqual(deprels.tolist(), [1, -1, -1, 0, -1])
+
+    def test_get_flat_kb_reuses_conversion(self):
+        self.dataset.save_to_disk(self.tmp_dir.name)
+        dataset = datasets.load_from_disk(self.tmp_dir.name)
+        with mock.patch.object(FlatKB, "from_kb", wraps=FlatKB.from_kb) as from_kb:
+            flat_kb = get_flat_kb(dataset)
+            again = get_flat_kb(dataset)
+        from_kb.assert_called_once()
+
+        [path] = Path(self.tmp_dir.name, FLAT_KB_DIR_NAME).iterdir()
+        self.assertTrue(path.name.startswith(f"train-{dataset._fingerprint[:16]}-"))
+        for table in ("documents", "entities", "relations", "coreferences"):
+            self.assertTrue(getattr(again, table).cache_files)
+            self.assertEqual(getattr(again, table).to_list(), getattr(flat_kb, table).to_list())
+        self.assertEqual(again.to_kb().to_list(), dataset.to_list())
+
+        # in-memory datasets are converted without saving
+        with mock.patch.object(FlatKB, "save") as save:
+            get_flat_kb(self.dataset)
+        save.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
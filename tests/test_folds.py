@@ -0,0 +1,83 @@
+"""
+Round-trip tests of the fold view pools of `nusacrowd.utils.folds`.
+"""
+import tempfile
+import unittest
+from pathlib import Path
+
+import datasets
+
+from nusacrowd.utils.folds import load_fold_view, prepare_fold_pool
+
+FOLD_LOADER = '''
+import datasets
+
+# ids are document ids, "doc-a" and "doc-b" have the same content
+DOCUMENTS = [("doc-a", "sama"), ("doc-b", "sama"), ("doc-c", "beda"), ("doc-d", "lain"), ("doc-e", "sama")]
+NUM_FOLDS = 3
+
+
+class ToyFolds(datasets.GeneratorBasedBuilder):
+    BUILDER_CONFIGS = [datasets.BuilderConfig(name=f"toy_folds_fold{i}_source") for i in range(NUM_FOLDS)]
+
+    def _info(self):
+        return datasets.DatasetInfo(features=datasets.Features({
+            "id": datasets.Value("string"),
+            "index": datasets.Value("string"),
+            "text": datasets.Value("string"),
+        }))
+
+    def _split_generators(self, dl_manager):
+        fold = int(self.config.name.split("_fold")[-1].split("_")[0])
+        return [
+            datasets.SplitGenerator(name=datasets.Split.TRAIN, gen_kwargs={"fold": fold, "is_test": False}),
+            datasets.SplitGenerator(name=datasets.Split.TEST, gen_kwargs={"fold": fold, "is_test": True}),
+        ]
+
+    def _generate_examples(self, fold, is_test):
+        documents = [document for i, document in enumerate(DOCUMENTS) if (i % NUM_FOLDS == fold) == is_test]
+        for i, (document_id, text) in enumerate(documents):
+            yield i, {"id": document_id, "index": str(i), "text": text}
+'''
+
+CONFIG_NAMES = [f"toy_folds_fold{i}_source" for i in range(3)]
+
+
+class TestFoldViews(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.script = self.tmp_path / "toy_folds" / "toy_folds.py"
+        self.script.parent.mkdir()
+        self.script.write_text(FOLD_LOADER)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def load_folds(self, id_columns):
+        """Each fold config loaded with `datasets.load_dataset` and as a view of a pool prepared with `id_columns`."""
+        cache_dir = str(self.tmp_path / "cache")
+        prepare_fold_pool(str(self.script), CONFIG_NAMES, cache_dir=cache_dir, id_columns=id_columns)
+        for config_name in CONFIG_NAMES:
+            expected = datasets.load_dataset(str(self.script), name=config_name, cache_dir=cache_dir)
+            yield expected, load_fold_view(str(self.script), config_name, CONFIG_NAMES, cache_dir=cache_dir)
+
+    def test_document_ids_round_trip(self):
+        for expected, view in self.load_folds(id_columns=("index",)):
+            self.assertEqual(set(view), set(expected))
+            for split in expected:
+                self.assertEqual(view[split]["id"], expected[split]["id"])
+                self.assertEqual(view[split]["text"], expected[split]["text"])
+
+    def test_positional_ids_renumbered(self):
+        pool_ids = set()
+        for expected, view in self.load_folds(id_columns=("id", "index")):
+            for split in expected:
+                self.assertEqual(view[split]["text"], expected[split]["text"])
+                pool_ids.update(zip(view[split]["id"], view[split]["text"]))
+        # identical documents are merged, the ids of distinct pool rows are distinct
+        self.assertEqual(len({pool_id for pool_id, _ in pool_ids}), len(pool_ids))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Modules imported by `import nusacrowd` and by config discovery (`NusantaraConfigHelper()`).
+
+Heavy optional dependencies of loader scripts must be imported in the functions
+using them, so that discovery neither pays for them nor fails when they are not
+installed. The tests check which modules are imported in a fresh interpreter;
+timings depend on the machine and are only reported (`pytest -s`).
+"""
+import json
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# imported by loaders, but not by `datasets` itself
+DEFERRED_MODULES = ["sklearn", "nltk", "translate", "conllu", "jsonlines"]
+
+# `import nusacrowd` resolves its public names on first access
+NOT_IMPORTED_BY_PACKAGE = ["datasets", "pandas", "pyarrow", "nusacrowd.config_helper", *DEFERRED_MODULES]
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], cwd=REPO_DIR, capture_output=True, text=True, check=True,
+    )
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Cumulative seconds per top-level module of `python -X importtime` output."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def imported_modules(code: str) -> dict:
+    """Run `code` in a fresh interpreter, return its `sys.modules` and duration."""
+    process = run_python(
+        "-c",
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"{code}\n"
+        "print(json.dumps({'seconds': time.perf_counter() - start, 'modules': sorted(sys.modules)}))",
+    )
+    result = json.loads(process.stdout.splitlines()[-1])
+    return {"seconds": result["seconds"], "modules": set(result["modules"])}
+
+
+def is_imported(module: str, modules: set) -> bool:
+    return any(name == module or name.startswith(module + ".") for name in modules)
+
+
+class TestImportTime(unittest.TestCase):
+    def test_import_nusacrowd(self):
+        result = imported_modules("import nusacrowd")
+        for module in NOT_IMPORTED_BY_PACKAGE:
+            self.assertFalse(is_imported(module, result["modules"]), f"`import nusacrowd` should not import {module}")
+
+        seconds = parse_importtime(run_python("-X", "importtime", "-c", "import nusacrowd").stderr)["nusacrowd"]
+        print(f"import nusacrowd: {seconds:.3f}s")
+
+    def test_discovery(self):
+        result = imported_modules("from nusacrowd import NusantaraConfigHelper\nNusantaraConfigHelper()")
+        for module in DEFERRED_MODULES:
+            self.assertFalse(is_imported(module, result["modules"]), f"{module} should be imported where it is used")
+        print(f"NusantaraConfigHelper(): {result['seconds']:.3f}s")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+Tests of the character n-gram language identifier of `nusacrowd.utils.langid`.
+"""
+import tempfile
+import unittest
+
+import datasets
+import numpy as np
+import pyarrow as pa
+
+from nusacrowd.utils.arrow_utils import code_points
+from nusacrowd.utils.langid import LanguageIdentifier, language_filter
+
+CORPUS = {
+    "ind": [
+        "saya tidak mau pergi ke sekolah hari ini",
+        "apa yang sedang kamu lakukan sekarang",
+        "mereka sudah makan nasi di rumah",
+        "kami tidak punya uang untuk membeli itu",
+        "dia sedang membaca buku di kamar",
+        "bagaimana kabar keluarga kamu",
+    ],
+    "sun": [
+        "abdi teu hoyong angkat ka sakola dinten ieu",
+        "naon anu nuju anjeun lakukeun ayeuna",
+        "aranjeunna parantos tuang sangu di bumi",
+        "urang teu gaduh artos kanggo meser eta",
+        "manehna nuju maca buku di kamar",
+        "kumaha damang kulawarga anjeun",
+    ],
+    "jav": [
+        "aku ora gelem lunga menyang sekolah dina iki",
+        "apa sing lagi kok lakoni saiki",
+        "wong wong kuwi wis mangan sega ing omah",
+        "awake dhewe ora duwe dhuwit kanggo tuku kuwi",
+        "dheweke lagi maca buku ing kamar",
+        "piye kabare kulawargamu",
+    ],
+}
+
+HELD_OUT = {
+    "saya tidak punya waktu hari ini": "ind",
+    "abdi teu gaduh waktos dinten ieu": "sun",
+    "aku ora duwe wektu dina iki": "jav",
+}
+
+
+class TestLanguageIdentifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        texts = [text for language in CORPUS for text in CORPUS[language]]
+        labels = [language for language in CORPUS for _ in CORPUS[language]]
+        cls.identifier = LanguageIdentifier.train(texts, labels, num_features=1 << 12, batch_size=5)
+
+    def test_predict(self):
+        languages, probs = self.identifier.predict(list(HELD_OUT))
+        self.assertEqual(languages, list(HELD_OUT.values()))
+        self.assertTrue(((probs > 0.5) & (probs <= 1)).all())
+        np.testing.assert_allclose(self.identifier.predict_proba(list(HELD_OUT)).sum(axis=1), 1, rtol=1e-6)
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.identifier.save(tmp_dir)
+            loaded = LanguageIdentifier.load(tmp_dir)
+        self.assertEqual(loaded.languages, ["ind", "jav", "sun"])
+        np.testing.assert_array_equal(loaded.predict_proba(list(HELD_OUT)), self.identifier.predict_proba(list(HELD_OUT)))
+
+    def test_language_filter(self):
+        corpus = datasets.Dataset.from_dict({"id": [str(i) for i in range(len(HELD_OUT))], "text": list(HELD_OUT)})
+        kept = corpus.filter(language_filter(self.identifier, ["sun", "jav"]), batched=True, batch_size=2)
+        self.assertEqual(kept["text"], [text for text, language in HELD_OUT.items() if language != "ind"])
+
+        # texts identified with a lower confidence are dropped
+        [sun_confidence] = self.identifier.predict(["abdi teu gaduh waktos dinten ieu"])[1]
+        kept = corpus.filter(language_filter(self.identifier, ["sun"], min_confidence=sun_confidence), batched=True)
+        self.assertEqual(kept["text"], ["abdi teu gaduh waktos dinten ieu"])
+        kept = corpus.filter(language_filter(self.identifier, ["sun"], min_confidence=sun_confidence + 1e-6), batched=True)
+        self.assertEqual(len(kept), 0)
+
+
+class TestCodePoints(unittest.TestCase):
+    def test_code_points(self):
+        strings = pa.array(["skip", "sayur", None, "", "mésér", "ꦲꦏ꧀ꦱꦫ"]).slice(1)
+        chars, starts = code_points(strings)
+        self.assertEqual(starts.tolist(), [0, 5, 5, 5, 10, 15])
+        decoded = ["".join(map(chr, chars[starts[i]:starts[i + 1]])) for i in range(len(strings))]
+        self.assertEqual(decoded, ["sayur", "", "", "mésér", "ꦲꦏ꧀ꦱꦫ"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+"""
+Multiprocess tests of `nusacrowd.utils.locking` and single-flight `NusantaraMetadata.load_dataset`.
+"""
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import datasets
+
+from nusacrowd.config_helper import NusantaraMetadata
+from nusacrowd.utils.locking import PreparationInProgress, PreparationLockTimeout, SingleFlightLock, get_lock_path, preparation_lock
+
+TOY_LOADER = '''
+import os
+import time
+
+import datasets
+
+
+class Toy(datasets.GeneratorBasedBuilder):
+    BUILDER_CONFIGS = [datasets.BuilderConfig(name="toy_source")]
+
+    def _info(self):
+        return datasets.DatasetInfo(features=datasets.Features({"text": datasets.Value("string")}))
+
+    def _split_generators(self, dl_manager):
+        return [datasets.SplitGenerator(name=datasets.Split.TRAIN, gen_kwargs={})]
+
+    def _generate_examples(self):
+        with open(os.environ["TOY_COUNTER"], "a") as f:
+            f.write(f"{os.getpid()}\\n")
+        time.sleep(1)
+        for i in range(100):
+            yield i, {"text": f"contoh {i}"}
+'''
+
+NUM_PROCESSES = 4
+
+
+def get_toy_metadata(script: str) -> NusantaraMetadata:
+    return NusantaraMetadata(
+        script=script,
+        dataset_name="toy",
+        tasks=[],
+        languages=["ind"],
+        config=datasets.BuilderConfig(name="toy_source"),
+        is_local=False,
+        is_nusantara_schema=False,
+        nusantara_schema_caps=None,
+        is_large=False,
+        is_resource=False,
+        is_default=True,
+        is_broken=False,
+        nusantara_version="1.0.0",
+        source_version="1.0.0",
+        citation="",
+        description="",
+        homepage="",
+        license="",
+        _ds_module=None,
+        _py_module=None,
+        _ds_cls=None,
+    )
+
+
+def load_toy(script: str, cache_dir: str, start_event) -> int:
+    start_event.wait()
+    dataset = get_toy_metadata(script).load_dataset(cache_dir=cache_dir, split="train")
+    return len(dataset)
+
+
+def prepare_once(cache_dir: str, start_event) -> bool:
+    """Check-then-prepare critical section, as done for fold view pools; True if this process prepared."""
+    start_event.wait()
+    marker = Path(cache_dir) / "prepared"
+    with preparation_lock("toy_source", cache_dir, poll_interval=0.05):
+        if marker.exists():
+            return False
+        time.sleep(0.5)
+        marker.write_text(str(os.getpid()))
+        return True
+
+
+def hold_lock(path: str, seconds: float, stale_after: float, acquired_event):
+    with SingleFlightLock(path, stale_after=stale_after):
+        acquired_event.set()
+        time.sleep(seconds)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.context = multiprocessing.get_context("spawn")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_single_flight(self):
+        with self.context.Manager() as manager, self.context.Pool(NUM_PROCESSES) as pool:
+            start_event = manager.Event()
+            results = pool.starmap_async(prepare_once, [(self.tmp_dir.name, start_event)] * NUM_PROCESSES)
+            start_event.set()
+            prepared = results.get(timeout=120)
+        self.assertEqual(sum(prepared), 1)
+
+    def test_concurrent_loads_prepare_once(self):
+        script = self.tmp_path / "toy" / "toy.py"
+        script.parent.mkdir()
+        script.write_text(TOY_LOADER)
+        counter = self.tmp_path / "counter.txt"
+        os.environ["TOY_COUNTER"] = str(counter)
+        try:
+            with self.context.Manager() as manager, self.context.Pool(NUM_PROCESSES) as pool:
+                start_event = manager.Event()
+                results = pool.starmap_async(load_toy, [(str(script), str(self.tmp_path / "cache"), start_event)] * NUM_PROCESSES)
+                start_event.set()
+                num_rows = results.get(timeout=300)
+        finally:
+            del os.environ["TOY_COUNTER"]
+
+        self.assertEqual(num_rows, [100] * NUM_PROCESSES)
+        self.assertEqual(len(counter.read_text().splitlines()), 1)
+        self.assertFalse(get_lock_path("toy_source", self.tmp_path / "cache").exists())
+
+    def test_stale_lock_of_dead_process(self):
+        process = self.context.Process(target=time.sleep, args=(0,))
+        process.start()
+        process.join()
+        path = self.tmp_path / "dead.lock"
+        path.write_text(json.dumps({"host": socket.gethostname(), "pid": process.pid, "token": "dead"}))
+
+        with SingleFlightLock(path, timeout=5) as lock:
+            self.assertEqual(json.loads(path.read_text())["token"], lock.token)
+        self.assertFalse(path.exists())
+
+    def test_stale_lock_without_heartbeat(self):
+        path = self.tmp_path / "remote.lock"
+        path.write_text(json.dumps({"host": "another-host", "pid": 1, "token": "remote"}))
+        old = time.time() - 10
+        os.utime(path, (old, old))
+
+        with SingleFlightLock(path, timeout=5, stale_after=1) as lock:
+            self.assertTrue(lock.is_locked)
+
+    def test_fail_fast_and_timeout(self):
+        path = self.tmp_path / "held.lock"
+        acquired_event = self.context.Event()
+        # held longer than `stale_after`, so the heartbeat must keep it fresh
+        holder = self.context.Process(target=hold_lock, args=(str(path), 3, 0.5, acquired_event))
+        holder.start()
+        try:
+            self.assertTrue(acquired_event.wait(60))
+            time.sleep(1)
+            with self.assertRaises(PreparationInProgress):
+                SingleFlightLock(path, fail_fast=True, stale_after=0.5).acquire()
+            with self.assertRaises(PreparationLockTimeout):
+                SingleFlightLock(path, timeout=0.5, stale_after=0.5, poll_interval=0.1).acquire()
+        finally:
+            holder.join()
+
+        with SingleFlightLock(path, fail_fast=True) as lock:
+            self.assertTrue(lock.is_locked)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Tests of the memory profiling of `nusacrowd.utils.memory_profile` on a local loader.
+"""
+import json
+import tempfile
+import unittest
+from dataclasses import asdict, fields
+from pathlib import Path
+from unittest import mock
+
+import datasets
+
+from nusacrowd.config_helper import NusantaraConfigHelper
+from nusacrowd.utils.memory_profile import MemoryProfile, format_report, profile_configs, profile_load, write_report
+from tests.test_locking import get_toy_metadata
+
+MEMORY_LOADER = '''
+import time
+
+import datasets
+
+
+class Toy(datasets.GeneratorBasedBuilder):
+    BUILDER_CONFIGS = [datasets.BuilderConfig(name="toy_source")]
+
+    def _info(self):
+        return datasets.DatasetInfo(features=datasets.Features({"text": datasets.Value("string")}))
+
+    def _split_generators(self, dl_manager):
+        return [
+            datasets.SplitGenerator(name=datasets.Split.TRAIN, gen_kwargs={"num_examples": 2000}),
+            datasets.SplitGenerator(name=datasets.Split.TEST, gen_kwargs={"num_examples": 10}),
+        ]
+
+    def _generate_examples(self, num_examples):
+        # about 16 MiB held while generating, so the sampler snapshots it
+        rows = [f"contoh kalimat nomor {i} " * 16 for i in range(40000)]
+        time.sleep(0.3)
+        for i in range(num_examples):
+            yield i, {"text": rows[i]}
+'''
+
+FAILING_LOADER = MEMORY_LOADER.replace("        return [\n", "        raise ValueError('rusak')\n        return [\n")
+
+
+class TestMemoryProfile(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_loader(self, name: str, source: str) -> str:
+        script = self.tmp_path / name / f"{name}.py"
+        script.parent.mkdir()
+        script.write_text(source)
+        return str(script)
+
+    def test_profile_load(self):
+        script = self.write_loader("toy", MEMORY_LOADER)
+        profile = profile_load({"path": script, "name": "toy_source", "cache_dir": str(self.tmp_path / "cache")}, sample_interval=0.01)
+
+        self.assertIsNone(profile.error)
+        self.assertEqual(profile.config_name, "toy_source")
+        self.assertGreater(profile.seconds, 0.3)
+        stages = {"load_dataset", "load_builder", "split_generators", "write_arrow[train]", "write_arrow[test]", "as_dataset"}
+        self.assertEqual(set(profile.stage_peaks), stages)
+        self.assertEqual(set(profile.stage_rss), stages)
+        self.assertGreater(profile.baseline_rss_bytes, 0)
+        self.assertGreaterEqual(profile.peak_rss_bytes, max(profile.stage_rss.values()))
+        self.assertEqual(profile.peak_traced_bytes, max(profile.stage_peaks.values()))
+        # the rows held by the generator are in the traced peak of its split and attributed to it
+        self.assertGreater(profile.stage_peaks["write_arrow[train]"], 8 << 20)
+        self.assertEqual(next(iter(profile.function_bytes)), "toy.py:_generate_examples")
+        self.assertEqual(profile.top_sites[0].function, "toy.py:_generate_examples")
+
+        # profiles are JSON serializable with every field
+        data = json.loads(json.dumps(asdict(profile)))
+        self.assertEqual(set(data), {field.name for field in fields(MemoryProfile)})
+        self.assertEqual(MemoryProfile.from_dict(data), profile)
+
+    def test_profile_configs(self):
+        selection = NusantaraConfigHelper(helpers=[
+            get_toy_metadata(self.write_loader("toy", MEMORY_LOADER)),
+            get_toy_metadata(self.write_loader("toy_broken", FAILING_LOADER)),
+        ])
+        with mock.patch.object(datasets.config, "HF_DATASETS_CACHE", self.tmp_path / "cache"):
+            profiles = profile_configs(selection, isolate=False, trace_allocations=False)
+
+        # failed configs first
+        self.assertEqual([profile.error for profile in profiles], ["ValueError('rusak')", None])
+        self.assertEqual(profiles[1].stage_peaks, {})
+        self.assertIn("write_arrow[train]", profiles[1].stage_rss)
+
+        write_report(profiles, self.tmp_path / "report" / "memory.txt")
+        report = (self.tmp_path / "report" / "memory.txt").read_text()
+        self.assertEqual(report, format_report(profiles) + "\n")
+        self.assertIn("FAILED: ValueError('rusak')", report)
+        with open(self.tmp_path / "report" / "memory.json") as f:
+            self.assertEqual([MemoryProfile.from_dict(data) for data in json.load(f)], profiles)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Tests of the offline mirror packs of `nusacrowd.utils.mirror`.
+"""
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import datasets
+
+from nusacrowd.config_helper import NusantaraConfigHelper
+from nusacrowd.utils.mirror import MissingFromMirrorError, build_mirror, load_from_mirror
+from tests.test_download import DOWNLOAD_LOADER, FILES, start_server
+from tests.test_locking import get_toy_metadata
+
+
+class TestMirror(unittest.TestCase):
+    def setUp(self):
+        self.server = start_server()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def write_loader(self, name: str, path: str) -> str:
+        script = self.tmp_path / name / f"{name}.py"
+        script.parent.mkdir()
+        script.write_text(DOWNLOAD_LOADER.format(url=self.base_url + path))
+        return str(script)
+
+    def test_pack_and_load_offline(self):
+        script = self.write_loader("toy", "/shard_4.jsonl.zst")
+        # a second config downloading the same file shares its blob
+        other_script = self.write_loader("toy_copy", "/shard_4.jsonl.zst")
+        selection = NusantaraConfigHelper(helpers=[get_toy_metadata(script), get_toy_metadata(other_script)])
+        pack_dir = self.tmp_path / "pack"
+        download_config = datasets.DownloadConfig(cache_dir=str(self.tmp_path / "downloads"))
+
+        manifest = build_mirror(selection, pack_dir, download_config=download_config, archive=True)
+        self.assertEqual(manifest["num_urls"], 1)
+        self.assertEqual(manifest["num_blobs"], 1)
+        self.assertEqual(manifest["num_bytes"], len(FILES["/shard_4.jsonl.zst"]))
+
+        # unpack on another "machine": no server, no downloads, no original pack
+        self.server.shutdown()
+        shutil.rmtree(self.tmp_path / "downloads")
+        unpacked_dir = self.tmp_path / "unpacked"
+        shutil.unpack_archive(f"{pack_dir}.tar", unpacked_dir)
+        shutil.rmtree(pack_dir)
+
+        dataset = load_from_mirror({"path": script, "name": "toy_source", "split": "train", "cache_dir": str(self.tmp_path / "cache")}, unpacked_dir)
+        path = Path(dataset[0]["path"])
+        self.assertEqual(path.parent.parent.parent, unpacked_dir)
+        self.assertEqual(path.read_bytes(), FILES["/shard_4.jsonl.zst"])
+
+        dataset = get_toy_metadata(other_script).load_dataset(mirror=str(unpacked_dir), split="train", cache_dir=str(self.tmp_path / "cache"))
+        self.assertEqual(Path(dataset[0]["path"]), path)
+
+        # rebuilding skips the mirrored configs
+        with open(unpacked_dir / "manifest.json") as f:
+            self.assertEqual(build_mirror(selection, unpacked_dir), json.load(f))
+
+    def test_missing_from_mirror(self):
+        script = self.write_loader("toy", "/shard_5.jsonl.zst")
+        pack_dir = self.tmp_path / "pack"
+        pack_dir.mkdir()
+        with open(pack_dir / "urls.json", "w") as f:
+            json.dump({}, f)
+        with self.assertRaises(MissingFromMirrorError):
+            load_from_mirror({"path": script, "name": "toy_source", "cache_dir": str(self.tmp_path / "cache")}, pack_dir)
+        self.assertEqual(self.server.requests, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
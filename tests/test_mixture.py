@@ -0,0 +1,64 @@
+"""
+Tests of the checkpointable multi-task sampler of `nusacrowd.utils.mixture`.
+"""
+import json
+import unittest
+
+import datasets
+import numpy as np
+
+from nusacrowd.utils.mixture import TaskMixture, get_mixture_weights
+
+
+def generate_stream():
+    for i in range(5):
+        yield {"text": f"stream {i}"}
+
+
+def make_mixture(**kwargs) -> TaskMixture:
+    sources = {
+        "small": datasets.Dataset.from_dict({"text": [f"small {i}" for i in range(7)]}),
+        "large": datasets.Dataset.from_dict({"text": [f"large {i}" for i in range(20)]}),
+        "stream": datasets.IterableDataset.from_generator(generate_stream),
+    }
+    return TaskMixture(sources, sizes={"stream": 5}, temperature=2.0, seed=3, num_steps=120, block_size=4, **kwargs)
+
+
+class TestTaskMixture(unittest.TestCase):
+    def test_resume_continues_sequence(self):
+        expected = list(make_mixture())
+        self.assertEqual(len(expected), 120)
+
+        for interrupt_at in (1, 37, 61):
+            mixture = make_mixture()
+            first = [pair for _, pair in zip(range(interrupt_at), mixture)]
+            # the state survives a checkpoint file
+            state = json.loads(json.dumps(mixture.state_dict()))
+
+            resumed = make_mixture()
+            resumed.load_state_dict(state)
+            self.assertEqual(first + list(resumed), expected, interrupt_at)
+
+    def test_every_source_repeated_over_epochs(self):
+        names = [name for name, _ in make_mixture()]
+        # with 120 steps every source is read for several epochs
+        for name, size in [("small", 7), ("large", 20), ("stream", 5)]:
+            self.assertGreater(names.count(name), size)
+        counts = {}
+        for name, example in make_mixture(shuffle=False):
+            self.assertEqual(example["text"], f"{name} {counts.get(name, 0) % {'small': 7, 'large': 20, 'stream': 5}[name]}")
+            counts[name] = counts.get(name, 0) + 1
+
+    def test_mismatched_state(self):
+        state = make_mixture().state_dict()
+        mixture = TaskMixture({"small": datasets.Dataset.from_dict({"text": ["a"]})}, seed=4)
+        with self.assertRaises(ValueError):
+            mixture.load_state_dict(state)
+
+    def test_weights(self):
+        np.testing.assert_allclose(get_mixture_weights([10, 30]), [0.25, 0.75])
+        np.testing.assert_allclose(get_mixture_weights([10, 40], temperature=2.0), [1 / 3, 2 / 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,14 +5,16 @@ import argparse
 import importlib
 import sys
 import unittest
-from collections import defaultdict
 from pathlib import Path
-from typing import Iterable, Iterator, List, Optional, Union, Dict
+from typing import List, Optional, Union, Dict
 
 import datasets
 from datasets import DatasetDict, Features
 from nusacrowd.utils.constants import Tasks, TASK_TO_SCHEMA, VALID_TASKS, VALID_SCHEMAS, SCHEMA_TO_FEATURES, TASK_TO_FEATURES
 from nusacrowd.utils.schemas import kb_features, pairs_features, pairs_features_score, qa_features, text2text_features, text_features, text_multi_features, seq_label_features, ssp_features, speech_text_features, image_text_features
+from nusacrowd.utils.arrow_utils import element_lengths, flatten_path, get_arrow_table
+from nusacrowd.utils.statistics import DatasetStatistics
+from nusacrowd.utils.validation import KB_OFFSET_FEATURES, find_duplicate_ids, find_missing_references, find_offset_count_mismatches, find_offset_mismatches
 
 sys.path.append(str(Path(__file__).parent.parent))
 
@@ -21,13 +23,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-def _get_example_text(example: dict) -> str:
-    """
-    Concatenate all text from passages in an example of a KB schema
-    :param example: An instance of the KB schema
-    """
-    return " ".join([t for p in example["passages"] for t in p["text"]])
-
+MAX_REPORTED_ERRORS = 10
 
 OFFSET_ERROR_MSG = "\n\n" "There are features with wrong offsets!" " This is not a hard failure, as it is common for this type of datasets." " However, if the error list is long (e.g. >10) you should double check your code. \n\n"
 
@@ -72,13 +68,10 @@ class TestDataLoader(unittest.TestCase):
             with self.subTest("Check schema validity"):
                 self.test_schema(schema)
 
-            mapped_features = SCHEMA_TO_FEATURES[schema]
-            split_to_feature_statistics = self.get_feature_statistics(mapped_features, schema)
             for split_name, split in self.datasets_nusantara[schema].items():
                 print(split_name)
                 print("=" * 10)
-                for k, v in split_to_feature_statistics[split_name].items():
-                    print(f"{k}: {v}")
+                print(DatasetStatistics.from_dataset(split, schema))
                 print()
 
             if schema == "KB":
@@ -149,14 +142,10 @@ class TestDataLoader(unittest.TestCase):
                 use_auth_token=self.USE_AUTH_TOKEN,
             )
 
-        # check dataset samples
-        for schema in ['source'] + [f"nusantara_{s.lower()}" for s in self.schemas_to_check]:
-            dataset = datasets.load_dataset(
-                self.PATH,
-                name=f"{self.SUBSET_ID}_{schema}",
-                data_dir=self.DATA_DIR,
-                use_auth_token=self.USE_AUTH_TOKEN,
-            )
+        # check dataset samples, reusing the datasets loaded above
+        samples = {"source": self.dataset_source}
+        samples.update({f"nusantara_{schema.lower()}": dataset for schema, dataset in self.datasets_nusantara.items()})
+        for schema, dataset in samples.items():
             logger.info(f"Dataset sample [{schema}]\n{dataset[list(dataset.keys())[0]][0]}")
 
 
@@ -165,127 +154,47 @@ class TestDataLoader(unittest.TestCase):
         Gets sample statistics, for each split and sample of the number of
         features in the schema present; only works for the nusantara schema.
 
+        Counts are computed with Arrow over the cached tables, nested KB
+        features are reported with dotted names (e.g. `entities.normalized`).
+
         :param schema_type: Type of schema to reference features from
         """  # noqa
         logger.info("Gathering schema statistics")
         all_counters = {}
         for split_name, split in self.datasets_nusantara[schema].items():
-
-            counter = defaultdict(int)
-            for example in split:
-                for feature_name, feature in features.items():
-                    if example.get(feature_name, None) is not None:
-                        if isinstance(feature, datasets.ClassLabel) or isinstance(feature, datasets.Value):
-                            if example[feature_name] is not None:
-                                counter[feature_name] += 1
-                        else:
-                            counter[feature_name] += len(example[feature_name])
-
-                            # TODO do proper recursion here
-                            if feature_name == "entities":
-                                for entity in example["entities"]:
-                                    counter["normalized"] += len(entity["normalized"])
-
-            all_counters[split_name] = counter
+            all_counters[split_name] = DatasetStatistics.from_dataset(split, schema, features=features).counts
 
         return all_counters
 
-    def _assert_ids_globally_unique(
-        self,
-        collection: Iterable,
-        ids_seen: set,
-        ignore_assertion: bool = False,
-    ):
-        """
-        Checks if all IDs are globally unique across a feature list.
-        This looks recursively through elements of arrays to check if every referenced ID is unique.
-
-        :param collection: An iterable of features that contain NLP info (ex: entities, events)
-        :param ids_seen: Set of previously seen numerical IDs (empty by default)
-        :param ignore_assertion: Whether to raise an error if id was already seen.
-        """  # noqa
-        if isinstance(collection, dict):
-
-            for k, v in collection.items():
-                if isinstance(v, dict):
-                    self._assert_ids_globally_unique(v, ids_seen)
-
-                elif isinstance(v, list):
-                    for elem in v:
-                        self._assert_ids_globally_unique(elem, ids_seen)
-                else:
-                    if k == "id":
-                        if not ignore_assertion:
-                            self.assertNotIn(v, ids_seen)
-                        ids_seen.add(v)
-
-        elif isinstance(collection, list):
-            for elem in collection:
-                self._assert_ids_globally_unique(elem, ids_seen)
+    def _report_first(self, items: list, limit: int = MAX_REPORTED_ERRORS) -> str:
+        """Format the first offending items of a check, with the total count."""
+        lines = [str(item) for item in items[:limit]]
+        if len(items) > limit:
+            lines.append(f"... and {len(items) - limit} more")
+        return "\n".join(lines)
 
     def test_are_ids_globally_unique(self, dataset_nusantara: DatasetDict):
         """
         Tests each example in a split has a unique ID.
+
+        All (nested) `id` columns are flattened with Arrow and checked for uniqueness in bulk.
         """
         logger.info("Checking global ID uniqueness")
-        for split in dataset_nusantara.values():
-            ids_seen = set()
-            for example in split:
-                self._assert_ids_globally_unique(example, ids_seen=ids_seen)
-        logger.info("Found {} unique IDs".format(len(ids_seen)))
-
-    def _get_referenced_ids(self, example):
-        referenced_ids = []
-
-        if example.get("events", None) is not None:
-            for event in example["events"]:
-                for argument in event["arguments"]:
-                    referenced_ids.append((argument["ref_id"], "event"))
-
-        if example.get("coreferences", None) is not None:
-            for coreference in example["coreferences"]:
-                for entity_id in coreference["entity_ids"]:
-                    referenced_ids.append((entity_id, "entity"))
-
-        if example.get("relations", None) is not None:
-            for relation in example["relations"]:
-                referenced_ids.append((relation["arg1_id"], "entity"))
-                referenced_ids.append((relation["arg2_id"], "entity"))
-
-        return referenced_ids
-
-    def _get_existing_referable_ids(self, example):
-        existing_ids = []
-
-        for entity in example["entities"]:
-            existing_ids.append((entity["id"], "entity"))
-
-        if example.get("events", None) is not None:
-            for event in example["events"]:
-                existing_ids.append((event["id"], "event"))
-
-        return existing_ids
+        for split_name, split in dataset_nusantara.items():
+            duplicates = find_duplicate_ids(get_arrow_table(split))
+            msg = f"Split:{split_name} - Found duplicated ids (id, rows):\n" + self._report_first(duplicates)
+            self.assertEqual(len(duplicates), 0, msg)
+            logger.info("No duplicated IDs in the {} examples of split {}".format(len(split), split_name))
 
     def test_do_all_referenced_ids_exist(self, dataset_nusantara: DatasetDict):
         """
         Checks if referenced IDs are correctly labeled.
         """
         logger.info("Checking if referenced IDs are properly mapped")
-        for split in dataset_nusantara.values():
-            for example in split:
-                referenced_ids = set()
-                existing_ids = set()
-
-                referenced_ids.update(self._get_referenced_ids(example))
-                existing_ids.update(self._get_existing_referable_ids(example))
-
-                for ref_id, ref_type in referenced_ids:
-                    if ref_type == "event":
-                        if not ((ref_id, "entity") in existing_ids or (ref_id, "event") in existing_ids):
-                            logger.warning(f"Referenced element ({ref_id}, entity/event) could not be found in existing ids {existing_ids}. Please make sure that this is not because of a bug in your data loader.")
-                    else:
-                        if not (ref_id, ref_type) in referenced_ids:
-                            logger.warning(f"Referenced element {(ref_id, ref_type)} could not be found in existing ids {existing_ids}. Please make sure that this is not because of a bug in your data loader.")
+        for split_name, split in dataset_nusantara.items():
+            missing = find_missing_references(get_arrow_table(split))
+            if len(missing) > 0:
+                logger.warning(f"Split:{split_name} - {len(missing)} referenced elements (row, feature, id) could not be found in existing ids. Please make sure that this is not because of a bug in your data loader.\n" + self._report_first(missing))
 
     def test_passages_offsets(self, dataset_nusantara: DatasetDict):
         """
@@ -296,80 +205,42 @@ class TestDataLoader(unittest.TestCase):
         for split in dataset_nusantara:
 
             if "passages" in dataset_nusantara[split].features:
+                table = get_arrow_table(dataset_nusantara[split])
 
-                for example in dataset_nusantara[split]:
-
-                    example_text = _get_example_text(example)
-
-                    for passage in example["passages"]:
-
-                        example_id = example["id"]
-
-                        text = passage["text"]
-                        offsets = passage["offsets"]
-
-                        self._test_is_list(msg="Text in passages must be a list", field=text)
+                for feature in ["text", "offsets"]:
+                    values, rows = flatten_path(table, f"passages.{feature}", flatten_leaf=False)
+                    lengths = element_lengths(values)
+                    with self.subTest(f"{feature.capitalize()} in passages must have only one element"):
+                        self.assertTrue((lengths == 1).all(), f"Split:{split} - first offending rows: {sorted(set(rows[lengths != 1].tolist()))[:MAX_REPORTED_ERRORS]}")
 
-                        self._test_is_list(
-                            msg="Offsets in passages must be a list",
-                            field=offsets,
-                        )
+                mismatches = list(find_offset_mismatches(table, "passages"))
+                self.assertEqual(len(mismatches), 0, f"Split:{split} - " + self._report_first(mismatches))
 
-                        self._test_has_only_one_item(
-                            msg="Offsets in passages must have only one element",
-                            field=offsets,
-                        )
-
-                        self._test_has_only_one_item(
-                            msg="Text in passages must have only one element",
-                            field=text,
-                        )
-
-                        for idx, (start, end) in enumerate(offsets):
-                            msg = f"Split:{split} - Example:{example_id} - text:`{example_text[start:end]}` != text_by_offset:`{text[idx]}`"
-                            self.assertEqual(example_text[start:end], text[idx], msg)
-
-    def _check_offsets(
-        self,
-        example_id: int,
-        split: str,
-        example_text: str,
-        offsets: List[List[int]],
-        texts: List[str],
-    ) -> Iterator:
+    def _check_offsets(self, dataset_nusantara: DatasetDict, element: str) -> List[str]:
         """
+        Vectorized offset check of the KB elements `element` (entities or events) of every split.
 
-        :param example_text:
-        :param offsets:
-        :param texts:
-
+        :return: error messages of the elements whose offsets do not match their text
         """  # noqa
+        errors = []
+        for split in dataset_nusantara:
 
-        if len(texts) != len(offsets):
-            logger.warning(f"Split:{split} - Example:{example_id} - Number of texts {len(texts)} != number of offsets {len(offsets)}. Please make sure that this error already exists in the original data and was not introduced in the data loader.")
-
-        self._test_is_list(
-            msg=f"Split:{split} - Example:{example_id} - Text fields paired with offsets must be in the form [`text`, ...]",
-            field=texts,
-        )
-
-        with self.subTest(
-            f"Split:{split} - Example:{example_id} - All offsets must be in the form [(lo1, hi1), ...]",
-            offsets=offsets,
-        ):
-            self.assertTrue(all(len(o) == 2 for o in offsets))
-
-        # offsets are always list of lists
-        for idx, (start, end) in enumerate(offsets):
+            if element in dataset_nusantara[split].features:
+                table = get_arrow_table(dataset_nusantara[split])
+                span_path = KB_OFFSET_FEATURES[element]
 
-            by_offset_text = example_text[start:end]
-            try:
-                text = texts[idx]
-            except IndexError:
-                text = ""
+                for row, element_id, n_texts, n_offsets in find_offset_count_mismatches(table, element, span_path):
+                    logger.warning(
+                        f"Split:{split} - Row:{row} - {element}:{element_id} - Number of texts {n_texts} != number of offsets {n_offsets}. "
+                        "Please make sure that this error already exists in the original data and was not introduced in the data loader."
+                    )
 
-            if by_offset_text != text:
-                yield f" text:`{text}` != text_by_offset:`{by_offset_text}`"
+                with self.subTest(f"Split:{split} - All offsets must be in the form [(lo1, hi1), ...]"):
+                    try:
+                        errors += [f"Split:{split} - {mismatch}" for mismatch in find_offset_mismatches(table, element, span_path)]
+                    except ValueError as e:
+                        self.fail(str(e))
+        return errors
 
     def test_entities_offsets(self, dataset_nusantara: DatasetDict):
         """
@@ -377,29 +248,7 @@ class TestDataLoader(unittest.TestCase):
         i.e.: entity text == text extracted via the entity offsets
         """  # noqa
         logger.info("KB ONLY: Checking entity offsets")
-        errors = []
-
-        for split in dataset_nusantara:
-
-            if "entities" in dataset_nusantara[split].features:
-
-                for example in dataset_nusantara[split]:
-
-                    example_id = example["id"]
-                    example_text = _get_example_text(example)
-
-                    for entity in example["entities"]:
-
-                        for msg in self._check_offsets(
-                            example_id=example_id,
-                            split=split,
-                            example_text=example_text,
-                            offsets=entity["offsets"],
-                            texts=entity["text"],
-                        ):
-
-                            entity_id = entity["id"]
-                            errors.append(f"Example:{example_id} - entity:{entity_id} " + msg)
+        errors = self._check_offsets(dataset_nusantara, "entities")
 
         if len(errors) > 0:
             logger.warning(msg="\n".join(errors) + OFFSET_ERROR_MSG)
@@ -411,29 +260,7 @@ class TestDataLoader(unittest.TestCase):
         i.e.: trigger text == text extracted via the trigger offsets
         """
         logger.info("KB ONLY: Checking event offsets")
-        errors = []
-
-        for split in dataset_nusantara:
-
-            if "events" in dataset_nusantara[split].features:
-
-                for example in dataset_nusantara[split]:
-
-                    example_id = example["id"]
-                    example_text = _get_example_text(example)
-
-                    for event in example["events"]:
-
-                        for msg in self._check_offsets(
-                            example_id=example_id,
-                            split=split,
-                            example_text=example_text,
-                            offsets=event["trigger"]["offsets"],
-                            texts=event["trigger"]["text"],
-                        ):
-
-                            event_id = event["id"]
-                            errors.append(f"Example:{example_id} - event:{event_id} " + msg)
+        errors = self._check_offsets(dataset_nusantara, "events")
 
         if len(errors) > 0:
             logger.warning(msg="\n".join(errors) + OFFSET_ERROR_MSG)
@@ -448,15 +275,9 @@ class TestDataLoader(unittest.TestCase):
         for split in dataset_nusantara:
 
             if "coreferences" in dataset_nusantara[split].features:
-
-                for example in dataset_nusantara[split]:
-                    example_id = example["id"]
-                    entity_lookup = {ent["id"]: ent for ent in example["entities"]}
-
-                    # check all coref entity ids are in entity lookup
-                    for coref in example["coreferences"]:
-                        for entity_id in coref["entity_ids"]:
-                            assert entity_id in entity_lookup, f"Split:{split} - Example:{example_id} - Entity:{entity_id} not found!"
+                table = get_arrow_table(dataset_nusantara[split])
+                missing = find_missing_references(table, references=[("coreferences.entity_ids", ["entities.id"])])
+                assert len(missing) == 0, f"Split:{split} - Entities not found (row, feature, id):\n" + self._report_first(missing)
 
     def test_multiple_choice(self, dataset_nusantara: DatasetDict):
         """
@@ -504,20 +325,6 @@ class TestDataLoader(unittest.TestCase):
                 if count > 0 and feature not in non_empty_features and feature in set().union(*TASK_TO_FEATURES.values()):
                     logger.warning(f"Found instances of '{feature}' but there seems to be no task in 'SUPPORTED_TASKS' for them. Is 'SUPPORTED_TASKS' correct?")
 
-    def _test_is_list(self, msg: str, field: list):
-        with self.subTest(
-            msg,
-            field=field,
-        ):
-            self.assertIsInstance(field, list)
-
-    def _test_has_only_one_item(self, msg: str, field: list):
-        with self.subTest(
-            msg,
-            field=field,
-        ):
-            self.assertEqual(len(field), 1)
-
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
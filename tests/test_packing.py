@@ -0,0 +1,77 @@
+"""
+Tests of the packed token blocks of `nusacrowd.utils.packing`.
+"""
+import tempfile
+import unittest
+from pathlib import Path
+
+import datasets
+import numpy as np
+
+from nusacrowd.utils.constants import SCHEMA_TO_FEATURES
+from nusacrowd.utils.packing import PackedBlocks, pack_ssp_dataset
+
+EOS_ID = 0
+BLOCK_SIZE = 8
+
+
+def tokenize(text):
+    return [int(token) for token in text.split()]
+
+
+def fail_to_tokenize(text):
+    raise AssertionError("the existing pack should be reused")
+
+
+class TestPacking(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = Path(self.tmp_dir.name) / "packed"
+        rng = np.random.default_rng(0)
+        texts = [" ".join(str(token) for token in rng.integers(1, 1000, size=rng.integers(1, 20))) for _ in range(50)]
+        self.dataset = datasets.Dataset.from_dict({"id": [str(i) for i in range(len(texts))], "text": texts}, features=SCHEMA_TO_FEATURES["SSP"])
+        # documents separated by the end-of-sequence id
+        self.stream = np.array([token for text in texts for token in tokenize(text) + [EOS_ID]])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def pack(self, tokenizer=tokenize, **kwargs):
+        kwargs = {"block_size": BLOCK_SIZE, "eos_id": EOS_ID, "vocab_size": 1000, "blocks_per_shard": 4, "chunk_size": 7, **kwargs}
+        return pack_ssp_dataset(self.dataset, tokenizer, self.output_dir, **kwargs)
+
+    def assert_blocks_match_stream(self, blocks: PackedBlocks):
+        num_blocks = len(self.stream) // BLOCK_SIZE
+        self.assertEqual(len(blocks), num_blocks)
+        self.assertEqual(blocks.dtype, np.uint16)
+        np.testing.assert_array_equal(np.concatenate(list(blocks)), self.stream[:num_blocks * BLOCK_SIZE])
+        # the final partial block is dropped
+        self.assertEqual(blocks.index["dropped_tokens"], len(self.stream) % BLOCK_SIZE)
+        self.assertEqual(blocks.index["num_tokens"], len(self.stream))
+        self.assertEqual(blocks.index["num_documents"], len(self.dataset))
+        np.testing.assert_array_equal(blocks[-1], self.stream[(num_blocks - 1) * BLOCK_SIZE:num_blocks * BLOCK_SIZE])
+
+    def test_blocks_concatenate_to_stream(self):
+        blocks = self.pack()
+        self.assertGreater(len(blocks.index["shards"]), 1)
+        self.assert_blocks_match_stream(blocks)
+        self.assert_blocks_match_stream(PackedBlocks(self.output_dir))
+
+    def test_streamed_dataset_in_workers(self):
+        blocks = pack_ssp_dataset(iter(self.dataset), tokenize, self.output_dir, block_size=BLOCK_SIZE, eos_id=EOS_ID, vocab_size=1000, blocks_per_shard=4, num_proc=2, chunk_size=7)
+        self.assert_blocks_match_stream(blocks)
+
+    def test_rebuild_reuses_pack(self):
+        self.pack()
+        self.assert_blocks_match_stream(self.pack(tokenizer=fail_to_tokenize))
+
+        # other parameters pack again
+        with self.assertRaises(AssertionError):
+            self.pack(tokenizer=fail_to_tokenize, block_size=BLOCK_SIZE * 2)
+        with self.assertRaises(AssertionError):
+            self.pack(tokenizer=fail_to_tokenize, overwrite=True)
+        self.assert_blocks_match_stream(self.pack())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+Tests of the deduplicated parallel corpus store of `nusacrowd.utils.parallel_corpus`.
+"""
+import tempfile
+import unittest
+from pathlib import Path
+
+import datasets
+
+from nusacrowd.utils.parallel_corpus import ParallelCorpus
+from nusacrowd.utils.schemas import text2text_features
+
+
+def t2t_split(pairs, prefix):
+    """:param pairs: (text_1, text_2, text_1_name, text_2_name) tuples"""
+    columns = dict(zip(["text_1", "text_2", "text_1_name", "text_2_name"], map(list, zip(*pairs))))
+    return datasets.Dataset.from_dict({"id": [f"{prefix}{i}" for i in range(len(pairs))], **columns}, features=text2text_features)
+
+
+class TestParallelCorpus(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = Path(self.tmp_dir.name) / "store"
+        self.t2t_datasets = {
+            "toy_a_nusantara_t2t": datasets.DatasetDict({
+                "train": t2t_split([
+                    ("selamat pagi", "sugeng enjing", "ind", "jav"),
+                    ("terima kasih", "hatur nuhun", "ind", "sun"),
+                    ("apa kabar", "piye kabare", "ind", "jav"),
+                ], "a"),
+                "test": t2t_split([("sampai jumpa", "sampun nggih", "ind", "jav")], "a-test"),
+            }),
+            "toy_b_nusantara_t2t": datasets.DatasetDict({
+                "train": t2t_split([
+                    ("terima  kasih ", "matur nuwun", "ind", "jav"),
+                    # same pair as toy_a, up to whitespace
+                    ("selamat  pagi", " sugeng enjing", "ind", "jav"),
+                    ("sugeng enjing", "selamat pagi", "jav", "ind"),
+                ], "b"),
+            }),
+        }
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_shared_pair_keeps_every_source(self):
+        corpus = ParallelCorpus.build_from_datasets(self.t2t_datasets, self.output_dir, batch_size=2)
+        self.assertEqual(corpus.index["num_pairs"], 6)
+        self.assertEqual(corpus.index["num_unique_pairs"], 5)
+        self.assertEqual(corpus.directions, [("ind", "jav"), ("ind", "sun"), ("jav", "ind")])
+
+        ind_jav = corpus.get("ind", "jav")
+        self.assertEqual(ind_jav["text_2"], ["sugeng enjing", "piye kabare", "matur nuwun"])
+        self.assertEqual(ind_jav[0]["sources"], [
+            {"config": "toy_a_nusantara_t2t", "split": "train", "id": "a0"},
+            {"config": "toy_b_nusantara_t2t", "split": "train", "id": "b1"},
+        ])
+        self.assertEqual(ind_jav[2]["sources"], [{"config": "toy_b_nusantara_t2t", "split": "train", "id": "b0"}])
+        self.assertEqual(corpus.get("ind", "sun")["text_2"], ["hatur nuhun"])
+        self.assertEqual(corpus.get("jav", "ind")["text_2"], ["selamat pagi"])
+
+        # directions are contiguous slices covering the store
+        start = 0
+        for direction in corpus.directions:
+            pairs = corpus.get(*direction)
+            self.assertEqual(pairs[:], corpus.dataset[start:start + len(pairs)])
+            self.assertTrue(all((row["text_1_name"], row["text_2_name"]) == direction for row in pairs))
+            start += len(pairs)
+        self.assertEqual(start, len(corpus))
+        with self.assertRaises(KeyError):
+            corpus.get("sun", "ind")
+
+    def test_splits(self):
+        corpus = ParallelCorpus.build_from_datasets(self.t2t_datasets, self.output_dir)
+        self.assertNotIn("sampai jumpa", corpus.dataset["text_1"])
+
+        corpus = ParallelCorpus.build_from_datasets(self.t2t_datasets, self.output_dir, splits=None)
+        self.assertEqual(corpus.index["num_pairs"], 7)
+        self.assertIn("sampai jumpa", corpus.get("ind", "jav")["text_1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
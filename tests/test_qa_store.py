@@ -0,0 +1,112 @@
+"""
+Tests of the context-deduplicated storage of `nusacrowd.utils.qa_store`.
+"""
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import datasets
+
+from nusacrowd.utils.qa_store import QA_STORE_DIR_NAME, QAStore, benchmark_qa_storage, get_qa_store, synthetic_mrc
+from nusacrowd.utils.schemas import qa_features
+
+JAKARTA_1 = "Jakarta adalah ibu kota Indonesia. Jakarta terletak di pulau Jawa."
+JAKARTA_2 = "Penduduk Jakarta lebih dari sepuluh juta jiwa."
+MEDAN = "Medan adalah kota terbesar di Sumatra."
+
+
+def question(question_id, document_id, context, answer):
+    return {
+        "id": question_id,
+        "question_id": question_id,
+        "document_id": document_id,
+        "question": f"pertanyaan {question_id}?",
+        "type": "extractive",
+        "choices": [],
+        "context": context,
+        "answer": answer,
+    }
+
+
+ROWS = [
+    # squad_id: paragraphs of a title share its document_id
+    question("q0", "Jakarta", JAKARTA_1, ["ibu kota"]),
+    question("q1", "Jakarta", JAKARTA_2, ["sepuluh juta"]),
+    # occurs twice, the first occurrence is found
+    question("q2", "Jakarta", JAKARTA_1, ["Jakarta", "pulau Jawa"]),
+    # tydiqa_id: a per-question document_id for a repeated context
+    question("q3", "tydi-3", MEDAN, ["Sumatra"]),
+    question("q4", "tydi-4", MEDAN, ["Bandung", ""]),
+    question("q5", "tydi-5", MEDAN, []),
+    question("q6", "tanpa-konteks", None, ["apa saja"]),
+]
+
+
+class TestQAStore(unittest.TestCase):
+    def setUp(self):
+        self.dataset = datasets.Dataset.from_list(ROWS, features=qa_features, split="train")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        store = QAStore.from_qa(self.dataset)
+        self.assertEqual(len(store), 7)
+        self.assertEqual(store.contexts.to_pylist(), [JAKARTA_1, JAKARTA_2, MEDAN])
+        self.assertEqual(store.documents["document_id"], ["Jakarta", "Jakarta", "tydi-3"])
+        self.assertEqual(store.questions["document"], [0, 1, 0, 2, 2, 2, None])
+
+        self.assertEqual(store.to_qa().features, qa_features)
+        self.assertEqual(store.to_qa().to_list(), ROWS)
+        self.assertEqual(list(store.iter_rows(batch_size=3)), ROWS)
+        self.assertEqual([store[i] for i in range(len(store))], ROWS)
+
+        selected = self.dataset.select([6, 4, 1])
+        self.assertEqual(QAStore.from_qa(selected).to_qa().to_list(), selected.to_list())
+
+    def test_answer_spans(self):
+        store = QAStore.from_qa(self.dataset)
+        self.assertEqual(store.questions["answer_start"], [[15], [28], [0, 55], [30], [-1, -1], [], [-1]])
+        for row in store.questions:
+            context = store.contexts[row["document"]].as_py() if row["document"] is not None else None
+            for answer, start, end in zip(row["answer"], row["answer_start"], row["answer_end"]):
+                if start >= 0:
+                    self.assertEqual(context[start:end], answer)
+                else:
+                    self.assertEqual(end, -1)
+
+    def test_document_rows(self):
+        store = QAStore.from_qa(self.dataset)
+        self.assertEqual(store.document_rows("Jakarta").tolist(), [0, 1])
+        self.assertEqual(store.document_rows("tydi-4").tolist(), [2])
+        self.assertEqual([store.contexts[row].as_py() for row in store.document_rows("tydi-5")], [MEDAN])
+        # questions without a context have no document row
+        self.assertEqual(store.document_rows("tanpa-konteks").tolist(), [])
+        self.assertEqual(store.document_rows("tidak-ada").tolist(), [])
+        self.assertEqual(set(store.document_index), {"Jakarta", "tydi-3", "tydi-4", "tydi-5"})
+
+    def test_get_qa_store_reuses_conversion(self):
+        self.dataset.save_to_disk(self.tmp_dir.name)
+        dataset = datasets.load_from_disk(self.tmp_dir.name)
+        with mock.patch.object(QAStore, "from_qa", wraps=QAStore.from_qa) as from_qa:
+            get_qa_store(dataset)
+            store = get_qa_store(dataset)
+        from_qa.assert_called_once()
+
+        [path] = Path(self.tmp_dir.name, QA_STORE_DIR_NAME).iterdir()
+        self.assertEqual(path.name, f"train-{dataset._fingerprint[:16]}")
+        self.assertTrue(store.documents.cache_files)
+        self.assertTrue(store.questions.cache_files)
+        self.assertEqual(store.to_qa().to_list(), ROWS)
+        self.assertEqual(store.document_rows("Jakarta").tolist(), [0, 1])
+
+    def test_benchmark(self):
+        results = benchmark_qa_storage(synthetic_mrc(num_paragraphs=20, questions_per_paragraph=3))
+        self.assertEqual(set(results), {"nested_bytes", "store_bytes", "nested_tokenize_seconds", "store_tokenize_seconds"})
+        self.assertLess(results["store_bytes"], results["nested_bytes"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Tests of the seeded splits of `nusacrowd.utils.splits`.
+"""
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import datasets
+import numpy as np
+
+from nusacrowd.utils import splits
+from nusacrowd.utils.splits import SPLITS_DIR_NAME, get_splits_dir, make_split_indices, split_dataset, train_test_indices
+
+
+def labeled_dataset(counts, label_names=("negative", "neutral", "positive")) -> datasets.Dataset:
+    """Rows of the labels of `counts`, interleaved, with a string `topic` column of two values."""
+    labels = np.concatenate([np.full(count, label) for label, count in enumerate(counts)])
+    labels = labels[np.random.RandomState(0).permutation(len(labels))]
+    return datasets.Dataset.from_dict(
+        {"id": [str(i) for i in range(len(labels))], "label": labels.tolist(), "topic": ["politik" if i % 3 else "olahraga" for i in range(len(labels))]},
+        features=datasets.Features({"id": datasets.Value("string"), "label": datasets.ClassLabel(names=list(label_names)), "topic": datasets.Value("string")}),
+    )
+
+
+class TestTrainTestIndices(unittest.TestCase):
+    def test_sklearn_train_test_split(self):
+        # id_hsd_nofaaulia: sklearn's train_test_split(test_size=0.1, random_state=42) of 907 rows,
+        # which shuffles with `RandomState(42).permutation` and takes the test rows first
+        train, test = train_test_indices(907, test_size=0.1, seed=42)
+        permutation = np.random.RandomState(42).permutation(907)
+        self.assertEqual((len(train), len(test)), (816, 91))
+        self.assertEqual(test[:8].tolist(), [868, 439, 342, 735, 784, 836, 522, 265])
+        self.assertEqual(train[-5:].tolist(), [106, 270, 860, 435, 102])
+        np.testing.assert_array_equal(test, permutation[:91])
+        np.testing.assert_array_equal(train, permutation[91:])
+
+
+class TestSplits(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def assert_partition(self, indices, num_rows):
+        all_indices = np.concatenate(list(indices.values()))
+        self.assertEqual(sorted(all_indices.tolist()), list(range(num_rows)))
+        for split_indices in indices.values():
+            self.assertTrue((np.diff(split_indices.astype(np.int64)) > 0).all())
+
+    def test_split_sizes(self):
+        dataset = labeled_dataset([500, 300, 203])
+        indices = make_split_indices(dataset, {"train": 8, "validation": 1, "test": 1})
+        self.assert_partition(indices, 1003)
+        # 802.4, 100.3 and 100.3 rows, the largest remainder rounded up
+        self.assertEqual({split: len(split_indices) for split, split_indices in indices.items()}, {"train": 803, "validation": 100, "test": 100})
+
+        same = make_split_indices(dataset, {"train": 8, "validation": 1, "test": 1})
+        other_seed = make_split_indices(dataset, {"train": 8, "validation": 1, "test": 1}, seed=0)
+        for split in indices:
+            np.testing.assert_array_equal(indices[split], same[split])
+        self.assertFalse(np.array_equal(indices["test"], other_seed["test"]))
+
+    def test_stratified_proportions(self):
+        dataset = labeled_dataset([500, 300, 200])
+        labels = np.asarray(dataset["label"])
+        indices = make_split_indices(dataset, {"train": 0.8, "validation": 0.1, "test": 0.1}, stratify_by="label")
+        self.assert_partition(indices, 1000)
+        expected = {"train": [400, 240, 160], "validation": [50, 30, 20], "test": [50, 30, 20]}
+        self.assertEqual({split: np.bincount(labels[split_indices], minlength=3).tolist() for split, split_indices in indices.items()}, expected)
+
+        # string columns are stratified by value
+        topics = np.asarray(dataset["topic"])
+        indices = make_split_indices(dataset, {"train": 0.5, "test": 0.5}, stratify_by="topic")
+        for split_indices in indices.values():
+            self.assertEqual(int((topics[split_indices] == "olahraga").sum()), 167)
+
+        with self.assertRaises(ValueError):
+            make_split_indices(datasets.Dataset.from_dict({"tokens": [["saya"], ["kamu"]]}), {"train": 1}, stratify_by="tokens")
+
+    def test_split_dataset_reuses_manifest(self):
+        labeled_dataset([60, 30, 10]).save_to_disk(self.tmp_dir.name)
+        dataset = datasets.load_from_disk(self.tmp_dir.name)
+        ratios = {"train": 0.7, "test": 0.3}
+
+        with mock.patch.object(splits, "make_split_indices", wraps=make_split_indices) as make_indices:
+            first = split_dataset(dataset, ratios, stratify_by="label")
+            second = split_dataset(dataset, ratios, stratify_by="label")
+            make_indices.assert_called_once()
+            # another seed is another set of splits
+            split_dataset(dataset, ratios, seed=0, stratify_by="label")
+            self.assertEqual(make_indices.call_count, 2)
+
+        splits_dir = get_splits_dir(dataset, ratios, 42, "label")
+        self.assertEqual(splits_dir.parent, Path(self.tmp_dir.name, SPLITS_DIR_NAME))
+        with open(splits_dir / "manifest.json") as f:
+            manifest = json.load(f)
+        self.assertEqual(manifest, {"ratios": ratios, "seed": 42, "stratify_by": "label", "splits": {"train": "train.npy", "test": "test.npy"}})
+        for split in ratios:
+            self.assertEqual(first[split]["id"], second[split]["id"])
+            np.testing.assert_array_equal(np.load(splits_dir / f"{split}.npy"), np.asarray(first[split]["id"], dtype=int))
+        self.assertEqual((first["train"].num_rows, first["test"].num_rows), (70, 30))
+        # selections over the cache, rows in their original order
+        self.assertEqual(first["test"].cache_files, dataset.cache_files)
+        self.assertEqual(first["test"]["id"], sorted(first["test"]["id"], key=int))
+
+    def test_in_memory_dataset_not_saved(self):
+        dataset = labeled_dataset([10, 10, 10])
+        with mock.patch.object(splits, "_save") as save:
+            self.assertEqual(split_dataset(dataset)["validation"].num_rows, 3)
+        save.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
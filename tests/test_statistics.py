@@ -0,0 +1,81 @@
+"""
+Tests of `nusacrowd.utils.statistics` against counts over the decoded examples.
+"""
+import unittest
+from collections import Counter
+
+import datasets
+
+from nusacrowd.utils.schemas import kb_features, seq_label_features, text_features
+from nusacrowd.utils.statistics import MISSING_LABEL, DatasetStatistics
+
+LABEL_NAMES = ["negative", "neutral", "positive"]
+TAG_NAMES = ["O", "B-PER", "I-PER"]
+
+
+def kb_example(i, entity_types, relation_type=None):
+    entities = [
+        {"id": f"{i}-e{j}", "type": entity_type, "text": [f"nama {j}"], "offsets": [[j, j + 6]], "normalized": [{"db_name": "kb", "db_id": str(j)}] * j}
+        for j, entity_type in enumerate(entity_types)
+    ]
+    relations = []
+    if relation_type is not None:
+        relations.append({"id": f"{i}-r0", "type": relation_type, "arg1_id": f"{i}-e0", "arg2_id": f"{i}-e1", "normalized": []})
+    return {
+        "id": str(i),
+        "passages": [{"id": f"{i}-p0", "type": "text", "text": ["nama 0 nama 1"], "offsets": [[0, 13]]}],
+        "entities": entities,
+        "events": [],
+        "coreferences": [{"id": f"{i}-c0", "entity_ids": [entity["id"] for entity in entities]}],
+        "relations": relations,
+    }
+
+
+class TestDatasetStatistics(unittest.TestCase):
+    def test_text(self):
+        # -1 marks an unlabeled example, e.g. of a test split without labels
+        labels = [0, 2, -1, 2, 1, -1]
+        dataset = datasets.Dataset.from_dict(
+            {"id": [str(i) for i in range(len(labels))], "text": ["kalimat"] * len(labels), "label": labels},
+            features=text_features(LABEL_NAMES),
+        )
+        stats = DatasetStatistics.from_dataset(dataset, "TEXT")
+
+        expected = Counter(LABEL_NAMES[label] if label >= 0 else MISSING_LABEL for label in dataset["label"])
+        self.assertEqual(stats.label_distribution["label"], dict(expected))
+        self.assertEqual(stats.label_distribution["label"][MISSING_LABEL], 2)
+        self.assertEqual(stats.num_examples, len(labels))
+        self.assertEqual(stats.counts["text"], len(labels))
+        self.assertEqual(stats.text_lengths["text"]["max"], len("kalimat"))
+
+    def test_seq_label(self):
+        tokens = [["Budi", "pergi"], ["Siti", "Nurbaya", "datang", "."], []]
+        labels = [[1, 0], [1, 2, -1, 0], []]
+        dataset = datasets.Dataset.from_dict(
+            {"id": ["0", "1", "2"], "tokens": tokens, "labels": labels},
+            features=seq_label_features(TAG_NAMES),
+        )
+        stats = DatasetStatistics.from_dataset(dataset, "SEQ_LABEL")
+
+        expected = Counter(TAG_NAMES[label] if label >= 0 else MISSING_LABEL for example in dataset["labels"] for label in example)
+        self.assertEqual(stats.label_distribution["labels"], dict(expected))
+        self.assertEqual(stats.counts["tokens"], sum(len(example) for example in tokens))
+        self.assertEqual(stats.counts["labels"], sum(len(example) for example in labels))
+        self.assertEqual(stats.list_lengths["tokens"], dict(Counter(len(example) for example in tokens)))
+
+    def test_kb(self):
+        examples = [kb_example(0, ["PER", "LOC"], "lahir_di"), kb_example(1, ["PER"]), kb_example(2, ["ORG", "PER", "LOC"], "bekerja_di")]
+        dataset = datasets.Dataset.from_list(examples, features=kb_features)
+        stats = DatasetStatistics.from_dataset(dataset, "KB")
+
+        for name in ["passages", "entities", "events", "coreferences", "relations"]:
+            self.assertEqual(stats.counts[name], sum(len(example[name]) for example in dataset), name)
+        # a `datasets.Sequence` of dicts decodes to a dict of lists
+        self.assertEqual(stats.counts["entities.normalized"], sum(len(entity["normalized"]["db_id"]) for example in dataset for entity in example["entities"]))
+        self.assertEqual(stats.counts["coreferences.entity_ids"], sum(len(ref["entity_ids"]) for example in dataset for ref in example["coreferences"]))
+        self.assertEqual(stats.label_distribution["entities.type"], dict(Counter(entity["type"] for example in dataset for entity in example["entities"])))
+        self.assertEqual(stats.label_distribution["relations.type"], dict(Counter(relation["type"] for example in dataset for relation in example["relations"])))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Tests of the tag harmonization of `nusacrowd.utils.tag_harmonization`.
+"""
+import tempfile
+import unittest
+
+import datasets
+
+from nusacrowd.utils.schemas import seq_label_features
+from nusacrowd.utils.tag_harmonization import BIO_NER_SCHEME, TAG_MAPPINGS, UPOS_SCHEME, TagMapping
+
+
+def seq_label_dataset(label_names, labels, **info_kwargs) -> datasets.Dataset:
+    features = seq_label_features(label_names)
+    tokens = [[f"token{i}" for i in range(len(sentence))] for sentence in labels]
+    return datasets.Dataset.from_dict(
+        {"id": [str(i) for i in range(len(labels))], "tokens": tokens, "labels": [[label_names.index(tag) for tag in sentence] for sentence in labels]},
+        features=features,
+        info=datasets.DatasetInfo(features=features, **info_kwargs),
+    )
+
+
+def tags(dataset: datasets.Dataset):
+    names = dataset.features["labels"].feature.names
+    return [[names[label] for label in sentence] for sentence in dataset["labels"]]
+
+
+class TestTagMapping(unittest.TestCase):
+    def test_io_tags_to_bio(self):
+        # singgalang is IO-tagged
+        dataset = seq_label_dataset(["O", "Person", "Organisation", "Place"], [
+            ["Person", "Person", "O", "Place"],
+            ["Person", "Organisation", "Organisation"],
+            [],
+            # an entity ending a sentence and one starting the next are distinct
+            ["O", "Place"],
+            ["Place", "Place", "O"],
+        ])
+        harmonized = TAG_MAPPINGS["singgalang"].apply(dataset)
+        self.assertEqual(harmonized.features["labels"].feature.names, BIO_NER_SCHEME.tags)
+        self.assertEqual(tags(harmonized), [
+            ["B-PER", "I-PER", "O", "B-LOC"],
+            ["B-PER", "B-ORG", "I-ORG"],
+            [],
+            ["O", "B-LOC"],
+            ["B-LOC", "I-LOC", "O"],
+        ])
+
+    def test_invalid_bio_repaired(self):
+        dataset = seq_label_dataset(["O", "B-PPL", "I-PPL", "B-PLC", "I-PLC", "B-EVT", "I-EVT"], [
+            ["I-PPL", "I-PPL", "O", "I-PLC"],
+            ["B-PPL", "B-PPL", "I-PLC", "I-PLC"],
+            # types without a target are outside
+            ["B-EVT", "I-EVT", "B-PPL"],
+        ])
+        self.assertEqual(tags(TAG_MAPPINGS["nerp"].apply(dataset)), [
+            ["B-PER", "I-PER", "O", "B-LOC"],
+            ["B-PER", "B-PER", "B-LOC", "I-LOC"],
+            ["O", "O", "B-PER"],
+        ])
+
+    def test_pos_mapping(self):
+        dataset = seq_label_dataset(["B-NNO", "B-VBI", "B-PPO", "B-SYM", "B-ZZZ"], [["B-NNO", "B-VBI", "B-PPO", "B-NNO", "B-SYM"], ["B-ZZZ"]])
+        harmonized = TAG_MAPPINGS["posp"].apply(dataset)
+        self.assertEqual(harmonized.features["labels"].feature.names, UPOS_SCHEME.tags)
+        self.assertEqual(tags(harmonized), [["NOUN", "VERB", "ADP", "NOUN", "PUNCT"], ["X"]])
+
+        with self.assertRaisesRegex(ValueError, r"\['B-SYM', 'B-ZZZ'\]"):
+            TagMapping(UPOS_SCHEME, {"NNO": "NOUN", "VBI": "VERB", "PPO": "ADP"}).apply(dataset)
+
+    def test_info_and_memory_mapping_kept(self):
+        dataset = seq_label_dataset(["O", "Person"], [["Person", "O"], ["O"], ["Person"]], description="Korpus NER", citation="@article{toy}")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dataset.save_to_disk(tmp_dir)
+            dataset = datasets.load_from_disk(tmp_dir)
+            harmonized = TAG_MAPPINGS["singgalang"].apply(dataset)
+            self.assertEqual(harmonized.info.description, "Korpus NER")
+            self.assertEqual(harmonized.info.citation, "@article{toy}")
+            self.assertEqual(harmonized.cache_files, dataset.cache_files)
+            self.assertEqual(harmonized.column_names, dataset.column_names)
+            self.assertEqual(harmonized["tokens"], dataset["tokens"])
+            self.assertNotEqual(harmonized._fingerprint, dataset._fingerprint)
+
+            # an indices mapping is kept
+            selected = TAG_MAPPINGS["singgalang"].apply(dataset.select([2, 0]))
+            self.assertEqual(tags(selected), [["B-PER"], ["B-PER", "O"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+Tests of the per-stage tracing of `nusacrowd.utils.tracing` on a local loader.
+"""
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from nusacrowd.utils.tracing import JSONLSink, OpenTelemetrySink, Tracer, load_dataset, read_events
+from tests.test_download import FILES, start_server
+
+TRACED_LOADER = '''
+import datasets
+
+URL = "{url}"
+
+
+class Toy(datasets.GeneratorBasedBuilder):
+    BUILDER_CONFIGS = [datasets.BuilderConfig(name="toy_source")]
+
+    def _info(self):
+        return datasets.DatasetInfo(features=datasets.Features({{"byte": datasets.Value("int32")}}))
+
+    def _split_generators(self, dl_manager):
+        path = dl_manager.download(URL)
+        return [
+            datasets.SplitGenerator(name=datasets.Split.TRAIN, gen_kwargs={{"path": path, "num_examples": 300}}),
+            datasets.SplitGenerator(name=datasets.Split.TEST, gen_kwargs={{"path": path, "num_examples": 100}}),
+        ]
+
+    def _generate_examples(self, path, num_examples):
+        with open(path, "rb") as f:
+            data = f.read(num_examples)
+        for i, byte in enumerate(data):
+            yield i, {{"byte": byte}}
+'''
+
+PREPARE_STAGES = {"load_dataset", "load_builder", "download", "split_generators", "generate_examples", "write_arrow", "as_dataset"}
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.server = start_server()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        script = self.tmp_path / "toy" / "toy.py"
+        script.parent.mkdir()
+        script.write_text(TRACED_LOADER.format(url=f"http://127.0.0.1:{self.server.server_address[1]}/shard_0.jsonl.zst"))
+        self.load_dataset_kwargs = {"path": str(script), "name": "toy_source", "cache_dir": str(self.tmp_path / "cache")}
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def test_prepare_stages(self):
+        events = []
+        tracer = Tracer([events.append, JSONLSink(self.tmp_path / "trace.jsonl")])
+        dataset = load_dataset(self.load_dataset_kwargs, tracer)
+        tracer.close()
+        self.assertEqual(dataset.num_rows, {"train": 300, "test": 100})
+
+        self.assertEqual({event.stage for event in events}, PREPARE_STAGES)
+        self.assertTrue(all(event.config_name == "toy_source" for event in events))
+        self.assertEqual(len({event.trace_id for event in events}), 1)
+        by_stage = {}
+        for event in events:
+            by_stage.setdefault(event.stage, []).append(event)
+
+        # nesting: the whole load, then preparation stages
+        [root] = by_stage["load_dataset"]
+        self.assertIsNone(root.parent_id)
+        parents = {event.span_id: event.stage for event in events}
+        self.assertEqual(parents[by_stage["load_builder"][0].parent_id], "load_dataset")
+        self.assertEqual(parents[by_stage["split_generators"][0].parent_id], "load_dataset")
+        self.assertEqual(parents[by_stage["download"][0].parent_id], "split_generators")
+        self.assertEqual(parents[by_stage["as_dataset"][0].parent_id], "load_dataset")
+        self.assertEqual({parents[event.parent_id] for event in by_stage["generate_examples"]}, {"write_arrow"})
+
+        self.assertEqual(by_stage["download"][0].num_bytes, len(FILES["/shard_0.jsonl.zst"]))
+        self.assertEqual({event.split: event.num_examples for event in by_stage["write_arrow"]}, {"train": 300, "test": 100})
+        self.assertEqual(sorted(event.num_examples for event in by_stage["generate_examples"]), [100, 300])
+        for event in events:
+            self.assertLessEqual(event.self_duration, event.duration)
+            self.assertLessEqual(event.duration, root.duration)
+
+        # the JSON lines log has the same events
+        self.assertEqual(read_events(self.tmp_path / "trace.jsonl"), events)
+        summary = tracer.summary()
+        self.assertEqual(set(summary.seconds["toy_source"]), PREPARE_STAGES)
+        self.assertEqual(summary.seconds["toy_source"]["load_dataset"], root.duration)
+        self.assertEqual(summary.num_examples, {"toy_source": 400})
+        self.assertEqual(summary.rank("write_arrow"), [("toy_source", summary.seconds["toy_source"]["write_arrow"])])
+        self.assertIn("write_arrow (total", summary.report())
+
+    def test_cached_load(self):
+        load_dataset(self.load_dataset_kwargs, Tracer())
+        tracer = Tracer()
+        dataset = load_dataset({**self.load_dataset_kwargs, "split": "test"}, tracer)
+        self.assertEqual(len(dataset), 100)
+        # nothing is downloaded nor prepared again
+        self.assertEqual([event.stage for event in tracer.events], ["load_builder", "as_dataset", "load_dataset"])
+
+    def test_opentelemetry_fallback(self):
+        sink = OpenTelemetrySink(self.tmp_path / "spans.jsonl", fallback_only=True)
+        tracer = Tracer([sink])
+        load_dataset(self.load_dataset_kwargs, tracer)
+        tracer.close()
+
+        with open(self.tmp_path / "spans.jsonl") as f:
+            spans = [json.loads(line) for line in f]
+        self.assertEqual([span["spanId"] for span in spans], [event.span_id for event in tracer.events])
+        span_ids = {span["spanId"] for span in spans}
+        for span in spans:
+            self.assertTrue(span["parentSpanId"] == "" or span["parentSpanId"] in span_ids)
+            self.assertLessEqual(span["startTimeUnixNano"], span["endTimeUnixNano"])
+            self.assertEqual(span["name"], f"{span['attributes']['nusacrowd.stage']} toy_source")
+        write_arrow = [span for span in spans if span["attributes"]["nusacrowd.stage"] == "write_arrow"]
+        self.assertEqual({span["attributes"]["nusacrowd.split"] for span in write_arrow}, {"train", "test"})
+
+
+if __name__ == "__main__":
+    unittest.main()